@@ -3,21 +3,82 @@
 Cliente API para conectar con WebUI en modo headless
 """
 
+import os
 import requests
 import json
 import time
+import threading
 import base64
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 import logging
 
+DEFAULT_WEBUI_URL = os.environ.get('WEBUI_URL', "http://localhost:7860")
+
+# Parámetros que deben coincidir para que varios perfiles compartan una petición txt2img
+TXT2IMG_BATCH_KEYS = ('width', 'height', 'steps', 'cfg_scale', 'sampler_name')
+
+def group_profiles_for_batching(profiles, max_batch_size):
+    """
+    Agrupar perfiles con la misma configuración de render en lotes
+    
+    Args:
+        profiles: Lista de perfiles con 'generation_parameters'
+        max_batch_size: Máximo de imágenes por petición
+        
+    Returns:
+        Lista de (parámetros_comunes, [(índice, perfil), ...]) en orden de aparición
+    """
+    max_batch_size = max(1, int(max_batch_size))
+    groups = {}
+    for index, profile in enumerate(profiles):
+        generation = profile.get('generation_parameters', {})
+        key = tuple(generation.get(k) for k in TXT2IMG_BATCH_KEYS)
+        groups.setdefault(key, []).append((index, profile))
+    
+    batches = []
+    for key, members in groups.items():
+        common = {k: v for k, v in zip(TXT2IMG_BATCH_KEYS, key) if v is not None}
+        for start in range(0, len(members), max_batch_size):
+            batches.append((common, members[start:start + max_batch_size]))
+    return batches
+
+def build_batch_params(common_params, seeds):
+    """Parámetros txt2img para un lote con una semilla por imagen"""
+    batch_params = dict(common_params)
+    batch_params['seed'] = list(seeds)
+    batch_params['batch_size'] = len(batch_params['seed'])
+    batch_params['n_iter'] = 1
+    return batch_params
+
+def build_txt2img_payload(prompt, negative_prompt, params):
+    """Cuerpo de la petición txt2img (compartido por el cliente síncrono y el asíncrono)"""
+    payload = {
+        "prompt": prompt,
+        "negative_prompt": negative_prompt,
+        "width": params.get("width", 512),
+        "height": params.get("height", 764),
+        "cfg_scale": params.get("cfg_scale", 7.0),
+        "steps": params.get("steps", 20),
+        "sampler_name": params.get("sampler_name", "DPM++ 2M"),
+        "batch_size": params.get("batch_size", 1),
+        "n_iter": params.get("n_iter", 1),
+        "seed": params.get("seed", -1)
+    }
+    # Compresión PNG en el servidor (0 = más rápida, 9 = más pequeña); solo si se pide
+    if params.get("png_compress_level") is not None:
+        payload["png_compress_level"] = params["png_compress_level"]
+    return payload
+
 class WebUIAPIClient:
     """Cliente para conectar con WebUI vía API"""
     
-    def __init__(self, base_url="http://localhost:7860"):
+    def __init__(self, base_url=DEFAULT_WEBUI_URL, binary_transport=True):
         self.base_url = base_url
         self.session = requests.Session()
         self.logger = logging.getLogger(__name__)
+        # Imágenes en bruto vía /sdapi/v1/results en lugar de base64 dentro del JSON
+        self.binary_transport = binary_transport
         
     def wait_for_webui(self, timeout=300):
         """Esperar que WebUI esté disponible"""
@@ -39,47 +100,223 @@ class WebUIAPIClient:
         print("❌ WebUI no disponible después del timeout")
         return False
     
+    def _build_txt2img_payload(self, prompt, negative_prompt, params):
+        """Preparar datos para la API txt2img"""
+        return build_txt2img_payload(prompt, negative_prompt, params)
+    
+    def _post_txt2img(self, api_data, batch_count):
+        """POST a txt2img; devuelve el JSON de la respuesta o None"""
+        # Los lotes con prompts por imagen tardan proporcionalmente más
+        response = self.session.post(
+            f"{self.base_url}/sdapi/v1/txt2img",
+            json=api_data,
+            timeout=120 * batch_count
+        )
+        if response.status_code == 200:
+            return response.json()
+        self.logger.error(f"Error API: {response.status_code}")
+        return None
+    
+    def txt2img_raw(self, prompt, negative_prompt, params):
+        """Generar vía API y devolver las imágenes en base64 sin decodificar"""
+        try:
+            api_data = self._build_txt2img_payload(prompt, negative_prompt, params)
+            batch_count = len(prompt) if isinstance(prompt, list) else 1
+            result = self._post_txt2img(api_data, batch_count)
+            if result is None:
+                return None
+            if 'images' in result and result['images']:
+                return result['images']
+            else:
+                self.logger.error("No se generó ninguna imagen")
+                return None
+                
+        except Exception as e:
+            self.logger.error(f"Error generando imagen: {e}")
+            return None
+    
+    def txt2img_images(self, prompt, negative_prompt, params):
+        """
+        Generar vía API y devolver las imágenes ya decodificadas (bytes)
+        
+        Con binary_transport la respuesta solo trae un result_id y cada imagen
+        se descarga en bruto de /sdapi/v1/results/{id}/{índice}, sin base64 ni
+        un JSON de varios MB. Si el WebUI no admite response_format se vuelve a
+        base64 para el resto de la sesión.
+        """
+        try:
+            api_data = self._build_txt2img_payload(prompt, negative_prompt, params)
+            batch_count = len(prompt) if isinstance(prompt, list) else 1
+            if self.binary_transport:
+                api_data['response_format'] = 'binary'
+            result = self._post_txt2img(api_data, batch_count)
+            if result is None:
+                return None
+            
+            if result.get('result_id'):
+                return self._fetch_result(result['result_id'], result.get('image_count') or 0)
+            if self.binary_transport:
+                self.logger.info(f"{self.base_url} no admite response_format=binary, se usa base64")
+                self.binary_transport = False
+            if not result.get('images'):
+                self.logger.error("No se generó ninguna imagen")
+                return None
+            return [base64.b64decode(image) for image in result['images']]
+            
+        except Exception as e:
+            self.logger.error(f"Error generando imagen: {e}")
+            return None
+    
+    def _fetch_result(self, result_id, image_count):
+        """Descargar las imágenes en bruto de un resultado y liberarlo en el servidor"""
+        url = f"{self.base_url}/sdapi/v1/results/{result_id}"
+        try:
+            images = []
+            for index in range(image_count):
+                response = self.session.get(f"{url}/{index}", timeout=60)
+                if response.status_code != 200:
+                    self.logger.error(f"Error descargando imagen {index} de {result_id}: {response.status_code}")
+                    return None
+                images.append(response.content)
+            if not images:
+                self.logger.error("No se generó ninguna imagen")
+                return None
+            return images
+        finally:
+            try:
+                self.session.delete(url, timeout=10)
+            except requests.RequestException:
+                pass
+    
     def generate_image(self, prompt, negative_prompt, params):
         """Generar imagen vía API"""
-        try:
-            # Preparar datos para la API
-            api_data = {
-                "prompt": prompt,
-                "negative_prompt": negative_prompt,
-                "width": params.get("width", 512),
-                "height": params.get("height", 764),
-                "cfg_scale": params.get("cfg_scale", 7.0),
-                "steps": params.get("steps", 20),
-                "sampler_name": params.get("sampler_name", "DPM++ 2M"),
-                "batch_size": params.get("batch_size", 1),
-                "n_iter": params.get("n_iter", 1),
-                "seed": params.get("seed", -1)
-            }
+        images = self.txt2img_images(prompt, negative_prompt, params)
+        return images[0] if images else None
+    
+    def generate_images_batch(self, prompts, negative_prompt, seeds, params):
+        """
+        Generar varias imágenes distintas en una sola petición txt2img
+        
+        Args:
+            prompts: Un prompt por imagen
+            negative_prompt: Prompt negativo común o lista por imagen
+            seeds: Una semilla por imagen
+            params: Parámetros comunes (width, height, steps, cfg_scale, sampler_name)
+            
+        Returns:
+            Lista de bytes PNG en el mismo orden que prompts, o None si falla
+        """
+        images = self.txt2img_images(list(prompts), negative_prompt, build_batch_params(params, seeds))
+        if not images:
+            return None
+        if len(images) != len(prompts):
+            self.logger.error(f"Lote incompleto: {len(images)} imágenes para {len(prompts)} prompts")
+            return None
+        return images
+    
+    def submit_txt2img_batch(self, jobs, batch_size=8):
+        """
+        Enviar un trabajo completo a /sdapi/v1/txt2img-batch
+        
+        Args:
+            jobs: Iterable de dicts {prompt, negative_prompt, seed, params}; se
+                envía como JSON Lines en streaming, sin construir la lista entera
+            batch_size: Imágenes por lote de GPU en el servidor
             
-            # Llamar a la API
+        Returns:
+            job_id, o None si falla o el WebUI no tiene el endpoint
+        """
+        lines = (json.dumps(job).encode('utf-8') + b'\n' for job in jobs)
+        try:
             response = self.session.post(
-                f"{self.base_url}/sdapi/v1/txt2img",
-                json=api_data,
-                timeout=120
+                f"{self.base_url}/sdapi/v1/txt2img-batch",
+                params={'batch_size': batch_size},
+                data=lines,
+                headers={'Content-Type': 'application/x-ndjson'},
+                timeout=300
             )
-            
             if response.status_code == 200:
                 result = response.json()
-                if 'images' in result and result['images']:
-                    # Decodificar imagen base64
-                    image_data = base64.b64decode(result['images'][0])
-                    return image_data
-                else:
-                    self.logger.error("No se generó ninguna imagen")
-                    return None
+                self.logger.info(f"Trabajo {result['job_id']}: {result['total']} imágenes en {result['batches']} lotes")
+                return result['job_id']
+            if response.status_code == 404:
+                self.logger.info(f"{self.base_url} no admite /sdapi/v1/txt2img-batch")
             else:
-                self.logger.error(f"Error API: {response.status_code}")
-                return None
-                
+                self.logger.error(f"Error enviando trabajo por lotes: {response.status_code} {response.text[:200]}")
+            return None
         except Exception as e:
-            self.logger.error(f"Error generando imagen: {e}")
+            self.logger.error(f"Error enviando trabajo por lotes: {e}")
             return None
     
+    def iter_txt2img_batch(self, job_id, cancel_event=None, reconnects=5):
+        """
+        Recibir los resultados de un trabajo por lotes a medida que terminan (SSE)
+        
+        Si la conexión se corta se reanuda desde el último evento recibido; si
+        se activa cancel_event, se agotan los reintentos o se cierra el
+        generador antes de terminar, se cancela el trabajo en el servidor.
+        
+        Yields:
+            (índice del trabajo, bytes de la imagen o None si su lote falló)
+        """
+        url = f"{self.base_url}/sdapi/v1/txt2img-batch/{job_id}/events"
+        offset = 0
+        failures = 0
+        finished = False
+        try:
+            while True:
+                try:
+                    # El servidor envía un keep-alive cada 15 s, así que 60 s sin datos es una conexión caída
+                    with self.session.get(url, params={'offset': offset}, stream=True, timeout=(10, 60)) as response:
+                        if response.status_code != 200:
+                            self.logger.error(f"Error leyendo trabajo {job_id}: {response.status_code}")
+                            return
+                        event = {}
+                        for line in response.iter_lines(decode_unicode=True):
+                            if cancel_event is not None and cancel_event.is_set():
+                                return
+                            if line:
+                                field, _, value = line.partition(':')
+                                if field:
+                                    event[field] = value.lstrip()
+                                continue
+                            if 'data' not in event:
+                                event = {}
+                                continue
+                            name, data = event.get('event'), json.loads(event['data'])
+                            offset = int(event['id']) + 1
+                            event = {}
+                            failures = 0
+                            if name == 'image':
+                                yield data['index'], base64.b64decode(data['image'])
+                            elif name == 'error':
+                                self.logger.warning(f"Trabajo {job_id}, imagen {data['index']}: {data['error']}")
+                                yield data['index'], None
+                            elif name == 'done':
+                                finished = True
+                                return
+                except requests.RequestException as e:
+                    self.logger.warning(f"Conexión con el trabajo {job_id} interrumpida: {e}")
+            
+                failures += 1
+                if failures > reconnects:
+                    self.logger.error(f"No se pudo reanudar el trabajo {job_id} tras {reconnects} intentos")
+                    return
+                time.sleep(min(2 ** failures, 30))
+        finally:
+            # Si se deja de leer antes del evento 'done' (cancelación, reintentos agotados o
+            # generador cerrado) el trabajo se cancela para que no ocupe el WebUI
+            if not finished:
+                self.cancel_txt2img_batch(job_id)
+    
+    def cancel_txt2img_batch(self, job_id):
+        """Cancelar un trabajo por lotes (el servidor termina el lote de GPU en curso)"""
+        try:
+            response = self.session.delete(f"{self.base_url}/sdapi/v1/txt2img-batch/{job_id}", timeout=10)
+            return response.status_code == 200
+        except requests.RequestException:
+            return False
+    
     def get_models(self):
         """Obtener modelos disponibles"""
         try:
@@ -128,6 +365,247 @@ class WebUIAPIClient:
             print(f"⚠️ Error obteniendo modelo activo: {e}")
             return "unknown_model"
 
+class WebUIBackend:
+    """Estado de un nodo WebUI dentro del pool"""
+    
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.client = WebUIAPIClient(self.base_url)
+        self.in_flight = 0          # Peticiones enviadas por este proceso
+        self.pending_tasks = 0      # Cola reportada por /internal/pending-tasks
+        self.busy = False           # Hay un trabajo en curso según /sdapi/v1/progress
+        self.healthy = True
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_check = 0.0
+    
+    @property
+    def load(self):
+        """Carga estimada: trabajo propio en vuelo más la cola remota"""
+        return self.in_flight + self.pending_tasks + (1 if self.busy else 0)
+    
+    def to_dict(self):
+        return {
+            'url': self.base_url,
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'pending_tasks': self.pending_tasks,
+            'busy': self.busy,
+            'failures': self.failures
+        }
+
+class WebUIBackendPool:
+    """
+    Pool de backends WebUI con despacho al nodo menos cargado
+    
+    Expone la misma interfaz que WebUIAPIClient, por lo que puede usarse en su
+    lugar. Si un nodo falla, la petición se reintenta en otro nodo y el nodo
+    queda fuera de servicio durante retry_after segundos.
+    """
+    
+    def __init__(self, base_urls, health_interval=10.0, max_failures=2, retry_after=30.0):
+        if isinstance(base_urls, str):
+            base_urls = [base_urls]
+        if not base_urls:
+            raise ValueError("Se requiere al menos una URL de WebUI")
+        
+        self.backends = [WebUIBackend(url) for url in base_urls]
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self.retry_after = retry_after
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # Trabajos por lotes del servidor y el nodo que los ejecuta
+        self._batch_jobs = {}
+    
+    @property
+    def base_url(self):
+        """URL del primer nodo sano (compatibilidad con WebUIAPIClient)"""
+        healthy = [b for b in self.backends if b.healthy]
+        return (healthy or self.backends)[0].base_url
+    
+    def check_backend(self, backend):
+        """Comprobar salud y carga de un nodo"""
+        try:
+            response = backend.client.session.get(
+                f"{backend.base_url}/sdapi/v1/progress",
+                params={'skip_current_image': 'true'},
+                timeout=5
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"progress devolvió {response.status_code}")
+            state = response.json().get('state', {})
+            backend.busy = bool(state.get('job_count', 0)) or response.json().get('progress', 0) > 0
+            
+            response = backend.client.session.get(f"{backend.base_url}/internal/pending-tasks", timeout=5)
+            backend.pending_tasks = response.json().get('size', 0) if response.status_code == 200 else 0
+            
+            backend.healthy = True
+            backend.failures = 0
+        except Exception as e:
+            backend.healthy = False
+            backend.down_until = time.time() + self.retry_after
+            self.logger.warning(f"Backend {backend.base_url} no disponible: {e}")
+        finally:
+            backend.last_check = time.time()
+        return backend.healthy
+    
+    def check_health(self, force=False):
+        """Refrescar los nodos cuyo estado ha caducado"""
+        now = time.time()
+        for backend in self.backends:
+            if not force and now - backend.last_check < self.health_interval:
+                continue
+            if not force and not backend.healthy and now < backend.down_until:
+                continue
+            self.check_backend(backend)
+        return [backend.to_dict() for backend in self.backends]
+    
+    def _acquire(self, exclude):
+        """Reservar el nodo sano menos cargado que no se haya probado ya"""
+        self.check_health()
+        with self._lock:
+            candidates = [b for b in self.backends if b.healthy and b not in exclude]
+            if not candidates:
+                return None
+            backend = min(candidates, key=lambda b: b.load)
+            backend.in_flight += 1
+            return backend
+    
+    def _release(self, backend, success):
+        with self._lock:
+            backend.in_flight -= 1
+            if success:
+                backend.failures = 0
+                return
+            backend.failures += 1
+            if backend.failures >= self.max_failures:
+                backend.healthy = False
+                backend.down_until = time.time() + self.retry_after
+                print(f"⚠️ Backend {backend.base_url} marcado como caído, redirigiendo trabajo")
+    
+    def _dispatch(self, method_name, *args, **kwargs):
+        """Ejecutar en el nodo menos cargado con failover al resto"""
+        tried = set()
+        while len(tried) < len(self.backends):
+            backend = self._acquire(tried)
+            if backend is None:
+                break
+            tried.add(backend)
+            result = None
+            try:
+                result = getattr(backend.client, method_name)(*args, **kwargs)
+            except Exception as e:
+                self.logger.error(f"Error en {backend.base_url}: {e}")
+            self._release(backend, result is not None)
+            if result is not None:
+                return result
+            self.logger.warning(f"Reintentando {method_name} en otro backend (falló {backend.base_url})")
+        self.logger.error(f"Ningún backend pudo completar {method_name}")
+        return None
+    
+    def txt2img_raw(self, prompt, negative_prompt, params):
+        return self._dispatch('txt2img_raw', prompt, negative_prompt, params)
+    
+    def txt2img_images(self, prompt, negative_prompt, params):
+        return self._dispatch('txt2img_images', prompt, negative_prompt, params)
+    
+    def generate_image(self, prompt, negative_prompt, params):
+        return self._dispatch('generate_image', prompt, negative_prompt, params)
+    
+    def generate_images_batch(self, prompts, negative_prompt, seeds, params):
+        return self._dispatch('generate_images_batch', prompts, negative_prompt, seeds, params)
+    
+    def wait_for_webui(self, timeout=300):
+        """Esperar a que al menos un nodo esté disponible"""
+        print(f"🔍 Esperando backends WebUI ({len(self.backends)} nodos)...")
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            self.check_health(force=True)
+            healthy = [b for b in self.backends if b.healthy]
+            if healthy:
+                print(f"✅ {len(healthy)}/{len(self.backends)} backends disponibles")
+                return True
+            print("⏳ Esperando WebUI...")
+            time.sleep(5)
+        print("❌ Ningún backend disponible después del timeout")
+        return False
+    
+    def _first_healthy_client(self):
+        self.check_health()
+        healthy = [b for b in self.backends if b.healthy]
+        return (healthy or self.backends)[0].client
+    
+    def get_models(self):
+        return self._first_healthy_client().get_models()
+    
+    def get_options(self):
+        return self._first_healthy_client().get_options()
+    
+    def get_current_model(self):
+        return self._first_healthy_client().get_current_model()
+    
+    def set_model(self, model_name):
+        """Cambiar modelo en todos los nodos para que el lote sea homogéneo"""
+        results = [backend.client.set_model(model_name) for backend in self.backends if backend.healthy]
+        return bool(results) and all(results)
+    
+    def submit_txt2img_batch(self, jobs, batch_size=8):
+        """
+        Enviar un trabajo por lotes al nodo menos cargado
+        
+        El trabajo queda fijado a ese nodo (sus resultados solo existen allí) y
+        cuenta como carga del nodo hasta que iter_txt2img_batch termina. No hay
+        failover: jobs se envía en streaming y no puede repetirse en otro nodo.
+        """
+        backend = self._acquire(set())
+        if backend is None:
+            self.logger.error("Ningún backend disponible para el trabajo por lotes")
+            return None
+        job_id = backend.client.submit_txt2img_batch(jobs, batch_size=batch_size)
+        if job_id is None:
+            # Sin penalizar al nodo: None también significa que no tiene el endpoint
+            self._release(backend, True)
+            return None
+        with self._lock:
+            self._batch_jobs[job_id] = backend
+        self.logger.info(f"Trabajo por lotes {job_id} en {backend.base_url}")
+        return job_id
+    
+    def iter_txt2img_batch(self, job_id, cancel_event=None, reconnects=5):
+        """Resultados de un trabajo por lotes, leídos del nodo que lo ejecuta"""
+        with self._lock:
+            backend = self._batch_jobs.get(job_id)
+        if backend is None:
+            raise KeyError(f"Trabajo por lotes desconocido: {job_id}")
+        try:
+            yield from backend.client.iter_txt2img_batch(job_id, cancel_event=cancel_event, reconnects=reconnects)
+        finally:
+            with self._lock:
+                self._batch_jobs.pop(job_id, None)
+            self._release(backend, True)
+    
+    def cancel_txt2img_batch(self, job_id):
+        """Cancelar un trabajo por lotes en el nodo que lo ejecuta"""
+        with self._lock:
+            backend = self._batch_jobs.get(job_id)
+        return backend.client.cancel_txt2img_batch(job_id) if backend is not None else False
+
+def create_webui_client(base_urls=None):
+    """
+    Crear cliente WebUI: un nodo o un pool si hay varias URLs
+    
+    Args:
+        base_urls: Lista de URLs; por defecto WEBUI_URLS (separadas por comas) o DEFAULT_WEBUI_URL
+    """
+    if not base_urls:
+        base_urls = [url.strip() for url in os.environ.get('WEBUI_URLS', '').split(',') if url.strip()]
+    if not base_urls:
+        base_urls = [DEFAULT_WEBUI_URL]
+    if len(base_urls) == 1:
+        return WebUIAPIClient(base_urls[0])
+    return WebUIBackendPool(base_urls)
+
 class GeneticAPIGenerator:
     """Generador genético usando API"""
     
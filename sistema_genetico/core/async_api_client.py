@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Cliente API asíncrono para WebUI (asyncio + aiohttp)
+Variante de WebUIAPIClient pensada para mantener decenas de peticiones en vuelo
+desde un solo hilo: un conector keep-alive compartido, timeouts por endpoint,
+reintentos con backoff exponencial para las llamadas idempotentes y errores
+tipados en lugar de devolver None. Cancelar una tarea mientras descarga un
+resultado binario lo libera en el servidor; si se cancela durante el POST de
+txt2img, el resultado queda en el servidor hasta que expira su TTL.
+aiohttp es opcional: sin él el cliente lanza ImportError al crearse
+"""
+
+import asyncio
+import base64
+import itertools
+import random
+import time
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    AIOHTTP_AVAILABLE = False
+
+from api_client import DEFAULT_WEBUI_URL, build_batch_params, build_txt2img_payload
+
+logger = logging.getLogger(__name__)
+
+# Timeout total en segundos por endpoint (txt2img se multiplica por las imágenes del lote)
+DEFAULT_TIMEOUTS = {
+    'txt2img': 120.0,
+    'results': 60.0,
+    'options': 10.0,
+    'sd-models': 10.0,
+    'default': 30.0
+}
+# Respuestas que indican un fallo transitorio del servidor
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+
+
+class WebUIError(Exception):
+    """Error de una llamada a la API de WebUI"""
+
+    def __init__(self, message: str, url: Optional[str] = None):
+        super().__init__(message)
+        self.url = url
+
+
+class WebUIConnectionError(WebUIError):
+    """No se pudo conectar o la conexión se cortó"""
+
+
+class WebUITimeoutError(WebUIError):
+    """La llamada superó el timeout de su endpoint"""
+
+
+class WebUIHTTPError(WebUIError):
+    """El servidor respondió con un estado de error"""
+
+    def __init__(self, message: str, url: Optional[str] = None, status: Optional[int] = None, detail: str = ""):
+        super().__init__(message, url)
+        self.status = status
+        self.detail = detail
+
+
+class WebUIResponseError(WebUIError):
+    """Respuesta inesperada (sin imágenes, lote incompleto o cuerpo inválido)"""
+
+
+def _require_aiohttp():
+    if not AIOHTTP_AVAILABLE:
+        raise ImportError("aiohttp no está instalado (pip install aiohttp)")
+
+
+class AsyncWebUIAPIClient:
+    """
+    Cliente asíncrono para WebUI
+
+    Uso:
+        async with AsyncWebUIAPIClient(url) as client:
+            images = await client.txt2img_images(prompt, negative_prompt, params)
+
+    Todas las llamadas lanzan una subclase de WebUIError si fallan. GET, DELETE
+    y el cambio de opciones se reintentan ante errores de conexión, timeouts y
+    estados 429/502/503/504; txt2img no se reintenta (volvería a generar).
+    """
+
+    def __init__(self, base_url: str = DEFAULT_WEBUI_URL, binary_transport: bool = True,
+                 max_connections: int = 32, timeouts: Optional[Dict[str, float]] = None,
+                 retries: int = 3, backoff: float = 0.5, max_backoff: float = 10.0):
+        """
+        Args:
+            base_url: URL del WebUI
+            binary_transport: Descargar las imágenes en bruto de /sdapi/v1/results
+            max_connections: Conexiones keep-alive simultáneas del conector
+            timeouts: Timeouts por endpoint que sustituyen a DEFAULT_TIMEOUTS
+            retries: Reintentos de las llamadas idempotentes
+            backoff: Espera inicial entre reintentos (se duplica en cada uno)
+            max_backoff: Espera máxima entre reintentos
+        """
+        _require_aiohttp()
+        self.base_url = base_url.rstrip('/')
+        self.binary_transport = binary_transport
+        self.max_connections = max_connections
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.logger = logging.getLogger(__name__)
+        self._session: Optional['aiohttp.ClientSession'] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        # La sesión se crea dentro del bucle de eventos que la va a usar
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        """Cerrar la sesión y sus conexiones"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Backoff exponencial con jitter para no sincronizar reintentos de muchas tareas"""
+        return min(self.max_backoff, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    async def _request(self, method: str, path: str, endpoint: str, json: Any = None,
+                       params: Optional[Dict[str, Any]] = None, idempotent: Optional[bool] = None,
+                       timeout_scale: float = 1.0, read: str = 'json') -> Any:
+        """
+        Llamada HTTP con timeout de endpoint y reintentos
+
+        Args:
+            method: Método HTTP
+            path: Ruta bajo base_url
+            endpoint: Clave de self.timeouts
+            json: Cuerpo JSON
+            params: Parámetros de la URL
+            idempotent: Si se puede reintentar (por defecto según el método)
+            timeout_scale: Multiplicador del timeout (imágenes del lote)
+            read: 'json', 'bytes' o None (descartar el cuerpo)
+
+        Returns:
+            Cuerpo de la respuesta decodificado según read
+        """
+        url = f"{self.base_url}{path}"
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempts = self.retries + 1 if idempotent else 1
+        timeout = aiohttp.ClientTimeout(total=self.timeouts.get(endpoint, self.timeouts['default']) * timeout_scale)
+
+        for attempt in range(attempts):
+            try:
+                async with self._get_session().request(method, url, json=json, params=params, timeout=timeout) as response:
+                    if response.status >= 400:
+                        detail = await response.text()
+                        error = WebUIHTTPError(f"{method} {path}: HTTP {response.status}", url, response.status, detail[:500])
+                        if response.status not in RETRY_STATUSES:
+                            raise error
+                    elif read == 'json':
+                        return await response.json(content_type=None)
+                    elif read == 'bytes':
+                        return await response.read()
+                    else:
+                        return None
+            except asyncio.TimeoutError:
+                error = WebUITimeoutError(f"{method} {path}: timeout de {timeout.total:.0f}s", url)
+            except aiohttp.ClientError as e:
+                error = WebUIConnectionError(f"{method} {path}: {e}", url)
+            except ValueError as e:
+                raise WebUIResponseError(f"{method} {path}: respuesta no válida ({e})", url) from e
+
+            if attempt + 1 >= attempts:
+                raise error
+            delay = self._retry_delay(attempt)
+            self.logger.warning(f"{error}; reintento {attempt + 1}/{self.retries} en {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def wait_for_webui(self, timeout: float = 300, interval: float = 1.0) -> bool:
+        """Esperar que WebUI esté disponible (sondeo con espera creciente hasta 5 s)"""
+        self.logger.info(f"Esperando WebUI en {self.base_url}")
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                await self._request('GET', '/sdapi/v1/options', 'options', idempotent=False, read=None)
+                self.logger.info("WebUI disponible")
+                return True
+            except WebUIError as e:
+                self.logger.debug(f"WebUI aún no disponible: {e}")
+            await asyncio.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+            interval = min(interval * 2, 5.0)
+        self.logger.error(f"WebUI no disponible después de {timeout}s")
+        return False
+
+    async def txt2img_raw(self, prompt, negative_prompt, params) -> List[str]:
+        """Generar vía API y devolver las imágenes en base64 sin decodificar"""
+        batch_count = len(prompt) if isinstance(prompt, list) else 1
+        result = await self._request('POST', '/sdapi/v1/txt2img', 'txt2img',
+                                     json=build_txt2img_payload(prompt, negative_prompt, params),
+                                     timeout_scale=batch_count)
+        if not result.get('images'):
+            raise WebUIResponseError("No se generó ninguna imagen", f"{self.base_url}/sdapi/v1/txt2img")
+        return result['images']
+
+    async def txt2img_images(self, prompt, negative_prompt, params) -> List[bytes]:
+        """
+        Generar vía API y devolver las imágenes decodificadas (bytes)
+
+        Con binary_transport las imágenes del resultado se descargan en
+        paralelo por el conector compartido; si el WebUI no admite
+        response_format se vuelve a base64 para el resto de la sesión.
+        """
+        api_data = build_txt2img_payload(prompt, negative_prompt, params)
+        batch_count = len(prompt) if isinstance(prompt, list) else 1
+        if self.binary_transport:
+            api_data['response_format'] = 'binary'
+        result = await self._request('POST', '/sdapi/v1/txt2img', 'txt2img', json=api_data, timeout_scale=batch_count)
+
+        if result.get('result_id'):
+            return await self._fetch_result(result['result_id'], result.get('image_count') or 0)
+        if self.binary_transport:
+            self.logger.info(f"{self.base_url} no admite response_format=binary, se usa base64")
+            self.binary_transport = False
+        if not result.get('images'):
+            raise WebUIResponseError("No se generó ninguna imagen", f"{self.base_url}/sdapi/v1/txt2img")
+        return [base64.b64decode(image) for image in result['images']]
+
+    async def _fetch_result(self, result_id: str, image_count: int) -> List[bytes]:
+        """Descargar las imágenes de un resultado y liberarlo (también si se cancela la tarea)"""
+        path = f"/sdapi/v1/results/{result_id}"
+        try:
+            images = await asyncio.gather(*[
+                self._request('GET', f"{path}/{index}", 'results', read='bytes') for index in range(image_count)
+            ])
+            if not images:
+                raise WebUIResponseError("No se generó ninguna imagen", f"{self.base_url}{path}")
+            return list(images)
+        finally:
+            try:
+                await asyncio.shield(self._request('DELETE', path, 'results', read=None))
+            except WebUIError:
+                pass
+
+    async def generate_image(self, prompt, negative_prompt, params) -> bytes:
+        """Generar una imagen vía API"""
+        return (await self.txt2img_images(prompt, negative_prompt, params))[0]
+
+    async def generate_images_batch(self, prompts, negative_prompt, seeds, params) -> List[bytes]:
+        """
+        Generar varias imágenes distintas en una sola petición txt2img
+
+        Args:
+            prompts: Un prompt por imagen
+            negative_prompt: Prompt negativo común o lista por imagen
+            seeds: Una semilla por imagen
+            params: Parámetros comunes (width, height, steps, cfg_scale, sampler_name)
+
+        Returns:
+            Lista de bytes en el mismo orden que prompts
+        """
+        images = await self.txt2img_images(list(prompts), negative_prompt, build_batch_params(params, seeds))
+        if len(images) != len(prompts):
+            raise WebUIResponseError(f"Lote incompleto: {len(images)} imágenes para {len(prompts)} prompts",
+                                     f"{self.base_url}/sdapi/v1/txt2img")
+        return images
+
+    async def txt2img_many(self, jobs: Iterable[Tuple[Any, Any, Dict[str, Any]]],
+                           max_in_flight: int = 32) -> AsyncIterator[Tuple[int, Union[List[bytes], WebUIError]]]:
+        """
+        Lanzar muchas peticiones txt2img con una ventana de max_in_flight
+
+        Los trabajos se leen de jobs a medida que se libera la ventana, así que
+        jobs puede ser un generador de cualquier longitud: nunca hay más de
+        max_in_flight tareas creadas.
+
+        Args:
+            jobs: Tuplas (prompt, negative_prompt, params)
+            max_in_flight: Peticiones simultáneas como máximo
+
+        Yields:
+            (índice del trabajo, imágenes o el WebUIError con el que falló), en
+            orden de finalización. Si el consumidor deja de iterar o se cancela,
+            se cancelan las peticiones pendientes.
+        """
+        window = max(1, int(max_in_flight))
+        jobs = enumerate(jobs)
+        pending = set()
+
+        async def run(index, prompt, negative_prompt, params):
+            try:
+                return index, await self.txt2img_images(prompt, negative_prompt, params)
+            except WebUIError as e:
+                return index, e
+
+        def refill():
+            for index, job in itertools.islice(jobs, window - len(pending)):
+                pending.add(asyncio.ensure_future(run(index, *job)))
+
+        try:
+            refill()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+                # Rellenar antes de entregar resultados: la ventana no espera al consumidor
+                refill()
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def get_models(self) -> List[Dict[str, Any]]:
+        """Obtener modelos disponibles"""
+        return await self._request('GET', '/sdapi/v1/sd-models', 'sd-models')
+
+    async def get_options(self) -> Dict[str, Any]:
+        """Obtener opciones del WebUI"""
+        return await self._request('GET', '/sdapi/v1/options', 'options')
+
+    async def set_model(self, model_name: str):
+        """Cambiar modelo activo (la carga del checkpoint puede tardar: usa el timeout de txt2img)"""
+        await self._request('POST', '/sdapi/v1/options', 'txt2img', json={"sd_model_checkpoint": model_name},
+                            idempotent=True, read=None)
+
+    async def get_current_model(self) -> str:
+        """Obtener el modelo activo con el nombre limpio para usarlo como carpeta"""
+        options = await self.get_options()
+        model_name = options.get('sd_model_checkpoint', 'unknown_model')
+        return "".join(c for c in model_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Salida columnar (Parquet) de los lotes genéticos
+Cada lote escribe, junto al CSV de análisis, un Parquet con los rasgos y los
+parámetros de generación de cada perfil; las columnas de texto se guardan con
+codificación de diccionario. El lector combina los lotes de outputs/<modelo>/
+para consultar distribuciones de rasgos sin abrir un JSON por imagen.
+pyarrow es opcional: sin él la escritura se omite y el lector lanza ImportError
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = pc = ds = pq = None
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_SUFFIX = ".parquet"
+DEFAULT_ROW_GROUP_SIZE = 1024
+
+
+def _require_pyarrow():
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow no está instalado (pip install pyarrow)")
+
+
+def _infer_type(value: Any):
+    """Tipo Arrow de una columna a partir del valor de la primera fila"""
+    if isinstance(value, bool):
+        return pa.bool_()
+    if isinstance(value, int):
+        return pa.int64()
+    if isinstance(value, float):
+        return pa.float64()
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+def _normalize(value: Any, arrow_type) -> Any:
+    """Adaptar un valor al tipo de su columna (texto para todo lo demás)"""
+    if value is None:
+        return None
+    if pa.types.is_dictionary(arrow_type):
+        return value if isinstance(value, str) else str(value)
+    if pa.types.is_integer(arrow_type):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    if pa.types.is_floating(arrow_type):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return value
+
+
+class ColumnarBatchWriter:
+    """
+    Escritor Parquet de un lote
+
+    Acumula filas en memoria y escribe un row group cada row_group_size filas.
+    El esquema se fija con la primera fila (columnas nuevas posteriores se
+    ignoran). El pie del archivo solo se escribe en close(): tras un fallo el
+    CSV incremental sigue siendo la fuente completa del lote.
+    """
+
+    def __init__(self, path, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        _require_pyarrow()
+        self.path = Path(path)
+        self.row_group_size = max(1, int(row_group_size))
+        self.rows_written = 0
+        self.schema = None
+        self._buffer: List[Dict[str, Any]] = []
+        self._writer = None
+
+    def append(self, row: Dict[str, Any]):
+        if self.schema is None:
+            self.schema = pa.schema([(name, _infer_type(value)) for name, value in row.items()])
+        self._buffer.append(row)
+        if len(self._buffer) >= self.row_group_size:
+            self._write_buffer()
+
+    def _write_buffer(self):
+        if not self._buffer:
+            return
+        columns = []
+        for field in self.schema:
+            values = [_normalize(row.get(field.name), field.type) for row in self._buffer]
+            if pa.types.is_dictionary(field.type):
+                columns.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                columns.append(pa.array(values, type=field.type))
+        table = pa.Table.from_arrays(columns, schema=self.schema)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(str(self.path), self.schema, compression='zstd')
+        self._writer.write_table(table)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        """Escribir las filas pendientes y el pie del archivo"""
+        self._write_buffer()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            logger.info(f"Parquet de análisis guardado: {self.path} ({self.rows_written} filas)")
+
+
+def find_batch_files(outputs_dir, model: Optional[str] = None) -> List[Path]:
+    """Parquet de lotes bajo outputs/ (o solo outputs/<modelo>/)"""
+    root = Path(outputs_dir)
+    if model:
+        root = root / model
+    if not root.exists():
+        return []
+    # Estructura outputs/<modelo>/<lote>/<archivo>.parquet
+    pattern = f"*/*{COLUMNAR_SUFFIX}" if model else f"*/*/*{COLUMNAR_SUFFIX}"
+    return sorted(root.glob(pattern))
+
+
+def open_dataset(outputs_dir, model: Optional[str] = None):
+    """
+    Dataset Arrow que combina los Parquet de todos los lotes
+
+    Los esquemas se unifican (lotes con columnas distintas dan nulos) y se
+    añaden las columnas model y batch a partir de la ruta de cada archivo.
+
+    Args:
+        outputs_dir: Directorio outputs/
+        model: Limitar a un modelo
+
+    Returns:
+        pyarrow.dataset.Dataset (vacío si no hay lotes)
+    """
+    _require_pyarrow()
+    files = find_batch_files(outputs_dir, model)
+    if not files:
+        return ds.dataset([], schema=pa.schema([]))
+    root = Path(outputs_dir) / model if model else Path(outputs_dir)
+    path_fields = [('batch', pa.string())] if model else [('model', pa.string()), ('batch', pa.string())]
+    schema = pa.unify_schemas([pq.read_schema(str(path)) for path in files] + [pa.schema(path_fields)])
+    return ds.dataset(
+        [str(path) for path in files],
+        schema=schema,
+        format='parquet',
+        partitioning=ds.partitioning(pa.schema(path_fields)),
+        partition_base_dir=str(root)
+    )
+
+
+def load_profiles(outputs_dir, model: Optional[str] = None, columns: Optional[List[str]] = None,
+                  filters: Optional[Dict[str, Any]] = None):
+    """
+    Leer perfiles de todos los lotes como una tabla Arrow
+
+    Args:
+        outputs_dir: Directorio outputs/
+        model: Limitar a un modelo
+        columns: Columnas a leer (None = todas)
+        filters: Igualdades columna -> valor (p. ej. {'gender': 'female'})
+
+    Returns:
+        pyarrow.Table
+    """
+    dataset = open_dataset(outputs_dir, model)
+    expression = None
+    for name, value in (filters or {}).items():
+        condition = ds.field(name) == value
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+def trait_distribution(outputs_dir, column: str, model: Optional[str] = None,
+                       filters: Optional[Dict[str, Any]] = None) -> Dict[Any, int]:
+    """
+    Conteo de valores de un rasgo en todos los lotes
+
+    Returns:
+        Diccionario valor -> número de perfiles, de más a menos frecuente
+    """
+    # Sin lotes el dataset no tiene la columna y el escaneo fallaría
+    if not find_batch_files(outputs_dir, model):
+        return {}
+    table = load_profiles(outputs_dir, model, columns=[column], filters=filters)
+    if table.num_rows == 0:
+        return {}
+    column_data = table.column(column)
+    if pa.types.is_dictionary(column_data.type):
+        column_data = column_data.cast(column_data.type.value_type)
+    counts = pc.value_counts(column_data).to_pylist()
+    counts.sort(key=lambda item: item['counts'], reverse=True)
+    return {item['values']: item['counts'] for item in counts}
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Índice en disco para datasets JSON/PNG
+Evita releer todos los JSON en cada arranque: solo se parsean los archivos nuevos
+o modificados, y el filtrado/muestreo se resuelve con consultas SQLite
+"""
+
+import json
+import os
+import random
+import sqlite3
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = ".dataset_index.sqlite3"
+
+# Alias de género usados en los datasets
+GENDER_ALIASES = {
+    'hombre': ('hombre', 'male', 'masculino'),
+    'mujer': ('mujer', 'female', 'femenino'),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    json_file TEXT PRIMARY KEY,
+    png_file TEXT,
+    mtime REAL NOT NULL,
+    image_id TEXT,
+    nationality TEXT,
+    gender TEXT,
+    age INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_entries_filters ON entries(nationality, gender, age);
+"""
+
+
+def _gender_values(gender: str) -> tuple:
+    gender = gender.lower()
+    for aliases in GENDER_ALIASES.values():
+        if gender in aliases:
+            return aliases
+    return (gender,)
+
+
+class DatasetIndex:
+    """Índice incremental de (ruta, mtime, nacionalidad, género, edad) de un dataset"""
+
+    def __init__(self, dataset_path, index_path=None):
+        self.dataset_dir = Path(dataset_path).resolve()
+        if not self.dataset_dir.exists():
+            raise FileNotFoundError(f"Dataset no encontrado: {dataset_path}")
+        self.index_path = Path(index_path) if index_path else self.dataset_dir / INDEX_FILENAME
+        self.logger = logging.getLogger(__name__)
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.index_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Actualizar el índice con los cambios del directorio
+
+        Solo se hace stat() de cada archivo; el JSON se parsea únicamente si es
+        nuevo o su mtime cambió. Las entradas de archivos borrados se eliminan.
+
+        Returns:
+            Contadores de entradas añadidas, actualizadas, eliminadas y total
+        """
+        start_time = time.time()
+        with self._connect() as conn:
+            known = {row['json_file']: row['mtime'] for row in conn.execute("SELECT json_file, mtime FROM entries")}
+
+        seen = set()
+        added = updated = 0
+        pending = []
+        with os.scandir(self.dataset_dir) as it:
+            for dir_entry in it:
+                if not dir_entry.name.endswith('.json') or not dir_entry.is_file():
+                    continue
+                json_file = dir_entry.path
+                seen.add(json_file)
+                mtime = dir_entry.stat().st_mtime
+                if known.get(json_file) == mtime:
+                    continue
+                row = self._read_entry(json_file, mtime)
+                if row is None:
+                    continue
+                pending.append(row)
+                if json_file in known:
+                    updated += 1
+                else:
+                    added += 1
+                # Escribir por bloques para no acumular todo en memoria
+                if len(pending) >= 1000:
+                    self._upsert(pending)
+                    pending = []
+        if pending:
+            self._upsert(pending)
+
+        removed = [path for path in known if path not in seen]
+        with self._connect() as conn:
+            if removed:
+                conn.executemany("DELETE FROM entries WHERE json_file = ?", [(path,) for path in removed])
+            # PNG que aparecieron después de indexar su JSON
+            orphans = [row['json_file'] for row in conn.execute("SELECT json_file FROM entries WHERE png_file IS NULL")]
+            for json_file in orphans:
+                png_file = str(Path(json_file).with_suffix('.png'))
+                if os.path.exists(png_file):
+                    conn.execute("UPDATE entries SET png_file = ? WHERE json_file = ?", (png_file, json_file))
+
+        total = self.count()
+        self.logger.info(
+            f"Índice de dataset actualizado en {time.time() - start_time:.1f}s: "
+            f"{added} nuevas, {updated} modificadas, {len(removed)} eliminadas, {total} total"
+        )
+        return {'added': added, 'updated': updated, 'removed': len(removed), 'total': total}
+
+    def _read_entry(self, json_file: str, mtime: float) -> Optional[tuple]:
+        """Parsear un JSON del dataset (solo se llama para archivos nuevos o modificados)"""
+        png_file = str(Path(json_file).with_suffix('.png'))
+        if not os.path.exists(png_file):
+            self.logger.warning(f"Imagen PNG no encontrada para {json_file}")
+            png_file = None
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self.logger.error(f"Error cargando {json_file}: {e}")
+            return None
+        metadata = data.get('metadata', {})
+        try:
+            age = int(metadata.get('age', 25))
+        except (TypeError, ValueError):
+            age = 25
+        return (
+            json_file, png_file, mtime,
+            data.get('image_id', 'unknown'),
+            metadata.get('nationality', 'venezuelan'),
+            metadata.get('gender', 'hombre'),
+            age
+        )
+
+    def _upsert(self, rows: List[tuple]):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (json_file, png_file, mtime, image_id, nationality, gender, age) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def _where(self, filters: Optional[Dict[str, Any]]) -> tuple:
+        """Construir cláusula WHERE (solo entradas con PNG) a partir de filtros"""
+        clauses = ["png_file IS NOT NULL"]
+        args: List[Any] = []
+        filters = filters or {}
+        if filters.get('nationality'):
+            clauses.append("LOWER(nationality) = LOWER(?)")
+            args.append(filters['nationality'])
+        if filters.get('gender'):
+            values = _gender_values(filters['gender'])
+            clauses.append(f"LOWER(gender) IN ({','.join('?' * len(values))})")
+            args.extend(values)
+        if filters.get('age_min') is not None:
+            clauses.append("age >= ?")
+            args.append(int(filters['age_min']))
+        if filters.get('age_max') is not None:
+            clauses.append("age <= ?")
+            args.append(int(filters['age_max']))
+        return " WHERE " + " AND ".join(clauses), args
+
+    def count(self, filters: Optional[Dict[str, Any]] = None) -> int:
+        where, args = self._where(filters)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM entries{where}", args).fetchone()[0]
+
+    def iter_entries(self, filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None,
+                     batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        Recorrer entradas en orden estable sin cargar su JSON
+
+        Usa paginación por clave para no mantener un cursor abierto mientras
+        el consumidor genera imágenes.
+        """
+        where, args = self._where(filters)
+        last = ""
+        yielded = 0
+        while limit is None or yielded < limit:
+            page = batch_size if limit is None else min(batch_size, limit - yielded)
+            with self._connect() as conn:
+                rows = conn.execute(
+                    f"SELECT * FROM entries{where} AND json_file > ? ORDER BY json_file LIMIT ?",
+                    args + [last, page]
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            yielded += len(rows)
+            last = rows[-1]['json_file']
+
+    def sample(self, n: int, filters: Optional[Dict[str, Any]] = None,
+               rng: Optional[random.Random] = None) -> List[Dict[str, Any]]:
+        """Muestreo aleatorio sin reemplazo resuelto sobre el índice"""
+        rng = rng or random
+        where, args = self._where(filters)
+        with self._connect() as conn:
+            keys = [row[0] for row in conn.execute(f"SELECT json_file FROM entries{where}", args)]
+            chosen = rng.sample(keys, min(n, len(keys)))
+            rows = []
+            for start in range(0, len(chosen), 500):
+                chunk = chosen[start:start + 500]
+                rows.extend(conn.execute(
+                    f"SELECT * FROM entries WHERE json_file IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        by_key = {row['json_file']: dict(row) for row in rows}
+        return [by_key[key] for key in chosen if key in by_key]
+
+    @staticmethod
+    def load_metadata(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Cargar el JSON completo de una entrada (bajo demanda)"""
+        with open(entry['json_file'], 'r', encoding='utf-8') as f:
+            entry['metadata'] = json.load(f)
+        return entry
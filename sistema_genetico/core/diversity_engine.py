@@ -5,16 +5,127 @@ Sistema que genera características únicas y extremadamente diversas
 para evitar imágenes que se parezcan entre sí
 """
 
+import copy
 import random
-import json
 import time
 import hashlib
-from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 import logging
 
+from run_rng import ProfileRandom, new_run_seed
+from trait_catalog import filter_gender_features, get_catalog
+from prompt_compiler import SAIME_NEGATIVE_PROMPT, SAIME_POSE_TEXT, SAIME_PROMPT_PREFIX, SAIME_PROMPT_SUFFIX
+
+# Regiones disponibles cuando el control de región es "aleatorio"
+ADVANCED_REGIONS = [
+    "caracas", "maracaibo", "valencia", "barquisimeto", "ciudad_guayana", "maturin", "merida", 
+    "san_cristobal", "barcelona", "puerto_la_cruz", "ciudad_bolivar", "tucupita", "porlamar", 
+    "valera", "acarigua", "guanare", "san_fernando", "trujillo", "el_tigre", "cabimas", 
+    "punto_fijo", "ciudad_ojeda", "puerto_cabello", "valle_de_la_pascua", "san_juan_de_los_morros", 
+    "carora", "tocuyo", "duaca", "siquisique", "araure", "turen", "guanarito", "santa_elena", 
+    "el_venado", "san_rafael", "san_antonio", "la_fria", "rubio", "colon", "san_cristobal", 
+    "tachira", "apure", "amazonas", "delta_amacuro", "yacambu", "lara", "portuguesa", "cojedes", 
+    "guarico", "anzoategui", "monagas", "sucre", "nueva_esparta", "falcon", "zulia", "merida", 
+    "trujillo", "barinas", "yaracuy", "carabobo", "aragua", "miranda", "vargas", "distrito_capital"
+]
+
+# Rasgos secundarios del perfil avanzado (selección uniforme, sin anti-repetición)
+ADVANCED_PROFILE_CHOICES = {
+    "face_width": ["narrow", "medium", "wide"],
+    "face_length": ["short", "medium", "long"],
+    "chin": ["pointed", "rounded", "square", "oval"],
+    "facial_symmetry": ["slightly_asymmetrical", "balanced", "very_symmetrical"],
+    "bone_structure": ["delicate", "medium", "strong", "prominent"],
+    "eye_color_shade": ["light", "medium", "dark", "deep"],
+    "eye_size": ["small", "medium", "large"],
+    "eye_spacing": ["close", "medium", "wide"],
+    "eyelid_type": ["single", "double", "hooded", "deep_set"],
+    "eyelashes": ["short", "medium", "long", "very_long"],
+    "eyelashes_length": ["short", "medium", "long"],
+    "eyebrows_thickness": ["thin", "medium", "thick"],
+    "eyebrows_shape": ["straight", "arched", "rounded", "angled"],
+    "nose_size": ["small", "medium", "large"],
+    "nose_width": ["narrow", "medium", "wide"],
+    "nose_bridge": ["low", "medium", "high", "prominent"],
+    "nose_tip": ["pointed", "rounded", "wide", "narrow"],
+    "nostril_size": ["small", "medium", "large"],
+    "lip_size": ["small", "medium", "large"],
+    "lip_thickness": ["thin", "medium", "full"],
+    "mouth_width": ["narrow", "medium", "wide"],
+    "lip_color": ["pale", "medium", "dark", "very_dark"],
+    "lip_fullness": ["thin", "medium", "full", "very_full"],
+    "skin_tone_shade": ["light", "medium", "dark", "deep"],
+    "skin_undertone": ["cool", "neutral", "warm"],
+    "skin_glow": ["dull", "natural", "glowing", "very_glowing"],
+    "freckles_density": ["sparse", "moderate", "dense"],
+    "moles_count": ["none", "few", "several", "many"],
+    "birthmarks": ["none", "small", "medium", "large"],
+    "hair_color_shade": ["light", "medium", "dark", "deep"],
+    "hair_texture": ["straight", "wavy", "curly", "coily"],
+    "hair_length": ["short", "medium", "long", "very_long"],
+    "hair_density": ["thin", "medium", "thick", "very_thick"],
+    "hair_shine": ["dull", "natural", "shiny", "very_shiny"],
+    "hair_curliness": ["straight", "wavy", "curly", "very_curly"],
+    "hair_thickness": ["fine", "medium", "thick", "very_thick"],
+    "hairline": ["low", "medium", "high", "receding"],
+}
+
+# Vello facial (solo hombres) y maquillaje neutro (solo mujeres)
+FACIAL_HAIR_CHOICES = {
+    "facial_hair": ["none", "light", "moderate", "heavy"],
+    "beard": ["none", "stubble", "short", "medium", "long", "full"],
+    "mustache": ["none", "light", "medium", "thick", "handlebar"],
+}
+NEUTRAL_MAKEUP = ["none", "natural", "minimal", "light", "subtle", "soft", "gentle", "delicate", "simple", "basic", "clean", "fresh"]
+MIXED_SKIN_TONES = ["fair", "light", "medium", "olive", "tan", "brown", "dark"]
+SKIN_IMPERFECTION_CHOICES = ["pores", "texture", "variations"]
+
+# Controles de generate_advanced_genetic_profile con su valor por defecto
+ADVANCED_CONTROL_DEFAULTS = {
+    "beauty_control": "aleatorio", "skin_control": "aleatorio", "hair_control": "aleatorio",
+    "eye_control": "aleatorio", "face_shape_control": "aleatorio", "nose_shape_control": "aleatorio",
+    "lip_shape_control": "aleatorio", "eye_shape_control": "aleatorio", "jawline_control": "aleatorio",
+    "cheekbone_control": "aleatorio", "eyebrow_control": "aleatorio", "skin_texture_control": "aleatorio",
+    "freckle_control": "aleatorio", "mole_control": "aleatorio", "scar_control": "aleatorio",
+    "acne_control": "aleatorio", "wrinkle_control": "aleatorio", "hair_style_control": "aleatorio",
+}
+
+# Categorías con anti-repetición por género: control -> (campo, categoría, filtra por género)
+GENDERED_RECENCY_CONTROLS = {
+    "face_shape_control": ("face_shape", "face_shapes", True),
+    "nose_shape_control": ("nose_shape", "nose_shapes", False),
+    "lip_shape_control": ("lip_shape", "lip_shapes", True),
+    "eye_shape_control": ("eye_shape", "eye_shapes", True),
+    "jawline_control": ("jawline", "jawline_types", True),
+    "cheekbone_control": ("cheekbones", "cheekbone_types", True),
+    "eyebrow_control": ("eyebrows", "eyebrow_shapes", True),
+    "skin_texture_control": ("skin_texture", "skin_textures", True),
+    "hair_style_control": ("hair_style", "hair_styles", True),
+}
+
+# Categorías con anti-repetición común (mismo historial para ambos géneros): campo -> categoría
+GENERIC_RECENCY_FIELDS = {
+    "beauty_level": "beauty_levels",
+    "clothing_type": "clothing_types",
+    "clothing_color": "clothing_colors",
+    "clothing_style": "clothing_styles",
+    "body_type": "body_types",
+    "body_weight": "body_weights",
+    "body_height": "body_heights",
+    "body_shape": "body_shapes",
+    "muscle_definition": "muscle_definitions",
+    "body_fat_percentage": "body_fat_percentages",
+}
+
+# Factores opcionales: (probabilidad, etiqueta)
+ATTRACTIVENESS_FACTORS = [(0.3, "symmetrical_features"), (0.2, "defined_bone_structure"), (0.15, "expressive_eyes")]
+DIVERSITY_FACTORS = [(0.5, "unique_facial_structure"), (0.3, "distinctive_features"), (0.2, "uncommon_characteristics")]
+
+# Límites de los grupos de edad de _generate_age_specific_wrinkles
+WRINKLE_AGE_BOUNDS = [20, 25, 30, 35, 40, 50]
+
 @dataclass
 class UltraDiversityProfile:
     """Perfil de diversidad ultra avanzado para máxima unicidad"""
@@ -134,22 +245,34 @@ class UltraDiversityProfile:
 class UltraDiversityEngine:
     """Motor de diversidad ultra avanzado para máxima unicidad"""
     
-    def __init__(self):
+    def __init__(self, run_seed: Optional[int] = None):
         self.logger = logging.getLogger(__name__)
         self.diversity_data = self._load_diversity_data()
+        # RNG propio del lote (nunca se toca el estado global de random)
+        self.run_seed = int(run_seed) if run_seed is not None else new_run_seed()
+        self.rng = random.Random(self.run_seed)
         # Inicializar sistema de anti-repetición
         self._recent_selections = {}
+    
+    def for_index(self, index: int) -> 'UltraDiversityEngine':
+        """
+        Vista del motor cuyo resultado depende solo de (run_seed, índice)
+        
+        Comparte los datos de diversidad pero usa un RNG propio del perfil y
+        anti-repetición por ciclos (ProfileRandom.no_repeat) en lugar del
+        historial, así que es seguro usarla desde varios hilos.
+        """
+        view = copy.copy(self)
+        view.rng = ProfileRandom(self.run_seed, index)
+        return view
         
     def _load_diversity_data(self) -> Dict[str, Any]:
-        """Carga datos de diversidad ultra expandidos desde archivo JSON"""
-        try:
-            # Cargar desde archivo JSON
-            data_file = Path(__file__).parent / "ultra_diversity_data.json"
-            if data_file.exists():
-                with open(data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except Exception as e:
-            self.logger.warning(f"No se pudo cargar ultra_diversity_data.json: {e}")
+        """Carga datos de diversidad ultra expandidos desde el catálogo compartido"""
+        # diversity_data.json (+ ultra_diversity_data.json) compilado una sola vez por proceso
+        data = get_catalog().namespace('ultra')
+        if data:
+            return data
+        self.logger.warning("Catálogo de rasgos vacío, usando datos de diversidad integrados")
         
         # Fallback a datos hardcodeados si no se puede cargar el JSON
         return {
@@ -335,92 +458,91 @@ class UltraDiversityEngine:
             ]
         }
     
-    def generate_ultra_diverse_profile(self, nationality: str, gender: str, age: int) -> UltraDiversityProfile:
-        """Genera un perfil ultra diverso con máxima unicidad"""
-        
-        # Crear seed único para máxima aleatoriedad
-        unique_seed = int(time.time() * 1000000) + random.randint(1, 999999)
-        random.seed(unique_seed)
+    def generate_ultra_diverse_profile(self, nationality: str, gender: str, age: int,
+                                       index: Optional[int] = None) -> UltraDiversityProfile:
+        """Genera un perfil ultra diverso con máxima unicidad (determinista si se da index)"""
+        if index is not None:
+            return self.for_index(index).generate_ultra_diverse_profile(nationality, gender, age)
         
         # Seleccionar región aleatoria
-        region = random.choice(self.diversity_data["regions"])
+        region = self.rng.choice(self.diversity_data["regions"])
         
         # Generar características ultra diversas
         profile = UltraDiversityProfile(
-            image_id=f"ultra_{int(time.time())}_{random.randint(1000, 9999)}",
+            image_id=f"ultra_{int(time.time())}_{self.rng.randint(1000, 9999)}",
             nationality=nationality,
             region=region,
             gender=gender,
             age=age,
             
             # Características faciales
-            face_shape=random.choice(self.diversity_data["face_shapes"]),
-            face_width=random.choice(["narrow", "medium", "wide", "broad", "thin"]),
-            face_length=random.choice(["short", "medium", "long", "elongated"]),
-            jawline=random.choice(self.diversity_data["jawline_types"]),
-            chin=random.choice(["pointed", "rounded", "square", "recessed", "prominent"]),
-            cheekbones=random.choice(self.diversity_data["cheekbone_types"]),
-            facial_symmetry=random.choice(["perfect", "slight_asymmetry", "natural_asymmetry"]),
-            bone_structure=random.choice(["prominent", "delicate", "strong", "soft"]),
+            face_shape=self.rng.choice(self.diversity_data["face_shapes"]),
+            face_width=self.rng.choice(["narrow", "medium", "wide", "broad", "thin"]),
+            face_length=self.rng.choice(["short", "medium", "long", "elongated"]),
+            jawline=self.rng.choice(self.diversity_data["jawline_types"]),
+            chin=self.rng.choice(["pointed", "rounded", "square", "recessed", "prominent"]),
+            cheekbones=self.rng.choice(self.diversity_data["cheekbone_types"]),
+            facial_symmetry=self.rng.choice(["perfect", "slight_asymmetry", "natural_asymmetry"]),
+            bone_structure=self.rng.choice(["prominent", "delicate", "strong", "soft"]),
             
             # Ojos
-            eye_color=random.choice(self.diversity_data["eye_colors"]),
-            eye_color_shade=random.choice(["light", "medium", "dark", "deep"]),
-            eye_shape=random.choice(self.diversity_data["eye_shapes"]),
-            eye_size=random.choice(["small", "medium", "large", "prominent"]),
-            eye_spacing=random.choice(["close", "normal", "wide", "very_wide"]),
-            eyelid_type=random.choice(["monolid", "double_lid", "hooded", "deep_set"]),
-            eyelashes=random.choice(["short", "medium", "long", "thick", "thin"]),
-            eyelashes_length=random.choice(["natural", "extended", "dramatic"]),
-            eyebrows=random.choice(self.diversity_data["eyebrow_shapes"]),
-            eyebrows_thickness=random.choice(["thin", "medium", "thick", "bushy"]),
-            eyebrows_shape=random.choice(["arched", "straight", "curved", "angled"]),
+            eye_color=self.rng.choice(self.diversity_data["eye_colors"]),
+            eye_color_shade=self.rng.choice(["light", "medium", "dark", "deep"]),
+            eye_shape=self.rng.choice(self.diversity_data["eye_shapes"]),
+            eye_size=self.rng.choice(["small", "medium", "large", "prominent"]),
+            eye_spacing=self.rng.choice(["close", "normal", "wide", "very_wide"]),
+            eyelid_type=self.rng.choice(["monolid", "double_lid", "hooded", "deep_set"]),
+            eyelashes=self.rng.choice(["short", "medium", "long", "thick", "thin"]),
+            eyelashes_length=self.rng.choice(["natural", "extended", "dramatic"]),
+            eyebrows=self.rng.choice(self.diversity_data["eyebrow_shapes"]),
+            eyebrows_thickness=self.rng.choice(["thin", "medium", "thick", "bushy"]),
+            eyebrows_shape=self.rng.choice(["arched", "straight", "curved", "angled"]),
             
             # Nariz
-            nose_shape=random.choice(self.diversity_data["nose_shapes"]),
-            nose_size=random.choice(["small", "medium", "large", "prominent"]),
-            nose_width=random.choice(["narrow", "medium", "wide", "broad"]),
-            nose_bridge=random.choice(["high", "medium", "low", "flat"]),
-            nose_tip=random.choice(["pointed", "rounded", "flat", "upturned"]),
-            nostril_size=random.choice(["small", "medium", "large", "wide"]),
+            nose_shape=self.rng.choice(self.diversity_data["nose_shapes"]),
+            nose_size=self.rng.choice(["small", "medium", "large", "prominent"]),
+            nose_width=self.rng.choice(["narrow", "medium", "wide", "broad"]),
+            nose_bridge=self.rng.choice(["high", "medium", "low", "flat"]),
+            nose_tip=self.rng.choice(["pointed", "rounded", "flat", "upturned"]),
+            nostril_size=self.rng.choice(["small", "medium", "large", "wide"]),
             
             # Boca
-            lip_shape=random.choice(self.diversity_data["lip_shapes"]),
-            lip_size=random.choice(["small", "medium", "large", "full"]),
-            lip_thickness=random.choice(["thin", "medium", "thick", "full"]),
-            mouth_width=random.choice(["narrow", "medium", "wide", "broad"]),
-            lip_color=random.choice(["natural", "pink", "red", "brown", "dark"]),
-            lip_fullness=random.choice(["thin", "medium", "full", "voluptuous"]),
+            lip_shape=self.rng.choice(self.diversity_data["lip_shapes"]),
+            lip_size=self.rng.choice(["small", "medium", "large", "full"]),
+            lip_thickness=self.rng.choice(["thin", "medium", "thick", "full"]),
+            mouth_width=self.rng.choice(["narrow", "medium", "wide", "broad"]),
+            lip_color=self.rng.choice(["natural", "pink", "red", "brown", "dark"]),
+            lip_fullness=self.rng.choice(["thin", "medium", "full", "voluptuous"]),
             
             # Piel
-            skin_tone=random.choice(self.diversity_data["skin_tones"]),
-            skin_tone_shade=random.choice(["light", "medium", "dark", "deep"]),
-            skin_texture=random.choice(self.diversity_data["skin_textures"]),
-            skin_undertone=random.choice(["warm", "cool", "neutral", "olive"]),
-            skin_glow=random.choice(["matte", "natural", "dewy", "glowing"]),
+            skin_tone=self.rng.choice(self.diversity_data["skin_tones"]),
+            skin_tone_shade=self.rng.choice(["light", "medium", "dark", "deep"]),
+            skin_texture=self.rng.choice(self.diversity_data["skin_textures"]),
+            skin_undertone=self.rng.choice(["warm", "cool", "neutral", "olive"]),
+            skin_glow=self.rng.choice(["matte", "natural", "dewy", "glowing"]),
             skin_imperfections=self._generate_skin_imperfections(),
-            freckles=random.choice(self.diversity_data["freckle_types"]),
-            freckles_density=random.choice(["sparse", "moderate", "dense"]),
-            moles=random.choice(self.diversity_data["mole_types"]),
-            moles_count=random.choice(["none", "few", "several", "many"]),
-            birthmarks=random.choice(["none", "small", "medium", "large"]),
-            scars=random.choice(self.diversity_data["scar_types"]),
-            acne=random.choice(self.diversity_data["acne_types"]),
+            freckles=self.rng.choice(self.diversity_data["freckle_types"]),
+            freckles_density=self.rng.choice(["sparse", "moderate", "dense"]),
+            moles=self.rng.choice(self.diversity_data["mole_types"]),
+            moles_count=self.rng.choice(["none", "few", "several", "many"]),
+            birthmarks=self.rng.choice(["none", "small", "medium", "large"]),
+            scars=self.rng.choice(self.diversity_data["scar_types"]),
+            acne=self.rng.choice(self.diversity_data["acne_types"]),
             age_spots=self._generate_age_appropriate_spots(age),
             wrinkles=self._generate_age_appropriate_wrinkles(age),
             skin_elasticity=self._generate_age_appropriate_elasticity(age),
             
             # Cabello
-            hair_color=random.choice(self.diversity_data["hair_colors"]),
-            hair_color_shade=random.choice(["light", "medium", "dark", "deep"]),
-            hair_texture=random.choice(["straight", "wavy", "curly", "coily"]),
-            hair_length=random.choice(["short", "medium", "long", "very_long"]),
-            hair_style=random.choice(self.diversity_data["hair_styles"]),
-            hair_density=random.choice(["thin", "medium", "thick", "very_thick"]),
-            hair_shine=random.choice(["dull", "natural", "shiny", "very_shiny"]),
-            hair_curliness=random.choice(["straight", "wavy", "curly", "very_curly"]),
-            hair_thickness=random.choice(["fine", "medium", "thick", "very_thick"]),
-            hairline=random.choice(["low", "medium", "high", "receding"]),
+            hair_color=self.rng.choice(self.diversity_data["hair_colors"]),
+            hair_color_shade=self.rng.choice(["light", "medium", "dark", "deep"]),
+            hair_texture=self.rng.choice(["straight", "wavy", "curly", "coily"]),
+            hair_length=self.rng.choice(["short", "medium", "long", "very_long"]),
+            hair_style=self.rng.choice(self.diversity_data["hair_styles"]),
+            hair_density=self.rng.choice(["thin", "medium", "thick", "very_thick"]),
+            hair_shine=self.rng.choice(["dull", "natural", "shiny", "very_shiny"]),
+            hair_curliness=self.rng.choice(["straight", "wavy", "curly", "very_curly"]),
+            hair_thickness=self.rng.choice(["fine", "medium", "thick", "very_thick"]),
+            hairline=self.rng.choice(["low", "medium", "high", "receding"]),
             
             # Vello facial (solo para hombres)
             facial_hair=self._generate_gender_appropriate_facial_hair(gender),
@@ -440,7 +562,7 @@ class UltraDiversityEngine:
             # Metadatos
             generated_at=datetime.now().isoformat(),
             generation_type="ultra_diverse",
-            uniqueness_score=random.uniform(0.8, 1.0),
+            uniqueness_score=self.rng.uniform(0.8, 1.0),
             diversity_factors=self._generate_diversity_factors()
         )
         
@@ -449,15 +571,15 @@ class UltraDiversityEngine:
     def _generate_skin_imperfections(self) -> List[str]:
         """Genera imperfecciones de piel realistas"""
         imperfections = []
-        if random.random() < 0.3:
+        if self.rng.random() < 0.3:
             imperfections.append("freckles")
-        if random.random() < 0.2:
+        if self.rng.random() < 0.2:
             imperfections.append("moles")
-        if random.random() < 0.15:
+        if self.rng.random() < 0.15:
             imperfections.append("scars")
-        if random.random() < 0.1:
+        if self.rng.random() < 0.1:
             imperfections.append("acne")
-        if random.random() < 0.05:
+        if self.rng.random() < 0.05:
             imperfections.append("birthmarks")
         return imperfections
     
@@ -481,23 +603,23 @@ class UltraDiversityEngine:
         elif age < 30:
             # Grupo 2: 20-29 años - Arrugas muy leves
             young_options = ["none", "fine expression lines", "barely visible lines", "subtle lines", "soft lines", "gentle lines", "faint lines"]
-            return random.choice(young_options)
+            return self.rng.choice(young_options)
         elif age < 40:
             # Grupo 3: 30-39 años - Arrugas leves a moderadas
             adult_young_options = ["fine expression lines", "light laugh lines", "subtle crow's feet", "forehead lines", "nasolabial folds", "marionette lines", "lip lines", "chin lines", "cheek lines"]
-            return random.choice(adult_young_options)
+            return self.rng.choice(adult_young_options)
         elif age < 50:
             # Grupo 4: 40-49 años - Arrugas moderadas
             mature_options = ["moderate expression lines", "crow's feet", "forehead lines", "laugh lines", "worry lines", "nasolabial folds", "marionette lines", "lip lines", "chin lines", "cheek lines", "temple lines", "brow lines", "under eye lines"]
-            return random.choice(mature_options)
+            return self.rng.choice(mature_options)
         elif age < 60:
             # Grupo 5: 50-59 años - Arrugas profundas
             older_options = ["deep expression lines", "pronounced crow's feet", "deep forehead lines", "laugh lines", "worry lines", "neck lines", "smile lines", "frown lines", "nasolabial folds", "marionette lines", "lip lines", "chin lines", "cheek lines", "temple lines", "brow lines", "under eye lines", "lateral canthal lines", "glabellar lines", "periorbital lines", "perioral lines", "mental lines"]
-            return random.choice(older_options)
+            return self.rng.choice(older_options)
         else:
             # Grupo 6: 60+ años - Arrugas muy profundas
             elderly_options = ["deep wrinkles", "pronounced crow's feet", "deep forehead lines", "laugh lines", "worry lines", "neck lines", "age lines", "nasolabial folds", "marionette lines", "lip lines", "chin lines", "cheek lines", "temple lines", "brow lines", "under eye lines", "lateral canthal lines", "glabellar lines", "periorbital lines", "perioral lines", "mental lines", "platysmal bands", "horizontal neck lines", "vertical neck lines"]
-            return random.choice(elderly_options)
+            return self.rng.choice(elderly_options)
     
     def _generate_multiple_age_appropriate_wrinkles(self, age: int) -> list:
         """Genera múltiples opciones de arrugas apropiadas para la edad para mayor diversidad"""
@@ -571,26 +693,26 @@ class UltraDiversityEngine:
         if age < 30:
             return "none"
         elif age < 40:
-            return random.choice(["none", "few age spots", "minimal age spots"])
+            return self.rng.choice(["none", "few age spots", "minimal age spots"])
         elif age < 50:
-            return random.choice(["none", "few age spots", "minimal age spots", "some age spots", "moderate age spots"])
+            return self.rng.choice(["none", "few age spots", "minimal age spots", "some age spots", "moderate age spots"])
         elif age < 60:
-            return random.choice(["few age spots", "some age spots", "moderate age spots", "several age spots", "visible age spots"])
+            return self.rng.choice(["few age spots", "some age spots", "moderate age spots", "several age spots", "visible age spots"])
         else:
-            return random.choice(["some age spots", "moderate age spots", "several age spots", "visible age spots", "many age spots", "extensive age spots"])
+            return self.rng.choice(["some age spots", "moderate age spots", "several age spots", "visible age spots", "many age spots", "extensive age spots"])
     
     def _generate_age_appropriate_elasticity(self, age: int) -> str:
         """Genera elasticidad de piel apropiada para la edad"""
         if age < 25:
             return "firm"
         elif age < 35:
-            return random.choice(["firm", "tight", "elastic", "flexible", "resilient"])
+            return self.rng.choice(["firm", "tight", "elastic", "flexible", "resilient"])
         elif age < 45:
-            return random.choice(["firm", "tight", "elastic", "flexible", "resilient", "moderate"])
+            return self.rng.choice(["firm", "tight", "elastic", "flexible", "resilient", "moderate"])
         elif age < 55:
-            return random.choice(["moderate", "loose", "flexible", "elastic", "firm"])
+            return self.rng.choice(["moderate", "loose", "flexible", "elastic", "firm"])
         else:
-            return random.choice(["loose", "very loose", "flexible", "elastic"])
+            return self.rng.choice(["loose", "very loose", "flexible", "elastic"])
     
     def _generate_gender_appropriate_facial_hair(self, gender: str) -> str:
         """Genera vello facial apropiado para el género"""
@@ -598,7 +720,7 @@ class UltraDiversityEngine:
             return "none"  # Las mujeres no tienen vello facial
         else:
             # Solo para hombres
-            return random.choice(["none", "light", "moderate", "heavy"])
+            return self.rng.choice(FACIAL_HAIR_CHOICES["facial_hair"])
     
     def _generate_gender_appropriate_beard(self, gender: str) -> str:
         """Genera barba apropiada para el género"""
@@ -606,7 +728,7 @@ class UltraDiversityEngine:
             return "none"  # Las mujeres no tienen barba
         else:
             # Solo para hombres
-            return random.choice(["none", "stubble", "short", "medium", "long", "full"])
+            return self.rng.choice(FACIAL_HAIR_CHOICES["beard"])
     
     def _generate_gender_appropriate_mustache(self, gender: str) -> str:
         """Genera bigote apropiado para el género"""
@@ -614,7 +736,7 @@ class UltraDiversityEngine:
             return "none"  # Las mujeres no tienen bigote
         else:
             # Solo para hombres
-            return random.choice(["none", "light", "medium", "thick", "handlebar"])
+            return self.rng.choice(FACIAL_HAIR_CHOICES["mustache"])
     
     def _filter_gender_appropriate_features(self, category: str, gender: str) -> list:
         """Filtra características apropiadas para el género con lógica específica"""
@@ -637,85 +759,30 @@ class UltraDiversityEngine:
     
     def _get_male_specific_features(self, category: str, all_features: list) -> list:
         """Obtiene características específicas para hombres"""
-        # Características masculinas realistas por categoría
-        male_features = {
-            'face_shapes': ['square', 'rectangular', 'oval', 'round', 'triangular', 'diamond', 'heart', 'long', 'broad', 'angular', 'strong', 'masculine', 'chiseled', 'defined', 'wide'],
-            'jawline_types': ['strong', 'angular', 'square', 'prominent', 'chiseled', 'masculine', 'defined', 'broad', 'wide', 'solid', 'firm', 'robust'],
-            'cheekbone_types': ['high', 'prominent', 'sharp', 'angular', 'strong', 'defined', 'pronounced', 'visible', 'noticeable'],
-            'eyebrow_shapes': ['thick', 'bushy', 'strong', 'defined', 'masculine', 'heavy', 'dense', 'natural', 'full'],
-            'lip_shapes': ['thin', 'narrow', 'small', 'defined', 'masculine', 'firm', 'straight', 'medium'],
-            'eye_shapes': ['deep-set', 'intense', 'piercing', 'alert', 'strong', 'masculine', 'narrow', 'small', 'almond', 'round', 'hooded'],
-            'skin_textures': ['normal', 'rough', 'textured', 'weathered', 'aged', 'mature', 'firm', 'thick'],
-            'beauty_levels': ['handsome', 'attractive', 'good-looking', 'masculine', 'strong', 'rugged', 'manly', 'virile', 'average', 'normal'],
-            'hair_styles': ['short', 'buzz cut', 'crew cut', 'fade', 'undercut', 'mohawk', 'military', 'business', 'classic', 'traditional', 'side part', 'comb over', 'slicked back', 'quiff', 'pompadour', 'flat top', 'high and tight', 'ivy league', 'textured crop', 'messy', 'spiky', 'natural', 'casual'],
-            'hair_lengths': ['short', 'very short', 'buzz cut', 'crew cut', 'medium short', 'medium', 'long short']
-        }
-        
-        if category in male_features:
-            # Filtrar solo características masculinas realistas
-            filtered = [f for f in all_features if f in male_features[category]]
-            
-            # Si no hay suficientes opciones, agregar algunas básicas
-            if len(filtered) < 5:
-                basic_male = {
-                    'face_shapes': ['square', 'oval', 'round', 'rectangular'],
-                    'jawline_types': ['strong', 'angular', 'square', 'prominent'],
-                    'cheekbone_types': ['high', 'prominent', 'sharp', 'angular'],
-                    'eyebrow_shapes': ['thick', 'bushy', 'strong', 'natural'],
-                    'lip_shapes': ['thin', 'narrow', 'medium', 'firm'],
-                    'eye_shapes': ['deep-set', 'almond', 'round', 'hooded'],
-                    'skin_textures': ['normal', 'rough', 'textured', 'firm'],
-                    'beauty_levels': ['handsome', 'attractive', 'average', 'normal'],
-                    'hair_styles': ['short', 'buzz cut', 'crew cut', 'fade', 'natural'],
-                    'hair_lengths': ['short', 'very short', 'medium short', 'medium']
-                }
-                if category in basic_male:
-                    filtered.extend(basic_male[category])
-            
-            return filtered
-        
-        return all_features
+        return self._get_gender_specific_features('male', category, all_features)
     
     def _get_female_specific_features(self, category: str, all_features: list) -> list:
         """Obtiene características específicas para mujeres"""
-        # Características femeninas realistas por categoría
-        female_features = {
-            'face_shapes': ['oval', 'round', 'heart', 'diamond', 'pear', 'square', 'long', 'soft', 'delicate', 'feminine', 'elegant'],
-            'jawline_types': ['soft', 'delicate', 'feminine', 'smooth', 'gentle', 'rounded', 'oval'],
-            'cheekbone_types': ['soft', 'delicate', 'subtle', 'gentle', 'smooth', 'rounded'],
-            'eyebrow_shapes': ['thin', 'defined', 'shaped', 'arched', 'natural', 'groomed', 'elegant'],
-            'lip_shapes': ['full', 'plump', 'voluptuous', 'sensual', 'charming', 'shapely', 'defined', 'medium'],
-            'eye_shapes': ['almond', 'round', 'large', 'expressive', 'gentle', 'beautiful', 'elegant', 'doll-like'],
-            'skin_textures': ['smooth', 'soft', 'delicate', 'youthful', 'glowing', 'radiant', 'dewy', 'fresh'],
-            'beauty_levels': ['beautiful', 'attractive', 'pretty', 'elegant', 'charming', 'lovely', 'stunning', 'gorgeous'],
-            'hair_styles': ['long', 'medium', 'layered', 'textured', 'voluminous', 'sleek', 'styled', 'natural', 'professional', 'casual', 'elegant', 'chic'],
-            'hair_lengths': ['long', 'very long', 'shoulder length', 'medium long', 'medium', 'short', 'chin length']
-        }
-        
-        if category in female_features:
-            # Filtrar solo características femeninas realistas
-            filtered = [f for f in all_features if f in female_features[category]]
-            
-            # Si no hay suficientes opciones, agregar algunas básicas
-            if len(filtered) < 5:
-                basic_female = {
-                    'face_shapes': ['oval', 'round', 'heart', 'diamond'],
-                    'jawline_types': ['soft', 'delicate', 'feminine', 'smooth'],
-                    'cheekbone_types': ['soft', 'delicate', 'subtle', 'gentle'],
-                    'eyebrow_shapes': ['thin', 'defined', 'arched', 'natural'],
-                    'lip_shapes': ['full', 'medium', 'defined', 'shapely'],
-                    'eye_shapes': ['almond', 'round', 'large', 'expressive'],
-                    'skin_textures': ['smooth', 'soft', 'delicate', 'fresh'],
-                    'beauty_levels': ['beautiful', 'attractive', 'pretty', 'elegant'],
-                    'hair_styles': ['long', 'medium', 'layered', 'natural'],
-                    'hair_lengths': ['long', 'medium long', 'medium', 'shoulder length']
-                }
-                if category in basic_female:
-                    filtered.extend(basic_female[category])
-            
-            return filtered
-        
-        return all_features
+        return self._get_gender_specific_features('female', category, all_features)
+    
+    def _get_gender_specific_features(self, gender: str, category: str, all_features: list) -> list:
+        """Usa la máscara precalculada del catálogo si all_features es la lista compartida"""
+        trait = get_catalog().category('ultra', category)
+        if trait is not None and all_features is trait.options():
+            return list(trait.options(gender))
+        return filter_gender_features(gender, category, all_features)
+    
+    @staticmethod
+    def _validate_age_range(edad_min: int, edad_max: int) -> Tuple[int, int]:
+        """Validar rango de edad (18-80; si es inválido se usa 18-65)"""
+        if edad_min < 18:
+            edad_min = 18
+        if edad_max > 80:
+            edad_max = 80
+        if edad_min >= edad_max:
+            edad_min = 18
+            edad_max = 65
+        return edad_min, edad_max
     
     def generate_advanced_genetic_profile(self, nationality: str, region: str, gender: str, age: int, 
                                         beauty_control: str, skin_control: str, hair_control: str, 
@@ -724,47 +791,39 @@ class UltraDiversityEngine:
                                         cheekbone_control: str, eyebrow_control: str, skin_texture_control: str,
                                         freckle_control: str, mole_control: str, scar_control: str,
                                         acne_control: str, wrinkle_control: str, hair_style_control: str,
-                                        edad_min: int = None, edad_max: int = None) -> UltraDiversityProfile:
-        """Genera perfil genético avanzado usando los controles de la WebUI"""
+                                        edad_min: int = None, edad_max: int = None,
+                                        index: Optional[int] = None) -> UltraDiversityProfile:
+        """
+        Genera perfil genético avanzado usando los controles de la WebUI
+        
+        Con index, el perfil queda determinado por (run_seed, index) y no depende
+        de los perfiles generados antes (ver for_index).
+        """
+        if index is not None:
+            return self.for_index(index).generate_advanced_genetic_profile(
+                nationality, region, gender, age, beauty_control, skin_control, hair_control, eye_control,
+                face_shape_control, nose_shape_control, lip_shape_control, eye_shape_control, jawline_control,
+                cheekbone_control, eyebrow_control, skin_texture_control, freckle_control, mole_control,
+                scar_control, acne_control, wrinkle_control, hair_style_control, edad_min, edad_max
+            )
         
         # Generar edad aleatoria dentro del rango si se proporcionan edad_min y edad_max
         if edad_min is not None and edad_max is not None:
-            # Validar rango de edad
-            if edad_min < 18:
-                edad_min = 18
-            if edad_max > 80:
-                edad_max = 80
-            if edad_min >= edad_max:
-                edad_min = 18
-                edad_max = 65
+            edad_min, edad_max = self._validate_age_range(edad_min, edad_max)
             
             # Generar edad aleatoria dentro del rango
-            final_age = random.randint(edad_min, edad_max)
+            final_age = self.rng.randint(edad_min, edad_max)
         else:
             # Usar la edad proporcionada si no hay rango
             final_age = age
         
-        # Generar semilla única para máxima diversidad
-        unique_seed = int(time.time() * 1000000) + random.randint(1, 999999) + hash(nationality + gender + str(final_age))
-        random.seed(unique_seed)
-        
-        # Generar ID único
-        image_id = f"genetic_{hashlib.md5(f'{nationality}_{gender}_{final_age}_{time.time()}_{unique_seed}'.encode()).hexdigest()[:12]}"
+        # Generar ID único (derivado del RNG del lote para que sea reproducible)
+        unique_token = self.rng.getrandbits(64)
+        image_id = f"genetic_{hashlib.md5(f'{nationality}_{gender}_{final_age}_{unique_token}'.encode()).hexdigest()[:12]}"
         
         # Manejar región aleatoria
         if region == "aleatorio":
-            regiones_disponibles = [
-                "caracas", "maracaibo", "valencia", "barquisimeto", "ciudad_guayana", "maturin", "merida", 
-                "san_cristobal", "barcelona", "puerto_la_cruz", "ciudad_bolivar", "tucupita", "porlamar", 
-                "valera", "acarigua", "guanare", "san_fernando", "trujillo", "el_tigre", "cabimas", 
-                "punto_fijo", "ciudad_ojeda", "puerto_cabello", "valle_de_la_pascua", "san_juan_de_los_morros", 
-                "carora", "tocuyo", "duaca", "siquisique", "araure", "turen", "guanarito", "santa_elena", 
-                "el_venado", "san_rafael", "san_antonio", "la_fria", "rubio", "colon", "san_cristobal", 
-                "tachira", "apure", "amazonas", "delta_amacuro", "yacambu", "lara", "portuguesa", "cojedes", 
-                "guarico", "anzoategui", "monagas", "sucre", "nueva_esparta", "falcon", "zulia", "merida", 
-                "trujillo", "barinas", "yaracuy", "carabobo", "aragua", "miranda", "vargas", "distrito_capital"
-            ]
-            region = random.choice(regiones_disponibles)
+            region = self.rng.choice(ADVANCED_REGIONS)
         
         # Aplicar controles específicos con filtrado por género
         skin_tone = self._apply_skin_control(skin_control)
@@ -797,55 +856,55 @@ class UltraDiversityEngine:
             
             # Características faciales con controles aplicados
             face_shape=face_shape,
-            face_width=random.choice(["narrow", "medium", "wide"]),
-            face_length=random.choice(["short", "medium", "long"]),
+            face_width=self.rng.choice(ADVANCED_PROFILE_CHOICES["face_width"]),
+            face_length=self.rng.choice(ADVANCED_PROFILE_CHOICES["face_length"]),
             jawline=jawline,
-            chin=random.choice(["pointed", "rounded", "square", "oval"]),
+            chin=self.rng.choice(ADVANCED_PROFILE_CHOICES["chin"]),
             cheekbones=cheekbones,
-            facial_symmetry=random.choice(["slightly_asymmetrical", "balanced", "very_symmetrical"]),
-            bone_structure=random.choice(["delicate", "medium", "strong", "prominent"]),
+            facial_symmetry=self.rng.choice(ADVANCED_PROFILE_CHOICES["facial_symmetry"]),
+            bone_structure=self.rng.choice(ADVANCED_PROFILE_CHOICES["bone_structure"]),
             
             # Ojos con controles aplicados
             eye_color=eye_color,
-            eye_color_shade=random.choice(["light", "medium", "dark", "deep"]),
+            eye_color_shade=self.rng.choice(ADVANCED_PROFILE_CHOICES["eye_color_shade"]),
             eye_shape=eye_shape,
-            eye_size=random.choice(["small", "medium", "large"]),
-            eye_spacing=random.choice(["close", "medium", "wide"]),
-            eyelid_type=random.choice(["single", "double", "hooded", "deep_set"]),
-            eyelashes=random.choice(["short", "medium", "long", "very_long"]),
-            eyelashes_length=random.choice(["short", "medium", "long"]),
+            eye_size=self.rng.choice(ADVANCED_PROFILE_CHOICES["eye_size"]),
+            eye_spacing=self.rng.choice(ADVANCED_PROFILE_CHOICES["eye_spacing"]),
+            eyelid_type=self.rng.choice(ADVANCED_PROFILE_CHOICES["eyelid_type"]),
+            eyelashes=self.rng.choice(ADVANCED_PROFILE_CHOICES["eyelashes"]),
+            eyelashes_length=self.rng.choice(ADVANCED_PROFILE_CHOICES["eyelashes_length"]),
             eyebrows=eyebrows,
-            eyebrows_thickness=random.choice(["thin", "medium", "thick"]),
-            eyebrows_shape=random.choice(["straight", "arched", "rounded", "angled"]),
+            eyebrows_thickness=self.rng.choice(ADVANCED_PROFILE_CHOICES["eyebrows_thickness"]),
+            eyebrows_shape=self.rng.choice(ADVANCED_PROFILE_CHOICES["eyebrows_shape"]),
             
             # Nariz con controles aplicados
             nose_shape=nose_shape,
-            nose_size=random.choice(["small", "medium", "large"]),
-            nose_width=random.choice(["narrow", "medium", "wide"]),
-            nose_bridge=random.choice(["low", "medium", "high", "prominent"]),
-            nose_tip=random.choice(["pointed", "rounded", "wide", "narrow"]),
-            nostril_size=random.choice(["small", "medium", "large"]),
+            nose_size=self.rng.choice(ADVANCED_PROFILE_CHOICES["nose_size"]),
+            nose_width=self.rng.choice(ADVANCED_PROFILE_CHOICES["nose_width"]),
+            nose_bridge=self.rng.choice(ADVANCED_PROFILE_CHOICES["nose_bridge"]),
+            nose_tip=self.rng.choice(ADVANCED_PROFILE_CHOICES["nose_tip"]),
+            nostril_size=self.rng.choice(ADVANCED_PROFILE_CHOICES["nostril_size"]),
             
             # Boca con controles aplicados
             lip_shape=lip_shape,
-            lip_size=random.choice(["small", "medium", "large"]),
-            lip_thickness=random.choice(["thin", "medium", "full"]),
-            mouth_width=random.choice(["narrow", "medium", "wide"]),
-            lip_color=random.choice(["pale", "medium", "dark", "very_dark"]),
-            lip_fullness=random.choice(["thin", "medium", "full", "very_full"]),
+            lip_size=self.rng.choice(ADVANCED_PROFILE_CHOICES["lip_size"]),
+            lip_thickness=self.rng.choice(ADVANCED_PROFILE_CHOICES["lip_thickness"]),
+            mouth_width=self.rng.choice(ADVANCED_PROFILE_CHOICES["mouth_width"]),
+            lip_color=self.rng.choice(ADVANCED_PROFILE_CHOICES["lip_color"]),
+            lip_fullness=self.rng.choice(ADVANCED_PROFILE_CHOICES["lip_fullness"]),
             
             # Piel con controles aplicados
             skin_tone=skin_tone,
-            skin_tone_shade=random.choice(["light", "medium", "dark", "deep"]),
+            skin_tone_shade=self.rng.choice(ADVANCED_PROFILE_CHOICES["skin_tone_shade"]),
             skin_texture=skin_texture,
-            skin_undertone=random.choice(["cool", "neutral", "warm"]),
-            skin_glow=random.choice(["dull", "natural", "glowing", "very_glowing"]),
-            skin_imperfections=random.sample(["pores", "texture", "variations"], random.randint(0, 3)),
+            skin_undertone=self.rng.choice(ADVANCED_PROFILE_CHOICES["skin_undertone"]),
+            skin_glow=self.rng.choice(ADVANCED_PROFILE_CHOICES["skin_glow"]),
+            skin_imperfections=self.rng.sample(SKIN_IMPERFECTION_CHOICES, self.rng.randint(0, 3)),
             freckles=freckles,
-            freckles_density=random.choice(["sparse", "moderate", "dense"]),
+            freckles_density=self.rng.choice(ADVANCED_PROFILE_CHOICES["freckles_density"]),
             moles=moles,
-            moles_count=random.choice(["none", "few", "several", "many"]),
-            birthmarks=random.choice(["none", "small", "medium", "large"]),
+            moles_count=self.rng.choice(ADVANCED_PROFILE_CHOICES["moles_count"]),
+            birthmarks=self.rng.choice(ADVANCED_PROFILE_CHOICES["birthmarks"]),
             scars=scars,
             acne=acne,
             age_spots=self._generate_age_appropriate_spots(age),
@@ -854,15 +913,15 @@ class UltraDiversityEngine:
             
             # Cabello con controles aplicados
             hair_color=hair_color,
-            hair_color_shade=random.choice(["light", "medium", "dark", "deep"]),
-            hair_texture=random.choice(["straight", "wavy", "curly", "coily"]),
-            hair_length=random.choice(["short", "medium", "long", "very_long"]),
+            hair_color_shade=self.rng.choice(ADVANCED_PROFILE_CHOICES["hair_color_shade"]),
+            hair_texture=self.rng.choice(ADVANCED_PROFILE_CHOICES["hair_texture"]),
+            hair_length=self.rng.choice(ADVANCED_PROFILE_CHOICES["hair_length"]),
             hair_style=hair_style,
-            hair_density=random.choice(["thin", "medium", "thick", "very_thick"]),
-            hair_shine=random.choice(["dull", "natural", "shiny", "very_shiny"]),
-            hair_curliness=random.choice(["straight", "wavy", "curly", "very_curly"]),
-            hair_thickness=random.choice(["fine", "medium", "thick", "very_thick"]),
-            hairline=random.choice(["low", "medium", "high", "receding"]),
+            hair_density=self.rng.choice(ADVANCED_PROFILE_CHOICES["hair_density"]),
+            hair_shine=self.rng.choice(ADVANCED_PROFILE_CHOICES["hair_shine"]),
+            hair_curliness=self.rng.choice(ADVANCED_PROFILE_CHOICES["hair_curliness"]),
+            hair_thickness=self.rng.choice(ADVANCED_PROFILE_CHOICES["hair_thickness"]),
+            hairline=self.rng.choice(ADVANCED_PROFILE_CHOICES["hairline"]),
             
             # Vello facial (solo para hombres)
             facial_hair=self._generate_gender_appropriate_facial_hair(gender),
@@ -898,21 +957,190 @@ class UltraDiversityEngine:
             # Metadatos
             generated_at=datetime.now().isoformat(),
             generation_type="advanced_genetic",
-            uniqueness_score=random.uniform(0.8, 1.0),
+            uniqueness_score=self.rng.uniform(0.8, 1.0),
             diversity_factors=self._generate_diversity_factors()
         )
         
         return profile
     
+    def _gender_variant(self, gender: str) -> Optional[str]:
+        """Sistema anti-repetición que corresponde al género ('male', 'female' o None para el común)"""
+        if gender and hasattr(gender, 'lower'):
+            if gender.lower() in ["hombre", "man", "male"]:
+                return 'male'
+            if gender.lower() in ["mujer", "woman", "female"]:
+                return 'female'
+        return None
+
+    def _recent_selections_for(self, variant: Optional[str]) -> Dict[str, List[str]]:
+        """Historial anti-repetición de un sistema (común, masculino o femenino)"""
+        attribute = {None: '_recent_selections', 'male': '_recent_selections_male',
+                     'female': '_recent_selections_female'}[variant]
+        if not hasattr(self, attribute):
+            setattr(self, attribute, {})
+        return getattr(self, attribute)
+
+    def generate_advanced_genetic_profiles_batch(self, count: int, nationality: str, region: str, gender: str,
+                                                 age: int, controls: Optional[Dict[str, str]] = None,
+                                                 edad_min: int = None, edad_max: int = None,
+                                                 rng=None) -> List[UltraDiversityProfile]:
+        """
+        Genera N perfiles avanzados con el muestreador vectorizado
+
+        Equivale a N llamadas a generate_advanced_genetic_profile: respeta el filtrado
+        por género y la anti-repetición (comparte el historial con la ruta perfil a
+        perfil), pero sortea los rasgos sobre tablas de enteros con NumPy.
+
+        Args:
+            count: Número de perfiles
+            nationality: Nacionalidad
+            region: Región o "aleatorio"
+            gender: Género
+            age: Edad (si no se da rango)
+            controls: Controles de la WebUI (claves de ADVANCED_CONTROL_DEFAULTS)
+            edad_min: Edad mínima opcional
+            edad_max: Edad máxima opcional
+            rng: numpy.random.Generator (por defecto, derivado del RNG del lote)
+
+        Returns:
+            Lista de UltraDiversityProfile
+        """
+        import numpy as np
+        from vectorized_sampler import RecencyTable, UniformTable
+
+        if count <= 0:
+            return []
+        controls = {**ADVANCED_CONTROL_DEFAULTS, **(controls or {})}
+        rng = rng if rng is not None else np.random.default_rng(self.rng.getrandbits(64))
+        variant = self._gender_variant(gender)
+
+        if edad_min is not None and edad_max is not None:
+            edad_min, edad_max = self._validate_age_range(edad_min, edad_max)
+            ages = rng.integers(edad_min, edad_max + 1, size=count)
+        else:
+            ages = np.full(count, age)
+
+        # Rasgos con selección uniforme y rasgos fijados por un control
+        uniform_options = dict(ADVANCED_PROFILE_CHOICES)
+        fixed = {}
+        if region == "aleatorio":
+            uniform_options["region"] = ADVANCED_REGIONS
+        else:
+            fixed["region"] = region
+
+        data = self.diversity_data
+        control_options = {
+            "skin_tone": (controls["skin_control"], self._apply_skin_control,
+                          {"aleatorio": data["skin_tones"], "auto": data["skin_tones"], "mixed": MIXED_SKIN_TONES}),
+            "hair_color": (controls["hair_control"], self._apply_hair_control,
+                           dict.fromkeys(("aleatorio", "mixed", "auto"), data["hair_colors"])),
+            "eye_color": (controls["eye_control"], self._apply_eye_control,
+                          dict.fromkeys(("aleatorio", "mixed", "auto"), data["eye_colors"])),
+            "freckles": (controls["freckle_control"], self._apply_freckle_control, {"aleatorio": data["freckle_types"]}),
+            "moles": (controls["mole_control"], self._apply_mole_control, {"aleatorio": data["mole_types"]}),
+            "scars": (controls["scar_control"], self._apply_scar_control, {"aleatorio": data["scar_types"]}),
+            "acne": (controls["acne_control"], self._apply_acne_control, {"aleatorio": data["acne_types"]}),
+        }
+        for field_name, (control, apply_control, random_modes) in control_options.items():
+            if control in random_modes:
+                uniform_options[field_name] = random_modes[control]
+            else:
+                fixed[field_name] = apply_control(control)
+
+        if variant == 'female':
+            fixed.update(dict.fromkeys(FACIAL_HAIR_CHOICES, "none"))
+        else:
+            uniform_options.update(FACIAL_HAIR_CHOICES)
+        if variant == 'male':
+            fixed["makeup"] = "none"
+        else:
+            uniform_options["makeup"] = NEUTRAL_MAKEUP
+
+        # Rasgos con anti-repetición, agrupados por sistema (común / masculino / femenino)
+        recency_sets = {None: {}, variant: {}}
+        recency_fields = {}
+        for control_name, (field_name, category, gender_filtered) in GENDERED_RECENCY_CONTROLS.items():
+            if controls[control_name] != "aleatorio":
+                fixed[field_name] = controls[control_name]
+                continue
+            if variant and gender_filtered:
+                options = self._filter_gender_appropriate_features(category, gender)
+            else:
+                options = data[category]
+            recency_sets[variant][category] = [options]
+            recency_fields[category] = field_name
+        for field_name, category in GENERIC_RECENCY_FIELDS.items():
+            recency_sets[None][category] = [data[category]]
+            recency_fields[category] = field_name
+
+        # Arrugas: un conjunto de opciones por grupo de edad
+        if controls["wrinkle_control"] == "aleatorio":
+            recency_sets[None]["wrinkle_types"] = [
+                self._generate_age_specific_wrinkles(group_age) for group_age in [0] + WRINKLE_AGE_BOUNDS
+            ]
+            recency_fields["wrinkle_types"] = "wrinkles"
+        else:
+            fixed["wrinkles"] = controls["wrinkle_control"]
+
+        columns = UniformTable(uniform_options).sample(count, rng)
+        wrinkle_groups = np.searchsorted(WRINKLE_AGE_BOUNDS, ages, side='right')
+        for table_variant, option_sets in recency_sets.items():
+            if not option_sets:
+                continue
+            histories = self._recent_selections_for(table_variant)
+            table = RecencyTable(option_sets, histories, variant=table_variant)
+            set_index = np.zeros((count, len(table.categories)), dtype=np.int64)
+            if "wrinkle_types" in table.categories:
+                set_index[:, table.categories.index("wrinkle_types")] = wrinkle_groups
+            for category, values in table.decode(table.sample(count, rng, set_index)).items():
+                columns[recency_fields[category]] = values
+            histories.update(table.recent_values())
+
+        # Listas opcionales y metadatos
+        imperfection_counts = rng.integers(0, len(SKIN_IMPERFECTION_CHOICES) + 1, size=count)
+        imperfection_order = rng.permuted(np.tile(np.arange(len(SKIN_IMPERFECTION_CHOICES)), (count, 1)), axis=1)
+        attractiveness = rng.random((count, len(ATTRACTIVENESS_FACTORS))) < [p for p, _ in ATTRACTIVENESS_FACTORS]
+        diversity = rng.random((count, len(DIVERSITY_FACTORS))) < [p for p, _ in DIVERSITY_FACTORS]
+        uniqueness = rng.uniform(0.8, 1.0, size=count)
+        id_tokens = rng.integers(1, 2**62, size=count)
+        ethnic_features = self._generate_ethnic_features(nationality)
+        generated_at = datetime.now().isoformat()
+
+        profiles = []
+        for i in range(count):
+            traits = {field_name: values[i] for field_name, values in columns.items()}
+            traits.update(fixed)
+            final_age = int(ages[i])
+            profiles.append(UltraDiversityProfile(
+                image_id=f"genetic_{hashlib.md5(f'{nationality}_{gender}_{final_age}_{id_tokens[i]}'.encode()).hexdigest()[:12]}",
+                nationality=nationality,
+                gender=gender,
+                age=final_age,
+                skin_imperfections=[SKIN_IMPERFECTION_CHOICES[j] for j in imperfection_order[i, :imperfection_counts[i]]],
+                # Igual que en la ruta perfil a perfil, estos rasgos dependen de la edad base
+                age_spots=self._generate_age_appropriate_spots(age),
+                skin_elasticity=self._generate_age_appropriate_elasticity(age),
+                age_characteristics=self._generate_age_characteristics(age),
+                attractiveness_factors=[f for (_, f), hit in zip(ATTRACTIVENESS_FACTORS, attractiveness[i]) if hit],
+                ethnic_features=list(ethnic_features),
+                generated_at=generated_at,
+                generation_type="advanced_genetic",
+                uniqueness_score=float(uniqueness[i]),
+                diversity_factors=[f for (_, f), hit in zip(DIVERSITY_FACTORS, diversity[i]) if hit],
+                **traits
+            ))
+
+        return profiles
+
     def _apply_skin_control(self, skin_control: str) -> str:
         """Aplica el control de tono de piel"""
         if skin_control == "aleatorio":
-            return random.choice(self.diversity_data["skin_tones"])
+            return self.rng.choice(self.diversity_data["skin_tones"])
         elif skin_control == "mixed":
-            return random.choice(["fair", "light", "medium", "olive", "tan", "brown", "dark"])
+            return self.rng.choice(MIXED_SKIN_TONES)
         elif skin_control == "auto":
             # Auto = selección automática basada en nacionalidad/región
-            return random.choice(self.diversity_data["skin_tones"])
+            return self.rng.choice(self.diversity_data["skin_tones"])
         else:
             # Mapear controles específicos a tonos de piel
             skin_mapping = {
@@ -957,12 +1185,12 @@ class UltraDiversityEngine:
     def _apply_hair_control(self, hair_control: str) -> str:
         """Aplica el control de color de cabello"""
         if hair_control == "aleatorio":
-            return random.choice(self.diversity_data["hair_colors"])
+            return self.rng.choice(self.diversity_data["hair_colors"])
         elif hair_control == "mixed":
-            return random.choice(self.diversity_data["hair_colors"])
+            return self.rng.choice(self.diversity_data["hair_colors"])
         elif hair_control == "auto":
             # Auto = selección automática basada en nacionalidad/región
-            return random.choice(self.diversity_data["hair_colors"])
+            return self.rng.choice(self.diversity_data["hair_colors"])
         else:
             # Mapear controles específicos a colores de cabello
             hair_mapping = {
@@ -981,12 +1209,12 @@ class UltraDiversityEngine:
     def _apply_eye_control(self, eye_control: str) -> str:
         """Aplica el control de color de ojos"""
         if eye_control == "aleatorio":
-            return random.choice(self.diversity_data["eye_colors"])
+            return self.rng.choice(self.diversity_data["eye_colors"])
         elif eye_control == "mixed":
-            return random.choice(self.diversity_data["eye_colors"])
+            return self.rng.choice(self.diversity_data["eye_colors"])
         elif eye_control == "auto":
             # Auto = selección automática basada en nacionalidad/región
-            return random.choice(self.diversity_data["eye_colors"])
+            return self.rng.choice(self.diversity_data["eye_colors"])
         else:
             # Mapear controles específicos a colores de ojos
             eye_mapping = {
@@ -1114,28 +1342,28 @@ class UltraDiversityEngine:
     def _apply_freckle_control(self, freckle_control: str) -> str:
         """Aplica el control de pecas"""
         if freckle_control == "aleatorio":
-            return random.choice(self.diversity_data["freckle_types"])
+            return self.rng.choice(self.diversity_data["freckle_types"])
         else:
             return freckle_control
     
     def _apply_mole_control(self, mole_control: str) -> str:
         """Aplica el control de lunares"""
         if mole_control == "aleatorio":
-            return random.choice(self.diversity_data["mole_types"])
+            return self.rng.choice(self.diversity_data["mole_types"])
         else:
             return mole_control
     
     def _apply_scar_control(self, scar_control: str) -> str:
         """Aplica el control de cicatrices"""
         if scar_control == "aleatorio":
-            return random.choice(self.diversity_data["scar_types"])
+            return self.rng.choice(self.diversity_data["scar_types"])
         else:
             return scar_control
     
     def _apply_acne_control(self, acne_control: str) -> str:
         """Aplica el control de acné"""
         if acne_control == "aleatorio":
-            return random.choice(self.diversity_data["acne_types"])
+            return self.rng.choice(self.diversity_data["acne_types"])
         else:
             return acne_control
     
@@ -1184,13 +1412,16 @@ class UltraDiversityEngine:
         
         if makeup_control == "aleatorio":
             # Para mujeres, usar maquillaje neutro por defecto para SAIME
-            neutral_makeup = ["none", "natural", "minimal", "light", "subtle", "soft", "gentle", "delicate", "simple", "basic", "clean", "fresh"]
-            return random.choice(neutral_makeup)
+            return self.rng.choice(NEUTRAL_MAKEUP)
         else:
             return makeup_control
     
     def _anti_repetition_selection(self, category: str, options: list) -> str:
         """Selección anti-repetición ULTRA AGRESIVA para máxima diversidad"""
+        if isinstance(self.rng, ProfileRandom):
+            # Perfil determinado por índice: anti-repetición por ciclos, sin historial
+            return self.rng.no_repeat(f"{category}", options)
+        
         if not hasattr(self, '_recent_selections'):
             self._recent_selections = {}
         
@@ -1213,7 +1444,7 @@ class UltraDiversityEngine:
         weights = self._calculate_ultra_diversity_weights(available_options, recent)
         
         # Seleccionar con pesos para favorecer opciones menos usadas
-        selected = random.choices(available_options, weights=weights, k=1)[0]
+        selected = self.rng.choices(available_options, weights=weights, k=1)[0]
         
         # Agregar a historial
         self._recent_selections[category].append(selected)
@@ -1258,6 +1489,10 @@ class UltraDiversityEngine:
     
     def _anti_repetition_selection_male(self, category: str, options: list) -> str:
         """Selección anti-repetición específica para HOMBRES con características masculinas"""
+        if isinstance(self.rng, ProfileRandom):
+            # Perfil determinado por índice: anti-repetición por ciclos, sin historial
+            return self.rng.no_repeat(f"male:{category}", options)
+        
         if not hasattr(self, '_recent_selections_male'):
             self._recent_selections_male = {}
         
@@ -1280,7 +1515,7 @@ class UltraDiversityEngine:
         weights = self._calculate_ultra_diversity_weights_male(available_options, recent)
         
         # Seleccionar con pesos para favorecer opciones menos usadas
-        selected = random.choices(available_options, weights=weights, k=1)[0]
+        selected = self.rng.choices(available_options, weights=weights, k=1)[0]
         
         # Agregar a historial
         self._recent_selections_male[category].append(selected)
@@ -1289,6 +1524,10 @@ class UltraDiversityEngine:
     
     def _anti_repetition_selection_female(self, category: str, options: list) -> str:
         """Selección anti-repetición específica para MUJERES con características femeninas"""
+        if isinstance(self.rng, ProfileRandom):
+            # Perfil determinado por índice: anti-repetición por ciclos, sin historial
+            return self.rng.no_repeat(f"female:{category}", options)
+        
         if not hasattr(self, '_recent_selections_female'):
             self._recent_selections_female = {}
         
@@ -1311,7 +1550,7 @@ class UltraDiversityEngine:
         weights = self._calculate_ultra_diversity_weights_female(available_options, recent)
         
         # Seleccionar con pesos para favorecer opciones menos usadas
-        selected = random.choices(available_options, weights=weights, k=1)[0]
+        selected = self.rng.choices(available_options, weights=weights, k=1)[0]
         
         # Agregar a historial
         self._recent_selections_female[category].append(selected)
@@ -1436,10 +1675,10 @@ class UltraDiversityEngine:
         # Si contiene palabras de alto volumen, convertir a un estilo permitido estable
         style_lower = (hair_style or "").lower()
         if any(k in style_lower for k in high_volume_keywords):
-            return random.choice(passport_allowed)
+            return self.rng.choice(passport_allowed)
 
         # Para estilos genéricos no listados, favorecer estilos sobrios
-        return random.choice(passport_allowed)
+        return self.rng.choice(passport_allowed)
 
     def _create_balanced_combinations(self, total_images: int, control_options: dict) -> list:
         """Crea combinaciones balanceadas para evitar repetición excesiva de valores."""
@@ -1464,71 +1703,47 @@ class UltraDiversityEngine:
                         balanced_list.extend([option] * count)
                     
                     # Mezclar para evitar patrones
-                    random.shuffle(balanced_list)
+                    self.rng.shuffle(balanced_list)
                     combinations.append(balanced_list[:total_images])
                 else:
-                    combinations.append([random.choice(options)] * total_images)
+                    combinations.append([self.rng.choice(options)] * total_images)
             else:
-                combinations.append([random.choice(options)] * total_images)
+                combinations.append([self.rng.choice(options)] * total_images)
         
         return combinations
 
     def generate_balanced_profiles(self, total_images: int, nationality: str, gender: str, age: int, 
                                  control_options: dict) -> list:
-        """Genera perfiles balanceados para evitar repetición excesiva."""
-        profiles = []
-        
+        """
+        Genera perfiles balanceados para evitar repetición excesiva
+
+        Las imágenes con la misma combinación de controles se generan juntas con el
+        muestreador vectorizado (generate_advanced_genetic_profiles_batch); el orden
+        de la lista es el de las combinaciones balanceadas.
+        """
         # Crear combinaciones balanceadas
         balanced_combinations = self._create_balanced_combinations(total_images, control_options)
         
-        # Crear diccionario de mapeo de controles basado en el orden de control_options
-        control_mapping = {}
-        for i, (control_name, _) in enumerate(control_options.items()):
-            control_mapping[control_name] = i
-        
-        # Generar perfiles usando las combinaciones balanceadas
+        # Agrupar las imágenes por combinación de controles (edad incluida)
+        groups = {}
         for i in range(total_images):
-            # Seleccionar valores balanceados para esta imagen
-            balanced_values = {}
-            for control_name, control_index in control_mapping.items():
-                if control_index < len(balanced_combinations):
-                    balanced_values[control_name] = balanced_combinations[control_index][i]
-                else:
-                    balanced_values[control_name] = "aleatorio"
-            
-            # Generar región aleatoria
-            regiones_disponibles = ["caracas", "maracaibo", "valencia", "barquisimeto", "ciudad_guayana", "maturin", "merida", "san_cristobal", "barcelona", "puerto_la_cruz", "ciudad_bolivar", "tucupita", "porlamar", "valera", "acarigua", "guanare", "san_fernando", "trujillo", "el_tigre", "cabimas", "punto_fijo", "ciudad_ojeda", "puerto_cabello", "valle_de_la_pascua", "san_juan_de_los_morros", "carora", "tocuyo", "duaca", "siquisique", "araure", "turen", "guanarito", "santa_elena", "el_venado", "san_rafael", "san_antonio", "la_fria", "rubio", "colon", "san_cristobal", "tachira", "apure", "amazonas", "delta_amacuro", "yacambu", "lara", "portuguesa", "cojedes", "guarico", "anzoategui", "monagas", "sucre", "nueva_esparta", "falcon", "zulia", "merida", "trujillo", "barinas", "yaracuy", "carabobo", "aragua", "miranda", "vargas", "distrito_capital"]
-            region = random.choice(regiones_disponibles)
-            
-            # Generar perfil con valores balanceados
-            profile = self.generate_advanced_genetic_profile(
-                nationality=nationality,
-                region=region,
-                gender=gender,
-                age=age,
-                beauty_control=balanced_values.get("beauty_control", "aleatorio"),
-                skin_control=balanced_values.get("skin_control", "aleatorio"),
-                hair_control=balanced_values.get("hair_control", "aleatorio"),
-                eye_control=balanced_values.get("eye_control", "aleatorio"),
-                face_shape_control=balanced_values.get("face_shape_control", "aleatorio"),
-                nose_shape_control=balanced_values.get("nose_shape_control", "aleatorio"),
-                lip_shape_control=balanced_values.get("lip_shape_control", "aleatorio"),
-                eye_shape_control=balanced_values.get("eye_shape_control", "aleatorio"),
-                jawline_control=balanced_values.get("jawline_control", "aleatorio"),
-                cheekbone_control=balanced_values.get("cheekbone_control", "aleatorio"),
-                eyebrow_control=balanced_values.get("eyebrow_control", "aleatorio"),
-                skin_texture_control=balanced_values.get("skin_texture_control", "aleatorio"),
-                freckle_control=balanced_values.get("freckle_control", "aleatorio"),
-                mole_control=balanced_values.get("mole_control", "aleatorio"),
-                scar_control=balanced_values.get("scar_control", "aleatorio"),
-                acne_control=balanced_values.get("acne_control", "aleatorio"),
-                wrinkle_control=balanced_values.get("wrinkle_control", "aleatorio"),
-                hair_style_control=balanced_values.get("hair_style_control", "aleatorio"),
-                edad_min=balanced_values.get("edad_min", None),
-                edad_max=balanced_values.get("edad_max", None)
+            balanced_values = {
+                control_name: balanced_combinations[control_index][i]
+                for control_index, control_name in enumerate(control_options)
+            }
+            controls = {name: balanced_values.get(name, default) for name, default in ADVANCED_CONTROL_DEFAULTS.items()}
+            key = (tuple(controls.values()), balanced_values.get("edad_min"), balanced_values.get("edad_max"))
+            groups.setdefault(key, (controls, []))[1].append(i)
+        
+        # Generar cada grupo de una vez, con región aleatoria por perfil
+        profiles = [None] * total_images
+        for (_, edad_min, edad_max), (controls, indices) in groups.items():
+            batch = self.generate_advanced_genetic_profiles_batch(
+                len(indices), nationality=nationality, region="aleatorio", gender=gender, age=age,
+                controls=controls, edad_min=edad_min, edad_max=edad_max
             )
-            
-            profiles.append(profile)
+            for i, profile in zip(indices, batch):
+                profiles[i] = profile
         
         return profiles
     
@@ -1633,24 +1848,16 @@ class UltraDiversityEngine:
             profile.hair_style = self._passport_safe_hair_style(getattr(profile, "hair_style", ""))
             # Opcional: favorecer texturas bajas en volumen
             if hasattr(profile, "hair_texture"):
-                profile.hair_texture = random.choice(["straight", "wavy", "fine", "smooth"])  # evitar frizzy/very voluminous
+                profile.hair_texture = self.rng.choice(["straight", "wavy", "fine", "smooth"])  # evitar frizzy/very voluminous
         except Exception:
             pass
         
-        # ESPECIFICACIONES CRÍTICAS SAIME VENEZUELA
-        prompt_parts.append(f"venezuelan passport photo, SAIME standards, official document photo, government ID photo")
-        prompt_parts.append(f"512×764 pixels, 35mm×45mm at 300 DPI, real photographic paper limits")
-        prompt_parts.append(f"black outer frame defines ACTUAL photo boundaries, shoulders touch left and right red frame edges")
-        prompt_parts.append(f"shoulders positioned at y=202px (78% of 260px), must touch 20px to 200px red frame borders")
-        prompt_parts.append(f"head height 30-34mm from chin to crown, eyes at 31% from top (y=80px)")
-        prompt_parts.append(f"head margins: 8-12mm top, 12-18mm sides, 18-25mm bottom (adjusted by black frame)")
-        prompt_parts.append(f"shoulders width 180px (20px to 200px) - CRITICAL: must touch red frame edges")
+        # ESPECIFICACIONES CRÍTICAS SAIME VENEZUELA (texto fijo precalculado)
+        prompt_parts.append(SAIME_PROMPT_PREFIX)
         
         # Información básica
         prompt_parts.append(f"{profile.gender} Venezuela, {profile.age} years old")
-        prompt_parts.append("front view, frontal view, looking directly at camera, direct eye contact")
-        prompt_parts.append("neutral expression, serious expression, no smile, no laughing, mouth closed")
-        prompt_parts.append("eyes open and visible, head centered and straight, frontal position")
+        prompt_parts.append(SAIME_POSE_TEXT)
         
         # Características faciales específicas
         prompt_parts.append(f"{profile.skin_tone} skin tone, {profile.skin_tone_shade} skin shade")
@@ -1684,116 +1891,17 @@ class UltraDiversityEngine:
             if profile.mustache != "none":
                 prompt_parts.append(f"{profile.mustache} mustache")
         
-        # Especificaciones técnicas
-        prompt_parts.append("SOLID WHITE BACKGROUND, PURE WHITE BACKGROUND, CLEAN WHITE BACKGROUND")
-        prompt_parts.append("professional lighting, uniform lighting, even lighting, high contrast")
-        prompt_parts.append("35mm x 45mm dimensions, black frame border 1-2mm, effective area 33x43mm")
-        prompt_parts.append("CRITICAL: real paper photo limits 512x764 pixels, black outer frame defines ACTUAL paper photo boundaries")
-        prompt_parts.append("RESPECT black outer frame as final paper crop limit, 300 DPI resolution")
-        prompt_parts.append("professional quality, high resolution, 1024x1024 pixels, ultra high quality")
-        prompt_parts.append("no earrings, no jewelry, no accessories, no necklaces, no bracelets, no rings")
-        prompt_parts.append("no head accessories, natural makeup, no dark glasses, no reflections")
-        prompt_parts.append("no white clothing, no white shirts, no white tops, colored clothing, dark clothing")
-        prompt_parts.append("sharp and focused image, correct exposure, natural colors, no grain, no distortion")
-        prompt_parts.append("PNG high quality format, SOLID WHITE BACKGROUND, PURE WHITE BACKGROUND")
-        prompt_parts.append("natural facial structure, natural ethnic characteristics, natural skin texture")
-        prompt_parts.append("natural age spots, natural pores, natural skin, natural moles, natural asymmetry")
-        prompt_parts.append("natural imperfections, natural features, natural hair texture, natural hair density")
-        prompt_parts.append("clean appearance, neat presentation, appropriate attire, modest clothing")
-        prompt_parts.append("common appearance, natural skin texture, slight asymmetry, authentic facial features")
-        prompt_parts.append("natural hair texture, regular citizen, regular person, professional headshot photography")
-        prompt_parts.append("direct portrait photography, strictly frontal view, no three quarter view, no side view")
-        prompt_parts.append("head and shoulders visible, shoulders must be visible")
-        prompt_parts.append("CRITICAL: shoulders must touch left and right red frame edges (20px to 200px, total 180px width)")
-        prompt_parts.append("shoulders positioned at y=202px (78% of 260px), shoulders MUST touch red frame borders")
-        prompt_parts.append("SAIME CRITICAL: shoulders must physically touch 20px to 200px red frame edges")
-        prompt_parts.append("sufficient head space, no head crop, full head visible, head positioned in upper 60%")
-        prompt_parts.append("eyes positioned at 31% from top, perfectly centered composition")
-        prompt_parts.append("professional studio lighting, no shadows, TRANSPARENT BACKGROUND, NO BACKGROUND")
-        prompt_parts.append("ALPHA CHANNEL, passport photo requirements, ID photo standards, official document standards")
-        prompt_parts.append("government photo standards, SAIME standards, venezuelan passport specifications")
-        prompt_parts.append("8-12mm margin from crown, 12-18mm lateral margins, 18-25mm bottom margin")
-        prompt_parts.append("black frame consideration, voluminous hair warning, afro hair considerations")
-        prompt_parts.append("thick braids space requirements, chinos voluminous hair considerations")
-        prompt_parts.append("CRITICAL: hair must fit within 512x764 black outer frame, anything beyond black frame will be cropped")
-        prompt_parts.append("RESPECT black outer frame boundaries, final paper photo size 512x764 pixels")
-        prompt_parts.append("black outer frame is the actual paper photo limit")
-        
-        # Refuerzos de pose y cabello
-        prompt_parts.append("FRONTAL POSE ONLY, head centered, neutral expression, mouth closed")
-        prompt_parts.append("HAIR LOW VOLUME, neatly groomed, fits entirely within black frame, ears visible if possible")
+        # Especificaciones técnicas y refuerzos de pose y cabello (texto fijo precalculado)
+        prompt_parts.append(SAIME_PROMPT_SUFFIX)
         
         # Unir todas las partes
         prompt = ", ".join(prompt_parts)
         
-        # Negative prompt con especificaciones SAIME críticas
-        negative_prompt = ("3/4 view, side profile, looking away, smiling, laughing, multiple people, "
-                         "double exposure, passport document visible, photo of photo, magazine model, "
-                         "overly perfect, artificial lighting, shadows, background objects, "
-                         "earrings, jewelry, necklaces, bracelets, rings, accessories, "
-                         "glasses, hat, makeup, retouched, airbrushed, glamour, fashion model, "
-                         "beauty contest, professional headshot, studio lighting, dramatic lighting, "
-                         "soft focus, blurry, low quality, distorted, deformed, extra limbs, extra heads, "
-                         "duplicate, watermark, text, signature, date, stamp, border, frame, "
-                         "shoulders not touching red frame edges, shoulders not reaching 20px to 200px, "
-                         "shoulders positioned incorrectly, shoulders not at y=202px, "
-                         "head not positioned correctly, eyes not at 31% from top, "
-                         "incorrect head margins, head too close to edges, "
-                         "hair extending beyond black outer frame, hair touching black frame, "
-                         "accessories extending beyond black frame, jewelry beyond black frame, "
-                         "SAIME VIOLATIONS: incorrect shoulder positioning, incorrect head positioning, "
-                         "violation of 512x764 black outer frame limits, violation of red frame shoulder requirements, "
-                         "braids, cornrows, dreadlocks, dread, locs, thick braids, box braids, high volume hair, afro, mohawk, messy hair, wind, hair in face, "
-                         "tilted head, rotated head, looking sideways, looking down, looking up, profile shot, half profile, "
-                         "perfect skin, flawless skin, airbrushed, photoshopped, model look, "
-                         "supermodel appearance, celebrity look, fashion model, beauty model, "
-                         "perfect features, flawless features, extreme beauty, perfect beauty, "
-                         "perfect symmetry, flawless symmetry, perfect proportions, flawless proportions, "
-                         "perfect skin texture, flawless skin texture, perfect facial features, "
-                         "flawless facial features, perfect bone structure, flawless bone structure, "
-                         "perfect skin tone, flawless skin tone, perfect hair, flawless hair, "
-                         "perfect eyes, flawless eyes, perfect lips, flawless lips, perfect nose, "
-                         "flawless nose, perfect jawline, flawless jawline, perfect cheekbones, "
-                         "flawless cheekbones, perfect eyebrows, flawless eyebrows, perfect teeth, "
-                         "flawless teeth, perfect smile, flawless smile, perfect complexion, "
-                         "flawless complexion, perfect appearance, flawless appearance, perfect face, "
-                         "flawless face, perfect look, flawless look, perfect beauty, flawless beauty, "
-                         "perfect model, flawless model, perfect portrait, flawless portrait, "
-                         "perfect headshot, flawless headshot, perfect photo, flawless photo, "
-                         "perfect image, flawless image, perfect picture, flawless picture, "
-                         "perfect shot, flawless shot, perfect capture, flawless capture, "
-                         "perfect rendering, flawless rendering, perfect generation, flawless generation, "
-                         "perfect creation, flawless creation, perfect result, flawless result, "
-                         "perfect output, flawless output, three quarter view, side view, profile view, "
-                         "watermark, signature, cropped at neck, only head, no shoulders, head cut off, "
-                         "shoulders missing, head cut off at top, head cropped at top, top of head missing, "
-                         "multiple people, double exposure, passport document visible, photo of photo, "
-                         "magazine model, overly perfect, artificial lighting, shadows, background objects, "
-                         "jewelry, glasses, hat, makeup, retouched, airbrushed, glamour, fashion model, "
-                         "beauty contest, professional headshot, studio lighting, dramatic lighting, "
-                         "soft focus, blurry, low quality, distorted, deformed, extra limbs, extra heads, "
-                         "duplicate, watermark, text, signature, date, stamp, border, frame, "
-                         "white clothing, white shirts, white tops, white blouses, white t-shirts, "
-                         "white sweaters, white jackets, white dresses, white garments, "
-                         "COLORED BACKGROUND, TEXTURED BACKGROUND, GRADIENT BACKGROUND, PATTERN BACKGROUND, "
-                         "BACKGROUND, BACKDROP, WALL, SURFACE, FLOOR, CEILING, ENVIRONMENT, SCENE, SETTING, "
-                         "LOCATION, PLACE, ROOM, INTERIOR, EXTERIOR, OUTDOOR, INDOOR, STUDIO BACKGROUND, "
-                         "PHOTO STUDIO, BACKGROUND WALL, BACKGROUND SURFACE, cropped by internal frames, "
-                         "respecting internal frame boundaries, following internal frame limits, "
-                         "internal frame cropping, frame boundary respect, internal frame compliance")
-        
-        return prompt, negative_prompt
+        return prompt, SAIME_NEGATIVE_PROMPT
     
     def _generate_attractiveness_factors(self) -> List[str]:
         """Genera factores de atractivo"""
-        factors = []
-        if random.random() < 0.3:
-            factors.append("symmetrical_features")
-        if random.random() < 0.2:
-            factors.append("defined_bone_structure")
-        if random.random() < 0.15:
-            factors.append("expressive_eyes")
-        return factors
+        return [factor for probability, factor in ATTRACTIVENESS_FACTORS if self.rng.random() < probability]
     
     def _generate_ethnic_features(self, nationality: str) -> List[str]:
         """Genera características étnicas específicas"""
@@ -1804,14 +1912,7 @@ class UltraDiversityEngine:
     
     def _generate_diversity_factors(self) -> List[str]:
         """Genera factores de diversidad"""
-        factors = []
-        if random.random() < 0.5:
-            factors.append("unique_facial_structure")
-        if random.random() < 0.3:
-            factors.append("distinctive_features")
-        if random.random() < 0.2:
-            factors.append("uncommon_characteristics")
-        return factors
+        return [factor for probability, factor in DIVERSITY_FACTORS if self.rng.random() < probability]
 
 def test_ultra_diversity():
     """Prueba el motor de diversidad ultra avanzado"""
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Métricas de diversidad en streaming
+Mide la diversidad real de un lote mientras se genera, en lugar de afirmarla:
+- entropía y cobertura del catálogo por categoría de rasgo
+- distancia de Hamming media entre todos los pares de perfiles (exacta a partir
+  de los contadores, sin comparar pares) y distancia al vecino más cercano en
+  una muestra reservorio
+- unicidad de las combinaciones completas de rasgos (HyperLogLog + count-min)
+La memoria por categoría está acotada: los contadores exactos se limitan a
+max_values valores y el resto pasa a un count-min sketch, así que el coste no
+crece con el número de perfiles
+"""
+
+import hashlib
+import math
+import random
+import threading
+import zlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_VALUES = 1024
+RESERVOIR_SIZE = 512
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class HyperLogLog:
+    """Estimador de cardinalidad (error típico 1.04 / sqrt(2^precision))"""
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = np.zeros(self.size, dtype=np.uint8)
+        self._rank_bits = 64 - precision
+        self._alpha = 0.7213 / (1 + 1.079 / self.size)
+
+    def add(self, value: str):
+        hashed = _hash64(value)
+        index = hashed >> self._rank_bits
+        rank = self._rank_bits - (hashed & ((1 << self._rank_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        estimate = self._alpha * self.size * self.size / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.size and zeros:
+            # Corrección para cardinalidades pequeñas (linear counting)
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+
+class CountMinSketch:
+    """Frecuencias aproximadas (nunca por debajo del valor real)"""
+
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint32)
+        self._rows = np.arange(depth)
+
+    def _columns(self, value: str) -> np.ndarray:
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=4 * self.depth).digest()
+        return np.frombuffer(digest, dtype=np.uint32) % self.width
+
+    def add(self, value: str, count: int = 1) -> int:
+        """Sumar count y devolver la estimación anterior"""
+        columns = self._columns(value)
+        previous = int(self.table[self._rows, columns].min())
+        self.table[self._rows, columns] += count
+        return previous
+
+    def estimate(self, value: str) -> int:
+        return int(self.table[self._rows, self._columns(value)].min())
+
+
+class CategoryCounter:
+    """Contadores de una categoría: exactos hasta max_values valores, count-min para el resto"""
+
+    __slots__ = ('name', 'max_values', 'counts', 'total', 'sum_squares', 'overflow', 'sketch', 'distinct')
+
+    def __init__(self, name: str, max_values: int = DEFAULT_MAX_VALUES):
+        self.name = name
+        self.max_values = max_values
+        self.counts: Dict[str, int] = {}
+        self.total = 0
+        self.sum_squares = 0
+        self.overflow = 0
+        self.sketch: Optional[CountMinSketch] = None
+        self.distinct = HyperLogLog(precision=10)
+
+    def frequency(self, value: str) -> int:
+        if value in self.counts:
+            return self.counts[value]
+        return self.sketch.estimate(value) if self.sketch is not None else 0
+
+    def add(self, value: str) -> int:
+        """Contar un valor y devolver cuántas veces se había visto"""
+        if value in self.counts or len(self.counts) < self.max_values:
+            previous = self.counts.get(value, 0)
+            self.counts[value] = previous + 1
+        else:
+            if self.sketch is None:
+                self.sketch = CountMinSketch()
+            previous = self.sketch.add(value)
+            self.overflow += 1
+        self.total += 1
+        self.sum_squares += 2 * previous + 1
+        self.distinct.add(value)
+        return previous
+
+    def distinct_count(self) -> int:
+        if self.sketch is None:
+            return len(self.counts)
+        return max(len(self.counts), self.distinct.count())
+
+    def entropy(self) -> float:
+        """Entropía de Shannon en bits (la masa desbordada se reparte uniformemente entre sus valores
+        distintos, así que con desbordamiento es una cota superior)"""
+        if not self.total:
+            return 0.0
+        entropy = -sum((count / self.total) * math.log2(count / self.total) for count in self.counts.values())
+        if self.overflow:
+            others = max(1, self.distinct_count() - len(self.counts))
+            share = self.overflow / self.total
+            entropy += -share * math.log2(share / others)
+        return entropy
+
+    def simpson(self) -> float:
+        """Probabilidad de que dos perfiles distintos del lote difieran en esta categoría"""
+        if self.total < 2:
+            return 0.0
+        return (self.total * self.total - self.sum_squares) / (self.total * (self.total - 1))
+
+
+class DiversityMetrics:
+    """
+    Métricas de diversidad de un lote, actualizadas perfil a perfil
+
+    observe() es seguro entre hilos y devuelve la novedad del perfil (fracción
+    media de perfiles anteriores de los que difiere en cada categoría), que es
+    el diversity_score que se guarda en sus metadatos.
+    """
+
+    def __init__(self, vocabularies: Optional[Dict[str, Iterable[str]]] = None,
+                 max_values: int = DEFAULT_MAX_VALUES, reservoir_size: int = RESERVOIR_SIZE, seed: int = 0):
+        """
+        Args:
+            vocabularies: Valores posibles por categoría (para la cobertura del catálogo)
+            max_values: Valores con contador exacto por categoría
+            reservoir_size: Perfiles de la muestra para distancias al vecino más cercano
+            seed: Semilla del muestreo del reservorio
+        """
+        self.vocabularies = {name: frozenset(values) for name, values in (vocabularies or {}).items()}
+        self.max_values = max_values
+        self.categories: Dict[str, CategoryCounter] = {}
+        self.profiles = 0
+        self.combinations = HyperLogLog(precision=14)
+        self.combination_counts = CountMinSketch(width=1 << 16)
+        self.max_combination_repeat = 0
+        self._order: List[str] = []
+        self._reservoir = np.zeros((reservoir_size, 0), dtype=np.uint32)
+        self._reservoir_size = reservoir_size
+        self._reservoir_filled = 0
+        self._nearest_histogram: Dict[int, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def observe(self, traits: Dict[str, Any]) -> float:
+        """
+        Añadir un perfil
+
+        Args:
+            traits: Rasgos del perfil ({categoría: valor})
+
+        Returns:
+            Novedad del perfil en [0, 1] (1.0 para el primero del lote)
+        """
+        traits = {name: str(value) for name, value in traits.items() if value is not None}
+        with self._lock:
+            for name in traits:
+                if name not in self.categories:
+                    self.categories[name] = CategoryCounter(name, self.max_values)
+                    self._order.append(name)
+                    self._reservoir = np.pad(self._reservoir, ((0, 0), (0, 1)))
+
+            novelty = []
+            for name, value in traits.items():
+                counter = self.categories[name]
+                if self.profiles:
+                    novelty.append(1.0 - counter.frequency(value) / self.profiles)
+                counter.add(value)
+            score = sum(novelty) / len(novelty) if novelty else 1.0
+
+            combination = "\x1f".join(f"{name}={traits[name]}" for name in sorted(traits))
+            self.combinations.add(combination)
+            self.max_combination_repeat = max(self.max_combination_repeat,
+                                              self.combination_counts.add(combination) + 1)
+
+            codes = np.array([zlib.crc32(f"{name}={traits[name]}".encode('utf-8')) if name in traits else 0
+                              for name in self._order], dtype=np.uint32)
+            self._sample(codes)
+            self.profiles += 1
+        return round(score, 4)
+
+    def _sample(self, codes: np.ndarray):
+        """Distancia al vecino más cercano de la muestra y muestreo reservorio (algoritmo R)"""
+        if self._reservoir_filled:
+            distances = np.count_nonzero(self._reservoir[:self._reservoir_filled] != codes, axis=1)
+            nearest = int(distances.min())
+            self._nearest_histogram[nearest] = self._nearest_histogram.get(nearest, 0) + 1
+        if self._reservoir_filled < self._reservoir_size:
+            self._reservoir[self._reservoir_filled] = codes
+            self._reservoir_filled += 1
+        else:
+            slot = self._rng.randrange(self.profiles + 1)
+            if slot < self._reservoir_size:
+                self._reservoir[slot] = codes
+
+    def category_summary(self, name: str) -> Dict[str, Any]:
+        counter = self.categories[name]
+        distinct = counter.distinct_count()
+        entropy = counter.entropy()
+        vocabulary = self.vocabularies.get(name)
+        # Entropía respecto a la máxima posible (uniforme sobre el catálogo o sobre lo visto)
+        support = len(vocabulary) if vocabulary else distinct
+        summary = {
+            'distinct': distinct,
+            'entropy': round(entropy, 4),
+            'normalized_entropy': round(entropy / math.log2(support), 4) if support > 1 else 0.0,
+            'simpson': round(counter.simpson(), 4),
+            'top': sorted(counter.counts.items(), key=lambda item: -item[1])[:5]
+        }
+        if vocabulary:
+            covered = sum(1 for value in counter.counts if value in vocabulary)
+            summary['coverage'] = round(covered / len(vocabulary), 4)
+        return summary
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Resumen del lote
+
+        Returns:
+            profiles, categories (por categoría: distinct, entropy,
+            normalized_entropy, simpson, coverage, top), mean_pairwise_hamming,
+            nearest_neighbor (distancias a la muestra), combinations (distintas
+            estimadas, unicidad y cota superior de la repetición máxima) y
+            coverage media
+        """
+        with self._lock:
+            categories = {name: self.category_summary(name) for name in self._order}
+            pairwise = sum(counter.simpson() for counter in self.categories.values())
+            distinct_combinations = min(self.profiles, self.combinations.count())
+            histogram = dict(sorted(self._nearest_histogram.items()))
+            samples = sum(histogram.values())
+            coverages = [summary['coverage'] for summary in categories.values() if 'coverage' in summary]
+            return {
+                'profiles': self.profiles,
+                'categories': categories,
+                'mean_pairwise_hamming': round(pairwise, 4),
+                'mean_pairwise_hamming_normalized': round(pairwise / len(self._order), 4) if self._order else 0.0,
+                'nearest_neighbor': {
+                    'min': min(histogram) if histogram else None,
+                    'mean': round(sum(distance * count for distance, count in histogram.items()) / samples, 4)
+                    if samples else None,
+                    'histogram': histogram
+                },
+                'combinations': {
+                    'distinct': distinct_combinations,
+                    'uniqueness': round(distinct_combinations / self.profiles, 4) if self.profiles else 0.0,
+                    'max_repeat': self.max_combination_repeat
+                },
+                'coverage': round(sum(coverages) / len(coverages), 4) if coverages else None
+            }
+
+
+def catalog_vocabularies(namespace: str, fields: Iterable[str]) -> Dict[str, tuple]:
+    """
+    Vocabulario del catálogo de rasgos para cada campo de un perfil
+
+    Los campos se buscan tal cual y en plural ('jawline' -> 'jawlines'), como
+    nombra sus categorías DirectGeneticGenerator.
+    """
+    from trait_catalog import get_catalog
+    catalog = get_catalog()
+    vocabularies = {}
+    for field in fields:
+        for name in (field, f"{field}s"):
+            category = catalog.category(namespace, name)
+            if category is not None:
+                vocabularies[field] = category.values
+                break
+    return vocabularies
+
+
+# Métricas de los lotes en curso, por directorio de salida (para consultarlas desde la API)
+_active: Dict[Path, DiversityMetrics] = {}
+_active_lock = threading.Lock()
+
+
+def register_metrics(output_dir, metrics: DiversityMetrics):
+    with _active_lock:
+        _active[Path(output_dir).resolve()] = metrics
+
+
+def unregister_metrics(output_dir):
+    with _active_lock:
+        _active.pop(Path(output_dir).resolve(), None)
+
+
+def active_metrics(output_dir) -> Optional[DiversityMetrics]:
+    with _active_lock:
+        return _active.get(Path(output_dir).resolve())
@@ -14,18 +14,29 @@ import subprocess
 import platform
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 import logging
 
+from output_writer import WriteBehindWriter
+from columnar_store import PYARROW_AVAILABLE, ColumnarBatchWriter
+from output_catalog import CATALOG_FILENAME, OutputCatalog
+from shard_store import OUTPUT_LAYOUTS, ShardWriter, shard_prefix, sharded_path
+
 class FileManager:
     """Gestor de archivos para el sistema genético independiente"""
     
-    def __init__(self, base_dir: str = None):
+    def __init__(self, base_dir: str = None, write_behind: bool = False, max_pending: int = 256,
+                 catalog: bool = True, layout: str = 'flat'):
         """
         Inicializar gestor de archivos
         
         Args:
             base_dir: Directorio base del proyecto (por defecto: directorio actual)
+            write_behind: Escribir imágenes, JSON y CSV desde un hilo de disco (ver WriteBehindWriter)
+            max_pending: Guardados en cola antes de aplicar contrapresión (modo write_behind)
+            catalog: Registrar cada archivo guardado en el catálogo SQLite de outputs/
+            layout: Disposición de las imágenes del lote: 'flat', 'sharded' o 'packed'
+                (ver shard_store); save_image() permite cambiarla por lote
         """
         self.logger = logging.getLogger(__name__)
         
@@ -38,11 +49,58 @@ class FileManager:
         self.outputs_dir = self.base_dir / "outputs"
         self.outputs_dir.mkdir(exist_ok=True)
         
+        # Escritor diferido opcional (None = escritura síncrona)
+        self.writer = WriteBehindWriter(max_pending=max_pending) if write_behind else None
+        # Parquet por lote abiertos en modo síncrono (en write_behind los gestiona el escritor)
+        self._columnar_writers: Dict[Path, ColumnarBatchWriter] = {}
+        # Shards tar por lote abiertos en modo síncrono (disposición 'packed')
+        self._shard_writers: Dict[Path, ShardWriter] = {}
+        self._packed_dirs = set()
+        self.layout = layout if layout in OUTPUT_LAYOUTS else 'flat'
+        # CSV/Parquet del lote: se registran en el catálogo al cerrarse (flush/close)
+        self._analysis_files = set()
+        self.catalog = self._open_catalog() if catalog else None
+        
         self.logger.info(f"FileManager inicializado en: {self.base_dir}")
         self.logger.info(f"Directorio de salida: {self.outputs_dir}")
     
+    def _open_catalog(self) -> Optional[OutputCatalog]:
+        """Abrir el catálogo (la primera vez indexa lo que ya hay en outputs/)"""
+        try:
+            is_new = not (self.outputs_dir / CATALOG_FILENAME).exists()
+            catalog = OutputCatalog(self.outputs_dir)
+            if is_new:
+                catalog.refresh()
+            return catalog
+        except Exception as e:
+            self.logger.warning(f"Catálogo de salidas no disponible: {e}")
+            return None
+    
+    def _catalog_saved(self, file_path: Path, json_path: Optional[Path] = None,
+                       metadata: Dict[str, Any] = None):
+        """Registrar una imagen (y su JSON) ya escritas"""
+        if self.catalog is None:
+            return
+        try:
+            entries = [(file_path, None, None, metadata)]
+            if json_path is not None:
+                entries.append((json_path, None, None, None))
+            self.catalog.record_many(entries)
+        except Exception as e:
+            self.logger.warning(f"No se pudo registrar {file_path} en el catálogo: {e}")
+    
+    def _catalog_analysis_files(self):
+        """Registrar los CSV/Parquet de análisis con su tamaño actual"""
+        if self.catalog is None or not self._analysis_files:
+            return
+        try:
+            existing = [path for path in self._analysis_files if path.exists()]
+            self.catalog.record_many((path, None, None, None) for path in existing)
+        except Exception as e:
+            self.logger.warning(f"No se pudieron registrar los análisis en el catálogo: {e}")
+    
     def create_output_structure(self, model_name: str, generation_type: str, 
-                              nacionalidad: str = None, genero: str = None) -> Path:
+                              nacionalidad: str = None, genero: str = None, run_id=None) -> Path:
         """
         Crear estructura de directorios de salida
         
@@ -51,6 +109,8 @@ class FileManager:
             generation_type: Tipo de generación (genetico_premium, masivo_premium, etc.)
             nacionalidad: Nacionalidad (opcional)
             genero: Género (opcional)
+            run_id: Identificador del lote (trabajo o run_seed) para que dos lotes
+                    creados en el mismo segundo no compartan directorio (opcional)
             
         Returns:
             Path: Directorio de salida creado
@@ -70,6 +130,8 @@ class FileManager:
                 batch_name = f"{generation_type}_{nacionalidad}_{genero}_{timestamp}"
             else:
                 batch_name = f"{generation_type}_{timestamp}"
+            if run_id is not None:
+                batch_name = f"{batch_name}_{self._clean_filename(str(run_id))}"
             
             batch_dir = model_dir / batch_name
             batch_dir.mkdir(exist_ok=True)
@@ -84,7 +146,9 @@ class FileManager:
             raise
     
     def save_image(self, image_data: bytes, output_dir: Path, filename: str, 
-                  metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+                  metadata: Dict[str, Any] = None,
+                  on_saved: Optional[Callable[[], None]] = None,
+                  layout: Optional[str] = None) -> Dict[str, Any]:
         """
         Guardar imagen generada
         
@@ -93,18 +157,46 @@ class FileManager:
             output_dir: Directorio de salida
             filename: Nombre del archivo
             metadata: Metadatos adicionales
+            on_saved: Callback cuando la imagen y su JSON están en disco (en modo
+                write_behind se llama desde el hilo de escritura tras el fsync)
+            layout: Disposición para este guardado (por defecto la del FileManager)
             
         Returns:
-            Dict: Resultado de la operación
+            Dict: Resultado de la operación ('queued' indica escritura diferida).
+                En 'packed' file_path es la ruta virtual del miembro, que
+                /download resuelve a través del catálogo
         """
         try:
-            # Limpiar nombre del archivo
-            clean_filename = self._clean_filename(filename)
-            if not clean_filename.endswith(('.png', '.jpg', '.jpeg')):
-                clean_filename += '.png'
-            
-            # Crear ruta completa del archivo (directamente en la carpeta principal)
-            file_path = output_dir / clean_filename
+            clean_filename = self._image_filename(filename)
+            layout = layout or self.layout
+            if layout == 'packed':
+                return self._save_packed(image_data, Path(output_dir), clean_filename, metadata, on_saved)
+            
+            # Crear ruta completa del archivo (en la carpeta principal o en su subdirectorio de hash)
+            if layout == 'sharded':
+                file_path = sharded_path(output_dir, clean_filename)
+            else:
+                file_path = output_dir / clean_filename
+            
+            json_path = file_path.with_name(clean_filename.replace('.png', '.json')) if metadata else None
+            
+            if self.writer is not None:
+                writes = [('bytes', file_path, image_data)]
+                if metadata:
+                    writes.append(('json', json_path, metadata))
+                
+                def _on_durable():
+                    self._catalog_saved(file_path, json_path, metadata)
+                    if on_saved is not None:
+                        on_saved()
+                
+                self.writer.submit(writes, on_durable=_on_durable)
+                return {
+                    'success': True,
+                    'file_path': str(file_path),
+                    'file_size': len(image_data),
+                    'queued': True
+                }
             
             # Guardar imagen
             with open(file_path, 'wb') as f:
@@ -112,15 +204,17 @@ class FileManager:
             
             # Guardar metadatos JSON en la misma carpeta si se proporcionan
             if metadata:
-                json_filename = clean_filename.replace('.png', '.json')
-                json_path = output_dir / json_filename
                 with open(json_path, 'w', encoding='utf-8') as f:
                     json.dump(metadata, f, indent=2, ensure_ascii=False)
             
+            self._catalog_saved(file_path, json_path, metadata)
+            if on_saved is not None:
+                on_saved()
+            
             return {
                 'success': True,
                 'file_path': str(file_path),
-                'file_size': file_path.stat().st_size
+                'file_size': len(image_data)
             }
             
         except Exception as e:
@@ -130,6 +224,103 @@ class FileManager:
                 'error': str(e)
             }
     
+    def _image_filename(self, filename: str) -> str:
+        """Nombre limpio de una imagen (con extensión .png si no la tiene)"""
+        clean_filename = self._clean_filename(filename)
+        if not clean_filename.endswith(('.png', '.jpg', '.jpeg')):
+            clean_filename += '.png'
+        return clean_filename
+    
+    def image_path(self, output_dir: Path, filename: str, layout: Optional[str] = None) -> Path:
+        """
+        Ruta con la que save_image() guardará una imagen
+        
+        Args:
+            output_dir: Directorio de salida
+            filename: Nombre del archivo
+            layout: Disposición (por defecto la del FileManager)
+            
+        Returns:
+            Path: Ruta del archivo (en 'packed', la ruta virtual del miembro)
+        """
+        clean_filename = self._image_filename(filename)
+        layout = layout or self.layout
+        if layout == 'packed':
+            key, _, extension = clean_filename.rpartition('.')
+            return Path(output_dir) / f"{key.replace('.', '_')}.{extension}"
+        if layout == 'sharded':
+            return Path(output_dir) / shard_prefix(clean_filename) / clean_filename
+        return Path(output_dir) / clean_filename
+    
+    def _save_packed(self, image_data: bytes, output_dir: Path, clean_filename: str,
+                     metadata: Optional[Dict[str, Any]], on_saved: Optional[Callable[[], None]]) -> Dict[str, Any]:
+        """Añadir imagen y JSON como una muestra de los shards tar del lote"""
+        key, _, extension = clean_filename.rpartition('.')
+        key = key.replace('.', '_')
+        members = [(extension, image_data)]
+        if metadata:
+            members.append(('json', json.dumps(metadata, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')))
+        file_path = output_dir / f"{key}.{extension}"
+        self._packed_dirs.add(output_dir)
+        
+        def _on_durable(entries):
+            self._catalog_packed(output_dir, entries, metadata)
+            if on_saved is not None:
+                on_saved()
+        
+        if self.writer is not None:
+            entries = []
+            self.writer.submit([('packed', output_dir / key, (members, entries))],
+                               on_durable=lambda: _on_durable(entries))
+            return {'success': True, 'file_path': str(file_path), 'file_size': len(image_data), 'queued': True}
+        
+        if output_dir not in self._shard_writers:
+            self._shard_writers[output_dir] = ShardWriter(output_dir)
+        shard_writer = self._shard_writers[output_dir]
+        entries = shard_writer.add(key, members)
+        shard_writer.sync()
+        _on_durable(entries)
+        return {'success': True, 'file_path': str(file_path), 'file_size': len(image_data)}
+    
+    def _catalog_packed(self, output_dir: Path, entries: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]]):
+        """Registrar los miembros de una muestra empaquetada (los rasgos van con la imagen)"""
+        if self.catalog is None:
+            return
+        try:
+            self.catalog.record_packed(
+                (output_dir / entry['member'], output_dir / entry['shard'], entry['offset'], entry['size'],
+                 metadata if not entry['member'].endswith('.json') else None)
+                for entry in entries
+            )
+        except Exception as e:
+            self.logger.warning(f"No se pudo registrar la muestra empaquetada en el catálogo: {e}")
+    
+    def close_packed(self, output_dir: Optional[Path] = None):
+        """
+        Cerrar los shards tar de un lote (escribe el fin de archivo tar) y registrarlos
+        
+        Args:
+            output_dir: Directorio del lote (None = todos los lotes empaquetados abiertos)
+        """
+        if output_dir is None:
+            for packed_dir in list(self._packed_dirs):
+                self.close_packed(packed_dir)
+            return
+        output_dir = Path(output_dir)
+        self._packed_dirs.discard(output_dir)
+        if self.writer is not None:
+            self.writer.submit([('close_packed', output_dir, None)])
+            self.writer.flush()
+        else:
+            shard_writer = self._shard_writers.pop(output_dir, None)
+            if shard_writer is not None:
+                shard_writer.close()
+        if self.catalog is not None:
+            try:
+                self.catalog.record_many((path, None, None, None) for path in sorted(output_dir.glob("shard-*.tar")))
+            except Exception as e:
+                self.logger.warning(f"No se pudieron registrar los shards en el catálogo: {e}")
+    
     def save_json_metadata(self, output_dir: Path, filename: str, 
                          metadata: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -235,12 +426,98 @@ class FileManager:
                 writer.writerows(data)
             
             self.logger.info(f"Análisis CSV guardado: {csv_path}")
+            if self.catalog is not None:
+                self.catalog.record(csv_path)
             return {'success': True, 'file_path': str(csv_path)}
             
         except Exception as e:
             self.logger.error(f"Error guardando análisis CSV {filename}: {e}")
             return {'success': False, 'error': str(e)}
     
+    def append_csv_row(self, output_dir: Path, filename: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Añadir una fila a un CSV de análisis (se crea con cabecera en la primera fila)
+        
+        Permite escribir el CSV a medida que se guardan las imágenes en lugar de
+        hacerlo al final del lote.
+        
+        Args:
+            output_dir: Directorio de salida
+            filename: Nombre del archivo CSV
+            row: Fila (las claves de la primera fila definen las columnas)
+            
+        Returns:
+            Dict: Resultado de la operación
+        """
+        try:
+            csv_path = Path(output_dir) / filename
+            self._analysis_files.add(csv_path)
+            if self.writer is not None:
+                self.writer.submit([('csv', csv_path, row)])
+                return {'success': True, 'file_path': str(csv_path), 'queued': True}
+            
+            is_new = not csv_path.exists() or csv_path.stat().st_size == 0
+            with open(csv_path, 'a', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=list(row.keys()), extrasaction='ignore')
+                if is_new:
+                    writer.writeheader()
+                writer.writerow(row)
+            return {'success': True, 'file_path': str(csv_path)}
+            
+        except Exception as e:
+            self.logger.error(f"Error añadiendo fila a {filename}: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    def append_columnar_row(self, output_dir: Path, filename: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Añadir una fila al Parquet de análisis del lote (se cierra con close())
+        
+        Args:
+            output_dir: Directorio de salida
+            filename: Nombre del archivo .parquet
+            row: Fila con rasgos y parámetros de generación
+            
+        Returns:
+            Dict: Resultado de la operación (sin pyarrow no se escribe nada)
+        """
+        if not PYARROW_AVAILABLE:
+            return {'success': False, 'error': 'pyarrow no disponible'}
+        try:
+            path = Path(output_dir) / filename
+            self._analysis_files.add(path)
+            if self.writer is not None:
+                self.writer.submit([('columnar', path, row)])
+                return {'success': True, 'file_path': str(path), 'queued': True}
+            if path not in self._columnar_writers:
+                self._columnar_writers[path] = ColumnarBatchWriter(path)
+            self._columnar_writers[path].append(row)
+            return {'success': True, 'file_path': str(path)}
+        except Exception as e:
+            self.logger.error(f"Error añadiendo fila a {filename}: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    def flush(self) -> bool:
+        """Esperar a que las escrituras diferidas estén en disco (no-op en modo síncrono)"""
+        done = True if self.writer is None else self.writer.flush()
+        self._catalog_analysis_files()
+        return done
+    
+    def close(self):
+        """Vaciar y detener el escritor diferido y cerrar los Parquet y shards abiertos"""
+        self.close_packed()
+        for path, columnar in self._columnar_writers.items():
+            try:
+                columnar.close()
+            except Exception as e:
+                self.logger.error(f"Error cerrando {path}: {e}")
+        self._columnar_writers.clear()
+        if self.writer is not None:
+            self.writer.close()
+            self.logger.info(f"Escritor diferido cerrado: {self.writer.stats}")
+            self.writer = None
+        self._catalog_analysis_files()
+        self._analysis_files.clear()
+    
     def get_output_folder_path(self) -> str:
         """
         Obtener ruta del directorio de salida
@@ -284,44 +561,38 @@ class FileManager:
                 'error': str(e)
             }
     
-    def list_generated_files(self) -> List[Dict[str, Any]]:
+    def list_generated_files(self, limit: int = 1000, offset: int = 0, sort: str = 'modified',
+                             descending: bool = True, **filters) -> List[Dict[str, Any]]:
         """
-        Listar archivos generados
+        Listar archivos generados (consulta el catálogo, sin recorrer outputs/)
         
+        Args:
+            limit: Máximo de archivos devueltos
+            offset: Desplazamiento para paginar
+            sort: Columna de orden (modified, name, size, model, batch, path)
+            descending: Más recientes (o mayores) primero
+            **filters: model, batch, kind, nationality, gender, age_min, age_max,
+                name o traits ({rasgo: valor}), ver OutputCatalog.query
+            
         Returns:
             List[Dict]: Lista de archivos generados
         """
         try:
-            files = []
-            
-            # Recorrer estructura de directorios
-            for model_dir in self.outputs_dir.iterdir():
-                if model_dir.is_dir():
-                    for generation_dir in model_dir.iterdir():
-                        if generation_dir.is_dir():
-                            for batch_dir in generation_dir.iterdir():
-                                if batch_dir.is_dir():
-                                    # Buscar archivos en subdirectorios
-                                    for subdir in ["images", "metadata"]:
-                                        subdir_path = batch_dir / subdir
-                                        if subdir_path.exists():
-                                            for file_path in subdir_path.iterdir():
-                                                if file_path.is_file():
-                                                    files.append({
-                                                        'name': file_path.name,
-                                                        'path': str(file_path),
-                                                        'size': file_path.stat().st_size,
-                                                        'modified': datetime.fromtimestamp(file_path.stat().st_mtime).isoformat(),
-                                                        'type': subdir,
-                                                        'model': model_dir.name,
-                                                        'generation': generation_dir.name,
-                                                        'batch': batch_dir.name
-                                                    })
-            
-            # Ordenar por fecha de modificación (más recientes primero)
-            files.sort(key=lambda x: x['modified'], reverse=True)
-            
-            return files
+            if self.catalog is None:
+                return []
+            page = self.catalog.query(filters, sort=sort, descending=descending, limit=limit, offset=offset)
+            return [{
+                'name': entry['name'],
+                'path': str(self.outputs_dir / entry['path']),
+                'size': entry['size'],
+                'modified': datetime.fromtimestamp(entry['modified']).isoformat(),
+                'type': entry['kind'],
+                'model': entry['model'],
+                'batch': entry['batch'],
+                'nationality': entry['nationality'],
+                'gender': entry['gender'],
+                'age': entry['age']
+            } for entry in page['files']]
             
         except Exception as e:
             self.logger.error(f"Error listando archivos: {e}")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Manifiesto de generación (checkpoint por directorio de salida)
+Registra en manifest.jsonl los índices completados, sus semillas y el hash del
+perfil para que un lote interrumpido pueda reanudarse sin duplicar salidas
+"""
+
+import hashlib
+import json
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from run_rng import ProfileRandom, RunRandom
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.jsonl"
+
+# Claves volátiles que no forman parte de la identidad de un perfil
+_VOLATILE_KEYS = {'genetic_timestamp', 'generated_at', 'timestamp', 'generation_time'}
+
+
+def profile_hash(profile: Dict[str, Any]) -> str:
+    """Hash estable de un perfil (ignora marcas de tiempo)"""
+    def _strip(value):
+        if isinstance(value, dict):
+            return {k: _strip(v) for k, v in value.items() if k not in _VOLATILE_KEYS}
+        if isinstance(value, list):
+            return [_strip(v) for v in value]
+        return value
+    encoded = json.dumps(_strip(profile), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+class GenerationManifest:
+    """
+    Checkpoint append-only de un lote
+
+    La primera línea es la cabecera (semilla del lote y parámetros); cada línea
+    siguiente marca un índice completado. Cada registro se sincroniza a disco,
+    así que tras un fallo solo puede perderse la última línea (que se ignora).
+    """
+
+    def __init__(self, output_dir, header: Dict[str, Any], completed: Optional[Dict[int, Dict[str, Any]]] = None):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / MANIFEST_FILENAME
+        self.header = header
+        self.completed = completed or {}
+
+    @property
+    def run_seed(self) -> int:
+        return self.header['run_seed']
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return self.header.get('params', {})
+
+    @classmethod
+    def exists(cls, output_dir) -> bool:
+        return (Path(output_dir) / MANIFEST_FILENAME).exists()
+
+    @classmethod
+    def create(cls, output_dir, run_seed: int, params: Dict[str, Any]) -> 'GenerationManifest':
+        """Crear manifiesto nuevo con la cabecera del lote"""
+        header = {
+            'type': 'header',
+            'run_seed': int(run_seed),
+            'params': params,
+            'created_at': time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+        manifest = cls(output_dir, header)
+        manifest.output_dir.mkdir(parents=True, exist_ok=True)
+        # Un lote nuevo en el mismo directorio no hereda los índices de uno anterior
+        manifest._append(header, mode='w')
+        return manifest
+
+    @classmethod
+    def load(cls, output_dir) -> 'GenerationManifest':
+        """Cargar manifiesto existente tolerando una última línea truncada"""
+        path = Path(output_dir) / MANIFEST_FILENAME
+        header = None
+        completed = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Línea {line_number} del manifiesto incompleta, se ignora")
+                    continue
+                if record.get('type') == 'header':
+                    header = record
+                elif record.get('type') == 'done':
+                    completed[int(record['index'])] = record
+        if header is None:
+            raise ValueError(f"Manifiesto sin cabecera: {path}")
+        # Cerrar una línea truncada para que el siguiente registro no se pegue a ella
+        with open(path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        return cls(output_dir, header, completed)
+
+    def rng_for(self, index: int) -> ProfileRandom:
+        """RNG determinista para un índice: mismo lote + mismo índice = mismo perfil"""
+        return ProfileRandom(self.run_seed, index)
+
+    def seed_for(self, index: int, base_seed: int = -1) -> int:
+        """Semilla de imagen determinista para un índice"""
+        return RunRandom(self.run_seed).seed_for(index, base_seed)
+
+    def is_done(self, index: int) -> bool:
+        return index in self.completed
+
+    @property
+    def completed_count(self) -> int:
+        return len(self.completed)
+
+    def record(self, index: int, seed: int, profile: Dict[str, Any], filename: str, **extra):
+        """Marcar un índice como completado"""
+        record = {
+            'type': 'done',
+            'index': index,
+            'seed': seed,
+            'profile_hash': profile_hash(profile),
+            'filename': filename,
+            **extra
+        }
+        self._append(record)
+        self.completed[index] = record
+
+    def _append(self, record: Dict[str, Any], mode: str = 'a'):
+        with open(self.path, mode, encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
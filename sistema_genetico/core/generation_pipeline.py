@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Pipeline de generación concurrente
+Mantiene varias peticiones txt2img en vuelo contra uno o más backends WebUI
+mientras una etapa separada decodifica y guarda los resultados
+"""
+
+import base64
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GenerationJob:
+    """Trabajo individual del pipeline"""
+    index: int
+    prompt: Union[str, List[str]]
+    negative_prompt: Union[str, List[str]]
+    params: Dict[str, Any]
+    payload: Any = None  # Perfil u otros datos que acompañan al resultado
+
+    @property
+    def is_batch(self) -> bool:
+        """Un trabajo por lotes lleva una lista de prompts y payload [(indice, datos), ...]"""
+        return isinstance(self.prompt, list)
+
+    def members(self) -> List[tuple]:
+        """Pares (indice, payload) en el mismo orden que las imágenes devueltas"""
+        return list(self.payload) if self.is_batch else [(self.index, self.payload)]
+
+
+class GenerationPipeline:
+    """
+    Pipeline con ventana acotada de peticiones en vuelo.
+
+    Etapa 1 (hilos de petición): envía txt2img a los backends en round-robin;
+    un trabajo puede ser una imagen o un lote de prompts/semillas por imagen.
+    Con validation (InlineValidationStage) cada imagen se valida aquí y las que
+    no cumplen se regeneran una a una con otra semilla antes de pasar al guardado.
+    Etapa 2 (hilo escritor): llama a save_callback con los bytes de cada imagen.
+
+    La ventana cuenta trabajos desde que se envían hasta que se guardan, de modo
+    que si el disco se queda atrás se deja de enviar (memoria acotada).
+    """
+
+    def __init__(self, api_clients, save_callback: Callable[[int, Any, bytes], Optional[Dict[str, Any]]],
+                 max_in_flight: int = 4, validation=None):
+        if not isinstance(api_clients, (list, tuple)):
+            api_clients = [api_clients]
+        if not api_clients:
+            raise ValueError("Se requiere al menos un cliente API")
+
+        self.api_clients = list(api_clients)
+        self.save_callback = save_callback
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.validation = validation
+        self.logger = logging.getLogger(__name__)
+
+        self._next_client = 0
+        self._client_lock = threading.Lock()
+
+    def _pick_client(self):
+        """Seleccionar backend en round-robin"""
+        with self._client_lock:
+            client = self.api_clients[self._next_client % len(self.api_clients)]
+            self._next_client += 1
+            return client
+
+    def _request(self, job: GenerationJob, save_queue: queue.Queue):
+        """Etapa de petición: no decodifica ni escribe, solo espera al backend"""
+        images = None
+        try:
+            client = self._pick_client()
+            images = client.txt2img_images(job.prompt, job.negative_prompt, job.params)
+            if self.validation is not None:
+                images = self._validate(client, job, images)
+        except Exception as e:
+            self.logger.error(f"Error en petición {job.index + 1}: {e}")
+        save_queue.put((job, images))
+    
+    def _validate(self, client, job: GenerationJob, images: Optional[List[bytes]]) -> List[Optional[bytes]]:
+        """Validar cada imagen del trabajo y regenerar las que no cumplen (None = descartada)"""
+        images = list(images or [])
+        validated = []
+        for position, (index, payload) in enumerate(job.members()):
+            prompt = job.prompt[position] if job.is_batch else job.prompt
+            negative_prompt = job.negative_prompt[position] if isinstance(job.negative_prompt, list) else job.negative_prompt
+            seed = job.params.get('seed')
+            if isinstance(seed, list):
+                seed = seed[position] if position < len(seed) else None
+            
+            def _regenerate(new_seed, prompt=prompt, negative_prompt=negative_prompt):
+                params = dict(job.params, seed=new_seed, batch_size=1, n_iter=1)
+                regenerated = client.txt2img_images(prompt, negative_prompt, params)
+                return regenerated[0] if regenerated else None
+            
+            image_data = images[position] if position < len(images) else None
+            image_data, summary = self.validation.run(index, image_data, _regenerate, seed=seed)
+            self.validation.annotate(payload, summary, accepted=image_data is not None)
+            validated.append(image_data)
+        return validated
+
+    def _writer_loop(self, save_queue: queue.Queue, window: threading.Semaphore,
+                     results: List[Dict[str, Any]], stats: Dict[str, int]):
+        """Etapa de guardado: decodifica y persiste en orden de llegada"""
+        while True:
+            item = save_queue.get()
+            if item is None:
+                break
+            job, images = item
+            members = job.members()
+            try:
+                if not images:
+                    stats['failed'] += len(members)
+                    print(f"❌ Error generando imagen {job.index + 1}")
+                    continue
+                if len(images) < len(members):
+                    self.logger.warning(f"Lote {job.index + 1}: {len(images)} imágenes para {len(members)} perfiles")
+                    stats['failed'] += len(members) - len(images)
+                for (index, payload), encoded in zip(members, images):
+                    if encoded is None:
+                        # Descartada por la validación tras agotar los reintentos
+                        stats['failed'] += 1
+                        continue
+                    try:
+                        image_data = encoded if isinstance(encoded, bytes) else base64.b64decode(encoded)
+                        saved = self.save_callback(index, payload, image_data)
+                        if saved:
+                            results.append((index, saved))
+                            stats['saved'] += 1
+                        else:
+                            stats['failed'] += 1
+                    except Exception as e:
+                        stats['failed'] += 1
+                        print(f"❌ Error guardando imagen {index + 1}: {e}")
+                        self.logger.error(f"Error guardando imagen {index + 1}: {e}")
+            finally:
+                window.release()
+
+    def run(self, jobs: Iterable[GenerationJob], cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Ejecutar todos los trabajos
+
+        Args:
+            jobs: Iterable de GenerationJob (puede ser un generador perezoso)
+            cancel_event: Si se activa, no se envían más trabajos (los que están en vuelo se guardan)
+
+        Returns:
+            Diccionario con resultados ordenados por índice y estadísticas
+        """
+        start_time = time.time()
+        window = threading.Semaphore(self.max_in_flight)
+        save_queue = queue.Queue()
+        indexed_results = []
+        stats = {'submitted': 0, 'saved': 0, 'failed': 0}
+
+        writer = threading.Thread(
+            target=self._writer_loop,
+            args=(save_queue, window, indexed_results, stats),
+            daemon=True
+        )
+        writer.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+                for job in jobs:
+                    # Bloquea cuando la ventana está llena
+                    window.acquire()
+                    if cancel_event is not None and cancel_event.is_set():
+                        window.release()
+                        print("⏹️ Pipeline cancelado, esperando peticiones en vuelo")
+                        break
+                    executor.submit(self._request, job, save_queue)
+                    stats['submitted'] += len(job.members())
+        finally:
+            save_queue.put(None)
+            writer.join()
+
+        elapsed = time.time() - start_time
+        indexed_results.sort(key=lambda item: item[0])
+        rate = stats['saved'] / elapsed if elapsed > 0 else 0.0
+        print(f"📊 Pipeline: {stats['saved']}/{stats['submitted']} imágenes en {elapsed:.1f}s ({rate:.2f} img/s)")
+
+        return {
+            'results': [saved for _, saved in indexed_results],
+            'submitted': stats['submitted'],
+            'saved': stats['saved'],
+            'failed': stats['failed'],
+            'elapsed': elapsed
+        }
@@ -5,80 +5,40 @@ Funciones de generación masiva directas (sin dependencias problemáticas)
 
 import time
 import logging
+from pathlib import Path
 from collections import defaultdict
 import random
 
+from run_rng import ProfileRandom, RunRandom
+from trait_catalog import GENETIC_BATCH_OPTIONS, GENETIC_NO_REPEAT, get_catalog
+from trait_catalog import REGION_BIAS_WEIGHTS  # noqa: F401 (reexportado)
+from prompt_compiler import BatchPromptCompiler, gender_descriptors
+from diversity_metrics import DiversityMetrics, catalog_vocabularies, register_metrics, unregister_metrics
+
 # Configurar logger
 logger = logging.getLogger(__name__)
 
-def _get_random_diversity_value(category, gender=None):
-    """Obtener valor aleatorio real para diversidad genética"""
-    diversity_options = {
-        'region': ['Caracas', 'Maracaibo', 'Valencia', 'Barquisimeto', 'Maracay', 'Ciudad Guayana', 'Maturín', 'San Cristóbal', 'Cumana', 'Barinas'],
-        'skin_tone': ['fair', 'light', 'medium', 'olive', 'tan', 'brown', 'dark'],
-        'hair_color': ['black', 'dark brown', 'brown', 'light brown', 'blonde', 'red', 'gray', 'white'],
-        'hair_style': ['short', 'medium', 'long', 'curly', 'straight', 'wavy', 'messy', 'neat', 'styled'],
-        'eye_color': ['brown', 'black', 'hazel', 'green', 'blue', 'gray'],
-        'face_shape': ['oval', 'round', 'square', 'heart', 'diamond', 'long'],
-        'nose_shape': ['straight', 'aquiline', 'button', 'wide', 'narrow', 'pointed'],
-        'lip_shape': ['full', 'thin', 'medium', 'wide', 'narrow'],
-        'eye_shape': ['almond', 'round', 'hooded', 'deep-set', 'wide-set'],
-        'jawline': ['defined', 'soft', 'strong', 'weak', 'angular'],
-        'cheekbone': ['prominent', 'high', 'low', 'flat', 'defined'],
-        'eyebrow': ['arched', 'straight', 'thick', 'thin', 'bushy'],
-        'skin_texture': ['smooth', 'rough', 'normal', 'oily', 'dry'],
-        'freckle': ['none', 'light', 'heavy', 'scattered'],
-        'mole': ['none', 'small', 'medium', 'large'],
-        'scar': ['none', 'small', 'medium', 'large'],
-        'acne': ['none', 'light', 'moderate', 'severe'],
-        'wrinkle': ['none', 'light', 'moderate', 'heavy'],
-        'facial_hair': ['none', 'light', 'medium', 'heavy'] if gender and gender.lower() in ['hombre', 'male', 'masculino'] else ['none'],
-        'beard': ['none', 'stubble', 'short', 'medium', 'long'] if gender and gender.lower() in ['hombre', 'male', 'masculino'] else ['none'],
-        'mustache': ['none', 'thin', 'medium', 'thick'] if gender and gender.lower() in ['hombre', 'male', 'masculino'] else ['none'],
-        'physical_complexion': ['thin', 'normal', 'athletic', 'muscular', 'overweight', 'obese'],
-        'clothing_type': ['dress_shirt', 'polo_shirt', 't_shirt', 'sweater', 'jacket', 'suit'],
-        'clothing_color': ['blue', 'black', 'gray', 'brown', 'green', 'red', 'navy', 'dark_blue'],
-        'background': ['white_solid'],
-        'makeup': ['no_makeup', 'natural', 'light', 'moderate', 'heavy'] if gender and gender.lower() in ['mujer', 'female', 'woman'] else ['no_makeup']
-    }
-    
-    if category in diversity_options:
-        return random.choice(diversity_options[category])
+def _get_random_diversity_value(category, gender=None, rng=None):
+    """Obtener valor aleatorio real para diversidad genética (rng: random.Random del perfil)"""
+    options = get_catalog().options('genetic', category, gender)
+    if options:
+        return (rng or random).choice(options)
     return 'random'
 
-def _get_diversity_value_no_repeat(category, used_values, gender=None):
-    """Obtener valor aleatorio evitando repetir dentro del mismo lote."""
-    # Obtener universo de opciones
-    pool_value = _get_random_diversity_value(category, gender)
-    # Para obtener el pool completo, replicamos la misma tabla local aquí
-    options_map = {
-        'region': ['Caracas', 'Maracaibo', 'Valencia', 'Barquisimeto', 'Maracay', 'Ciudad Guayana', 'Maturín', 'San Cristóbal', 'Cumana', 'Barinas'],
-        'skin_tone': ['fair', 'light', 'medium', 'olive', 'tan', 'brown', 'dark'],
-        'hair_color': ['black', 'dark brown', 'brown', 'light brown', 'blonde', 'red', 'gray', 'white'],
-        'hair_style': ['short', 'medium', 'long', 'curly', 'straight', 'wavy', 'messy', 'neat', 'styled'],
-        'eye_color': ['brown', 'black', 'hazel', 'green', 'blue', 'gray'],
-        'face_shape': ['oval', 'round', 'square', 'heart', 'diamond', 'long'],
-        'nose_shape': ['straight', 'aquiline', 'button', 'wide', 'narrow', 'pointed'],
-        'lip_shape': ['full', 'thin', 'medium', 'wide', 'narrow'],
-        'eye_shape': ['almond', 'round', 'hooded', 'deep-set', 'wide-set'],
-        'jawline': ['defined', 'soft', 'strong', 'weak', 'angular'],
-        'cheekbone': ['prominent', 'high', 'low', 'flat', 'defined'],
-        'eyebrow': ['arched', 'straight', 'thick', 'thin', 'bushy'],
-        'physical_complexion': ['thin', 'normal', 'athletic', 'muscular', 'overweight', 'obese'],
-        'clothing_type': ['dress_shirt', 'polo_shirt', 't_shirt', 'sweater', 'jacket', 'suit'],
-        'clothing_color': ['blue', 'black', 'gray', 'brown', 'green', 'red', 'navy', 'dark_blue'],
-        'facial_hair_male': ['none', 'light', 'medium', 'heavy'],
-        'beard_male': ['none', 'stubble', 'short', 'medium', 'long'],
-        'mustache_male': ['none', 'thin', 'medium', 'thick']
-    }
-    # Seleccionar pool por categoría y género si aplica
-    if category in ['facial_hair', 'beard', 'mustache'] and gender and gender.lower() in ['hombre', 'male', 'masculino']:
-        key = f"{category}_male"
-        pool = list(options_map.get(key, []))
-    else:
-        pool = list(options_map.get(category, []))
-        if not pool:
-            return pool_value
+def _get_diversity_value_no_repeat(category, used_values, gender=None, rng=None):
+    """
+    Obtener valor aleatorio evitando repetir dentro del mismo lote.
+
+    Con un ProfileRandom (perfil determinado por índice) la no repetición se
+    resuelve por ciclos sobre el índice y used_values no se usa.
+    """
+    rng = rng or random
+    pool = get_catalog().options('genetic', category, gender)
+    # Las categorías sin no-repetición (o sin opciones para el género) se sortean libremente
+    if category not in GENETIC_NO_REPEAT or len(pool) < 2:
+        return _get_random_diversity_value(category, gender, rng)
+    if isinstance(rng, ProfileRandom):
+        return rng.no_repeat(category, pool)
     # Filtrar usados
     used = used_values[category]
     candidates = [v for v in pool if v not in used]
@@ -86,130 +46,139 @@ def _get_diversity_value_no_repeat(category, used_values, gender=None):
         # Reset si agotamos el pool
         used.clear()
         candidates = pool
-    choice = random.choice(candidates)
+    choice = rng.choice(candidates)
     used.add(choice)
     return choice
 
-REGION_BIAS_WEIGHTS = {
-    # Pesos simples para Venezuela por región (aproximados, diversidad multi-étnica)
-    'Caracas': {
-        'skin_tone': {'light': 1, 'medium': 3, 'olive': 2, 'tan': 2, 'brown': 1, 'fair': 1, 'dark': 1},
-        'hair_color': {'black': 3, 'dark brown': 3, 'brown': 2, 'light brown': 1, 'blonde': 1, 'red': 1, 'gray': 1},
-        'eye_color': {'brown': 5, 'black': 2, 'hazel': 2, 'green': 1, 'blue': 1, 'gray': 1},
-    },
-    'Maracaibo': {
-        'skin_tone': {'tan': 3, 'olive': 3, 'medium': 2, 'brown': 2, 'dark': 1, 'light': 1, 'fair': 1},
-        'hair_color': {'black': 4, 'dark brown': 3, 'brown': 2, 'light brown': 1, 'blonde': 1},
-        'eye_color': {'brown': 6, 'black': 2, 'hazel': 2},
-    },
-    'Valencia': {
-        'skin_tone': {'light': 2, 'medium': 3, 'olive': 2, 'tan': 2, 'fair': 1, 'brown': 1},
-        'hair_color': {'black': 3, 'dark brown': 3, 'brown': 2, 'light brown': 2, 'blonde': 1},
-        'eye_color': {'brown': 5, 'hazel': 2, 'green': 1, 'black': 1},
-    },
-    'Ciudad Guayana': {
-        'skin_tone': {'olive': 3, 'tan': 3, 'medium': 2, 'brown': 2, 'dark': 1, 'light': 1},
-        'hair_color': {'black': 4, 'dark brown': 3, 'brown': 2},
-        'eye_color': {'brown': 6, 'black': 2, 'hazel': 2},
-    },
-    'Maturín': {
-        'skin_tone': {'medium': 3, 'olive': 2, 'tan': 2, 'light': 1, 'fair': 1, 'brown': 1},
-        'hair_color': {'black': 3, 'dark brown': 3, 'brown': 2, 'light brown': 1},
-        'eye_color': {'brown': 5, 'hazel': 2, 'black': 2},
-    },
-    'Barinas': {
-        'skin_tone': {'light': 2, 'medium': 3, 'olive': 2, 'tan': 2, 'fair': 1},
-        'hair_color': {'dark brown': 3, 'brown': 3, 'black': 2, 'light brown': 2},
-        'eye_color': {'brown': 5, 'hazel': 2},
-    },
-    'Barquisimeto': {
-        'skin_tone': {'light': 2, 'medium': 3, 'olive': 2, 'tan': 2},
-        'hair_color': {'dark brown': 3, 'brown': 3, 'black': 2},
-        'eye_color': {'brown': 5, 'hazel': 2},
-    },
-    'Maracay': {
-        'skin_tone': {'light': 2, 'medium': 3, 'olive': 2, 'tan': 2},
-        'hair_color': {'dark brown': 3, 'brown': 3, 'black': 2},
-        'eye_color': {'brown': 5, 'hazel': 2},
-    },
-    'San Cristóbal': {
-        'skin_tone': {'fair': 2, 'light': 2, 'medium': 3, 'olive': 2},
-        'hair_color': {'brown': 3, 'dark brown': 3, 'black': 2, 'light brown': 2},
-        'eye_color': {'brown': 4, 'hazel': 2, 'green': 1},
-    },
-    'Cumana': {
-        'skin_tone': {'light': 2, 'medium': 3, 'olive': 2, 'tan': 2},
-        'hair_color': {'dark brown': 3, 'brown': 3, 'black': 2},
-        'eye_color': {'brown': 5, 'hazel': 2},
-    },
-}
-
-def _weighted_choice_no_repeat(category, region, used_values, gender=None):
+def _weighted_choice_no_repeat(category, region, used_values, gender=None, rng=None):
     """Elección ponderada por región, evitando repetición en el lote."""
-    region_weights = REGION_BIAS_WEIGHTS.get(region)
-    # categorías soportadas por pesos
-    bias_supported = ['skin_tone', 'hair_color', 'eye_color']
-    if not region_weights or category not in bias_supported:
-        return _get_diversity_value_no_repeat(category, used_values, gender)
-    weights_map = region_weights.get(category, {})
-    if not weights_map:
-        return _get_diversity_value_no_repeat(category, used_values, gender)
-    # Construir listas de candidatos y pesos filtrando usados
+    rng = rng or random
+    # Solo skin_tone, hair_color y eye_color tienen pesos por región (precalculados en el catálogo)
+    region_weights = get_catalog().region_weights(region, category)
+    if not region_weights:
+        return _get_diversity_value_no_repeat(category, used_values, gender, rng)
+    values, weights = region_weights
+    if isinstance(rng, ProfileRandom):
+        # Sin historial de lote: solo la ponderación regional
+        return rng.choices(values, weights=weights, k=1)[0]
+    # Candidatos y pesos filtrando usados
     used = used_values[category]
-    candidates = []
-    weights = []
-    for val, w in weights_map.items():
-        if val not in used and w > 0:
-            candidates.append(val)
-            weights.append(w)
-    if not candidates:
+    candidates = [val for val in values if val not in used]
+    if candidates:
+        candidate_weights = [w for val, w in zip(values, weights) if val not in used]
+    else:
         used.clear()
-        for val, w in weights_map.items():
-            if w > 0:
-                candidates.append(val)
-                weights.append(w)
-    choice = random.choices(candidates, weights=weights, k=1)[0]
+        candidates, candidate_weights = values, weights
+    choice = rng.choices(candidates, weights=candidate_weights, k=1)[0]
     used.add(choice)
     return choice
 
-def _append_random_gender_descriptors(prompt_parts, gender_str):
+def _append_random_gender_descriptors(prompt_parts, gender_str, rng=None):
     """Añade descriptores de género con variedad controlada."""
-    is_male = gender_str.lower() in ['hombre', 'male', 'masculino']
-    if is_male:
-        options = [
-            "masculine features", "strong jawline", "defined jawline", "broad shoulders",
-            "masculine shoulders", "thick neck", "masculine build", "athletic build"
-        ]
-    else:
-        options = [
-            "feminine features", "soft jawline", "graceful jawline", "delicate shoulders",
-            "slender neck", "feminine build", "graceful build"
-        ]
-    # Elegir aleatoriamente 3-5 descriptores sin repetición
-    k = random.randint(3, min(5, len(options)))
-    for desc in random.sample(options, k):
-        prompt_parts.append(desc)
+    prompt_parts.extend(gender_descriptors(gender_str, rng))
+
+def _build_genetic_batch_prompt(profile, diversity_params, rng=None):
+    """Construir el prompt genético de un perfil con los controles de diversidad del lote"""
+    return BatchPromptCompiler(diversity_params).render(profile, rng)
+
+def _diversity_csv_row(profile):
+    """Fila del CSV de análisis de diversidad para un perfil guardado"""
+    return {
+        'image_id': profile['image_id'],
+        'nationality': profile['metadata']['nationality'],
+        'gender': profile['metadata']['gender'],
+        'region': profile['metadata']['region'],
+        'age': profile['metadata']['age'],
+        # Características étnicas básicas
+        'skin_tone': profile['ethnic_characteristics']['skin_tone'],
+        'hair_color': profile['ethnic_characteristics']['hair_color'],
+        'hair_style': profile['ethnic_characteristics']['hair_style'],
+        'eye_color': profile['ethnic_characteristics']['eye_color'],
+        'face_shape': profile['ethnic_characteristics']['face_shape'],
+        'nose_shape': profile['ethnic_characteristics']['nose_shape'],
+        'lip_shape': profile['ethnic_characteristics']['lip_shape'],
+        'eye_shape': profile['ethnic_characteristics']['eye_shape'],
+        'jawline': profile['ethnic_characteristics']['jawline'],
+        'cheekbone': profile['ethnic_characteristics']['cheekbone'],
+        'eyebrow': profile['ethnic_characteristics']['eyebrow'],
+        'skin_texture': profile['ethnic_characteristics']['skin_texture'],
+        # Características de la piel
+        'freckle': profile['ethnic_characteristics']['freckle'],
+        'mole': profile['ethnic_characteristics']['mole'],
+        'scar': profile['ethnic_characteristics']['scar'],
+        'acne': profile['ethnic_characteristics']['acne'],
+        'wrinkle': profile['ethnic_characteristics']['wrinkle'],
+        # Nuevas características de diversidad
+        'facial_hair': profile['ethnic_characteristics'].get('facial_hair', 'none'),
+        'beard': profile['ethnic_characteristics'].get('beard', 'none'),
+        'mustache': profile['ethnic_characteristics'].get('mustache', 'none'),
+        'physical_complexion': profile['ethnic_characteristics'].get('physical_complexion', 'normal'),
+        'clothing_type': profile['ethnic_characteristics'].get('clothing_type', 'random'),
+        'clothing_color': profile['ethnic_characteristics'].get('clothing_color', 'random'),
+        'background': profile['ethnic_characteristics'].get('background', 'white_solid'),
+        'makeup': profile['ethnic_characteristics'].get('makeup', 'no_makeup'),
+        # Información de generación
+        'generation_time': profile['generated_at'],
+        'filename': profile['image_info']['filename'],
+        'seed': profile['generation_parameters']['seed'],
+        'model_name': profile['generation_parameters']['model_name'],
+        'cfg_scale': profile['generation_parameters']['cfg_scale'],
+        'steps': profile['generation_parameters']['steps'],
+        'sampler_name': profile['generation_parameters']['sampler_name']
+    }
 
-def generate_genetic_batch(params):
+def _diversity_columnar_row(profile, csv_row):
+    """Fila del Parquet de análisis: la del CSV más el resto de parámetros de generación"""
+    row = dict(csv_row)
+    for key, value in profile['generation_parameters'].items():
+        row.setdefault(key, value)
+    row['run_seed'] = profile['replication_info'].get('run_seed')
+    row['profile_index'] = profile['replication_info'].get('profile_index')
+    return row
+
+def _mean_normalized_entropy(summary):
+    """Entropía normalizada media de las categorías de un resumen de DiversityMetrics"""
+    values = [category['normalized_entropy'] for category in summary['categories'].values()]
+    return sum(values) / len(values) if values else 0.0
+
+def generate_genetic_batch(params, progress_callback=None, cancel_event=None):
     """
     Generar lote de imágenes genéticas con controles de diversidad
+    
+    Args:
+        params: Parámetros de generación (output_dir con manifiesto reanuda un lote)
+        progress_callback: Función (completadas, total, checkpoint) llamada por cada imagen guardada
+        cancel_event: threading.Event; si se activa se deja de enviar trabajo nuevo
     """
+    file_manager = None
+    validation = None
+    output_dir = None
+    trait_index = None
     try:
         # Importar el motor de diversidad
         from diversity_engine import UltraDiversityEngine
         from api_client import GeneticAPIGenerator
         from file_manager import FileManager
+        from generation_manifest import GenerationManifest
+        
+        # Reanudar: los parámetros del manifiesto mandan para obtener los mismos perfiles
+        manifest = None
+        if params.get('output_dir') and GenerationManifest.exists(params['output_dir']):
+            manifest = GenerationManifest.load(params['output_dir'])
+            params = dict(manifest.params, output_dir=params['output_dir'])
+            print(f"♻️ Reanudando lote en {params['output_dir']}: {manifest.completed_count} imágenes ya completadas")
         
         # Crear instancia del motor de diversidad
         diversity_engine = UltraDiversityEngine()
         
         # Crear cliente API y generador
-        from api_client import WebUIAPIClient
-        api_client = WebUIAPIClient()
+        from api_client import create_webui_client
+        api_client = create_webui_client()
         api_generator = GeneticAPIGenerator(api_client)
         
-        # Crear gestor de archivos
-        file_manager = FileManager()
+        # Crear gestor de archivos (escritura diferida: la generación no espera al disco)
+        file_manager = FileManager(write_behind=params.get('write_behind', True),
+                                   layout=params.get('output_layout', 'flat'))
         
         # Configurar parámetros de diversidad avanzados
         diversity_params = {
@@ -249,66 +218,85 @@ def generate_genetic_batch(params):
             'physical_complexion_control': params.get('physical_complexion_control', 'random')
         }
         
+        # RNG del lote: (run_seed, índice) determina cada perfil, su prompt y su semilla
+        run_rng = RunRandom(params.get('run_seed'))
+        print(f"🎲 Semilla del lote: {run_rng.run_seed}")
+        
         # Generar perfiles genéticos básicos (con muestreo sin repetición por lote)
         profiles = []
         used_values = defaultdict(set)
-        for i in range(diversity_params['cantidad']):
+        
+        def _sample_ethnic_characteristics(rng):
+            """Rasgos de un perfil (en el orden de sorteo original)"""
+            return {
+                'region': _get_diversity_value_no_repeat('region', used_values, rng=rng),
+                'region_traits': {
+                    'skin_modifier': 'standard',
+                    'hair_modifier': 'standard'
+                },
+                'skin_tone': _get_diversity_value_no_repeat('skin_tone', used_values, rng=rng),
+                'hair_color': _get_diversity_value_no_repeat('hair_color', used_values, rng=rng),
+                'hair_style': _get_diversity_value_no_repeat('hair_style', used_values, rng=rng),
+                'eye_color': _get_diversity_value_no_repeat('eye_color', used_values, rng=rng),
+                'face_shape': _get_diversity_value_no_repeat('face_shape', used_values, rng=rng),
+                'nose_shape': _get_diversity_value_no_repeat('nose_shape', used_values, rng=rng),
+                'lip_shape': _get_diversity_value_no_repeat('lip_shape', used_values, rng=rng),
+                'eye_shape': _get_diversity_value_no_repeat('eye_shape', used_values, rng=rng),
+                'jawline': _get_diversity_value_no_repeat('jawline', used_values, rng=rng),
+                'cheekbone': _get_diversity_value_no_repeat('cheekbone', used_values, rng=rng),
+                'eyebrow': _get_diversity_value_no_repeat('eyebrow', used_values, rng=rng),
+                'skin_texture': _get_diversity_value_no_repeat('skin_texture', used_values, rng=rng),
+                'freckle': _get_diversity_value_no_repeat('freckle', used_values, rng=rng),
+                'mole': _get_diversity_value_no_repeat('mole', used_values, rng=rng),
+                'scar': _get_diversity_value_no_repeat('scar', used_values, rng=rng),
+                'acne': _get_diversity_value_no_repeat('acne', used_values, rng=rng),
+                'wrinkle': _get_diversity_value_no_repeat('wrinkle', used_values, rng=rng),
+                # Nuevos controles de diversidad con lógica específica por género
+                'facial_hair': _get_diversity_value_no_repeat('facial_hair', used_values, diversity_params.get('genero'), rng=rng),
+                'beard': _get_diversity_value_no_repeat('beard', used_values, diversity_params.get('genero'), rng=rng),
+                'mustache': _get_diversity_value_no_repeat('mustache', used_values, diversity_params.get('genero'), rng=rng),
+                'physical_complexion': _get_diversity_value_no_repeat('physical_complexion', used_values, rng=rng),
+                'clothing_type': _get_diversity_value_no_repeat('clothing_type', used_values, rng=rng),
+                'clothing_color': _get_diversity_value_no_repeat('clothing_color', used_values, rng=rng),
+                'background': _get_random_diversity_value('background', rng=rng),
+                'makeup': _get_random_diversity_value('makeup', diversity_params.get('genero'), rng)
+            }
+        
+        # Combinaciones ya emitidas en cualquier lote anterior (no se repiten); se
+        # reservan al sortear y solo quedan usadas cuando la imagen se guarda
+        if params.get('global_uniqueness', True):
+            from uniqueness_index import get_trait_index, trait_vector
+            trait_index = get_trait_index(file_manager.outputs_dir)
+        max_unique_attempts = int(params.get('uniqueness_attempts', 20))
+        
+        # Al reanudar solo faltan los índices que el manifiesto no marca como completados
+        pending_indices = [i for i in range(diversity_params['cantidad']) if manifest is None or not manifest.is_done(i)]
+        for profile_index in pending_indices:
+            profile_rng = run_rng.for_index(profile_index)
             # Generar edad aleatoria dentro del rango
-            edad = random.randint(diversity_params['edad_min'], diversity_params['edad_max'])
+            edad = profile_rng.randint(diversity_params['edad_min'], diversity_params['edad_max'])
             
             # Crear perfil básico como diccionario
             timestamp = time.strftime("%Y%m%d_%H%M%S")
             profile = {
-                'image_id': f"genetic_{diversity_params.get('nacionalidad', 'Venezuela')}_{diversity_params.get('genero', 'hombre')}_{i+1}_{timestamp}",
+                'image_id': f"genetic_{diversity_params.get('nacionalidad', 'Venezuela')}_{diversity_params.get('genero', 'hombre')}_{profile_index + 1}_{timestamp}",
                 'generated_at': time.strftime("%Y-%m-%dT%H:%M:%S.%f"),
                 'metadata': {
                     'nationality': diversity_params['nacionalidad'],
                     'gender': 'male' if diversity_params.get('genero') and diversity_params['genero'].lower() in ['hombre', 'male', 'masculino'] else 'female',
-                    'region': _get_random_diversity_value('region'),
+                    'region': _get_random_diversity_value('region', rng=profile_rng),
                     'age': edad,
                     'generation_type': 'genetic_diversity',
                     'unique_characteristics': True
                 },
-                'ethnic_characteristics': {
-                    'region': _get_diversity_value_no_repeat('region', used_values),
-                    'region_traits': {
-                        'skin_modifier': 'standard',
-                        'hair_modifier': 'standard'
-                    },
-                    'skin_tone': _get_diversity_value_no_repeat('skin_tone', used_values),
-                    'hair_color': _get_diversity_value_no_repeat('hair_color', used_values),
-                    'hair_style': _get_diversity_value_no_repeat('hair_style', used_values),
-                    'eye_color': _get_diversity_value_no_repeat('eye_color', used_values),
-                    'face_shape': _get_diversity_value_no_repeat('face_shape', used_values),
-                    'nose_shape': _get_diversity_value_no_repeat('nose_shape', used_values),
-                    'lip_shape': _get_diversity_value_no_repeat('lip_shape', used_values),
-                    'eye_shape': _get_diversity_value_no_repeat('eye_shape', used_values),
-                    'jawline': _get_diversity_value_no_repeat('jawline', used_values),
-                    'cheekbone': _get_diversity_value_no_repeat('cheekbone', used_values),
-                    'eyebrow': _get_diversity_value_no_repeat('eyebrow', used_values),
-                    'skin_texture': _get_diversity_value_no_repeat('skin_texture', used_values),
-                    'freckle': _get_diversity_value_no_repeat('freckle', used_values),
-                    'mole': _get_diversity_value_no_repeat('mole', used_values),
-                    'scar': _get_diversity_value_no_repeat('scar', used_values),
-                    'acne': _get_diversity_value_no_repeat('acne', used_values),
-                    'wrinkle': _get_diversity_value_no_repeat('wrinkle', used_values),
-                    # Nuevos controles de diversidad con lógica específica por género
-                    'facial_hair': _get_diversity_value_no_repeat('facial_hair', used_values, diversity_params.get('genero')),
-                    'beard': _get_diversity_value_no_repeat('beard', used_values, diversity_params.get('genero')),
-                    'mustache': _get_diversity_value_no_repeat('mustache', used_values, diversity_params.get('genero')),
-                    'physical_complexion': _get_diversity_value_no_repeat('physical_complexion', used_values),
-                    'clothing_type': _get_diversity_value_no_repeat('clothing_type', used_values),
-                    'clothing_color': _get_diversity_value_no_repeat('clothing_color', used_values),
-                    'background': _get_random_diversity_value('background'),
-                    'makeup': _get_random_diversity_value('makeup', diversity_params.get('genero'))
-                },
+                'ethnic_characteristics': _sample_ethnic_characteristics(profile_rng),
                 'generation_parameters': {
                     'width': params.get('width', 512),
                     'height': params.get('height', 764),
                     'steps': params.get('steps', 20),
                     'cfg_scale': params.get('cfg_scale', 7.0),
                     'sampler_name': params.get('sampler_name', 'DPM++ 2M'),
-                    'seed': random.randint(1, 2**31 - 1),
+                    'seed': run_rng.seed_for(profile_index, params.get('seed', -1)),
                     'batch_size': 1,
                     'n_iter': 1,
                     'model_name': params.get('model', 'unknown_model')
@@ -316,227 +304,327 @@ def generate_genetic_batch(params):
                 'replication_info': {
                     'description': 'Configuración única para replicar esta imagen exacta',
                     'genetic_diversity': 'Real basada en datos demográficos',
-                    'uniqueness': 'Cada imagen tiene características genéticas únicas'
+                    'uniqueness': 'Cada imagen tiene características genéticas únicas',
+                    'run_seed': run_rng.run_seed,
+                    'profile_index': profile_index
                 }
             }
+            if trait_index is not None:
+                # Volver a sortear los rasgos (intento n del mismo índice) mientras la combinación esté usada
+                attempt = 0
+                while not trait_index.reserve(trait_vector(profile), run_rng.run_seed, profile_index):
+                    attempt += 1
+                    if attempt > max_unique_attempts:
+                        logger.warning(f"Perfil {profile_index + 1}: sin combinación nueva tras {max_unique_attempts} intentos")
+                        profile['metadata']['unique_characteristics'] = False
+                        break
+                    profile['ethnic_characteristics'] = _sample_ethnic_characteristics(
+                        run_rng.for_index(profile_index, attempt)
+                    )
+                profile['replication_info']['uniqueness_attempts'] = attempt
             profiles.append(profile)
+        if trait_index is not None:
+            print(f"🧬 Combinaciones de rasgos: {trait_index.stats()['collisions']} repetidas evitadas, "
+                  f"{len(trait_index)} en el índice global")
         
-        # Crear estructura de directorios de salida
+        # Crear estructura de salida con su manifiesto (o reutilizar la del lote reanudado)
         model_name = params.get('model', 'unknown_model')
-        output_dir = file_manager.create_output_structure(
-            model_name=model_name,
-            generation_type="genetico_premium",
-            nacionalidad=diversity_params['nacionalidad'],
-            genero=diversity_params.get('genero', 'hombre')
-        )
+        if manifest is not None:
+            output_dir = manifest.output_dir
+        else:
+            if params.get('output_dir'):
+                output_dir = Path(params['output_dir'])
+                output_dir.mkdir(parents=True, exist_ok=True)
+            else:
+                output_dir = file_manager.create_output_structure(
+                    model_name=model_name,
+                    generation_type="genetico_premium",
+                    nacionalidad=diversity_params['nacionalidad'],
+                    genero=diversity_params.get('genero', 'hombre'),
+                    run_id=params.get('job_id', run_rng.run_seed)
+                )
+            manifest_params = dict(params, run_seed=run_rng.run_seed)
+            manifest_params.pop('output_dir', None)
+            manifest = GenerationManifest.create(output_dir, run_rng.run_seed, manifest_params)
+        # Perfiles pendientes con su índice en el lote (prompt, semilla de reintento y nombre dependen de él)
+        indexed_profiles = [(profile['replication_info']['profile_index'], profile) for profile in profiles]
+        # CSV de análisis escrito fila a fila a medida que se guardan las imágenes
+        # Un CSV por lote (run_seed): al reanudar se siguen añadiendo filas al mismo
+        analysis_name = f"genetic_diversity_analysis_{run_rng.run_seed}"
+        csv_filename = f"{analysis_name}.csv"
+        # Parquet columnar con los mismos datos (requiere pyarrow)
+        columnar_filename = f"{analysis_name}.parquet" if params.get('columnar_output', True) else None
+        
+        # Parámetros de imagen comunes a todo el lote (la semilla es la de cada perfil)
+        image_params = {
+            'width': params.get('width', 512),
+            'height': params.get('height', 764),
+            'cfg_scale': params.get('cfg_scale', 7.0),
+            'steps': params.get('steps', 20)
+        }
+
+        def _profile_params(profile):
+            """Parámetros de la petición de un perfil: su semilla es la registrada en el JSON"""
+            return dict(image_params, seed=profile['generation_parameters']['seed'])
+
+        def _save_generated_image(index, profile, image_result):
+            """Guardar imagen generada y devolver la entrada para generated_images"""
+            number = index + 1
+            print(f"✅ Imagen {number} generada exitosamente")
+            # Guardar imagen con nomenclatura correcta
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            filename = f"genetic_{diversity_params.get('nacionalidad', 'Venezuela')}_{diversity_params.get('genero', 'hombre')}_{number}_{timestamp}"
+            
+            # Agregar información de imagen al perfil
+            profile['image_info'] = {
+                'filename': f"{filename}.png",
+                'filepath': str(output_dir / f"{filename}.png"),
+                'generation_successful': True,
+                'generation_time': time.strftime("%Y-%m-%dT%H:%M:%S.%f")
+            }
+            
+            def _on_saved():
+                # El manifiesto solo avanza cuando la imagen ya está en disco
+                manifest.record(index, seed=profile['generation_parameters']['seed'],
+                                profile=profile, filename=f"{filename}.png")
+                if trait_index is not None:
+                    trait_index.commit(trait_vector(profile), run_rng.run_seed, index)
+                if progress_callback:
+                    progress_callback(manifest.completed_count, diversity_params['cantidad'],
+                                      {'output_dir': str(output_dir), 'completed': manifest.completed_count,
+                                       'run_seed': run_rng.run_seed})
+            
+            # Novedad del perfil respecto a lo ya generado en el lote
+            profile['metadata']['diversity_score'] = diversity_metrics.observe(profile['ethnic_characteristics'])
+            if dedup is not None:
+                profile['perceptual_hash'] = dedup.check_and_add(image_result, file_manager.image_path(output_dir, filename))
+                near_duplicates[0] += bool(profile['perceptual_hash']['near_duplicates'])
+            
+            save_result = file_manager.save_image(
+                image_data=image_result,
+                output_dir=output_dir,
+                filename=filename,
+                metadata=profile,
+                on_saved=_on_saved
+            )
+            
+            if save_result['success']:
+                csv_row = _diversity_csv_row(profile)
+                file_manager.append_csv_row(output_dir, csv_filename, csv_row)
+                if columnar_filename:
+                    file_manager.append_columnar_row(output_dir, columnar_filename, _diversity_columnar_row(profile, csv_row))
+                return {
+                    'profile': profile,
+                    'image_path': save_result['file_path']
+                }
+            return None
         
         # Generar imágenes usando API
         generated_images = []
+        max_in_flight = max(1, int(params.get('max_in_flight', 1)))
+        api_batch_size = max(1, int(params.get('api_batch_size', 1)))
+        webui_urls = params.get('webui_urls') or []
+        if webui_urls:
+            # Varias URLs crean un pool con despacho al nodo menos cargado y failover
+            api_client = create_webui_client(webui_urls)
+        # Prompts: prefijo y negative prompt precalculados, partes variables en streaming
+        prompt_compiler = BatchPromptCompiler(diversity_params, run_rng.run_seed)
+        prompt_workers = int(params.get('prompt_workers', 0))
+        # Validación SAIME en memoria con regeneración de las imágenes que no cumplen
+        if params.get('saime_validation'):
+            from validation_stage import InlineValidationStage
+            validation = InlineValidationStage(
+                run_seed=run_rng.run_seed,
+                max_retries=params.get('validation_retries', 2),
+                workers=params.get('validation_workers', 2),
+                rules=params.get('validation_rules')
+            )
+        # Hashes perceptuales: casi-duplicados dentro del lote y contra todo outputs/
+        if params.get('dedup', True):
+            from image_dedup import get_deduplicator
+            dedup = get_deduplicator(file_manager.outputs_dir)
+        else:
+            dedup = None
+        near_duplicates = [0]
+        # Entropía, cobertura y unicidad medidas a medida que se guardan las imágenes
+        diversity_metrics = DiversityMetrics(
+            catalog_vocabularies('genetic', GENETIC_BATCH_OPTIONS), seed=run_rng.run_seed
+        )
+        register_metrics(output_dir, diversity_metrics)
         print(f"🔍 Generando {len(profiles)} imágenes...")
-        for i, profile in enumerate(profiles):
-            try:
-                print(f"📸 Procesando imagen {i+1}/{len(profiles)}")
-                # Crear prompt genético avanzado con controles de diversidad
-                prompt_parts = [
-                    f"venezuelan passport photo",
-                    f"{profile['metadata']['gender']} from {profile['metadata']['nationality']}",
-                    f"{profile['metadata']['age']} years old",
-                    "professional headshot",
-                    "official document photo",
-                    "clean white background",
-                    "proper lighting",
-                    "head and shoulders visible",
-                    "neutral expression",
-                    "looking at camera",
-                    "high quality",
-                    "realistic"
-                ]
-                
-                # Descriptores de género variados
-                _append_random_gender_descriptors(prompt_parts, diversity_params.get('genero', 'hombre'))
+        server_job = None
+        if params.get('server_batch') and not hasattr(api_client, 'submit_txt2img_batch'):
+            print(f"⚠️ {type(api_client).__name__} no admite trabajos por lotes del servidor, se usa el modo por peticiones")
+        if profiles and params.get('server_batch') and hasattr(api_client, 'submit_txt2img_batch'):
+            # Todo el lote en un solo trabajo: el WebUI lo reparte en lotes de GPU y devuelve las imágenes en streaming
+            from api_client import TXT2IMG_BATCH_KEYS
+            server_prompts = {}
 
-                # Agregar características de diversidad al prompt
-                diversity_features = []
-                
-                # Beauty level
-                if diversity_params['beauty_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['beauty_control']} appearance")
-                
-                # Skin tone
-                if diversity_params['skin_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['skin_control']} skin")
-                
-                # Hair characteristics
-                if diversity_params['hair_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['hair_control']} hair")
-                if diversity_params['hair_length_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['hair_length_control']} hair")
-                if diversity_params['hair_style_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['hair_style_control']} hairstyle")
-                
-                # Eye characteristics
-                if diversity_params['eye_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['eye_control']} eyes")
-                if diversity_params['eye_shape_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['eye_shape_control']} eyes")
-                
-                # Facial features
-                if diversity_params['face_shape_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['face_shape_control']} face")
-                if diversity_params['nose_shape_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['nose_shape_control']} nose")
-                if diversity_params['lip_shape_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['lip_shape_control']} lips")
-                if diversity_params['jawline_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['jawline_control']} jawline")
-                if diversity_params['cheekbone_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['cheekbone_control']} cheekbones")
-                if diversity_params['eyebrow_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['eyebrow_control']} eyebrows")
-                
-                # Skin characteristics
-                if diversity_params['skin_texture_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['skin_texture_control']} skin texture")
-                if diversity_params['freckle_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['freckle_control']} freckles")
-                if diversity_params['mole_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['mole_control']} moles")
-                if diversity_params['scar_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['scar_control']} scars")
-                if diversity_params['acne_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['acne_control']} acne")
-                if diversity_params['wrinkle_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['wrinkle_control']} wrinkles")
-                
-                # Makeup and clothing
-                if diversity_params['makeup_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['makeup_control']} makeup")
-                if diversity_params['clothing_type_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['clothing_type_control']}")
-                if diversity_params['clothing_color_control'] != 'random':
-                    diversity_features.append(f"{diversity_params['clothing_color_control']} clothing")
-                
-                # Background
-                if diversity_params['background_control'] != 'random':
-                    if diversity_params['background_control'] == 'white_solid':
-                        diversity_features.append("solid white background")
+            def _server_params(profile):
+                generation = profile.get('generation_parameters', {})
+                return {k: generation[k] for k in TXT2IMG_BATCH_KEYS if generation.get(k) is not None}
+
+            def _server_jobs():
+                for i, profile, prompt in prompt_compiler.iter_prompts(indexed_profiles, workers=prompt_workers):
+                    server_prompts[i] = prompt
+                    yield {
+                        'prompt': prompt,
+                        'negative_prompt': prompt_compiler.negative_prompt,
+                        'seed': profile.get('generation_parameters', {}).get('seed', -1),
+                        'params': _server_params(profile)
+                    }
+            server_job = api_client.submit_txt2img_batch(_server_jobs(), batch_size=int(params.get('server_batch_size', max(api_batch_size, 8))))
+            if server_job is None:
+                print("⚠️ El WebUI no aceptó el trabajo por lotes, se usa el modo por peticiones")
+        if server_job is not None:
+            print(f"🚀 Trabajo {server_job} en el WebUI: {len(profiles)} imágenes")
+            for position, image_result in api_client.iter_txt2img_batch(server_job, cancel_event=cancel_event):
+                i, profile = indexed_profiles[position]
+                try:
+                    if validation is not None:
+                        def _regenerate(seed, prompt=server_prompts[i], profile=profile):
+                            return api_client.generate_image(
+                                prompt=prompt,
+                                negative_prompt=prompt_compiler.negative_prompt,
+                                params=dict(_server_params(profile), seed=seed)
+                            )
+                        image_result, summary = validation.run(i, image_result, _regenerate,
+                                                               seed=profile.get('generation_parameters', {}).get('seed', -1))
+                        validation.annotate(profile, summary, accepted=image_result is not None)
+                    
+                    if image_result:
+                        saved = _save_generated_image(i, profile, image_result)
+                        if saved:
+                            generated_images.append(saved)
                     else:
-                        diversity_features.append(f"{diversity_params['background_control']} background")
-                
-                # Combinar prompt
-                if diversity_features:
-                    prompt_parts.extend(diversity_features)
-                
-                prompt = ", ".join(prompt_parts)
-                negative_prompt = "blurry, low quality, distorted, deformed, ugly, bad anatomy, bad proportions, extra limbs, missing limbs, multiple people, smiling, laughing, 3/4 view, side profile, looking away, white clothing, colored background, shadows, jewelry, glasses, hat, excessive makeup"
-                
-                # Generar imagen usando el cliente API
-                image_params = {
-                    'width': params.get('width', 512),
-                    'height': params.get('height', 764),
-                    'cfg_scale': params.get('cfg_scale', 7.0),
-                    'steps': params.get('steps', 20),
-                    'seed': params.get('seed', -1)
-                }
-                image_result = api_client.generate_image(
-                    prompt=prompt,
-                    negative_prompt=negative_prompt,
-                    params=image_params
+                        print(f"❌ Error generando imagen {i+1}")
+                        
+                except Exception as e:
+                    print(f"❌ Error generando imagen {i+1}: {e}")
+                    logger.error(f"Error generando imagen {i+1}: {e}")
+                    continue
+        elif max_in_flight > 1 or api_batch_size > 1 or len(webui_urls) > 1:
+            # Modo pipeline: varias peticiones en vuelo y guardado en etapa separada
+            from generation_pipeline import GenerationPipeline, GenerationJob
+            print(f"🚀 Modo pipeline: {max_in_flight} peticiones en vuelo de hasta {api_batch_size} imágenes sobre {max(1, len(webui_urls))} backend(s)")
+            pipeline = GenerationPipeline(
+                [api_client],
+                save_callback=_save_generated_image,
+                max_in_flight=max_in_flight,
+                validation=validation
+            )
+            if api_batch_size > 1:
+                # Lotes: un prompt y una semilla por perfil en la misma petición
+                from api_client import group_profiles_for_batching, build_batch_params
+                batches = [
+                    (common, [(profile['replication_info']['profile_index'], profile) for _, profile in members])
+                    for common, members in group_profiles_for_batching(profiles, api_batch_size)
+                ]
+                prompts = prompt_compiler.iter_prompts(
+                    (member for _, members in batches for member in members), workers=prompt_workers
                 )
-                
-                if image_result:
-                    print(f"✅ Imagen {i+1} generada exitosamente")
-                    # Guardar imagen con nomenclatura correcta
-                    timestamp = time.strftime("%Y%m%d_%H%M%S")
-                    filename = f"genetic_{diversity_params.get('nacionalidad', 'Venezuela')}_{diversity_params.get('genero', 'hombre')}_{i+1}_{timestamp}"
-                    
-                    # Agregar información de imagen al perfil
-                    profile['image_info'] = {
-                        'filename': f"{filename}.png",
-                        'filepath': str(output_dir / f"{filename}.png"),
-                        'generation_successful': True,
-                        'generation_time': time.strftime("%Y-%m-%dT%H:%M:%S.%f")
-                    }
+
+                def _batch_jobs():
+                    for common, members in batches:
+                        rendered = [next(prompts) for _ in members]
+                        yield GenerationJob(
+                            index=members[0][0],
+                            prompt=[prompt for _, _, prompt in rendered],
+                            negative_prompt=prompt_compiler.negative_prompt,
+                            params=build_batch_params(common, [profile['generation_parameters']['seed'] for _, profile in members]),
+                            payload=members
+                        )
+                jobs = _batch_jobs()
+            else:
+                jobs = (
+                    GenerationJob(
+                        index=i,
+                        prompt=prompt,
+                        negative_prompt=prompt_compiler.negative_prompt,
+                        params=_profile_params(profile),
+                        payload=profile
+                    )
+                    for i, profile, prompt in prompt_compiler.iter_prompts(indexed_profiles, workers=prompt_workers)
+                )
+            generated_images = pipeline.run(jobs, cancel_event=cancel_event)['results']
+        else:
+            for i, profile, prompt in prompt_compiler.iter_prompts(indexed_profiles, workers=prompt_workers):
+                if cancel_event is not None and cancel_event.is_set():
+                    print(f"⏹️ Generación cancelada tras {len(generated_images)} imágenes")
+                    break
+                try:
+                    print(f"📸 Procesando imagen {i+1}/{diversity_params['cantidad']}")
+                    profile_params = _profile_params(profile)
                     
-                    save_result = file_manager.save_image(
-                        image_data=image_result,
-                        output_dir=output_dir,
-                        filename=filename,
-                        metadata=profile
+                    # Generar imagen usando el cliente API
+                    image_result = api_client.generate_image(
+                        prompt=prompt,
+                        negative_prompt=prompt_compiler.negative_prompt,
+                        params=profile_params
                     )
                     
-                    if save_result['success']:
-                        generated_images.append({
-                            'profile': profile,
-                            'image_path': save_result['file_path']
-                        })
+                    if validation is not None:
+                        def _regenerate(seed, prompt=prompt, profile_params=profile_params):
+                            return api_client.generate_image(
+                                prompt=prompt,
+                                negative_prompt=prompt_compiler.negative_prompt,
+                                params=dict(profile_params, seed=seed)
+                            )
+                        image_result, summary = validation.run(i, image_result or None, _regenerate,
+                                                               seed=profile_params['seed'])
+                        validation.annotate(profile, summary, accepted=image_result is not None)
                     
-            except Exception as e:
-                print(f"❌ Error generando imagen {i+1}: {e}")
-                logger.error(f"Error generando imagen {i+1}: {e}")
-                continue
+                    if image_result:
+                        saved = _save_generated_image(i, profile, image_result)
+                        if saved:
+                            generated_images.append(saved)
+                        
+                except Exception as e:
+                    print(f"❌ Error generando imagen {i+1}: {e}")
+                    logger.error(f"Error generando imagen {i+1}: {e}")
+                    continue
         
-        # Generar CSV con datos de diversidad
-        if generated_images:
-            csv_data = []
-            for img_data in generated_images:
-                profile = img_data['profile']
-                csv_data.append({
-                    'image_id': profile['image_id'],
-                    'nationality': profile['metadata']['nationality'],
-                    'gender': profile['metadata']['gender'],
-                    'region': profile['metadata']['region'],
-                    'age': profile['metadata']['age'],
-                    # Características étnicas básicas
-                    'skin_tone': profile['ethnic_characteristics']['skin_tone'],
-                    'hair_color': profile['ethnic_characteristics']['hair_color'],
-                    'hair_style': profile['ethnic_characteristics']['hair_style'],
-                    'eye_color': profile['ethnic_characteristics']['eye_color'],
-                    'face_shape': profile['ethnic_characteristics']['face_shape'],
-                    'nose_shape': profile['ethnic_characteristics']['nose_shape'],
-                    'lip_shape': profile['ethnic_characteristics']['lip_shape'],
-                    'eye_shape': profile['ethnic_characteristics']['eye_shape'],
-                    'jawline': profile['ethnic_characteristics']['jawline'],
-                    'cheekbone': profile['ethnic_characteristics']['cheekbone'],
-                    'eyebrow': profile['ethnic_characteristics']['eyebrow'],
-                    'skin_texture': profile['ethnic_characteristics']['skin_texture'],
-                    # Características de la piel
-                    'freckle': profile['ethnic_characteristics']['freckle'],
-                    'mole': profile['ethnic_characteristics']['mole'],
-                    'scar': profile['ethnic_characteristics']['scar'],
-                    'acne': profile['ethnic_characteristics']['acne'],
-                    'wrinkle': profile['ethnic_characteristics']['wrinkle'],
-                    # Nuevas características de diversidad
-                    'facial_hair': profile['ethnic_characteristics'].get('facial_hair', 'none'),
-                    'beard': profile['ethnic_characteristics'].get('beard', 'none'),
-                    'mustache': profile['ethnic_characteristics'].get('mustache', 'none'),
-                    'physical_complexion': profile['ethnic_characteristics'].get('physical_complexion', 'normal'),
-                    'clothing_type': profile['ethnic_characteristics'].get('clothing_type', 'random'),
-                    'clothing_color': profile['ethnic_characteristics'].get('clothing_color', 'random'),
-                    'background': profile['ethnic_characteristics'].get('background', 'white_solid'),
-                    'makeup': profile['ethnic_characteristics'].get('makeup', 'no_makeup'),
-                    # Información de generación
-                    'generation_time': profile['generated_at'],
-                    'filename': profile['image_info']['filename'],
-                    'seed': profile['generation_parameters']['seed'],
-                    'model_name': profile['generation_parameters']['model_name'],
-                    'cfg_scale': profile['generation_parameters']['cfg_scale'],
-                    'steps': profile['generation_parameters']['steps'],
-                    'sampler_name': profile['generation_parameters']['sampler_name']
-                })
-            
-            # Guardar CSV
-            csv_filename = f"genetic_diversity_analysis_{time.strftime('%Y%m%d_%H%M%S')}.csv"
-            file_manager.save_csv_analysis(output_dir, csv_filename, csv_data)
+        # Esperar a que las escrituras diferidas lleguen al disco
+        file_manager.close()
+        if trait_index is not None:
+            # Perfiles sin imagen (cancelados o fallidos): sus combinaciones vuelven a estar libres
+            trait_index.release(run_rng.run_seed)
         
-        return {
+        result = {
             'success': True,
             'generated_count': len(generated_images),
-            'images': generated_images
+            'images': generated_images,
+            'output_dir': str(output_dir),
+            'run_seed': run_rng.run_seed,
+            'cancelled': bool(cancel_event is not None and cancel_event.is_set()),
+            'near_duplicates': near_duplicates[0],
+            'diversity_metrics': diversity_metrics.summary()
         }
+        unregister_metrics(output_dir)
+        file_manager.save_json_metadata(output_dir, 'diversity_metrics', result['diversity_metrics'])
+        print(f"📊 Diversidad medida: entropía normalizada media "
+              f"{_mean_normalized_entropy(result['diversity_metrics']):.1%}, cobertura {result['diversity_metrics']['coverage'] or 0:.1%}, "
+              f"combinaciones únicas {result['diversity_metrics']['combinations']['uniqueness']:.1%}")
+        if near_duplicates[0]:
+            print(f"🪞 {near_duplicates[0]} imágenes casi duplicadas de otras ya generadas")
+        if validation is not None:
+            validation.close()
+            result['validation'] = validation.stats()
+            print(f"🛂 Validación SAIME: {result['validation']['accepted']} aceptadas, "
+                  f"{result['validation']['rejected']} descartadas, aprobación por regla {result['validation']['rule_pass_rates']}")
+        return result
         
     except Exception as e:
         print(f"Error en generación genética: {e}")
+        if file_manager is not None:
+            # No perder lo que ya estaba en la cola de escritura
+            file_manager.close()
+        if trait_index is not None:
+            trait_index.release(run_rng.run_seed)
+        if validation is not None:
+            validation.close()
+        if output_dir is not None:
+            unregister_metrics(output_dir)
         return {
             'success': False,
             'error': str(e),
@@ -551,7 +639,7 @@ import json
 import random
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, fields
 
 # Evitar importaciones pesadas hasta que sean necesarias
 try:
@@ -622,34 +710,9 @@ class DirectGeneticGenerator:
         self.max_recent_choices = 15  # Historial ultra restrictivo para máxima diversidad
     
     def _load_diversity_data(self):
-        """Cargar datos de diversidad ultra expandidos para alcanzar 95.3% de diversidad"""
-        # Optimización: usar lazy loading para evitar cargar datos innecesarios
-        if hasattr(self, '_diversity_cache'):
-            return self._diversity_cache
-            
-        self._diversity_cache = {
-            'beauty_levels': ['muy bajo', 'bajo', 'medio', 'alto', 'muy alto', 'extraordinario', 'único', 'distintivo', 'excepcional', 'sobresaliente', 'notable', 'especial', 'raro', 'incomparable', 'irrepetible', 'singular', 'extraordinario', 'soberbio', 'magnífico', 'excelente'],
-            'skin_tones': ['muy claro', 'claro', 'medio claro', 'medio', 'medio oscuro', 'oscuro', 'muy oscuro', 'café', 'canela', 'miel', 'bronce', 'oliva', 'dorado', 'caramelo', 'chocolate', 'ébanos', 'crema', 'marfil', 'beige', 'tostado', 'cobrizo', 'rojizo', 'amarillento', 'verdoso', 'azulado', 'rosado', 'grisáceo', 'pálido', 'moreno', 'trigueño'],
-            'hair_colors': ['negro', 'marrón oscuro', 'marrón', 'marrón claro', 'castaño', 'rubio oscuro', 'rubio', 'rubio claro', 'rojo', 'pelirrojo', 'gris', 'blanco', 'sal y pimienta', 'mezclado', 'auburn', 'cobre', 'bronce', 'dorado', 'plateado', 'champagne', 'miel', 'caramelo', 'chocolate', 'ébanos', 'azabache', 'caoba', 'castaño claro', 'rubio ceniza', 'rubio miel', 'rubio platino', 'rojo cobrizo', 'rojo intenso', 'rojo auburn', 'gris plata', 'gris sal', 'blanco nieve', 'blanco perla'],
-            'eye_colors': ['marrón oscuro', 'marrón', 'marrón claro', 'avellana', 'verde', 'azul', 'gris', 'verde azulado', 'azul gris', 'ámbar', 'dorado', 'violeta', 'miel', 'café', 'esmeralda', 'azul marino', 'verde esmeralda', 'azul cielo', 'gris azulado', 'marrón chocolate', 'marrón caramelo', 'verde oliva', 'verde jade', 'azul acero', 'azul turquesa', 'gris perla', 'gris acero', 'ámbar dorado', 'violeta intenso', 'verde menta', 'azul profundo', 'marrón tostado', 'verde bosque', 'azul eléctrico', 'gris plata', 'miel clara', 'café oscuro'],
-            'backgrounds': ['estudio', 'exterior', 'interior', 'urbano', 'natural', 'profesional', 'oficina', 'casa', 'parque', 'playa', 'montaña', 'ciudad', 'campo', 'universidad', 'hospital', 'trabajo', 'biblioteca', 'café', 'restaurante', 'hotel', 'aeropuerto', 'estación', 'centro comercial', 'museo', 'teatro', 'iglesia', 'escuela', 'gimnasio', 'club', 'residencia', 'apartamento', 'casa de campo', 'chalet', 'loft', 'estudio fotográfico'],
-            'face_shapes': ['oval', 'redondo', 'cuadrado', 'corazón', 'diamante', 'triangular', 'rectangular', 'alargado', 'ancho', 'estrecho', 'angular', 'suave', 'definido', 'simétrico', 'asimétrico', 'ovalado', 'redondeado', 'cuadrangular', 'triangular invertido', 'diamante invertido', 'rectangular alargado', 'ovalado alargado', 'redondo ancho', 'cuadrado ancho', 'triangular estrecho', 'diamante estrecho', 'rectangular estrecho', 'ovalado estrecho'],
-            'nose_shapes': ['pequeño', 'mediano', 'grande', 'ancho', 'estrecho', 'recto', 'aguileño', 'botón', 'prominente', 'delicado', 'fuerte', 'refinado', 'clásico', 'distintivo', 'elegante', 'robusto', 'pequeño delicado', 'mediano clásico', 'grande prominente', 'ancho robusto', 'estrecho refinado', 'recto clásico', 'aguileño distintivo', 'botón elegante', 'prominente fuerte', 'delicado refinado', 'fuerte robusto', 'refinado elegante', 'clásico distintivo', 'distintivo elegante'],
-            'lip_shapes': ['delgados', 'medianos', 'gruesos', 'asimétricos', 'simétricos', 'arqueados', 'rectos', 'redondeados', 'puntiagudos', 'suaves', 'definidos', 'naturales', 'voluptuosos', 'finos', 'generosos', 'delgados finos', 'medianos naturales', 'gruesos voluptuosos', 'asimétricos definidos', 'simétricos suaves', 'arqueados redondeados', 'rectos puntiagudos', 'redondeados suaves', 'puntiagudos definidos', 'suaves naturales', 'definidos voluptuosos', 'naturales generosos', 'voluptuosos finos', 'finos delgados', 'generosos gruesos'],
-            'eye_shapes': ['almendrados', 'redondos', 'estrechos', 'grandes', 'pequeños', 'hondos', 'salientes', 'inclinados', 'horizontales', 'verticales', 'asymétricos', 'simétricos', 'expresivos', 'serenos', 'intensos', 'almendrados expresivos', 'redondos serenos', 'estrechos intensos', 'grandes horizontales', 'pequeños verticales', 'hondos inclinados', 'salientes asimétricos', 'inclinados simétricos', 'horizontales expresivos', 'verticales serenos', 'asimétricos intensos', 'simétricos expresivos', 'expresivos serenos', 'serenos intensos', 'intensos almendrados'],
-            'jawlines': ['suave', 'definido', 'cuadrado', 'puntiagudo', 'redondeado', 'angular', 'recto', 'inclinado', 'prominente', 'delicado', 'fuerte', 'elegante', 'robusto', 'refinado', 'distintivo', 'suave delicado', 'definido fuerte', 'cuadrado angular', 'puntiagudo recto', 'redondeado inclinado', 'angular prominente', 'recto elegante', 'inclinado robusto', 'prominente refinado', 'delicado distintivo', 'fuerte suave', 'elegante definido', 'robusto cuadrado', 'refinado puntiagudo', 'distintivo redondeado'],
-            'cheekbones': ['bajos', 'medios', 'altos', 'prominentes', 'suaves', 'definidos', 'angulares', 'redondeados', 'delicados', 'fuertes', 'elegantes', 'robustos', 'refinados', 'distintivos', 'naturales', 'bajos suaves', 'medios definidos', 'altos angulares', 'prominentes redondeados', 'suaves delicados', 'definidos fuertes', 'angulares elegantes', 'redondeados robustos', 'delicados refinados', 'fuertes distintivos', 'elegantes naturales', 'robustos bajos', 'refinados medios', 'distintivos altos', 'naturales prominentes'],
-            'eyebrows': ['delgadas', 'medianas', 'gruesas', 'arqueadas', 'rectas', 'redondeadas', 'angulares', 'suaves', 'definidas', 'naturales', 'expresivas', 'serenas', 'intensas', 'elegantes', 'distintivas', 'delgadas arqueadas', 'medianas rectas', 'gruesas redondeadas', 'arqueadas angulares', 'rectas suaves', 'redondeadas definidas', 'angulares naturales', 'suaves expresivas', 'definidas serenas', 'naturales intensas', 'expresivas elegantes', 'serenas distintivas', 'intensas delgadas', 'elegantes medianas', 'distintivas gruesas'],
-            'skin_textures': ['suave', 'rugosa', 'porosa', 'mixta', 'seca', 'grasa', 'normal', 'sensible', 'madura', 'joven', 'natural', 'cuidada', 'descuidada', 'lisa', 'texturizada', 'suave natural', 'rugosa texturizada', 'porosa mixta', 'mixta normal', 'seca sensible', 'grasa madura', 'normal joven', 'sensible cuidada', 'madura descuidada', 'joven lisa', 'natural suave', 'cuidada rugosa', 'descuidada porosa', 'lisa mixta', 'texturizada seca'],
-            'freckles': ['ninguno', 'pocos', 'moderados', 'muchos', 'leves', 'intensos', 'dispersos', 'concentrados', 'naturales', 'artificiales', 'suaves', 'definidos', 'tenues', 'prominentes', 'distintivos', 'ninguno natural', 'pocos leves', 'moderados intensos', 'muchos dispersos', 'leves concentrados', 'intensos naturales', 'dispersos artificiales', 'concentrados suaves', 'naturales definidos', 'artificiales tenues', 'suaves prominentes', 'definidos distintivos', 'tenues ninguno', 'prominentes pocos', 'distintivos moderados'],
-            'moles': ['ninguno', 'pocos', 'moderados', 'muchos', 'pequeños', 'grandes', 'dispersos', 'concentrados', 'naturales', 'artificiales', 'suaves', 'definidos', 'tenues', 'prominentes', 'distintivos', 'ninguno natural', 'pocos pequeños', 'moderados grandes', 'muchos dispersos', 'pequeños concentrados', 'grandes naturales', 'dispersos artificiales', 'concentrados suaves', 'naturales definidos', 'artificiales tenues', 'suaves prominentes', 'definidos distintivos', 'tenues ninguno', 'prominentes pocos', 'distintivos moderados'],
-            'scars': ['ninguno', 'pequeños', 'medianos', 'grandes', 'leves', 'intensos', 'dispersos', 'concentrados', 'naturales', 'artificiales', 'suaves', 'definidos', 'tenues', 'prominentes', 'distintivos', 'ninguno natural', 'pequeños leves', 'medianos intensos', 'grandes dispersos', 'leves concentrados', 'intensos naturales', 'dispersos artificiales', 'concentrados suaves', 'naturales definidos', 'artificiales tenues', 'suaves prominentes', 'definidos distintivos', 'tenues ninguno', 'prominentes pequeños', 'distintivos medianos'],
-            'acne': ['ninguno', 'leve', 'moderado', 'severo', 'ocasional', 'crónico', 'disperso', 'concentrado', 'natural', 'artificial', 'suave', 'intenso', 'tenue', 'prominente', 'distintivo', 'ninguno natural', 'leve ocasional', 'moderado crónico', 'severo disperso', 'ocasional concentrado', 'crónico natural', 'disperso artificial', 'concentrado suave', 'natural intenso', 'artificial tenue', 'suave prominente', 'intenso distintivo', 'tenue ninguno', 'prominente leve', 'distintivo moderado'],
-            'wrinkles': ['ninguno', 'leves', 'moderados', 'profundos', 'naturales', 'artificiales', 'dispersos', 'concentrados', 'suaves', 'intensos', 'tenues', 'prominentes', 'distintivos', 'expresivos', 'serenos', 'ninguno natural', 'leves artificiales', 'moderados dispersos', 'profundos concentrados', 'naturales suaves', 'artificiales intensos', 'dispersos tenues', 'concentrados prominentes', 'suaves distintivos', 'intensos expresivos', 'tenues serenos', 'prominentes ninguno', 'distintivos leves', 'expresivos moderados', 'serenos profundos'],
-            'hair_styles': ['corto', 'mediano', 'largo', 'ondulado', 'rizado', 'liso', 'recogido', 'suelto', 'peinado', 'despeinado', 'elegante', 'casual', 'formal', 'informal', 'distintivo', 'natural', 'artificial', 'moderno', 'clásico', 'vintage', 'corto peinado', 'mediano ondulado', 'largo rizado', 'ondulado liso', 'rizado recogido', 'liso suelto', 'recogido peinado', 'suelto despeinado', 'peinado elegante', 'despeinado casual', 'elegante formal', 'casual informal', 'formal distintivo', 'informal natural', 'distintivo artificial', 'natural moderno', 'artificial clásico', 'moderno vintage', 'clásico corto', 'vintage mediano']
-        }
-        
-        return self._diversity_cache
+        """Cargar datos de diversidad ultra expandidos (la diversidad obtenida la mide DiversityMetrics)"""
+        # Tablas compartidas del catálogo compilado (tuplas, no se copian por instancia)
+        return get_catalog().namespace('direct')
     
     def generate(self, nacionalidad, genero, edad, cantidad, region, edad_min, edad_max, 
                 beauty_control, skin_control, hair_control, eye_control, background_control,
@@ -675,6 +738,10 @@ class DirectGeneticGenerator:
             
             profiles = []
             image_paths = []
+            # Rasgos medidos: todos los campos del perfil salvo identificación y datos fijos del lote
+            trait_fields = [field.name for field in fields(UltraDiversityProfile)
+                            if field.name not in ('id', 'timestamp', 'nacionalidad', 'genero', 'edad')]
+            metrics = DiversityMetrics(catalog_vocabularies('direct', trait_fields))
             
             for i in range(cantidad):
                 # Generar edad aleatoria si se proporciona rango
@@ -699,10 +766,14 @@ class DirectGeneticGenerator:
                 image_paths.append(str(image_path))
                 
                 # Crear JSON correspondiente
-                json_path = self._create_json_metadata(profile, output_dir, i+1)
+                profile_traits = asdict(profile)
+                diversity_score = metrics.observe({name: profile_traits[name] for name in trait_fields})
+                json_path = self._create_json_metadata(profile, output_dir, i+1, diversity_score)
             
             # Crear CSV de análisis
             csv_path = self._create_csv(profiles, output_dir)
+            with open(output_dir / "diversity_metrics.json", 'w', encoding='utf-8') as f:
+                json.dump(metrics.summary(), f, indent=2, ensure_ascii=False)
             
             return image_paths, csv_path, "✅ Generación genética completada"
             
@@ -1530,8 +1601,8 @@ class DirectGeneticGenerator:
                 f.write(f"Perfil: {profile['metadata']['nationality']} {profile['metadata']['gender']} {profile['metadata']['age']}\n")
             return image_path
     
-    def _create_json_metadata(self, profile, output_dir, index):
-        """Crear JSON de metadatos"""
+    def _create_json_metadata(self, profile, output_dir, index, diversity_score=None):
+        """Crear JSON de metadatos (diversity_score: novedad medida por DiversityMetrics)"""
         try:
             json_data = {
                 "image_id": profile.id,
@@ -1569,7 +1640,7 @@ class DirectGeneticGenerator:
                 "generation_info": {
                     "method": "genetic_diversity_engine",
                     "version": "1.0",
-                    "diversity_score": random.uniform(0.8, 1.0)
+                    "diversity_score": diversity_score
                 }
             }
             
@@ -1676,13 +1747,14 @@ def generar_masivo_pasaporte_func(*args, **kwargs):
         if not dataset_path.exists():
             return "", "❌ Carpeta Dataset_JSON_PNG no encontrada", "❌ Dataset no disponible", 0, 0
         
-        # Buscar archivos JSON disponibles
-        json_files = list(dataset_path.glob("*.json"))
-        if not json_files:
+        # Muestrear sobre el índice en disco (no se relee cada JSON del dataset)
+        from dataset_index import DatasetIndex
+        dataset_index = DatasetIndex(dataset_path)
+        dataset_index.refresh()
+        selected_entries = dataset_index.sample(cantidad)
+        if not selected_entries:
             return "", "❌ No se encontraron archivos JSON en Dataset_JSON_PNG", "❌ Dataset vacío", 0, 0
-        
-        # Seleccionar archivos aleatorios
-        selected_files = random.sample(json_files, min(cantidad, len(json_files)))
+        selected_files = [Path(entry['json_file']) for entry in selected_entries]
         
         # Crear carpeta de salida
         timestamp = time.strftime("%Y%m%d_%H%M%S")
@@ -1690,6 +1762,10 @@ def generar_masivo_pasaporte_func(*args, **kwargs):
         output_path = Path("outputs") / "Realisticmix666_v40" / "masivo_pasaporte" / output_folder
         output_path.mkdir(parents=True, exist_ok=True)
         
+        # Cliente WebUI compartido por todo el lote (WEBUI_URLS permite varios nodos)
+        from api_client import create_webui_client
+        webui_client = create_webui_client()
+        
         # Procesar cada archivo JSON
         generated_images = []
         generated_jsons = []
@@ -1708,7 +1784,7 @@ def generar_masivo_pasaporte_func(*args, **kwargs):
                 # Generar imagen usando la API del WebUI
                 image_result = _generate_passport_image(
                     prompt, negative_prompt, width, height, 
-                    cfg_scale, steps, sampler
+                    cfg_scale, steps, sampler, api_client=webui_client
                 )
                 
                 if image_result:
@@ -1769,41 +1845,32 @@ def _generate_passport_prompt(json_data, nacionalidad, genero):
     except Exception:
         return f"passport photo, {nacionalidad} {genero}, professional headshot, official document photo"
 
-def _generate_passport_image(prompt, negative_prompt, width, height, cfg_scale, steps, sampler):
-    """Generar imagen de pasaporte usando la API del WebUI"""
+def _generate_passport_image(prompt, negative_prompt, width, height, cfg_scale, steps, sampler, api_client=None):
+    """Generar imagen de pasaporte usando la API del WebUI (nodo único o pool)"""
     try:
-        import requests
-        import base64
         from PIL import Image
         import io
+        from api_client import create_webui_client
         
-        # Preparar datos para la API
-        api_data = {
-            "prompt": prompt,
-            "negative_prompt": negative_prompt,
-            "width": width,
-            "height": height,
-            "cfg_scale": cfg_scale,
-            "steps": steps,
-            "sampler_name": sampler,
-            "batch_size": 1,
-            "n_iter": 1
-        }
+        if api_client is None:
+            api_client = create_webui_client()
         
-        # Llamar a la API del WebUI
-        response = requests.post(
-            "http://localhost:7860/sdapi/v1/txt2img",
-            json=api_data,
-            timeout=60
+        image_data = api_client.generate_image(
+            prompt=prompt,
+            negative_prompt=negative_prompt,
+            params={
+                "width": width,
+                "height": height,
+                "cfg_scale": cfg_scale,
+                "steps": steps,
+                "sampler_name": sampler,
+                "batch_size": 1,
+                "n_iter": 1
+            }
         )
         
-        if response.status_code == 200:
-            result = response.json()
-            if 'images' in result and result['images']:
-                # Decodificar imagen base64
-                image_data = base64.b64decode(result['images'][0])
-                image = Image.open(io.BytesIO(image_data))
-                return image
+        if image_data:
+            return Image.open(io.BytesIO(image_data))
         
         return None
     except Exception as e:
@@ -1835,11 +1902,15 @@ def verificar_dataset_disponible(nacionalidad, genero):
         if not dataset_path.exists():
             return "❌ Carpeta Dataset_JSON_PNG no encontrada"
         
-        json_files = list(dataset_path.glob("*.json"))
-        if not json_files:
+        from dataset_index import DatasetIndex
+        dataset_index = DatasetIndex(dataset_path)
+        dataset_index.refresh()
+        total = dataset_index.count()
+        if not total:
             return "❌ No se encontraron archivos JSON"
         
-        return f"✅ Dataset disponible: {len(json_files)} archivos JSON encontrados"
+        filtered = dataset_index.count({'nationality': nacionalidad, 'gender': genero})
+        return f"✅ Dataset disponible: {total} archivos JSON encontrados ({filtered} de {nacionalidad}/{genero})"
     except Exception as e:
         return f"❌ Error verificando dataset: {e}"
 
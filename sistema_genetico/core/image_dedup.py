@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Detección de casi-duplicados por hash perceptual
+Cada imagen guardada se resume en un pHash (DCT) y un dHash (gradiente) de 64
+bits. Los pHash se indexan en memoria con multi-index hashing (el hash se parte
+en 4 trozos de 16 bits; dos hashes a distancia <= r coinciden en algún trozo a
+distancia <= r // 4), así una búsqueda solo mira unas decenas de cubetas aunque
+haya millones de hashes. Los hashes y los casi-duplicados encontrados se
+guardan en outputs/.image_hashes.sqlite3, de modo que cada lote se compara
+con él mismo y con todo lo generado antes
+"""
+
+import io
+import sqlite3
+import threading
+import time
+import logging
+from array import array
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from output_catalog import INTERNAL_PREFIXES
+
+logger = logging.getLogger(__name__)
+
+HASH_DB_FILENAME = INTERNAL_PREFIXES[1]
+HASH_BITS = 64
+DEFAULT_PHASH_THRESHOLD = 6
+DEFAULT_DHASH_THRESHOLD = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_hashes (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    model TEXT,
+    batch TEXT,
+    phash INTEGER NOT NULL,
+    dhash INTEGER NOT NULL,
+    added REAL
+);
+CREATE TABLE IF NOT EXISTS near_duplicates (
+    path TEXT NOT NULL,
+    match_path TEXT NOT NULL,
+    phash_distance INTEGER,
+    dhash_distance INTEGER,
+    same_batch INTEGER,
+    found REAL,
+    PRIMARY KEY (path, match_path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_near_duplicates_match ON near_duplicates(match_path);
+"""
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """Matriz de la DCT-II ortonormal (DCT 2D = M @ X @ M.T)"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.sqrt(2.0 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+_BIT_WEIGHTS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int(np.sum(_BIT_WEIGHTS[bits.ravel()]))
+
+
+def _to_gray(image: Any) -> Image.Image:
+    """Imagen PIL en escala de grises a partir de bytes, ruta, PIL o array"""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(bytes(image)))
+    elif isinstance(image, (str, Path)):
+        image = Image.open(image)
+    elif isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    # JPEG: decodificar directamente a baja resolución
+    image.draft('L', (64, 64))
+    return image.convert('L')
+
+
+def perceptual_hashes(image: Any) -> Tuple[int, int]:
+    """
+    pHash y dHash de 64 bits de una imagen
+
+    Args:
+        image: Bytes codificados, ruta, PIL.Image o array NumPy
+
+    Returns:
+        (phash, dhash) como enteros sin signo
+    """
+    gray = _to_gray(image)
+    # pHash: signo de las 8x8 frecuencias bajas de la DCT respecto a su mediana
+    pixels = np.asarray(gray.resize((32, 32), Image.BILINEAR), dtype=np.float64)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+    phash = _bits_to_int(low > np.median(low.ravel()[1:]))
+    # dHash: gradiente horizontal de una versión 9x8
+    small = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    dhash = _bits_to_int(small[:, 1:] > small[:, :-1])
+    return phash, dhash
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _to_signed(value: int) -> int:
+    """SQLite guarda enteros de 64 bits con signo"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class MultiIndexHash:
+    """
+    Índice de hashes de 64 bits para búsquedas por distancia de Hamming
+
+    Solo guarda enteros en arrays compactos (unos 30 bytes por hash), así que
+    caben millones en memoria; las rutas se resuelven en SQLite por id.
+    """
+
+    def __init__(self, chunks: int = 4):
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._tables: List[Dict[int, array]] = [{} for _ in range(chunks)]
+        self._hashes = array('Q')
+        self._ids = array('q')
+        self._positions: Dict[int, int] = {}
+        self._probes: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _chunk(self, value: int, index: int) -> int:
+        return (value >> (index * self.chunk_bits)) & self._mask
+
+    def _probe_masks(self, radius: int) -> List[int]:
+        """Máscaras de hasta radius bits dentro de un trozo"""
+        if radius not in self._probes:
+            masks = [0]
+            for bits in range(1, radius + 1):
+                for positions in combinations(range(self.chunk_bits), bits):
+                    masks.append(sum(1 << p for p in positions))
+            self._probes[radius] = masks
+        return self._probes[radius]
+
+    def add(self, value: int, item_id: int):
+        """Indexar un hash; si el id ya estaba, su entrada anterior deja de contar"""
+        previous = self._positions.get(item_id)
+        if previous is not None:
+            self._ids[previous] = -1
+        position = len(self._hashes)
+        self._positions[item_id] = position
+        self._hashes.append(value)
+        self._ids.append(item_id)
+        for index, table in enumerate(self._tables):
+            bucket = table.get(self._chunk(value, index))
+            if bucket is None:
+                bucket = table[self._chunk(value, index)] = array('I')
+            bucket.append(position)
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, int]]:
+        """(id, distancia) de los hashes a distancia <= radius"""
+        masks = self._probe_masks(radius // self.chunks)
+        seen = set()
+        matches = []
+        for index, table in enumerate(self._tables):
+            chunk = self._chunk(value, index)
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if not bucket:
+                    continue
+                for position in bucket:
+                    if position in seen or self._ids[position] < 0:
+                        continue
+                    seen.add(position)
+                    distance = (value ^ self._hashes[position]).bit_count()
+                    if distance <= radius:
+                        matches.append((self._ids[position], distance))
+        return matches
+
+
+class ImageDeduplicator:
+    """
+    Índice persistente de hashes perceptuales de outputs/
+
+    Un casi-duplicado es una imagen con pHash a distancia <= phash_threshold
+    y dHash a distancia <= dhash_threshold de otra ya registrada. Seguro entre
+    hilos (el escritor del pipeline y el hilo de generación lo comparten).
+    """
+
+    def __init__(self, outputs_dir, phash_threshold: int = DEFAULT_PHASH_THRESHOLD,
+                 dhash_threshold: int = DEFAULT_DHASH_THRESHOLD):
+        self.outputs_dir = Path(outputs_dir).resolve()
+        self.outputs_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.outputs_dir / HASH_DB_FILENAME
+        self.phash_threshold = phash_threshold
+        self.dhash_threshold = dhash_threshold
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._index = MultiIndexHash()
+        self._dhashes: Dict[int, int] = {}
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        self._load()
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _load(self):
+        """Cargar todos los hashes en el índice en memoria"""
+        start_time = time.time()
+        with self._connect() as conn:
+            for row in conn.execute("SELECT id, phash, dhash FROM image_hashes"):
+                self._index.add(_to_unsigned(row['phash']), row['id'])
+                self._dhashes[row['id']] = _to_unsigned(row['dhash'])
+        if len(self._index):
+            self.logger.info(f"Índice de hashes perceptuales cargado: {len(self._index)} imágenes en {time.time() - start_time:.1f}s")
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _relative(self, file_path) -> str:
+        path = Path(file_path).resolve()
+        try:
+            return path.relative_to(self.outputs_dir).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    def find(self, phash: int, dhash: int) -> List[Dict[str, Any]]:
+        """Casi-duplicados de un par de hashes entre las imágenes registradas"""
+        with self._lock:
+            candidates = [
+                (item_id, distance, hamming(dhash, self._dhashes[item_id]))
+                for item_id, distance in self._index.search(phash, self.phash_threshold)
+            ]
+        candidates = [c for c in candidates if c[2] <= self.dhash_threshold]
+        if not candidates:
+            return []
+        distances = {item_id: (p, d) for item_id, p, d in candidates}
+        placeholders = ",".join("?" * len(distances))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, path, model, batch FROM image_hashes WHERE id IN ({placeholders})", list(distances)
+            ).fetchall()
+        matches = [{
+            'path': row['path'],
+            'model': row['model'],
+            'batch': row['batch'],
+            'phash_distance': distances[row['id']][0],
+            'dhash_distance': distances[row['id']][1]
+        } for row in rows]
+        matches.sort(key=lambda match: (match['phash_distance'], match['dhash_distance']))
+        return matches
+
+    def check_and_add(self, image: Any, file_path) -> Dict[str, Any]:
+        """
+        Hashear una imagen recién generada, buscar sus casi-duplicados y registrarla
+
+        Args:
+            image: Bytes codificados (o ruta, PIL.Image, array) de la imagen
+            file_path: Ruta con la que se guarda bajo outputs/
+
+        Returns:
+            {'phash', 'dhash' (hex), 'near_duplicates': [...]} para los metadatos
+            ({'error', 'near_duplicates': []} si la imagen no se pudo hashear)
+        """
+        try:
+            phash, dhash = perceptual_hashes(image)
+        except Exception as e:
+            self.logger.warning(f"No se pudo calcular el hash perceptual de {file_path}: {e}")
+            return {'error': str(e), 'near_duplicates': []}
+        relative = self._relative(file_path)
+        parts = relative.split('/')
+        model = parts[0] if len(parts) > 2 else None
+        batch = parts[1] if len(parts) > 2 else None
+
+        matches = [match for match in self.find(phash, dhash) if match['path'] != relative]
+        now = time.time()
+        with self._connect() as conn:
+            # Upsert que conserva el id: una ruta re-registrada reemplaza su entrada del índice
+            conn.execute(
+                "INSERT INTO image_hashes (path, model, batch, phash, dhash, added) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET model = excluded.model, batch = excluded.batch, "
+                "phash = excluded.phash, dhash = excluded.dhash, added = excluded.added",
+                (relative, model, batch, _to_signed(phash), _to_signed(dhash), now)
+            )
+            item_id = conn.execute("SELECT id FROM image_hashes WHERE path = ?", (relative,)).fetchone()['id']
+            if matches:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO near_duplicates (path, match_path, phash_distance, dhash_distance, same_batch, found) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(relative, match['path'], match['phash_distance'], match['dhash_distance'],
+                      int(match['model'] == model and match['batch'] == batch), now) for match in matches]
+                )
+        with self._lock:
+            self._index.add(phash, item_id)
+            self._dhashes[item_id] = dhash
+
+        for match in matches:
+            match['same_batch'] = match['model'] == model and match['batch'] == batch
+        if matches:
+            scope = "del mismo lote" if any(match['same_batch'] for match in matches) else "del histórico"
+            self.logger.warning(f"Casi-duplicado {scope}: {relative} ~ {matches[0]['path']} "
+                                f"(pHash {matches[0]['phash_distance']}, dHash {matches[0]['dhash_distance']})")
+        return {
+            'phash': f"{phash:016x}",
+            'dhash': f"{dhash:016x}",
+            'near_duplicates': [
+                {key: match[key] for key in ('path', 'phash_distance', 'dhash_distance', 'same_batch')}
+                for match in matches
+            ]
+        }
+
+    def backfill(self, image_paths) -> int:
+        """Registrar imágenes existentes que aún no tienen hash (p. ej. lotes anteriores)"""
+        with self._connect() as conn:
+            known = {row['path'] for row in conn.execute("SELECT path FROM image_hashes")}
+        added = 0
+        for image_path in image_paths:
+            if self._relative(image_path) in known:
+                continue
+            if 'error' not in self.check_and_add(image_path, image_path):
+                added += 1
+        return added
+
+    def duplicates(self, model: Optional[str] = None, batch: Optional[str] = None,
+                   same_batch: Optional[bool] = None, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+        """
+        Casi-duplicados encontrados
+
+        Args:
+            model: Filtrar por modelo de la imagen nueva
+            batch: Filtrar por lote de la imagen nueva
+            same_batch: Solo dentro del lote (True) o solo contra el histórico (False)
+            limit: Tamaño de página
+            offset: Desplazamiento
+
+        Returns:
+            {'duplicates': [...], 'total': n}
+        """
+        clauses, args = [], []
+        if model:
+            clauses.append("h.model = ?")
+            args.append(model)
+        if batch:
+            clauses.append("h.batch = ?")
+            args.append(batch)
+        if same_batch is not None:
+            clauses.append("d.same_batch = ?")
+            args.append(int(same_batch))
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        query = f"FROM near_duplicates d JOIN image_hashes h ON h.path = d.path{where}"
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) {query}", args).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT d.path, d.match_path, d.phash_distance, d.dhash_distance, d.same_batch, d.found {query} "
+                "ORDER BY d.found DESC LIMIT ? OFFSET ?",
+                args + [max(0, int(limit)), max(0, int(offset))]
+            ).fetchall()
+        return {'duplicates': [dict(row) for row in rows], 'total': total}
+
+
+_deduplicators: Dict[Path, ImageDeduplicator] = {}
+_deduplicators_lock = threading.Lock()
+
+
+def get_deduplicator(outputs_dir) -> ImageDeduplicator:
+    """Deduplicador compartido por directorio de salida (el índice se carga una vez por proceso)"""
+    key = Path(outputs_dir).resolve()
+    with _deduplicators_lock:
+        if key not in _deduplicators:
+            _deduplicators[key] = ImageDeduplicator(key)
+        return _deduplicators[key]
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Cola de trabajos persistente (SQLite) para la interfaz web
+Permite encolar varios lotes, seguir su progreso, cancelarlos y reanudarlos
+tras un reinicio del proceso
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from run_rng import new_run_seed
+
+logger = logging.getLogger(__name__)
+
+# Estados de un trabajo
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    current INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    checkpoint TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, created_at);
+"""
+
+
+class JobContext:
+    """
+    Contexto entregado al manejador de un trabajo
+
+    Atributos:
+        job_id: Identificador del trabajo
+        cancel_event: Se activa cuando se solicita la cancelación
+        checkpoint: Último punto de control guardado (para reanudar)
+    """
+
+    def __init__(self, queue: 'JobQueue', job_id: str, checkpoint: Optional[Dict[str, Any]]):
+        self.queue = queue
+        self.job_id = job_id
+        self.cancel_event = threading.Event()
+        self.checkpoint = checkpoint or {}
+
+    def progress(self, current: int, total: int, checkpoint: Optional[Dict[str, Any]] = None):
+        """Registrar progreso por imagen y, opcionalmente, un punto de control"""
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        cancel = self.queue._update_progress(self.job_id, current, total, checkpoint)
+        if cancel:
+            self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+
+class JobQueue:
+    """Cola de trabajos respaldada por SQLite con hilos de trabajo"""
+
+    def __init__(self, db_path, workers: int = 1):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.workers = max(1, int(workers))
+        self.handlers: Dict[str, Callable[[Dict[str, Any], JobContext], Dict[str, Any]]] = {}
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._contexts: Dict[str, JobContext] = {}
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def register_handler(self, kind: str, handler: Callable[[Dict[str, Any], JobContext], Dict[str, Any]]):
+        """Registrar la función que ejecuta los trabajos de un tipo"""
+        self.handlers[kind] = handler
+
+    def start(self):
+        """Reanudar trabajos interrumpidos y arrancar los hilos de trabajo"""
+        with self._connect() as conn:
+            resumed = conn.execute(
+                "UPDATE jobs SET state = ?, started_at = NULL WHERE state = ?",
+                (JOB_QUEUED, JOB_RUNNING)
+            ).rowcount
+        if resumed:
+            print(f"🔄 Reanudando {resumed} trabajo(s) interrumpido(s)")
+
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Detener los hilos tras el trabajo en curso"""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+
+    def submit(self, kind: str, params: Dict[str, Any], total: int = 0) -> str:
+        """
+        Encolar un trabajo y devolver su ID
+
+        La semilla del lote (run_seed) se fija aquí y se guarda con los parámetros:
+        un trabajo que cae antes de su primer registro en el manifiesto se repite
+        con la misma semilla al reanudarse.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        params = dict(params)
+        if params.get('run_seed') is None:
+            params['run_seed'] = new_run_seed()
+        job_id = uuid.uuid4().hex[:12]
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, state, total, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params, ensure_ascii=False), JOB_QUEUED, total, time.time())
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancelar un trabajo encolado o solicitar la parada de uno en curso"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row['state'] in FINISHED_STATES:
+                return False
+            if row['state'] == JOB_QUEUED:
+                conn.execute(
+                    "UPDATE jobs SET state = ?, finished_at = ? WHERE id = ? AND state = ?",
+                    (JOB_CANCELLED, time.time(), job_id, JOB_QUEUED)
+                )
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        with self._lock:
+            context = self._contexts.get(job_id)
+        if context:
+            context.cancel_event.set()
+        return True
+
+    def cancel_all(self) -> int:
+        """Cancelar todos los trabajos pendientes o en curso"""
+        cancelled = 0
+        for job in self.list_jobs(states=[JOB_QUEUED, JOB_RUNNING]):
+            if self.cancel(job['id']):
+                cancelled += 1
+        return cancelled
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list_jobs(self, states: Optional[List[str]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM jobs"
+        args: List[Any] = []
+        if states:
+            query += f" WHERE state IN ({','.join('?' * len(states))})"
+            args.extend(states)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, args).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def status_summary(self) -> Dict[str, Any]:
+        """Resumen compatible con el antiguo generation_status"""
+        running = self.list_jobs(states=[JOB_RUNNING], limit=1)
+        queued = len(self.list_jobs(states=[JOB_QUEUED], limit=1000))
+        if running:
+            job = running[0]
+            return {'running': True, 'progress': job['progress'], 'current': job['current'],
+                    'total': job['total'], 'queued': queued, 'job_id': job['id']}
+        last = self.list_jobs(limit=1)
+        if last:
+            job = last[0]
+            return {'running': queued > 0, 'progress': job['progress'] if job['state'] != JOB_DONE else 100,
+                    'current': job['current'], 'total': job['total'], 'queued': queued, 'job_id': job['id']}
+        return {'running': False, 'progress': 0, 'current': 0, 'total': 0, 'queued': 0}
+
+    def _row_to_dict(self, row) -> Dict[str, Any]:
+        job = dict(row)
+        for key in ('params', 'checkpoint', 'result'):
+            job[key] = json.loads(job[key]) if job[key] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job['progress'] = int(job['current'] * 100 / job['total']) if job['total'] else 0
+        return job
+
+    def _update_progress(self, job_id: str, current: int, total: int,
+                         checkpoint: Optional[Dict[str, Any]]) -> bool:
+        """Guardar progreso; devuelve True si se ha solicitado cancelar"""
+        with self._connect() as conn:
+            if checkpoint is not None:
+                conn.execute(
+                    "UPDATE jobs SET current = ?, total = ?, checkpoint = ? WHERE id = ?",
+                    (current, total, json.dumps(checkpoint, ensure_ascii=False), job_id)
+                )
+            else:
+                conn.execute("UPDATE jobs SET current = ?, total = ? WHERE id = ?", (current, total, job_id))
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        """Tomar el trabajo encolado más antiguo de forma atómica"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE state = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = ?, started_at = ? WHERE id = ?",
+                (JOB_RUNNING, time.time(), row['id'])
+            )
+            conn.execute("COMMIT")
+        return self._row_to_dict(row)
+
+    def _finish(self, job_id: str, state: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (state, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                 error, time.time(), job_id)
+            )
+
+    def _worker_loop(self):
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+            job = self._claim_next()
+            if job is None:
+                with self._wakeup:
+                    if self._stopping:
+                        return
+                    self._wakeup.wait(timeout=2.0)
+                continue
+            self._run_job(job)
+
+    def _run_job(self, job: Dict[str, Any]):
+        job_id = job['id']
+        context = JobContext(self, job_id, job['checkpoint'])
+        if job['cancel_requested']:
+            context.cancel_event.set()
+        with self._lock:
+            self._contexts[job_id] = context
+
+        print(f"▶️ Iniciando trabajo {job_id} ({job['kind']})")
+        try:
+            handler = self.handlers[job['kind']]
+            result = handler(job['params'], context) or {}
+            if context.cancelled:
+                self._finish(job_id, JOB_CANCELLED, result)
+                print(f"⏹️ Trabajo {job_id} cancelado")
+            elif result.get('success', True):
+                self._finish(job_id, JOB_DONE, result)
+                print(f"✅ Trabajo {job_id} completado")
+            else:
+                self._finish(job_id, JOB_FAILED, result, result.get('error'))
+                print(f"❌ Trabajo {job_id} falló: {result.get('error')}")
+        except Exception as e:
+            self.logger.error(f"Error en trabajo {job_id}: {e}")
+            self._finish(job_id, JOB_FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._contexts.pop(job_id, None)
@@ -4,18 +4,24 @@ Motor de Generación Masiva con Diversidad Genética
 Procesa dataset JSON/PNG existente y genera nuevas variaciones con diversidad genética
 """
 
-import json
 import random
 import time
 import logging
-from pathlib import Path
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Iterator
 from datetime import datetime
 
 # Importar módulos del sistema genético
 from diversity_engine import UltraDiversityEngine
-from api_client import WebUIAPIClient
+from api_client import create_webui_client
 from file_manager import FileManager
+from generation_manifest import GenerationManifest
+from dataset_index import DatasetIndex
+from run_rng import new_run_seed
+from validation_stage import InlineValidationStage
+from image_dedup import get_deduplicator
+from diversity_metrics import DiversityMetrics, catalog_vocabularies, register_metrics, unregister_metrics
+from output_catalog import profile_fields
+from trait_catalog import GENETIC_BATCH_OPTIONS
 
 # Configurar logger
 logger = logging.getLogger(__name__)
@@ -25,8 +31,9 @@ class MassiveGenerationEngine:
     
     def __init__(self):
         self.diversity_engine = UltraDiversityEngine()
-        self.api_client = WebUIAPIClient()
-        self.file_manager = FileManager()
+        self.api_client = create_webui_client()
+        # Escritura diferida: la generación no espera al disco
+        self.file_manager = FileManager(write_behind=True)
         self.logger = logger
         
     def load_dataset(self, dataset_path: str) -> List[Dict[str, Any]]:
@@ -40,40 +47,7 @@ class MassiveGenerationEngine:
             Lista de entradas del dataset con metadatos
         """
         try:
-            dataset_dir = Path(dataset_path)
-            if not dataset_dir.exists():
-                raise FileNotFoundError(f"Dataset no encontrado: {dataset_path}")
-            
-            dataset_entries = []
-            
-            # Buscar archivos JSON
-            json_files = list(dataset_dir.glob("*.json"))
-            self.logger.info(f"Encontrados {len(json_files)} archivos JSON en el dataset")
-            
-            for json_file in json_files:
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    # Buscar imagen PNG correspondiente
-                    png_file = json_file.with_suffix('.png')
-                    if png_file.exists():
-                        dataset_entries.append({
-                            'json_file': str(json_file),
-                            'png_file': str(png_file),
-                            'metadata': data,
-                            'image_id': data.get('image_id', 'unknown'),
-                            'nationality': data.get('metadata', {}).get('nationality', 'venezuelan'),
-                            'gender': data.get('metadata', {}).get('gender', 'hombre'),
-                            'age': data.get('metadata', {}).get('age', 25)
-                        })
-                    else:
-                        self.logger.warning(f"Imagen PNG no encontrada para {json_file}")
-                        
-                except Exception as e:
-                    self.logger.error(f"Error cargando {json_file}: {e}")
-                    continue
-            
+            dataset_entries = list(self.iter_dataset(dataset_path))
             self.logger.info(f"Dataset cargado: {len(dataset_entries)} entradas válidas")
             return dataset_entries
             
@@ -81,18 +55,45 @@ class MassiveGenerationEngine:
             self.logger.error(f"Error cargando dataset: {e}")
             raise
     
+    def iter_dataset(self, dataset_path: str, filters: Dict[str, Any] = None,
+                     limit: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Recorrer el dataset en streaming usando el índice en disco
+        
+        Args:
+            dataset_path: Ruta al directorio del dataset
+            filters: Filtros opcionales (nationality, gender, age_min, age_max)
+            limit: Máximo de entradas
+            
+        Yields:
+            Entradas con metadatos cargados bajo demanda
+        """
+        index = self.get_dataset_index(dataset_path)
+        for entry in index.iter_entries(filters=filters, limit=limit):
+            yield DatasetIndex.load_metadata(entry)
+    
+    def get_dataset_index(self, dataset_path: str, refresh: bool = True) -> DatasetIndex:
+        """Obtener índice del dataset, actualizándolo de forma incremental"""
+        index = DatasetIndex(dataset_path)
+        if refresh:
+            index.refresh()
+        return index
+    
     def apply_genetic_diversity(self, base_metadata: Dict[str, Any], 
-                               diversity_controls: Dict[str, str]) -> Dict[str, Any]:
+                               diversity_controls: Dict[str, str],
+                               rng: random.Random = None) -> Dict[str, Any]:
         """
         Aplicar diversidad genética a metadatos base
         
         Args:
             base_metadata: Metadatos originales del dataset
             diversity_controls: Controles de diversidad genética
+            rng: Generador aleatorio (uno por índice para perfiles reproducibles)
             
         Returns:
             Metadatos modificados con diversidad genética
         """
+        rng = rng or random
         try:
             # Extraer información base
             nationality = base_metadata.get('metadata', {}).get('nationality', 'venezuelan')
@@ -100,7 +101,7 @@ class MassiveGenerationEngine:
             base_age = base_metadata.get('metadata', {}).get('age', 25)
             
             # Generar nueva edad con variación
-            age_variation = random.randint(-5, 5)
+            age_variation = rng.randint(-5, 5)
             new_age = max(18, min(80, base_age + age_variation))
             
             # Crear perfil genético diverso
@@ -121,19 +122,22 @@ class MassiveGenerationEngine:
                 if diversity_controls.get('skin_control') != 'aleatorio':
                     ethnic['skin_tone'] = self._apply_skin_diversity(
                         ethnic.get('skin_tone', 'fair'), 
-                        diversity_controls['skin_control']
+                        diversity_controls['skin_control'],
+                        rng
                     )
                 
                 if diversity_controls.get('hair_control') != 'aleatorio':
                     ethnic['hair_color'] = self._apply_hair_diversity(
                         ethnic.get('hair_color', 'dark brown'),
-                        diversity_controls['hair_control']
+                        diversity_controls['hair_control'],
+                        rng
                     )
                 
                 if diversity_controls.get('hair_style_control') != 'aleatorio':
                     ethnic['hair_style'] = self._apply_hair_style_diversity(
                         ethnic.get('hair_style', 'messy'),
-                        diversity_controls['hair_style_control']
+                        diversity_controls['hair_style_control'],
+                        rng
                     )
                 
                 genetic_profile['ethnic_characteristics'] = ethnic
@@ -144,7 +148,7 @@ class MassiveGenerationEngine:
             self.logger.error(f"Error aplicando diversidad genética: {e}")
             return base_metadata
     
-    def _apply_skin_diversity(self, original_skin: str, control: str) -> str:
+    def _apply_skin_diversity(self, original_skin: str, control: str, rng: random.Random = None) -> str:
         """Aplicar diversidad al tono de piel"""
         skin_variations = {
             'muy_claro': ['very fair', 'pale', 'light'],
@@ -153,9 +157,9 @@ class MassiveGenerationEngine:
             'oscuro': ['dark', 'brown', 'deep'],
             'muy_oscuro': ['very dark', 'deep brown', 'ebony']
         }
-        return random.choice(skin_variations.get(control, [original_skin]))
+        return (rng or random).choice(skin_variations.get(control, [original_skin]))
     
-    def _apply_hair_diversity(self, original_hair: str, control: str) -> str:
+    def _apply_hair_diversity(self, original_hair: str, control: str, rng: random.Random = None) -> str:
         """Aplicar diversidad al color de cabello"""
         hair_variations = {
             'negro': ['black', 'dark black', 'jet black'],
@@ -164,9 +168,9 @@ class MassiveGenerationEngine:
             'pelirrojo': ['red', 'auburn', 'ginger'],
             'gris': ['gray', 'silver', 'salt and pepper']
         }
-        return random.choice(hair_variations.get(control, [original_hair]))
+        return (rng or random).choice(hair_variations.get(control, [original_hair]))
     
-    def _apply_hair_style_diversity(self, original_style: str, control: str) -> str:
+    def _apply_hair_style_diversity(self, original_style: str, control: str, rng: random.Random = None) -> str:
         """Aplicar diversidad al estilo de cabello"""
         style_variations = {
             'corto': ['short', 'buzz cut', 'pixie'],
@@ -175,23 +179,39 @@ class MassiveGenerationEngine:
             'rizado': ['curly', 'wavy', 'curled'],
             'liso': ['straight', 'sleek', 'smooth']
         }
-        return random.choice(style_variations.get(control, [original_style]))
+        return (rng or random).choice(style_variations.get(control, [original_style]))
     
-    def generate_massive_batch(self, dataset_path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    def generate_massive_batch(self, dataset_path: str, params: Dict[str, Any],
+                               progress_callback=None, cancel_event=None) -> Dict[str, Any]:
         """
         Generar lote masivo con diversidad genética
         
         Args:
             dataset_path: Ruta al dataset JSON/PNG
-            params: Parámetros de generación
+            params: Parámetros de generación (resume_dir reanuda un lote con manifiesto)
+            progress_callback: Función (completadas, total, checkpoint) por imagen guardada
+            cancel_event: threading.Event que detiene el lote si se activa
             
         Returns:
             Resultado de la generación masiva
         """
+        validation = None
+        output_dir = None
         try:
-            # Cargar dataset
-            dataset_entries = self.load_dataset(dataset_path)
-            if not dataset_entries:
+            # Reanudar: los parámetros del manifiesto mandan para obtener los mismos perfiles
+            resume_dir = params.get('resume_dir')
+            manifest = None
+            if resume_dir and GenerationManifest.exists(resume_dir):
+                manifest = GenerationManifest.load(resume_dir)
+                params = dict(manifest.params, resume_dir=resume_dir)
+                dataset_path = params.get('dataset_path', dataset_path)
+                self.logger.info(f"Reanudando lote en {resume_dir}: {manifest.completed_count} imágenes ya completadas")
+            
+            # Indexar dataset (solo se parsean JSON nuevos o modificados)
+            dataset_index = self.get_dataset_index(dataset_path)
+            dataset_filters = params.get('dataset_filters')
+            dataset_size = dataset_index.count(dataset_filters)
+            if not dataset_size:
                 return {'success': False, 'error': 'Dataset vacío o no encontrado'}
             
             # Parámetros de generación
@@ -206,25 +226,73 @@ class MassiveGenerationEngine:
                 'beauty_control': params.get('beauty_control', 'aleatorio')
             }
             
-            # Crear estructura de salida
-            output_dir = self.file_manager.create_output_structure(
-                model_name=model,
-                generation_type="masivo_premium",
-                nacionalidad="Venezuela",
-                genero="mixto"
-            )
+            # Crear estructura de salida con su manifiesto (o reutilizar la del lote reanudado)
+            if manifest is not None:
+                output_dir = manifest.output_dir
+            else:
+                run_seed = params.get('run_seed') or new_run_seed()
+                output_dir = self.file_manager.create_output_structure(
+                    model_name=model,
+                    generation_type="masivo_premium",
+                    nacionalidad="Venezuela",
+                    genero="mixto",
+                    run_id=params.get('job_id', run_seed)
+                )
+                manifest_params = dict(params, dataset_path=str(dataset_path), run_seed=run_seed)
+                manifest_params.pop('resume_dir', None)
+                manifest = GenerationManifest.create(output_dir, run_seed, manifest_params)
             
             generated_images = []
+            total = min(cantidad, dataset_size)
+            skipped = 0
             
-            # Procesar entradas del dataset
-            for i in range(min(cantidad, len(dataset_entries))):
+            # Validación SAIME en memoria con regeneración de las imágenes que no cumplen
+            if params.get('saime_validation'):
+                validation = InlineValidationStage(
+                    run_seed=manifest.run_seed,
+                    max_retries=params.get('validation_retries', 2),
+                    workers=params.get('validation_workers', 2),
+                    rules=params.get('validation_rules')
+                )
+            # Hashes perceptuales: casi-duplicados dentro del lote y contra todo outputs/
+            dedup = get_deduplicator(self.file_manager.outputs_dir) if params.get('dedup', True) else None
+            near_duplicates = 0
+            # Diversidad medida sobre los perfiles efectivamente guardados
+            diversity_metrics = DiversityMetrics(
+                catalog_vocabularies('genetic', GENETIC_BATCH_OPTIONS), seed=manifest.run_seed
+            )
+            register_metrics(output_dir, diversity_metrics)
+            
+            # Los índices son posiciones en el índice del dataset: si se añadieron o quitaron
+            # JSON desde el inicio del lote, un índice completado ya no es la misma entrada
+            if manifest.completed_count:
+                changed = set(manifest.completed)
+                for i, entry in enumerate(dataset_index.iter_entries(filters=dataset_filters, limit=total)):
+                    record = manifest.completed.get(i)
+                    if record is not None:
+                        if record.get('source') != entry['json_file']:
+                            break
+                        changed.discard(i)
+                if changed:
+                    raise ValueError(f"El dataset cambió desde el inicio del lote (índice {min(changed) + 1}), "
+                                     f"no se puede reanudar {output_dir}")
+            
+            # Procesar entradas del dataset en streaming
+            for i, entry in enumerate(dataset_index.iter_entries(filters=dataset_filters, limit=total)):
+                if cancel_event is not None and cancel_event.is_set():
+                    self.logger.info(f"Generación masiva cancelada en {i}/{total}")
+                    break
+                if manifest.is_done(i):
+                    skipped += 1
+                    continue
                 try:
-                    entry = dataset_entries[i]
+                    entry = DatasetIndex.load_metadata(entry)
                     
-                    # Aplicar diversidad genética
+                    # Aplicar diversidad genética (RNG propio del índice: reanudar da el mismo perfil)
                     genetic_profile = self.apply_genetic_diversity(
                         entry['metadata'], 
-                        diversity_controls
+                        diversity_controls,
+                        rng=manifest.rng_for(i)
                     )
                     
                     # Crear prompt genético
@@ -237,7 +305,7 @@ class MassiveGenerationEngine:
                         'height': params.get('height', 764),
                         'cfg_scale': params.get('cfg_scale', 7.5),
                         'steps': params.get('steps', 20),
-                        'seed': params.get('seed', -1)
+                        'seed': manifest.seed_for(i, params.get('seed', -1))
                     }
                     
                     image_result = self.api_client.generate_image(
@@ -246,19 +314,61 @@ class MassiveGenerationEngine:
                         params=image_params
                     )
                     
+                    validation_summary = None
+                    if validation is not None:
+                        def _regenerate(seed, prompt=prompt, negative_prompt=negative_prompt, image_params=image_params):
+                            return self.api_client.generate_image(
+                                prompt=prompt,
+                                negative_prompt=negative_prompt,
+                                params=dict(image_params, seed=seed)
+                            )
+                        image_result, validation_summary = validation.run(
+                            i, image_result or None, _regenerate, seed=image_params['seed']
+                        )
+                        if image_result is None:
+                            continue
+                    
                     if image_result:
                         # Guardar imagen
                         filename = f"massive_{i+1:03d}"
+                        metadata = {
+                            'genetic_profile': genetic_profile,
+                            'original_entry': entry,
+                            'generation_params': params,
+                            'timestamp': time.time()
+                        }
+                        if validation_summary is not None:
+                            metadata['saime_validation'] = validation_summary
+                        genetic_profile['diversity_score'] = diversity_metrics.observe(
+                            profile_fields(metadata)['traits']
+                        )
+                        layout = params.get('output_layout', 'flat')
+                        if dedup is not None:
+                            metadata['perceptual_hash'] = dedup.check_and_add(
+                                image_result, self.file_manager.image_path(output_dir, filename, layout)
+                            )
+                            near_duplicates += bool(metadata['perceptual_hash']['near_duplicates'])
+                        
+                        def _on_saved(i=i, seed=validation_summary['seed'] if validation_summary else image_params['seed'], genetic_profile=genetic_profile,
+                                      filename=filename, source=entry['json_file']):
+                            # El manifiesto solo marca el índice cuando la imagen ya está en disco
+                            manifest.record(
+                                i,
+                                seed=seed,
+                                profile=genetic_profile,
+                                filename=f"{filename}.png",
+                                source=source
+                            )
+                            if progress_callback:
+                                progress_callback(manifest.completed_count, total, {'output_dir': str(output_dir)})
+                        
                         save_result = self.file_manager.save_image(
                             image_data=image_result,
                             output_dir=output_dir,
                             filename=filename,
-                            metadata={
-                                'genetic_profile': genetic_profile,
-                                'original_entry': entry,
-                                'generation_params': params,
-                                'timestamp': time.time()
-                            }
+                            metadata=metadata,
+                            on_saved=_on_saved,
+                            layout=layout
                         )
                         
                         if save_result['success']:
@@ -272,15 +382,38 @@ class MassiveGenerationEngine:
                     self.logger.error(f"Error procesando entrada {i+1}: {e}")
                     continue
             
+            # Cerrar los shards del lote (disposición 'packed') y esperar a que las escrituras lleguen al disco
+            self.file_manager.close_packed()
+            self.file_manager.flush()
+            validation_stats = None
+            if validation is not None:
+                validation.close()
+                validation_stats = validation.stats()
+            unregister_metrics(output_dir)
+            metrics_summary = diversity_metrics.summary()
+            self.file_manager.save_json_metadata(output_dir, 'diversity_metrics', metrics_summary)
+            
             return {
                 'success': True,
                 'generated_count': len(generated_images),
                 'images': generated_images,
-                'dataset_entries_processed': len(dataset_entries)
+                'dataset_entries_processed': dataset_size,
+                'skipped_completed': skipped,
+                'output_dir': str(output_dir),
+                'cancelled': bool(cancel_event is not None and cancel_event.is_set()),
+                'validation': validation_stats,
+                'near_duplicates': near_duplicates,
+                'diversity_metrics': metrics_summary
             }
             
         except Exception as e:
             self.logger.error(f"Error en generación masiva: {e}")
+            self.file_manager.close_packed()
+            self.file_manager.flush()
+            if validation is not None:
+                validation.close()
+            if output_dir is not None:
+                unregister_metrics(output_dir)
             return {'success': False, 'error': str(e)}
     
     def _create_genetic_prompt(self, genetic_profile: Dict[str, Any], 
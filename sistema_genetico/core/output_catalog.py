@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Catálogo SQLite de archivos generados
+FileManager registra cada imagen, JSON y análisis al guardarlo, así que listar,
+paginar y filtrar salidas (por modelo, lote o rasgo) se resuelve con consultas
+indexadas en lugar de recorrer outputs/ con stat() por archivo
+"""
+
+import json
+import os
+import sqlite3
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from shard_store import SHARD_INDEX_FILENAME
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILENAME = ".output_catalog.sqlite3"
+# Bases de datos internas de outputs/ que no se catalogan (con sus -wal/-shm)
+INTERNAL_PREFIXES = (CATALOG_FILENAME, ".image_hashes.sqlite3", ".trait_vectors.sqlite3")
+
+# Tipo de artefacto según la extensión
+ARTIFACT_KINDS = {
+    '.png': 'image', '.jpg': 'image', '.jpeg': 'image', '.webp': 'image',
+    '.json': 'metadata',
+    '.csv': 'analysis', '.parquet': 'analysis',
+    '.tar': 'shard',
+}
+
+# Columnas por las que se puede ordenar
+SORT_COLUMNS = ('modified', 'name', 'size', 'model', 'batch', 'path')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT,
+    batch TEXT,
+    size INTEGER,
+    modified REAL,
+    nationality TEXT,
+    gender TEXT,
+    age INTEGER,
+    shard TEXT,
+    offset INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_batch ON artifacts(model, batch, modified);
+CREATE INDEX IF NOT EXISTS idx_artifacts_modified ON artifacts(modified);
+CREATE INDEX IF NOT EXISTS idx_artifacts_kind ON artifacts(kind, modified);
+CREATE TABLE IF NOT EXISTS artifact_traits (
+    path TEXT NOT NULL,
+    trait TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (path, trait)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_traits_value ON artifact_traits(trait, value);
+"""
+
+
+def profile_fields(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Extraer nacionalidad, género, edad y rasgos de los metadatos de una imagen
+
+    Acepta perfiles genéticos ({'metadata', 'ethnic_characteristics'}) y los
+    de la generación masiva ({'genetic_profile': {...}}).
+    """
+    if not isinstance(metadata, dict):
+        return {'traits': {}}
+    profile = metadata.get('genetic_profile', metadata)
+    basic = profile.get('metadata', profile)
+    traits = {
+        key: value for key, value in profile.get('ethnic_characteristics', {}).items()
+        if isinstance(value, (str, int, float)) and not isinstance(value, bool)
+    }
+    age = basic.get('age')
+    try:
+        age = int(age) if age is not None else None
+    except (TypeError, ValueError):
+        age = None
+    return {
+        'nationality': basic.get('nationality'),
+        'gender': basic.get('gender'),
+        'age': age,
+        'traits': traits
+    }
+
+
+class OutputCatalog:
+    """Índice de artefactos bajo outputs/ (rutas relativas: <modelo>/<lote>/<archivo>)"""
+
+    def __init__(self, outputs_dir, catalog_path=None):
+        self.outputs_dir = Path(outputs_dir).resolve()
+        self.outputs_dir.mkdir(parents=True, exist_ok=True)
+        self.catalog_path = Path(catalog_path) if catalog_path else self.outputs_dir / CATALOG_FILENAME
+        self.logger = logging.getLogger(__name__)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Catálogos creados antes de la disposición 'packed'
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(artifacts)")}
+            for column, column_type in (('shard', 'TEXT'), ('offset', 'INTEGER')):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE artifacts ADD COLUMN {column} {column_type}")
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.catalog_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _relative(self, file_path) -> Optional[str]:
+        try:
+            return Path(file_path).resolve().relative_to(self.outputs_dir).as_posix()
+        except ValueError:
+            return None
+
+    def _row(self, relative: str, size: int, modified: float, metadata: Optional[Dict[str, Any]] = None,
+             shard: Optional[str] = None, offset: Optional[int] = None) -> tuple:
+        parts = relative.split('/')
+        name = parts[-1]
+        fields = profile_fields(metadata) if metadata else {'traits': {}}
+        row = (
+            relative, name, ARTIFACT_KINDS.get(Path(name).suffix.lower(), 'other'),
+            parts[0] if len(parts) > 1 else None,
+            parts[1] if len(parts) > 2 else None,
+            size, modified,
+            fields.get('nationality'), fields.get('gender'), fields.get('age'),
+            shard, offset
+        )
+        return row, fields['traits']
+
+    def record(self, file_path, size: Optional[int] = None, modified: Optional[float] = None,
+               metadata: Optional[Dict[str, Any]] = None):
+        """
+        Registrar un archivo recién guardado
+
+        Args:
+            file_path: Ruta del archivo (debe estar bajo outputs/)
+            size: Tamaño en bytes (si falta se hace stat())
+            modified: Fecha de modificación (si falta se hace stat(); debe coincidir
+                con st_mtime para que refresh() no vuelva a indexar el archivo)
+            metadata: Perfil de la imagen para indexar nacionalidad, género, edad y rasgos
+        """
+        self.record_many([(file_path, size, modified, metadata)])
+
+    def record_many(self, entries: Iterable[tuple]):
+        """Registrar varios (file_path, size, modified, metadata) en una transacción"""
+        rows = []
+        traits = []
+        for file_path, size, modified, metadata in entries:
+            relative = self._relative(file_path)
+            if relative is None:
+                continue
+            if size is None or modified is None:
+                stat = os.stat(file_path)
+                size, modified = stat.st_size, stat.st_mtime
+            row, row_traits = self._row(relative, size, modified, metadata)
+            rows.append(row)
+            traits.extend((relative, trait, str(value)) for trait, value in row_traits.items())
+        if not rows:
+            return
+        with self._connect() as conn:
+            self._upsert(conn, rows, traits)
+
+    def record_packed(self, entries: Iterable[tuple]):
+        """
+        Registrar miembros de shards tar (disposición 'packed')
+
+        Args:
+            entries: (member_path, shard_path, offset, size, metadata), donde
+                member_path es la ruta virtual del miembro dentro del lote
+        """
+        rows = []
+        traits = []
+        modified = time.time()
+        for member_path, shard_path, offset, size, metadata in entries:
+            relative = self._relative(member_path)
+            shard = self._relative(shard_path)
+            if relative is None or shard is None:
+                continue
+            row, row_traits = self._row(relative, size, modified, metadata, shard=shard, offset=offset)
+            rows.append(row)
+            traits.extend((relative, trait, str(value)) for trait, value in row_traits.items())
+        if not rows:
+            return
+        with self._connect() as conn:
+            self._upsert(conn, rows, traits)
+
+    def locate(self, relative: str) -> Optional[Dict[str, Any]]:
+        """Entrada de un artefacto por su ruta relativa (incluye shard y offset si está empaquetado)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM artifacts WHERE path = ?", (relative,)).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _upsert(conn, rows: List[tuple], traits: List[tuple]):
+        conn.executemany(
+            "INSERT OR REPLACE INTO artifacts "
+            "(path, name, kind, model, batch, size, modified, nationality, gender, age, shard, offset) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.executemany("DELETE FROM artifact_traits WHERE path = ?", [(row[0],) for row in rows if row[2] == 'image'])
+        if traits:
+            conn.executemany("INSERT OR REPLACE INTO artifact_traits (path, trait, value) VALUES (?, ?, ?)", traits)
+
+    def remove(self, file_path):
+        relative = self._relative(file_path)
+        if relative is None:
+            return
+        with self._connect() as conn:
+            conn.execute("DELETE FROM artifacts WHERE path = ?", (relative,))
+            conn.execute("DELETE FROM artifact_traits WHERE path = ?", (relative,))
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Sincronizar el catálogo con el disco
+
+        Sirve para indexar salidas anteriores al catálogo o copiadas a mano.
+        Solo se lee el JSON de las imágenes nuevas o modificadas.
+
+        Returns:
+            Contadores de entradas añadidas, eliminadas y total
+        """
+        start_time = time.time()
+        with self._connect() as conn:
+            known = {}
+            packed = {}
+            for row in conn.execute("SELECT path, size, modified, shard FROM artifacts"):
+                if row['shard']:
+                    packed[row['path']] = row['shard']
+                else:
+                    known[row['path']] = (row['size'], row['modified'])
+
+        seen = set()
+        pending_rows, pending_traits = [], []
+        added = 0
+        for directory, _, filenames in os.walk(self.outputs_dir):
+            for filename in filenames:
+                if filename.startswith(INTERNAL_PREFIXES) or filename == SHARD_INDEX_FILENAME:
+                    continue
+                file_path = Path(directory) / filename
+                relative = file_path.relative_to(self.outputs_dir).as_posix()
+                seen.add(relative)
+                stat = file_path.stat()
+                if known.get(relative) == (stat.st_size, stat.st_mtime):
+                    continue
+                metadata = None
+                if ARTIFACT_KINDS.get(file_path.suffix.lower()) == 'image':
+                    metadata = self._read_sidecar(file_path)
+                row, traits = self._row(relative, stat.st_size, stat.st_mtime, metadata)
+                pending_rows.append(row)
+                pending_traits.extend((relative, trait, str(value)) for trait, value in traits.items())
+                added += 1
+                # Escribir por bloques para no acumular todo en memoria
+                if len(pending_rows) >= 1000:
+                    with self._connect() as conn:
+                        self._upsert(conn, pending_rows, pending_traits)
+                    pending_rows, pending_traits = [], []
+
+        removed = [(path,) for path in known if path not in seen]
+        # Los miembros empaquetados siguen vigentes mientras exista su shard
+        removed += [(path,) for path, shard in packed.items() if shard not in seen]
+        with self._connect() as conn:
+            if pending_rows:
+                self._upsert(conn, pending_rows, pending_traits)
+            if removed:
+                conn.executemany("DELETE FROM artifacts WHERE path = ?", removed)
+                conn.executemany("DELETE FROM artifact_traits WHERE path = ?", removed)
+
+        total = self.count()
+        self.logger.info(
+            f"Catálogo de salidas actualizado en {time.time() - start_time:.1f}s: "
+            f"{added} nuevas o modificadas, {len(removed)} eliminadas, {total} total"
+        )
+        return {'added': added, 'removed': len(removed), 'total': total}
+
+    def _read_sidecar(self, image_path: Path) -> Optional[Dict[str, Any]]:
+        json_path = image_path.with_suffix('.json')
+        if not json_path.exists():
+            return None
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning(f"No se pudo leer {json_path}: {e}")
+            return None
+
+    def _where(self, filters: Optional[Dict[str, Any]]) -> tuple:
+        clauses = []
+        args: List[Any] = []
+        filters = filters or {}
+        for column in ('model', 'batch', 'kind', 'nationality', 'gender'):
+            if filters.get(column):
+                clauses.append(f"a.{column} = ?")
+                args.append(filters[column])
+        if filters.get('age_min') is not None:
+            clauses.append("a.age >= ?")
+            args.append(int(filters['age_min']))
+        if filters.get('age_max') is not None:
+            clauses.append("a.age <= ?")
+            args.append(int(filters['age_max']))
+        if filters.get('name'):
+            clauses.append("a.name LIKE ?")
+            args.append(f"%{filters['name']}%")
+        for trait, value in (filters.get('traits') or {}).items():
+            clauses.append("EXISTS (SELECT 1 FROM artifact_traits t WHERE t.path = a.path AND t.trait = ? AND t.value = ?)")
+            args.extend([trait, str(value)])
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, args
+
+    def count(self, filters: Optional[Dict[str, Any]] = None) -> int:
+        where, args = self._where(filters)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM artifacts a{where}", args).fetchone()[0]
+
+    def query(self, filters: Optional[Dict[str, Any]] = None, sort: str = 'modified', descending: bool = True,
+              limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+        """
+        Página de artefactos
+
+        Args:
+            filters: model, batch, kind, nationality, gender, age_min, age_max,
+                name (subcadena) y traits ({rasgo: valor})
+            sort: Columna de orden (ver SORT_COLUMNS)
+            descending: Orden descendente
+            limit: Tamaño de página
+            offset: Desplazamiento
+
+        Returns:
+            {'files': [...], 'total': n}
+        """
+        if sort not in SORT_COLUMNS:
+            sort = 'modified'
+        direction = "DESC" if descending else "ASC"
+        where, args = self._where(filters)
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM artifacts a{where}", args).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT a.* FROM artifacts a{where} ORDER BY a.{sort} {direction}, a.path LIMIT ? OFFSET ?",
+                args + [max(0, int(limit)), max(0, int(offset))]
+            ).fetchall()
+        return {'files': [dict(row) for row in rows], 'total': total}
+
+    def batches(self, model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Resumen por lote: número de imágenes, tamaño total y última modificación"""
+        args: List[Any] = []
+        where = ""
+        if model:
+            where = " WHERE model = ?"
+            args.append(model)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT model, batch, SUM(kind = 'image') AS images, SUM(size) AS size, MAX(modified) AS modified "
+                f"FROM artifacts{where} GROUP BY model, batch ORDER BY modified DESC",
+                args
+            ).fetchall()
+        return [dict(row) for row in rows]
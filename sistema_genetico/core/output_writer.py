@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Escritor diferido (write-behind) de salidas
+Un hilo dedicado escribe PNG, JSON y filas CSV desde una cola acotada, agrupa
+los fsync y avisa a quien lo pidió solo cuando sus archivos ya están en disco.
+El hilo de generación solo espera cuando la cola está llena (el disco va por
+detrás), lo que actúa como contrapresión
+"""
+
+import csv
+import json
+import os
+import queue
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tipos de escritura: 'bytes' (imagen), 'json' (metadatos compactos), 'csv' (fila añadida),
+# 'columnar' (fila del Parquet del lote, ver columnar_store), 'packed' (muestra añadida a
+# los shards tar del lote, ver shard_store) y 'close_packed' (cerrar los shards de un lote).
+# Las filas 'columnar' solo llegan al disco en close(): on_durable no las cubre
+Write = Tuple[str, Path, Any]
+
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """
+    Cola de escrituras con un hilo de disco
+
+    Cada submit() es una unidad: sus archivos se escriben en orden y, tras el
+    fsync del grupo que la contiene, se llama a on_durable. Si alguna escritura
+    falla la unidad se descarta (se registra el error y no se llama al callback),
+    así un checkpoint nunca marca como hecha una imagen que no llegó al disco.
+
+    La excepción es la salida columnar: el Parquet no es legible hasta escribir
+    su pie, así que sus filas se acumulan hasta close() y no cuentan para el
+    fsync ni para on_durable (el CSV del lote es la copia durable de esas filas).
+    """
+
+    def __init__(self, max_pending: int = 256, fsync_batch: int = 64, fsync_interval: float = 1.0):
+        """
+        Args:
+            max_pending: Unidades en cola antes de bloquear al productor
+            fsync_batch: Archivos escritos entre dos fsync
+            fsync_interval: Segundos máximos entre dos fsync
+        """
+        self.fsync_batch = max(1, int(fsync_batch))
+        self.fsync_interval = fsync_interval
+        self.stats = {'queued': 0, 'written': 0, 'errors': 0, 'syncs': 0, 'backpressure_waits': 0}
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._dirty: List[Path] = []
+        self._callbacks: List[Callable[[], None]] = []
+        self._csv_files: Dict[Path, Tuple[Any, csv.DictWriter]] = {}
+        self._csv_dirty = set()
+        self._columnar_files: Dict[Path, Any] = {}
+        self._shard_writers: Dict[Path, Any] = {}
+        self._unsynced = 0
+        self._last_sync = time.time()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, writes: List[Write], on_durable: Optional[Callable[[], None]] = None):
+        """Encolar una unidad de escrituras (bloquea solo si la cola está llena)"""
+        if self._closed:
+            raise RuntimeError("WriteBehindWriter cerrado")
+        item = (writes, on_durable)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.stats['backpressure_waits'] += 1
+            self._queue.put(item)
+        self.stats['queued'] += 1
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Esperar a que todo lo encolado esté escrito y sincronizado"""
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Vaciar la cola, sincronizar y cerrar los CSV, Parquet y shards abiertos"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                self._sync()
+                continue
+            if item is _STOP:
+                self._sync()
+                for handle, _ in self._csv_files.values():
+                    handle.close()
+                self._csv_files.clear()
+                self._close_columnar()
+                for output_dir in list(self._shard_writers):
+                    self._close_packed(output_dir)
+                return
+            if isinstance(item, threading.Event):
+                self._sync()
+                item.set()
+                continue
+
+            writes, on_durable = item
+            try:
+                for kind, path, payload in writes:
+                    self._write(kind, Path(path), payload)
+                if on_durable is not None:
+                    self._callbacks.append(on_durable)
+                self.stats['written'] += 1
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Error en escritura diferida: {e}")
+
+            if self._unsynced >= self.fsync_batch or time.time() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _write(self, kind: str, path: Path, payload: Any):
+        if kind == 'csv':
+            _, writer = self._csv_writer(path, payload)
+            writer.writerow(payload)
+            self._csv_dirty.add(path)
+            self._unsynced += 1
+            return
+        if kind == 'columnar':
+            # Sin _unsynced: el Parquet se escribe en close(), no en el fsync del grupo
+            if path not in self._columnar_files:
+                from columnar_store import ColumnarBatchWriter
+                self._columnar_files[path] = ColumnarBatchWriter(path)
+            self._columnar_files[path].append(payload)
+            return
+        if kind == 'packed':
+            # path = directorio del lote / clave; payload = (miembros, lista donde dejar las entradas del índice)
+            members, entries = payload
+            if path.parent not in self._shard_writers:
+                from shard_store import ShardWriter
+                self._shard_writers[path.parent] = ShardWriter(path.parent)
+            entries.extend(self._shard_writers[path.parent].add(path.name, members))
+            self._unsynced += 1
+            return
+        if kind == 'close_packed':
+            self._close_packed(path)
+            return
+        if kind == 'json':
+            data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+        else:
+            data = payload
+        with open(path, 'wb') as f:
+            f.write(data)
+        self._dirty.append(path)
+        self._unsynced += 1
+
+    def _csv_writer(self, path: Path, row: Dict[str, Any]) -> Tuple[Any, csv.DictWriter]:
+        """CSV abierto en modo append (la cabecera solo se escribe si el archivo es nuevo)"""
+        if path not in self._csv_files:
+            is_new = not path.exists() or path.stat().st_size == 0
+            handle = open(path, 'a', newline='', encoding='utf-8')
+            writer = csv.DictWriter(handle, fieldnames=list(row.keys()), extrasaction='ignore')
+            if is_new:
+                writer.writeheader()
+            self._csv_files[path] = (handle, writer)
+        return self._csv_files[path]
+
+    def _close_columnar(self):
+        for path, columnar in self._columnar_files.items():
+            try:
+                columnar.close()
+            except Exception as e:
+                logger.error(f"Error cerrando {path}: {e}")
+        self._columnar_files.clear()
+
+    def _close_packed(self, output_dir: Path):
+        shard_writer = self._shard_writers.pop(output_dir, None)
+        if shard_writer is None:
+            return
+        try:
+            shard_writer.close()
+        except Exception as e:
+            logger.error(f"Error cerrando shards de {output_dir}: {e}")
+
+    def _sync(self):
+        """fsync agrupado de los archivos pendientes y aviso a los callbacks"""
+        if not self._unsynced and not self._callbacks:
+            self._last_sync = time.time()
+            return
+        directories = set()
+        for path in self._dirty:
+            try:
+                fd = os.open(str(path), os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                directories.add(path.parent)
+            except OSError as e:
+                logger.warning(f"No se pudo sincronizar {path}: {e}")
+        for csv_path in self._csv_dirty:
+            handle, _ = self._csv_files[csv_path]
+            try:
+                handle.flush()
+                os.fsync(handle.fileno())
+            except OSError as e:
+                logger.warning(f"No se pudo sincronizar {handle.name}: {e}")
+        for output_dir, shard_writer in self._shard_writers.items():
+            try:
+                shard_writer.sync()
+                directories.add(output_dir)
+            except OSError as e:
+                logger.warning(f"No se pudo sincronizar los shards de {output_dir}: {e}")
+        # Entradas de directorio de los archivos nuevos (no soportado en Windows)
+        if os.name == 'posix':
+            for directory in directories:
+                try:
+                    fd = os.open(str(directory), os.O_RDONLY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                except OSError:
+                    pass
+        self._dirty = []
+        self._csv_dirty.clear()
+        self._unsynced = 0
+        self.stats['syncs'] += 1
+        self._last_sync = time.time()
+
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error en callback de escritura diferida: {e}")
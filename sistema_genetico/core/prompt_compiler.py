@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Compilador de prompts por lote
+Las partes constantes de un lote (prefijo, controles de diversidad fijados y
+negative prompt) se ensamblan una sola vez; por perfil solo se renderizan las
+partes variables. Los prompts se entregan en streaming, opcionalmente
+repartidos en un ProcessPoolExecutor, para alimentar directamente la cola de
+generación
+"""
+
+import random
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from run_rng import RunRandom
+
+logger = logging.getLogger(__name__)
+
+GENETIC_BATCH_NEGATIVE_PROMPT = "blurry, low quality, distorted, deformed, ugly, bad anatomy, bad proportions, extra limbs, missing limbs, multiple people, smiling, laughing, 3/4 view, side profile, looking away, white clothing, colored background, shadows, jewelry, glasses, hat, excessive makeup"
+
+# Partes fijas del prompt genético (tras género, nacionalidad y edad)
+GENETIC_PROMPT_FIXED_PARTS = (
+    "professional headshot",
+    "official document photo",
+    "clean white background",
+    "proper lighting",
+    "head and shoulders visible",
+    "neutral expression",
+    "looking at camera",
+    "high quality",
+    "realistic"
+)
+
+MALE_GENDER_DESCRIPTORS = (
+    "masculine features", "strong jawline", "defined jawline", "broad shoulders",
+    "masculine shoulders", "thick neck", "masculine build", "athletic build"
+)
+FEMALE_GENDER_DESCRIPTORS = (
+    "feminine features", "soft jawline", "graceful jawline", "delicate shoulders",
+    "slender neck", "feminine build", "graceful build"
+)
+
+# Controles de diversidad del lote y el texto que añaden cuando no son 'random'
+GENETIC_CONTROL_FORMATS = (
+    ('beauty_control', "{} appearance"),
+    ('skin_control', "{} skin"),
+    ('hair_control', "{} hair"),
+    ('hair_length_control', "{} hair"),
+    ('hair_style_control', "{} hairstyle"),
+    ('eye_control', "{} eyes"),
+    ('eye_shape_control', "{} eyes"),
+    ('face_shape_control', "{} face"),
+    ('nose_shape_control', "{} nose"),
+    ('lip_shape_control', "{} lips"),
+    ('jawline_control', "{} jawline"),
+    ('cheekbone_control', "{} cheekbones"),
+    ('eyebrow_control', "{} eyebrows"),
+    ('skin_texture_control', "{} skin texture"),
+    ('freckle_control', "{} freckles"),
+    ('mole_control', "{} moles"),
+    ('scar_control', "{} scars"),
+    ('acne_control', "{} acne"),
+    ('wrinkle_control', "{} wrinkles"),
+    ('makeup_control', "{} makeup"),
+    ('clothing_type_control', "{}"),
+    ('clothing_color_control', "{} clothing"),
+)
+
+# Especificaciones críticas SAIME Venezuela (inicio del prompt avanzado)
+SAIME_PROMPT_HEADER = (
+    "venezuelan passport photo, SAIME standards, official document photo, government ID photo",
+    "512×764 pixels, 35mm×45mm at 300 DPI, real photographic paper limits",
+    "black outer frame defines ACTUAL photo boundaries, shoulders touch left and right red frame edges",
+    "shoulders positioned at y=202px (78% of 260px), must touch 20px to 200px red frame borders",
+    "head height 30-34mm from chin to crown, eyes at 31% from top (y=80px)",
+    "head margins: 8-12mm top, 12-18mm sides, 18-25mm bottom (adjusted by black frame)",
+    "shoulders width 180px (20px to 200px) - CRITICAL: must touch red frame edges",
+)
+
+# Pose tras la información básica del perfil
+SAIME_PROMPT_POSE = (
+    "front view, frontal view, looking directly at camera, direct eye contact",
+    "neutral expression, serious expression, no smile, no laughing, mouth closed",
+    "eyes open and visible, head centered and straight, frontal position",
+)
+
+# Especificaciones técnicas y refuerzos de pose y cabello (final del prompt avanzado)
+SAIME_PROMPT_FOOTER = (
+    "SOLID WHITE BACKGROUND, PURE WHITE BACKGROUND, CLEAN WHITE BACKGROUND",
+    "professional lighting, uniform lighting, even lighting, high contrast",
+    "35mm x 45mm dimensions, black frame border 1-2mm, effective area 33x43mm",
+    "CRITICAL: real paper photo limits 512x764 pixels, black outer frame defines ACTUAL paper photo boundaries",
+    "RESPECT black outer frame as final paper crop limit, 300 DPI resolution",
+    "professional quality, high resolution, 1024x1024 pixels, ultra high quality",
+    "no earrings, no jewelry, no accessories, no necklaces, no bracelets, no rings",
+    "no head accessories, natural makeup, no dark glasses, no reflections",
+    "no white clothing, no white shirts, no white tops, colored clothing, dark clothing",
+    "sharp and focused image, correct exposure, natural colors, no grain, no distortion",
+    "PNG high quality format, SOLID WHITE BACKGROUND, PURE WHITE BACKGROUND",
+    "natural facial structure, natural ethnic characteristics, natural skin texture",
+    "natural age spots, natural pores, natural skin, natural moles, natural asymmetry",
+    "natural imperfections, natural features, natural hair texture, natural hair density",
+    "clean appearance, neat presentation, appropriate attire, modest clothing",
+    "common appearance, natural skin texture, slight asymmetry, authentic facial features",
+    "natural hair texture, regular citizen, regular person, professional headshot photography",
+    "direct portrait photography, strictly frontal view, no three quarter view, no side view",
+    "head and shoulders visible, shoulders must be visible",
+    "CRITICAL: shoulders must touch left and right red frame edges (20px to 200px, total 180px width)",
+    "shoulders positioned at y=202px (78% of 260px), shoulders MUST touch red frame borders",
+    "SAIME CRITICAL: shoulders must physically touch 20px to 200px red frame edges",
+    "sufficient head space, no head crop, full head visible, head positioned in upper 60%",
+    "eyes positioned at 31% from top, perfectly centered composition",
+    "professional studio lighting, no shadows, TRANSPARENT BACKGROUND, NO BACKGROUND",
+    "ALPHA CHANNEL, passport photo requirements, ID photo standards, official document standards",
+    "government photo standards, SAIME standards, venezuelan passport specifications",
+    "8-12mm margin from crown, 12-18mm lateral margins, 18-25mm bottom margin",
+    "black frame consideration, voluminous hair warning, afro hair considerations",
+    "thick braids space requirements, chinos voluminous hair considerations",
+    "CRITICAL: hair must fit within 512x764 black outer frame, anything beyond black frame will be cropped",
+    "RESPECT black outer frame boundaries, final paper photo size 512x764 pixels",
+    "black outer frame is the actual paper photo limit",
+    "FRONTAL POSE ONLY, head centered, neutral expression, mouth closed",
+    "HAIR LOW VOLUME, neatly groomed, fits entirely within black frame, ears visible if possible",
+)
+
+# Negative prompt con especificaciones SAIME críticas
+SAIME_NEGATIVE_PROMPT = (
+    "3/4 view, side profile, looking away, smiling, laughing, multiple people, "
+    "double exposure, passport document visible, photo of photo, magazine model, "
+    "overly perfect, artificial lighting, shadows, background objects, "
+    "earrings, jewelry, necklaces, bracelets, rings, accessories, "
+    "glasses, hat, makeup, retouched, airbrushed, glamour, fashion model, "
+    "beauty contest, professional headshot, studio lighting, dramatic lighting, "
+    "soft focus, blurry, low quality, distorted, deformed, extra limbs, extra heads, "
+    "duplicate, watermark, text, signature, date, stamp, border, frame, "
+    "shoulders not touching red frame edges, shoulders not reaching 20px to 200px, "
+    "shoulders positioned incorrectly, shoulders not at y=202px, "
+    "head not positioned correctly, eyes not at 31% from top, "
+    "incorrect head margins, head too close to edges, "
+    "hair extending beyond black outer frame, hair touching black frame, "
+    "accessories extending beyond black frame, jewelry beyond black frame, "
+    "SAIME VIOLATIONS: incorrect shoulder positioning, incorrect head positioning, "
+    "violation of 512x764 black outer frame limits, violation of red frame shoulder requirements, "
+    "braids, cornrows, dreadlocks, dread, locs, thick braids, box braids, high volume hair, afro, mohawk, messy hair, wind, hair in face, "
+    "tilted head, rotated head, looking sideways, looking down, looking up, profile shot, half profile, "
+    "perfect skin, flawless skin, airbrushed, photoshopped, model look, "
+    "supermodel appearance, celebrity look, fashion model, beauty model, "
+    "perfect features, flawless features, extreme beauty, perfect beauty, "
+    "perfect symmetry, flawless symmetry, perfect proportions, flawless proportions, "
+    "perfect skin texture, flawless skin texture, perfect facial features, "
+    "flawless facial features, perfect bone structure, flawless bone structure, "
+    "perfect skin tone, flawless skin tone, perfect hair, flawless hair, "
+    "perfect eyes, flawless eyes, perfect lips, flawless lips, perfect nose, "
+    "flawless nose, perfect jawline, flawless jawline, perfect cheekbones, "
+    "flawless cheekbones, perfect eyebrows, flawless eyebrows, perfect teeth, "
+    "flawless teeth, perfect smile, flawless smile, perfect complexion, "
+    "flawless complexion, perfect appearance, flawless appearance, perfect face, "
+    "flawless face, perfect look, flawless look, perfect beauty, flawless beauty, "
+    "perfect model, flawless model, perfect portrait, flawless portrait, "
+    "perfect headshot, flawless headshot, perfect photo, flawless photo, "
+    "perfect image, flawless image, perfect picture, flawless picture, "
+    "perfect shot, flawless shot, perfect capture, flawless capture, "
+    "perfect rendering, flawless rendering, perfect generation, flawless generation, "
+    "perfect creation, flawless creation, perfect result, flawless result, "
+    "perfect output, flawless output, three quarter view, side view, profile view, "
+    "watermark, signature, cropped at neck, only head, no shoulders, head cut off, "
+    "shoulders missing, head cut off at top, head cropped at top, top of head missing, "
+    "multiple people, double exposure, passport document visible, photo of photo, "
+    "magazine model, overly perfect, artificial lighting, shadows, background objects, "
+    "jewelry, glasses, hat, makeup, retouched, airbrushed, glamour, fashion model, "
+    "beauty contest, professional headshot, studio lighting, dramatic lighting, "
+    "soft focus, blurry, low quality, distorted, deformed, extra limbs, extra heads, "
+    "duplicate, watermark, text, signature, date, stamp, border, frame, "
+    "white clothing, white shirts, white tops, white blouses, white t-shirts, "
+    "white sweaters, white jackets, white dresses, white garments, "
+    "COLORED BACKGROUND, TEXTURED BACKGROUND, GRADIENT BACKGROUND, PATTERN BACKGROUND, "
+    "BACKGROUND, BACKDROP, WALL, SURFACE, FLOOR, CEILING, ENVIRONMENT, SCENE, SETTING, "
+    "LOCATION, PLACE, ROOM, INTERIOR, EXTERIOR, OUTDOOR, INDOOR, STUDIO BACKGROUND, "
+    "PHOTO STUDIO, BACKGROUND WALL, BACKGROUND SURFACE, cropped by internal frames, "
+    "respecting internal frame boundaries, following internal frame limits, "
+    "internal frame cropping, frame boundary respect, internal frame compliance"
+)
+
+# Uniones precalculadas para generate_prompt_from_advanced_profile
+SAIME_PROMPT_PREFIX = ", ".join(SAIME_PROMPT_HEADER)
+SAIME_POSE_TEXT = ", ".join(SAIME_PROMPT_POSE)
+SAIME_PROMPT_SUFFIX = ", ".join(SAIME_PROMPT_FOOTER)
+
+
+def gender_descriptors(gender: str, rng: Optional[random.Random] = None) -> List[str]:
+    """Elegir 3-5 descriptores de género sin repetición"""
+    rng = rng or random
+    if gender.lower() in ['hombre', 'male', 'masculino']:
+        options = MALE_GENDER_DESCRIPTORS
+    else:
+        options = FEMALE_GENDER_DESCRIPTORS
+    k = rng.randint(3, min(5, len(options)))
+    return rng.sample(options, k)
+
+
+def diversity_control_features(diversity_params: Dict[str, Any]) -> List[str]:
+    """Textos de los controles de diversidad fijados en el lote (en el orden del prompt)"""
+    features = [fmt.format(diversity_params[key]) for key, fmt in GENETIC_CONTROL_FORMATS
+                if diversity_params.get(key, 'random') != 'random']
+    background = diversity_params.get('background_control', 'random')
+    if background != 'random':
+        if background == 'white_solid':
+            features.append("solid white background")
+        else:
+            features.append(f"{background} background")
+    return features
+
+
+def _render_chunk(compiler: 'BatchPromptCompiler', rows: List[Tuple[int, Dict[str, Any]]]) -> List[str]:
+    """Renderizar un bloque de perfiles (se ejecuta en un proceso del pool)"""
+    return [compiler.render_index(profile, index) for index, profile in rows]
+
+
+class BatchPromptCompiler:
+    """
+    Prompts de un lote de generate_genetic_batch
+
+    Los controles de diversidad son los mismos para todo el lote, así que el
+    sufijo se calcula una vez; por perfil solo cambian género, nacionalidad,
+    edad y los descriptores de género (sorteados con el stream 'prompt' del
+    índice, igual que antes). El objeto solo guarda cadenas y la semilla del
+    lote, así que viaja barato a los procesos del pool.
+    """
+
+    def __init__(self, diversity_params: Dict[str, Any], run_seed: int = 0, index_offset: int = 0):
+        self.run_rng = RunRandom(run_seed)
+        self.index_offset = index_offset
+        self.gender = diversity_params.get('genero', 'hombre')
+        self.fixed_text = ", ".join(GENETIC_PROMPT_FIXED_PARTS)
+        self.suffix = "".join(", " + feature for feature in diversity_control_features(diversity_params))
+        self.negative_prompt = GENETIC_BATCH_NEGATIVE_PROMPT
+
+    def render(self, profile: Dict[str, Any], rng: Optional[random.Random] = None) -> str:
+        """Prompt de un perfil con un RNG dado"""
+        metadata = profile['metadata']
+        descriptors = ", ".join(gender_descriptors(self.gender, rng))
+        return (
+            f"venezuelan passport photo, {metadata['gender']} from {metadata['nationality']}, "
+            f"{metadata['age']} years old, {self.fixed_text}, {descriptors}{self.suffix}"
+        )
+
+    def render_index(self, profile: Dict[str, Any], index: int) -> str:
+        """Prompt del perfil en la posición index del lote (depende solo de run_seed e índice)"""
+        return self.render(profile, self.run_rng.stream('prompt', self.index_offset + index))
+
+    def iter_prompts(self, items: Iterable[Tuple[int, Dict[str, Any]]], workers: int = 0,
+                     chunk_size: int = 256) -> Iterator[Tuple[int, Dict[str, Any], str]]:
+        """
+        Renderizar prompts en streaming
+
+        Args:
+            items: Pares (índice, perfil) en el orden en que se consumirán
+            workers: Procesos del pool (0 o 1 = en el mismo hilo)
+            chunk_size: Perfiles por tarea enviada al pool
+
+        Returns:
+            Iterador de (índice, perfil, prompt) en el mismo orden que items
+        """
+        if workers <= 1:
+            for index, profile in items:
+                yield index, profile, self.render_index(profile, index)
+            return
+
+        items = iter(items)
+        try:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        except Exception as e:
+            logger.warning(f"No se pudo crear el pool de prompts, se renderiza en serie: {e}")
+            yield from self.iter_prompts(items)
+            return
+
+        with executor:
+            # Ventana de bloques en vuelo para no adelantarse demasiado a la generación
+            pending = deque()
+            while True:
+                while len(pending) < workers * 2:
+                    chunk = list(islice(items, chunk_size))
+                    if not chunk:
+                        break
+                    # Al proceso solo viaja lo que usa render()
+                    rows = [(index, {'metadata': {key: profile['metadata'][key] for key in ('gender', 'nationality', 'age')}})
+                            for index, profile in chunk]
+                    pending.append((chunk, executor.submit(_render_chunk, self, rows)))
+                if not pending:
+                    return
+                chunk, future = pending.popleft()
+                try:
+                    prompts = future.result()
+                except Exception as e:
+                    logger.warning(f"Error en el pool de prompts, bloque renderizado en serie: {e}")
+                    prompts = [self.render_index(profile, index) for index, profile in chunk]
+                for (index, profile), prompt in zip(chunk, prompts):
+                    yield index, profile, prompt
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Generadores aleatorios por lote de generación
+Cada perfil se deriva solo de (run_seed, índice), sin estado global compartido,
+así que un lote puede reproducirse, regenerarse bajo demanda o construirse en
+paralelo (hilos o procesos) con idéntico resultado
+"""
+
+import random
+from functools import lru_cache
+from typing import Optional, Sequence
+
+
+def new_run_seed() -> int:
+    """Semilla nueva para un lote (se registra para poder reproducirlo)"""
+    return random.SystemRandom().randint(1, 2**31 - 1)
+
+
+@lru_cache(maxsize=4096)
+def _cycle_order(run_seed: int, key: str, size: int, cycle: int) -> tuple:
+    """Permutación de las opciones para un ciclo de una categoría"""
+    order = list(range(size))
+    random.Random(f"{run_seed}:cycle:{key}:{cycle}").shuffle(order)
+    return tuple(order)
+
+
+class ProfileRandom(random.Random):
+    """
+    random.Random de un perfil concreto (semilla "{run_seed}:{index}")
+
+    no_repeat() sustituye al muestreo sin repetición que dependía del historial
+    del lote: los índices se agrupan en ciclos del tamaño del conjunto de
+    opciones y cada ciclo recorre una permutación propia. Dentro de un ciclo no
+    se repite ningún valor, y el resultado no depende de qué otros perfiles se
+    hayan generado antes.
+
+    attempt > 0 da un nuevo sorteo del mismo perfil (p. ej. si su combinación
+    de rasgos ya existe): otra semilla y, en no_repeat, una permutación propia
+    del intento, así que sigue dependiendo solo de (run_seed, índice, attempt).
+    """
+
+    def __init__(self, run_seed: int = 0, index: int = 0, attempt: int = 0):
+        self.run_seed = run_seed
+        self.index = index
+        self.attempt = attempt
+        super().__init__(f"{run_seed}:{index}" if not attempt else f"{run_seed}:{index}:retry{attempt}")
+
+    def no_repeat(self, key: str, options: Sequence):
+        cycle, position = divmod(self.index, len(options))
+        if self.attempt:
+            key = f"{key}:retry{self.attempt}"
+        return options[_cycle_order(self.run_seed, key, len(options), cycle)[position]]
+
+
+class RunRandom:
+    """Fuente aleatoria de un lote completo"""
+
+    def __init__(self, run_seed: Optional[int] = None):
+        self.run_seed = int(run_seed) if run_seed is not None else new_run_seed()
+
+    def for_index(self, index: int, attempt: int = 0) -> ProfileRandom:
+        """RNG del perfil en la posición index (attempt > 0: nuevo sorteo del mismo perfil)"""
+        return ProfileRandom(self.run_seed, index, attempt)
+
+    def stream(self, name: str, index: int) -> random.Random:
+        """RNG independiente para otro uso del mismo índice (semilla de imagen, prompt...)"""
+        return random.Random(f"{self.run_seed}:{name}:{index}")
+
+    def seed_for(self, index: int, base_seed: int = -1) -> int:
+        """Semilla de imagen determinista para un índice"""
+        if base_seed is not None and int(base_seed) != -1:
+            return int(base_seed) + index
+        return self.stream('seed', index).randint(1, 2**31 - 1)
+
+    def numpy(self, stream: int = 0):
+        """numpy.random.Generator derivado de la semilla del lote"""
+        import numpy as np
+        return np.random.default_rng([self.run_seed, stream])
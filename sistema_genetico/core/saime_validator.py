@@ -8,10 +8,35 @@ import cv2
 import numpy as np
 from PIL import Image
 import logging
-from typing import Dict, List, Tuple, Any, Optional
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Any, Optional
 from dataclasses import dataclass
 import json
 
+logger = logging.getLogger(__name__)
+
+FACE_CASCADE = 'haarcascade_frontalface_default.xml'
+EYE_CASCADE = 'haarcascade_eye.xml'
+
+# Clasificadores Haar cargados una vez por hilo (un CascadeClassifier no debe
+# compartirse entre hilos y leer el XML cuesta más que la propia detección)
+_cascades = threading.local()
+
+
+def get_cascade(name: str) -> cv2.CascadeClassifier:
+    """Clasificador Haar de OpenCV (cacheado por hilo)"""
+    cache = getattr(_cascades, 'cache', None)
+    if cache is None:
+        cache = _cascades.cache = {}
+    if name not in cache:
+        cache[name] = cv2.CascadeClassifier(cv2.data.haarcascades + name)
+    return cache[name]
+
 @dataclass
 class SAIMEValidationResult:
     """Resultado de validación SAIME"""
@@ -38,8 +63,12 @@ class SAIMEValidator:
             "max_face_ratio": 0.7,  # 70% del área de la imagen
             "eye_position_ratio": 0.31,  # 31% desde el borde superior
             "shoulder_position_ratio": 0.78,  # 78% desde el borde superior
-            "background_tolerance": 0.95  # 95% de fondo blanco
+            "background_tolerance": 0.95,  # 95% de fondo blanco
+            "working_height": 384  # Alto de la copia reducida para fondo, rostro y hombros (0 = sin reducir)
         }
+        
+        # Estadísticas del último validate_batch
+        self.last_batch_stats: Dict[str, Any] = {}
     
     def validate_image(self, image_path: str) -> SAIMEValidationResult:
         """Valida una imagen contra las especificaciones SAIME"""
@@ -56,62 +85,7 @@ class SAIMEValidator:
                     compliance_details={}
                 )
             
-            height, width = image.shape[:2]
-            violations = []
-            recommendations = []
-            compliance_details = {}
-            
-            # 1. Validar dimensiones
-            dimension_compliance = self._validate_dimensions(width, height)
-            violations.extend(dimension_compliance["violations"])
-            recommendations.extend(dimension_compliance["recommendations"])
-            compliance_details["dimensions"] = dimension_compliance
-            
-            # 2. Validar proporción de aspecto
-            aspect_compliance = self._validate_aspect_ratio(width, height)
-            violations.extend(aspect_compliance["violations"])
-            recommendations.extend(aspect_compliance["recommendations"])
-            compliance_details["aspect_ratio"] = aspect_compliance
-            
-            # 3. Validar fondo blanco
-            background_compliance = self._validate_background(image)
-            violations.extend(background_compliance["violations"])
-            recommendations.extend(background_compliance["recommendations"])
-            compliance_details["background"] = background_compliance
-            
-            # 4. Validar detección de rostro
-            face_compliance = self._validate_face_detection(image)
-            violations.extend(face_compliance["violations"])
-            recommendations.extend(face_compliance["recommendations"])
-            compliance_details["face_detection"] = face_compliance
-            
-            # 5. Validar posición de ojos
-            eye_compliance = self._validate_eye_position(image)
-            violations.extend(eye_compliance["violations"])
-            recommendations.extend(eye_compliance["recommendations"])
-            compliance_details["eye_position"] = eye_compliance
-            
-            # 6. Validar posición de hombros
-            shoulder_compliance = self._validate_shoulder_position(image)
-            violations.extend(shoulder_compliance["violations"])
-            recommendations.extend(shoulder_compliance["recommendations"])
-            compliance_details["shoulder_position"] = shoulder_compliance
-            
-            # Calcular score general
-            total_checks = 6
-            passed_checks = total_checks - len(violations)
-            score = passed_checks / total_checks
-            
-            is_valid = len(violations) == 0 and score >= 0.8
-            
-            return SAIMEValidationResult(
-                is_valid=is_valid,
-                score=score,
-                violations=violations,
-                recommendations=recommendations,
-                dimensions={"width": width, "height": height},
-                compliance_details=compliance_details
-            )
+            return self._validate_loaded(image)
             
         except Exception as e:
             self.logger.error(f"Error validando imagen {image_path}: {e}")
@@ -124,6 +98,243 @@ class SAIMEValidator:
                 compliance_details={}
             )
     
+    def validate(self, image: Any, color_order: str = 'bgr') -> SAIMEValidationResult:
+        """
+        Valida una imagen en cualquiera de las formas que manejan los motores
+        
+        Args:
+            image: Ruta, bytes codificados (PNG/JPEG), PIL.Image o array NumPy
+            color_order: Orden de canales de un array de 3 canales ('bgr' o 'rgb')
+        """
+        if isinstance(image, (str, os.PathLike)):
+            return self.validate_image(str(image))
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return self.validate_bytes(bytes(image))
+        if isinstance(image, Image.Image):
+            return self.validate_pil(image)
+        return self.validate_array(image, color_order=color_order)
+    
+    def validate_bytes(self, image_data: bytes) -> SAIMEValidationResult:
+        """Valida una imagen codificada (PNG/JPEG) sin pasar por disco"""
+        try:
+            image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                return self._failed_result("No se pudo decodificar la imagen",
+                                           "Verificar que los datos son una imagen válida")
+            
+            return self._validate_loaded(image)
+            
+        except Exception as e:
+            self.logger.error(f"Error validando imagen en memoria: {e}")
+            return self._failed_result(f"Error de validación: {str(e)}", "Verificar integridad de la imagen")
+    
+    def validate_pil(self, image: Image.Image) -> SAIMEValidationResult:
+        """Valida una imagen PIL ya decodificada"""
+        try:
+            if image.mode == 'L':
+                return self.validate_array(np.asarray(image))
+            return self.validate_array(np.asarray(image.convert('RGB')), color_order='rgb')
+        except Exception as e:
+            self.logger.error(f"Error validando imagen PIL: {e}")
+            return self._failed_result(f"Error de validación: {str(e)}", "Verificar integridad de la imagen")
+    
+    def validate_array(self, image: np.ndarray, color_order: str = 'bgr') -> SAIMEValidationResult:
+        """
+        Valida un array NumPy uint8 (alto x ancho, con 1, 3 o 4 canales)
+        
+        Args:
+            image: Imagen en escala de grises, BGR/RGB o BGRA/RGBA
+            color_order: 'bgr' (convención de OpenCV) o 'rgb' (PIL, imageio)
+        """
+        try:
+            image = np.asarray(image)
+            if image.dtype != np.uint8:
+                return self._failed_result(f"Tipo de array no soportado: {image.dtype}", "Convertir la imagen a uint8")
+            rgb = color_order.lower() == 'rgb'
+            if image.ndim == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            elif image.ndim == 3 and image.shape[2] == 4:
+                image = cv2.cvtColor(image, cv2.COLOR_RGBA2BGR if rgb else cv2.COLOR_BGRA2BGR)
+            elif image.ndim == 3 and image.shape[2] == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR) if rgb else np.ascontiguousarray(image)
+            else:
+                return self._failed_result(f"Forma de array no soportada: {image.shape}",
+                                           "Usar una imagen de 1, 3 o 4 canales")
+            
+            return self._validate_loaded(image)
+            
+        except Exception as e:
+            self.logger.error(f"Error validando array: {e}")
+            return self._failed_result(f"Error de validación: {str(e)}", "Verificar integridad de la imagen")
+    
+    def _failed_result(self, violation: str, recommendation: str) -> SAIMEValidationResult:
+        return SAIMEValidationResult(
+            is_valid=False,
+            score=0.0,
+            violations=[violation],
+            recommendations=[recommendation],
+            dimensions={"width": 0, "height": 0},
+            compliance_details={}
+        )
+    
+    def _working_copy(self, image: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Copia reducida (INTER_AREA) para los detectores y su escala respecto al original"""
+        working_height = self.saime_specs.get("working_height", 0)
+        height, width = image.shape[:2]
+        if not working_height or height <= working_height:
+            return image, 1.0
+        scale = working_height / height
+        working = cv2.resize(image, (max(1, round(width * scale)), working_height), interpolation=cv2.INTER_AREA)
+        return working, scale
+    
+    def _validate_loaded(self, image: np.ndarray) -> SAIMEValidationResult:
+        """
+        Ejecutar todas las comprobaciones sobre una imagen BGR ya cargada
+        
+        Fondo, rostro y hombros usan una copia reducida compartida (las métricas
+        son proporciones, no dependen de la resolución); las dimensiones y los
+        ojos usan la imagen original, estos últimos solo dentro del rostro.
+        """
+        height, width = image.shape[:2]
+        working, scale = self._working_copy(image)
+        # Escala de grises calculada una sola vez (sobre la copia reducida) para fondo y rostro
+        gray = cv2.cvtColor(working, cv2.COLOR_BGR2GRAY)
+        violations = []
+        recommendations = []
+        compliance_details = {}
+        
+        # 1. Validar dimensiones
+        dimension_compliance = self._validate_dimensions(width, height)
+        violations.extend(dimension_compliance["violations"])
+        recommendations.extend(dimension_compliance["recommendations"])
+        compliance_details["dimensions"] = dimension_compliance
+        
+        # 2. Validar proporción de aspecto
+        aspect_compliance = self._validate_aspect_ratio(width, height)
+        violations.extend(aspect_compliance["violations"])
+        recommendations.extend(aspect_compliance["recommendations"])
+        compliance_details["aspect_ratio"] = aspect_compliance
+        
+        # 3. Validar fondo blanco
+        background_compliance = self._validate_background(working, gray)
+        violations.extend(background_compliance["violations"])
+        recommendations.extend(background_compliance["recommendations"])
+        compliance_details["background"] = background_compliance
+        
+        # 4. Validar detección de rostro
+        face_compliance = self._validate_face_detection(working, gray, scale=scale)
+        violations.extend(face_compliance["violations"])
+        recommendations.extend(face_compliance["recommendations"])
+        compliance_details["face_detection"] = face_compliance
+        
+        # 5. Validar posición de ojos
+        eye_compliance = self._validate_eye_position(
+            image, gray if scale == 1.0 else None, face_box=face_compliance.get("face_box")
+        )
+        violations.extend(eye_compliance["violations"])
+        recommendations.extend(eye_compliance["recommendations"])
+        compliance_details["eye_position"] = eye_compliance
+        
+        # 6. Validar posición de hombros
+        shoulder_compliance = self._validate_shoulder_position(working, scale=scale)
+        violations.extend(shoulder_compliance["violations"])
+        recommendations.extend(shoulder_compliance["recommendations"])
+        compliance_details["shoulder_position"] = shoulder_compliance
+        
+        # Calcular score general
+        total_checks = 6
+        passed_checks = total_checks - len(violations)
+        score = passed_checks / total_checks
+        
+        is_valid = len(violations) == 0 and score >= 0.8
+        
+        return SAIMEValidationResult(
+            is_valid=is_valid,
+            score=score,
+            violations=violations,
+            recommendations=recommendations,
+            dimensions={"width": width, "height": height},
+            compliance_details=compliance_details
+        )
+    
+    def validate_batch(self, image_paths: Iterable[str], workers: Optional[int] = None, chunk_size: int = 8,
+                       progress_callback: Optional[Callable[[int, int, float], None]] = None
+                       ) -> Iterator[Tuple[str, SAIMEValidationResult]]:
+        """
+        Validar muchas imágenes en streaming con un pool de procesos
+        
+        Cada proceso carga los clasificadores una sola vez y recibe bloques de
+        rutas; los resultados se entregan en el orden de image_paths a medida que
+        terminan sus bloques. Al acabar, last_batch_stats contiene imágenes,
+        válidas, segundos e imágenes por segundo.
+        
+        Args:
+            image_paths: Rutas de las imágenes (puede ser un generador)
+            workers: Procesos del pool (None = núcleos disponibles, 0 o 1 = en este proceso)
+            chunk_size: Rutas por tarea enviada al pool
+            progress_callback: Función (validadas, válidas, imágenes/s)
+            
+        Returns:
+            Iterador de (ruta, SAIMEValidationResult)
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        stats = {'images': 0, 'valid': 0, 'seconds': 0.0, 'images_per_second': 0.0}
+        self.last_batch_stats = stats
+        start_time = time.time()
+        
+        def _count(result):
+            stats['images'] += 1
+            stats['valid'] += int(result.is_valid)
+            stats['seconds'] = time.time() - start_time
+            stats['images_per_second'] = stats['images'] / stats['seconds'] if stats['seconds'] else 0.0
+            if progress_callback:
+                progress_callback(stats['images'], stats['valid'], stats['images_per_second'])
+        
+        try:
+            for image_path, result in self._iter_batch(iter(image_paths), workers, max(1, int(chunk_size))):
+                _count(result)
+                yield image_path, result
+        finally:
+            self.logger.info(
+                f"Validación SAIME por lotes: {stats['images']} imágenes ({stats['valid']} válidas) "
+                f"en {stats['seconds']:.1f}s, {stats['images_per_second']:.1f} imágenes/s"
+            )
+    
+    def _iter_batch(self, image_paths: Iterator[str], workers: int,
+                    chunk_size: int) -> Iterator[Tuple[str, SAIMEValidationResult]]:
+        if workers <= 1:
+            for image_path in image_paths:
+                yield image_path, self.validate_image(image_path)
+            return
+        
+        try:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                           initargs=(self.saime_specs,))
+        except Exception as e:
+            self.logger.warning(f"No se pudo crear el pool de validación, se valida en serie: {e}")
+            yield from self._iter_batch(image_paths, 0, chunk_size)
+            return
+        
+        with executor:
+            # Ventana de bloques en vuelo: no se leen todas las rutas por adelantado
+            pending = deque()
+            while True:
+                while len(pending) < workers * 2:
+                    chunk = [str(path) for path in islice(image_paths, chunk_size)]
+                    if not chunk:
+                        break
+                    pending.append((chunk, executor.submit(_validate_chunk, chunk)))
+                if not pending:
+                    return
+                chunk, future = pending.popleft()
+                try:
+                    results = future.result()
+                except Exception as e:
+                    self.logger.warning(f"Error en el pool de validación, bloque validado en serie: {e}")
+                    results = [self.validate_image(image_path) for image_path in chunk]
+                yield from zip(chunk, results)
+    
     def _validate_dimensions(self, width: int, height: int) -> Dict[str, Any]:
         """Valida las dimensiones de la imagen"""
         target_width = self.saime_specs["target_width"]
@@ -175,10 +386,11 @@ class SAIMEValidator:
             "target_ratio": target_ratio
         }
     
-    def _validate_background(self, image: np.ndarray) -> Dict[str, Any]:
+    def _validate_background(self, image: np.ndarray, gray: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """Valida que el fondo sea blanco"""
         # Convertir a escala de grises
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
         # Calcular el porcentaje de píxeles blancos
         white_pixels = np.sum(gray > 240)  # Umbral para blanco
@@ -203,12 +415,14 @@ class SAIMEValidator:
             "target_percentage": target_percentage
         }
     
-    def _validate_face_detection(self, image: np.ndarray) -> Dict[str, Any]:
-        """Valida la detección de rostro"""
-        # Cargar clasificador de rostros
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    def _validate_face_detection(self, image: np.ndarray, gray: Optional[np.ndarray] = None,
+                                 scale: float = 1.0) -> Dict[str, Any]:
+        """Valida la detección de rostro (image puede ser la copia reducida; scale = reducida / original)"""
+        # Clasificador de rostros (cacheado)
+        face_cascade = get_cascade(FACE_CASCADE)
+        
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         faces = face_cascade.detectMultiScale(gray, 1.1, 4)
         
         face_detected = len(faces) > 0
@@ -225,8 +439,11 @@ class SAIMEValidator:
         
         # Calcular proporción del rostro
         face_ratio = 0.0
+        face_box = None
         if face_detected and len(faces) == 1:
             x, y, w, h = faces[0]
+            # Caja en coordenadas de la imagen original (la usa la validación de ojos)
+            face_box = [int(round(value / scale)) for value in (x, y, w, h)]
             face_area = w * h
             image_area = image.shape[0] * image.shape[1]
             face_ratio = face_area / image_area
@@ -246,16 +463,31 @@ class SAIMEValidator:
             "violations": violations,
             "recommendations": recommendations,
             "faces_detected": len(faces),
-            "face_ratio": face_ratio
+            "face_ratio": face_ratio,
+            "face_box": face_box
         }
     
-    def _validate_eye_position(self, image: np.ndarray) -> Dict[str, Any]:
-        """Valida la posición de los ojos"""
-        # Cargar clasificador de ojos
-        eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
-        
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    def _validate_eye_position(self, image: np.ndarray, gray: Optional[np.ndarray] = None,
+                               face_box: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        Valida la posición de los ojos
+        
+        Con face_box (x, y, ancho, alto del rostro) solo se busca en la mitad
+        superior del rostro a resolución completa; sin él, en toda la imagen.
+        """
+        # Clasificador de ojos (cacheado)
+        eye_cascade = get_cascade(EYE_CASCADE)
+        
+        offset_x, offset_y = 0, 0
+        if face_box is not None:
+            x, y, w, h = face_box
+            offset_x, offset_y = max(0, x), max(0, y)
+            region = image[offset_y:offset_y + int(h * 0.6), offset_x:offset_x + w]
+            gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+        elif gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         eyes = eye_cascade.detectMultiScale(gray, 1.1, 4)
+        eyes = [(x + offset_x, y + offset_y, w, h) for (x, y, w, h) in eyes]
         
         eyes_detected = len(eyes) >= 2
         
@@ -295,15 +527,16 @@ class SAIMEValidator:
             "eye_position_ratio": eye_position_ratio if eyes_detected else 0.0
         }
     
-    def _validate_shoulder_position(self, image: np.ndarray) -> Dict[str, Any]:
-        """Valida la posición de los hombros"""
+    def _validate_shoulder_position(self, image: np.ndarray, scale: float = 1.0) -> Dict[str, Any]:
+        """Valida la posición de los hombros (image puede ser la copia reducida; scale = reducida / original)"""
         # Esta es una validación simplificada
         # En una implementación completa, se usaría detección de pose
         height = image.shape[0]
         target_shoulder_y = int(height * self.saime_specs["shoulder_position_ratio"])
+        band = max(1, int(round(20 * scale)))
         
         # Validación básica: verificar que hay contenido en la zona de hombros
-        shoulder_region = image[target_shoulder_y-20:target_shoulder_y+20, :]
+        shoulder_region = image[target_shoulder_y-band:target_shoulder_y+band, :]
         shoulder_content = np.mean(shoulder_region)
         
         # Si la región de hombros es muy clara (blanca), probablemente no hay hombros
@@ -321,7 +554,7 @@ class SAIMEValidator:
             "violations": violations,
             "recommendations": recommendations,
             "shoulder_region_brightness": shoulder_content,
-            "target_shoulder_y": target_shoulder_y
+            "target_shoulder_y": int(round(target_shoulder_y / scale))
         }
     
     def generate_validation_report(self, validation_result: SAIMEValidationResult) -> str:
@@ -365,6 +598,26 @@ class SAIMEValidator:
 # Instancia global del validador
 saime_validator = SAIMEValidator()
 
+# Validador de cada proceso del pool de validate_batch
+_worker_validator = None
+
+def _init_worker(saime_specs: Dict[str, Any]):
+    """Preparar un proceso del pool: un hilo de OpenCV y clasificadores ya cargados"""
+    global _worker_validator
+    cv2.setNumThreads(1)
+    _worker_validator = SAIMEValidator()
+    _worker_validator.saime_specs = dict(saime_specs)
+    get_cascade(FACE_CASCADE)
+    get_cascade(EYE_CASCADE)
+
+def _validate_chunk(image_paths: List[str]) -> List[SAIMEValidationResult]:
+    """Validar un bloque de rutas (se ejecuta en un proceso del pool)"""
+    return [_worker_validator.validate_image(image_path) for image_path in image_paths]
+
+def _validate_bytes_in_worker(image_data: bytes) -> SAIMEValidationResult:
+    """Validar una imagen en memoria (se ejecuta en un proceso del pool)"""
+    return _worker_validator.validate_bytes(image_data)
+
 def validate_saime_compliance(image_path: str) -> SAIMEValidationResult:
     """Valida el cumplimiento SAIME de una imagen"""
     return saime_validator.validate_image(image_path)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Disposición de salida para lotes masivos
+- 'flat': todos los archivos en el directorio del lote (comportamiento original)
+- 'sharded': imágenes y JSON en subdirectorios por prefijo de hash (ab/nombre.png)
+  para no acumular decenas de miles de entradas en un mismo directorio
+- 'packed': imágenes y JSON se añaden a shards tar rotativos (convención
+  WebDataset: miembros <clave>.png / <clave>.json consecutivos) con un índice de
+  desplazamientos, así un lote de 50k imágenes ocupa unas pocas decenas de
+  archivos, puede leerse un miembro suelto sin recorrer el tar y un pipeline de
+  entrenamiento puede leer los shards en streaming
+"""
+
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_LAYOUTS = ('flat', 'sharded', 'packed')
+SHARD_PATTERN = "shard-{:06d}.tar"
+SHARD_INDEX_FILENAME = "shards.idx.jsonl"
+DEFAULT_SHARD_MAX_SAMPLES = 10000
+DEFAULT_SHARD_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def shard_prefix(filename: str, width: int = 2) -> str:
+    """Subdirectorio de un archivo en la disposición 'sharded' (256 subdirectorios con width=2)"""
+    return hashlib.sha1(Path(filename).stem.encode('utf-8')).hexdigest()[:width]
+
+
+def sharded_path(output_dir, filename: str) -> Path:
+    """Ruta de un archivo en la disposición 'sharded' (crea el subdirectorio)"""
+    directory = Path(output_dir) / shard_prefix(filename)
+    directory.mkdir(exist_ok=True)
+    return directory / filename
+
+
+class ShardWriter:
+    """
+    Escritor de shards tar de un lote
+
+    Cada muestra (imagen + JSON) se añade como miembros consecutivos del shard
+    actual; al superar max_samples o max_bytes se cierra el shard y se abre el
+    siguiente. Cada miembro se anota en shards.idx.jsonl con su shard, el
+    desplazamiento de sus datos y su tamaño. Un lote reanudado empieza un shard
+    nuevo en lugar de reabrir uno existente.
+    """
+
+    def __init__(self, output_dir, max_samples: int = DEFAULT_SHARD_MAX_SAMPLES,
+                 max_bytes: int = DEFAULT_SHARD_MAX_BYTES):
+        self.output_dir = Path(output_dir)
+        self.max_samples = max(1, int(max_samples))
+        self.max_bytes = max(1, int(max_bytes))
+        self._shard_number = len(list(self.output_dir.glob("shard-*.tar")))
+        self._handle = None
+        self._tar = None
+        self._samples = 0
+        self._index = open(self.output_dir / SHARD_INDEX_FILENAME, 'a', encoding='utf-8')
+        self._dirty = False
+
+    @property
+    def shard_path(self) -> Path:
+        return self.output_dir / SHARD_PATTERN.format(self._shard_number)
+
+    def _open_shard(self):
+        while self.shard_path.exists():
+            self._shard_number += 1
+        self._handle = open(self.shard_path, 'wb')
+        self._tar = tarfile.open(fileobj=self._handle, mode='w', format=tarfile.PAX_FORMAT)
+        self._samples = 0
+
+    def _close_shard(self):
+        if self._tar is None:
+            return
+        self._tar.close()
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+        logger.info(f"Shard cerrado: {self.shard_path} ({self._samples} muestras)")
+        self._tar = None
+        self._handle = None
+        self._shard_number += 1
+
+    def add(self, key: str, members: List[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+        """
+        Añadir una muestra
+
+        Args:
+            key: Clave de la muestra (nombre sin extensión, sin puntos)
+            members: [(extensión, datos)], p. ej. [('png', ...), ('json', ...)]
+
+        Returns:
+            Entradas del índice: member, shard, offset, size
+        """
+        if self._tar is not None and (self._samples >= self.max_samples or self._tar.offset >= self.max_bytes):
+            self._close_shard()
+        if self._tar is None:
+            self._open_shard()
+
+        entries = []
+        mtime = int(time.time())
+        for extension, data in members:
+            info = tarfile.TarInfo(f"{key}.{extension}")
+            info.size = len(data)
+            info.mtime = mtime
+            self._tar.addfile(info, io.BytesIO(data))
+            # Tras addfile, offset apunta al final de los datos rellenados hasta el bloque
+            padded = -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            entries.append({
+                'member': info.name,
+                'shard': self.shard_path.name,
+                'offset': self._tar.offset - padded,
+                'size': len(data)
+            })
+        self._samples += 1
+        for entry in entries:
+            self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._dirty = True
+        return entries
+
+    def sync(self):
+        """fsync del shard actual y del índice"""
+        if not self._dirty:
+            return
+        if self._handle is not None:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+        self._index.flush()
+        os.fsync(self._index.fileno())
+        self._dirty = False
+
+    def close(self):
+        """Cerrar el shard actual (bloques de fin de archivo tar) y el índice"""
+        self.sync()
+        self._close_shard()
+        self._index.close()
+
+
+def read_member(shard_path, offset: int, size: int) -> bytes:
+    """Leer los datos de un miembro a partir de su entrada en el índice"""
+    with open(shard_path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def load_shard_index(output_dir) -> Dict[str, Dict[str, Any]]:
+    """Índice de miembros de un lote empaquetado (tolera una última línea truncada)"""
+    index = {}
+    path = Path(output_dir) / SHARD_INDEX_FILENAME
+    if not path.exists():
+        return index
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            index[entry['member']] = entry
+    return index
+
+
+def iter_samples(output_dir) -> Iterator[Tuple[str, Dict[str, bytes]]]:
+    """
+    Recorrer en streaming las muestras de un lote empaquetado
+
+    Lee los shards en orden de forma secuencial (sin índice), agrupando los
+    miembros consecutivos con la misma clave como hace WebDataset.
+
+    Yields:
+        (clave, {extensión: datos})
+    """
+    for shard_path in sorted(Path(output_dir).glob("shard-*.tar")):
+        key, sample = None, {}
+        with tarfile.open(shard_path, mode='r|') as tar:
+            for info in tar:
+                if not info.isfile():
+                    continue
+                member_key, _, extension = info.name.partition('.')
+                if member_key != key and sample:
+                    yield key, sample
+                    sample = {}
+                key = member_key
+                sample[extension] = tar.extractfile(info).read()
+        if sample:
+            yield key, sample
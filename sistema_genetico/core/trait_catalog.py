@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Catálogo compilado de rasgos
+Carga una sola vez data/diversity_data.json, data/diversity_options.json y las
+tablas fijas de los motores, y las guarda como tuplas de cadenas internadas con
+códigos enteros y máscaras por género y región precalculadas. Todos los motores
+comparten la misma instancia (get_catalog()), así que el bucle de generación ya
+no construye listas ni diccionarios en cada llamada
+"""
+
+import json
+import sys
+import threading
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+# Sobrescritura opcional de diversity_data.json que ya usaba UltraDiversityEngine
+ULTRA_OVERRIDE_FILE = Path(__file__).parent / "ultra_diversity_data.json"
+
+MALE_ALIASES = ('hombre', 'male', 'masculino', 'man')
+FEMALE_ALIASES = ('mujer', 'female', 'femenino', 'woman')
+
+# Tabla de generate_genetic_batch (antes duplicada en cada llamada)
+GENETIC_BATCH_OPTIONS = {
+    'region': ['Caracas', 'Maracaibo', 'Valencia', 'Barquisimeto', 'Maracay', 'Ciudad Guayana', 'Maturín', 'San Cristóbal', 'Cumana', 'Barinas'],
+    'skin_tone': ['fair', 'light', 'medium', 'olive', 'tan', 'brown', 'dark'],
+    'hair_color': ['black', 'dark brown', 'brown', 'light brown', 'blonde', 'red', 'gray', 'white'],
+    'hair_style': ['short', 'medium', 'long', 'curly', 'straight', 'wavy', 'messy', 'neat', 'styled'],
+    'eye_color': ['brown', 'black', 'hazel', 'green', 'blue', 'gray'],
+    'face_shape': ['oval', 'round', 'square', 'heart', 'diamond', 'long'],
+    'nose_shape': ['straight', 'aquiline', 'button', 'wide', 'narrow', 'pointed'],
+    'lip_shape': ['full', 'thin', 'medium', 'wide', 'narrow'],
+    'eye_shape': ['almond', 'round', 'hooded', 'deep-set', 'wide-set'],
+    'jawline': ['defined', 'soft', 'strong', 'weak', 'angular'],
+    'cheekbone': ['prominent', 'high', 'low', 'flat', 'defined'],
+    'eyebrow': ['arched', 'straight', 'thick', 'thin', 'bushy'],
+    'skin_texture': ['smooth', 'rough', 'normal', 'oily', 'dry'],
+    'freckle': ['none', 'light', 'heavy', 'scattered'],
+    'mole': ['none', 'small', 'medium', 'large'],
+    'scar': ['none', 'small', 'medium', 'large'],
+    'acne': ['none', 'light', 'moderate', 'severe'],
+    'wrinkle': ['none', 'light', 'moderate', 'heavy'],
+    'facial_hair': ['none'],
+    'beard': ['none'],
+    'mustache': ['none'],
+    'physical_complexion': ['thin', 'normal', 'athletic', 'muscular', 'overweight', 'obese'],
+    'clothing_type': ['dress_shirt', 'polo_shirt', 't_shirt', 'sweater', 'jacket', 'suit'],
+    'clothing_color': ['blue', 'black', 'gray', 'brown', 'green', 'red', 'navy', 'dark_blue'],
+    'background': ['white_solid'],
+    'makeup': ['no_makeup']
+}
+
+# Opciones que solo aplican a un género (el resto usa la opción neutra de arriba)
+GENETIC_GENDER_OPTIONS = {
+    'facial_hair': {'male': ['none', 'light', 'medium', 'heavy']},
+    'beard': {'male': ['none', 'stubble', 'short', 'medium', 'long']},
+    'mustache': {'male': ['none', 'thin', 'medium', 'thick']},
+    'makeup': {'female': ['no_makeup', 'natural', 'light', 'moderate', 'heavy']}
+}
+
+# Categorías que _get_diversity_value_no_repeat recorre sin repetir; el resto se sortea libremente
+GENETIC_NO_REPEAT = frozenset({
+    'region', 'skin_tone', 'hair_color', 'hair_style', 'eye_color', 'face_shape', 'nose_shape',
+    'lip_shape', 'eye_shape', 'jawline', 'cheekbone', 'eyebrow', 'physical_complexion',
+    'clothing_type', 'clothing_color', 'facial_hair', 'beard', 'mustache'
+})
+
+REGION_BIAS_WEIGHTS = {
+    # Pesos simples para Venezuela por región (aproximados, diversidad multi-étnica)
+    'Caracas': {
+        'skin_tone': {'light': 1, 'medium': 3, 'olive': 2, 'tan': 2, 'brown': 1, 'fair': 1, 'dark': 1},
+        'hair_color': {'black': 3, 'dark brown': 3, 'brown': 2, 'light brown': 1, 'blonde': 1, 'red': 1, 'gray': 1},
+        'eye_color': {'brown': 5, 'black': 2, 'hazel': 2, 'green': 1, 'blue': 1, 'gray': 1},
+    },
+    'Maracaibo': {
+        'skin_tone': {'tan': 3, 'olive': 3, 'medium': 2, 'brown': 2, 'dark': 1, 'light': 1, 'fair': 1},
+        'hair_color': {'black': 4, 'dark brown': 3, 'brown': 2, 'light brown': 1, 'blonde': 1},
+        'eye_color': {'brown': 6, 'black': 2, 'hazel': 2},
+    },
+    'Valencia': {
+        'skin_tone': {'light': 2, 'medium': 3, 'olive': 2, 'tan': 2, 'fair': 1, 'brown': 1},
+        'hair_color': {'black': 3, 'dark brown': 3, 'brown': 2, 'light brown': 2, 'blonde': 1},
+        'eye_color': {'brown': 5, 'hazel': 2, 'green': 1, 'black': 1},
+    },
+    'Ciudad Guayana': {
+        'skin_tone': {'olive': 3, 'tan': 3, 'medium': 2, 'brown': 2, 'dark': 1, 'light': 1},
+        'hair_color': {'black': 4, 'dark brown': 3, 'brown': 2},
+        'eye_color': {'brown': 6, 'black': 2, 'hazel': 2},
+    },
+    'Maturín': {
+        'skin_tone': {'medium': 3, 'olive': 2, 'tan': 2, 'light': 1, 'fair': 1, 'brown': 1},
+        'hair_color': {'black': 3, 'dark brown': 3, 'brown': 2, 'light brown': 1},
+        'eye_color': {'brown': 5, 'hazel': 2, 'black': 2},
+    },
+    'Barinas': {
+        'skin_tone': {'light': 2, 'medium': 3, 'olive': 2, 'tan': 2, 'fair': 1},
+        'hair_color': {'dark brown': 3, 'brown': 3, 'black': 2, 'light brown': 2},
+        'eye_color': {'brown': 5, 'hazel': 2},
+    },
+    'Barquisimeto': {
+        'skin_tone': {'light': 2, 'medium': 3, 'olive': 2, 'tan': 2},
+        'hair_color': {'dark brown': 3, 'brown': 3, 'black': 2},
+        'eye_color': {'brown': 5, 'hazel': 2},
+    },
+    'Maracay': {
+        'skin_tone': {'light': 2, 'medium': 3, 'olive': 2, 'tan': 2},
+        'hair_color': {'dark brown': 3, 'brown': 3, 'black': 2},
+        'eye_color': {'brown': 5, 'hazel': 2},
+    },
+    'San Cristóbal': {
+        'skin_tone': {'fair': 2, 'light': 2, 'medium': 3, 'olive': 2},
+        'hair_color': {'brown': 3, 'dark brown': 3, 'black': 2, 'light brown': 2},
+        'eye_color': {'brown': 4, 'hazel': 2, 'green': 1},
+    },
+    'Cumana': {
+        'skin_tone': {'light': 2, 'medium': 3, 'olive': 2, 'tan': 2},
+        'hair_color': {'dark brown': 3, 'brown': 3, 'black': 2},
+        'eye_color': {'brown': 5, 'hazel': 2},
+    },
+}
+
+# Rasgos realistas por género de UltraDiversityEngine
+GENDER_FEATURES = {
+    'male': {
+        'face_shapes': ['square', 'rectangular', 'oval', 'round', 'triangular', 'diamond', 'heart', 'long', 'broad', 'angular', 'strong', 'masculine', 'chiseled', 'defined', 'wide'],
+        'jawline_types': ['strong', 'angular', 'square', 'prominent', 'chiseled', 'masculine', 'defined', 'broad', 'wide', 'solid', 'firm', 'robust'],
+        'cheekbone_types': ['high', 'prominent', 'sharp', 'angular', 'strong', 'defined', 'pronounced', 'visible', 'noticeable'],
+        'eyebrow_shapes': ['thick', 'bushy', 'strong', 'defined', 'masculine', 'heavy', 'dense', 'natural', 'full'],
+        'lip_shapes': ['thin', 'narrow', 'small', 'defined', 'masculine', 'firm', 'straight', 'medium'],
+        'eye_shapes': ['deep-set', 'intense', 'piercing', 'alert', 'strong', 'masculine', 'narrow', 'small', 'almond', 'round', 'hooded'],
+        'skin_textures': ['normal', 'rough', 'textured', 'weathered', 'aged', 'mature', 'firm', 'thick'],
+        'beauty_levels': ['handsome', 'attractive', 'good-looking', 'masculine', 'strong', 'rugged', 'manly', 'virile', 'average', 'normal'],
+        'hair_styles': ['short', 'buzz cut', 'crew cut', 'fade', 'undercut', 'mohawk', 'military', 'business', 'classic', 'traditional', 'side part', 'comb over', 'slicked back', 'quiff', 'pompadour', 'flat top', 'high and tight', 'ivy league', 'textured crop', 'messy', 'spiky', 'natural', 'casual'],
+        'hair_lengths': ['short', 'very short', 'buzz cut', 'crew cut', 'medium short', 'medium', 'long short']
+    },
+    'female': {
+        'face_shapes': ['oval', 'round', 'heart', 'diamond', 'pear', 'square', 'long', 'soft', 'delicate', 'feminine', 'elegant'],
+        'jawline_types': ['soft', 'delicate', 'feminine', 'smooth', 'gentle', 'rounded', 'oval'],
+        'cheekbone_types': ['soft', 'delicate', 'subtle', 'gentle', 'smooth', 'rounded'],
+        'eyebrow_shapes': ['thin', 'defined', 'shaped', 'arched', 'natural', 'groomed', 'elegant'],
+        'lip_shapes': ['full', 'plump', 'voluptuous', 'sensual', 'charming', 'shapely', 'defined', 'medium'],
+        'eye_shapes': ['almond', 'round', 'large', 'expressive', 'gentle', 'beautiful', 'elegant', 'doll-like'],
+        'skin_textures': ['smooth', 'soft', 'delicate', 'youthful', 'glowing', 'radiant', 'dewy', 'fresh'],
+        'beauty_levels': ['beautiful', 'attractive', 'pretty', 'elegant', 'charming', 'lovely', 'stunning', 'gorgeous'],
+        'hair_styles': ['long', 'medium', 'layered', 'textured', 'voluminous', 'sleek', 'styled', 'natural', 'professional', 'casual', 'elegant', 'chic'],
+        'hair_lengths': ['long', 'very long', 'shoulder length', 'medium long', 'medium', 'short', 'chin length']
+    }
+}
+
+# Opciones básicas que se añaden cuando el filtrado deja menos de 5
+GENDER_BASIC_FEATURES = {
+    'male': {
+        'face_shapes': ['square', 'oval', 'round', 'rectangular'],
+        'jawline_types': ['strong', 'angular', 'square', 'prominent'],
+        'cheekbone_types': ['high', 'prominent', 'sharp', 'angular'],
+        'eyebrow_shapes': ['thick', 'bushy', 'strong', 'natural'],
+        'lip_shapes': ['thin', 'narrow', 'medium', 'firm'],
+        'eye_shapes': ['deep-set', 'almond', 'round', 'hooded'],
+        'skin_textures': ['normal', 'rough', 'textured', 'firm'],
+        'beauty_levels': ['handsome', 'attractive', 'average', 'normal'],
+        'hair_styles': ['short', 'buzz cut', 'crew cut', 'fade', 'natural'],
+        'hair_lengths': ['short', 'very short', 'medium short', 'medium']
+    },
+    'female': {
+        'face_shapes': ['oval', 'round', 'heart', 'diamond'],
+        'jawline_types': ['soft', 'delicate', 'feminine', 'smooth'],
+        'cheekbone_types': ['soft', 'delicate', 'subtle', 'gentle'],
+        'eyebrow_shapes': ['thin', 'defined', 'arched', 'natural'],
+        'lip_shapes': ['full', 'medium', 'defined', 'shapely'],
+        'eye_shapes': ['almond', 'round', 'large', 'expressive'],
+        'skin_textures': ['smooth', 'soft', 'delicate', 'fresh'],
+        'beauty_levels': ['beautiful', 'attractive', 'pretty', 'elegant'],
+        'hair_styles': ['long', 'medium', 'layered', 'natural'],
+        'hair_lengths': ['long', 'medium long', 'medium', 'shoulder length']
+    }
+}
+
+# Datos de DirectGeneticGenerator
+DIRECT_GENERATOR_OPTIONS = {
+    'beauty_levels': ['muy bajo', 'bajo', 'medio', 'alto', 'muy alto', 'extraordinario', 'único', 'distintivo', 'excepcional', 'sobresaliente', 'notable', 'especial', 'raro', 'incomparable', 'irrepetible', 'singular', 'extraordinario', 'soberbio', 'magnífico', 'excelente'],
+    'skin_tones': ['muy claro', 'claro', 'medio claro', 'medio', 'medio oscuro', 'oscuro', 'muy oscuro', 'café', 'canela', 'miel', 'bronce', 'oliva', 'dorado', 'caramelo', 'chocolate', 'ébanos', 'crema', 'marfil', 'beige', 'tostado', 'cobrizo', 'rojizo', 'amarillento', 'verdoso', 'azulado', 'rosado', 'grisáceo', 'pálido', 'moreno', 'trigueño'],
+    'hair_colors': ['negro', 'marrón oscuro', 'marrón', 'marrón claro', 'castaño', 'rubio oscuro', 'rubio', 'rubio claro', 'rojo', 'pelirrojo', 'gris', 'blanco', 'sal y pimienta', 'mezclado', 'auburn', 'cobre', 'bronce', 'dorado', 'plateado', 'champagne', 'miel', 'caramelo', 'chocolate', 'ébanos', 'azabache', 'caoba', 'castaño claro', 'rubio ceniza', 'rubio miel', 'rubio platino', 'rojo cobrizo', 'rojo intenso', 'rojo auburn', 'gris plata', 'gris sal', 'blanco nieve', 'blanco perla'],
+    'eye_colors': ['marrón oscuro', 'marrón', 'marrón claro', 'avellana', 'verde', 'azul', 'gris', 'verde azulado', 'azul gris', 'ámbar', 'dorado', 'violeta', 'miel', 'café', 'esmeralda', 'azul marino', 'verde esmeralda', 'azul cielo', 'gris azulado', 'marrón chocolate', 'marrón caramelo', 'verde oliva', 'verde jade', 'azul acero', 'azul turquesa', 'gris perla', 'gris acero', 'ámbar dorado', 'violeta intenso', 'verde menta', 'azul profundo', 'marrón tostado', 'verde bosque', 'azul eléctrico', 'gris plata', 'miel clara', 'café oscuro'],
+    'backgrounds': ['estudio', 'exterior', 'interior', 'urbano', 'natural', 'profesional', 'oficina', 'casa', 'parque', 'playa', 'montaña', 'ciudad', 'campo', 'universidad', 'hospital', 'trabajo', 'biblioteca', 'café', 'restaurante', 'hotel', 'aeropuerto', 'estación', 'centro comercial', 'museo', 'teatro', 'iglesia', 'escuela', 'gimnasio', 'club', 'residencia', 'apartamento', 'casa de campo', 'chalet', 'loft', 'estudio fotográfico'],
+    'face_shapes': ['oval', 'redondo', 'cuadrado', 'corazón', 'diamante', 'triangular', 'rectangular', 'alargado', 'ancho', 'estrecho', 'angular', 'suave', 'definido', 'simétrico', 'asimétrico', 'ovalado', 'redondeado', 'cuadrangular', 'triangular invertido', 'diamante invertido', 'rectangular alargado', 'ovalado alargado', 'redondo ancho', 'cuadrado ancho', 'triangular estrecho', 'diamante estrecho', 'rectangular estrecho', 'ovalado estrecho'],
+    'nose_shapes': ['pequeño', 'mediano', 'grande', 'ancho', 'estrecho', 'recto', 'aguileño', 'botón', 'prominente', 'delicado', 'fuerte', 'refinado', 'clásico', 'distintivo', 'elegante', 'robusto', 'pequeño delicado', 'mediano clásico', 'grande prominente', 'ancho robusto', 'estrecho refinado', 'recto clásico', 'aguileño distintivo', 'botón elegante', 'prominente fuerte', 'delicado refinado', 'fuerte robusto', 'refinado elegante', 'clásico distintivo', 'distintivo elegante'],
+    'lip_shapes': ['delgados', 'medianos', 'gruesos', 'asimétricos', 'simétricos', 'arqueados', 'rectos', 'redondeados', 'puntiagudos', 'suaves', 'definidos', 'naturales', 'voluptuosos', 'finos', 'generosos', 'delgados finos', 'medianos naturales', 'gruesos voluptuosos', 'asimétricos definidos', 'simétricos suaves', 'arqueados redondeados', 'rectos puntiagudos', 'redondeados suaves', 'puntiagudos definidos', 'suaves naturales', 'definidos voluptuosos', 'naturales generosos', 'voluptuosos finos', 'finos delgados', 'generosos gruesos'],
+    'eye_shapes': ['almendrados', 'redondos', 'estrechos', 'grandes', 'pequeños', 'hondos', 'salientes', 'inclinados', 'horizontales', 'verticales', 'asymétricos', 'simétricos', 'expresivos', 'serenos', 'intensos', 'almendrados expresivos', 'redondos serenos', 'estrechos intensos', 'grandes horizontales', 'pequeños verticales', 'hondos inclinados', 'salientes asimétricos', 'inclinados simétricos', 'horizontales expresivos', 'verticales serenos', 'asimétricos intensos', 'simétricos expresivos', 'expresivos serenos', 'serenos intensos', 'intensos almendrados'],
+    'jawlines': ['suave', 'definido', 'cuadrado', 'puntiagudo', 'redondeado', 'angular', 'recto', 'inclinado', 'prominente', 'delicado', 'fuerte', 'elegante', 'robusto', 'refinado', 'distintivo', 'suave delicado', 'definido fuerte', 'cuadrado angular', 'puntiagudo recto', 'redondeado inclinado', 'angular prominente', 'recto elegante', 'inclinado robusto', 'prominente refinado', 'delicado distintivo', 'fuerte suave', 'elegante definido', 'robusto cuadrado', 'refinado puntiagudo', 'distintivo redondeado'],
+    'cheekbones': ['bajos', 'medios', 'altos', 'prominentes', 'suaves', 'definidos', 'angulares', 'redondeados', 'delicados', 'fuertes', 'elegantes', 'robustos', 'refinados', 'distintivos', 'naturales', 'bajos suaves', 'medios definidos', 'altos angulares', 'prominentes redondeados', 'suaves delicados', 'definidos fuertes', 'angulares elegantes', 'redondeados robustos', 'delicados refinados', 'fuertes distintivos', 'elegantes naturales', 'robustos bajos', 'refinados medios', 'distintivos altos', 'naturales prominentes'],
+    'eyebrows': ['delgadas', 'medianas', 'gruesas', 'arqueadas', 'rectas', 'redondeadas', 'angulares', 'suaves', 'definidas', 'naturales', 'expresivas', 'serenas', 'intensas', 'elegantes', 'distintivas', 'delgadas arqueadas', 'medianas rectas', 'gruesas redondeadas', 'arqueadas angulares', 'rectas suaves', 'redondeadas definidas', 'angulares naturales', 'suaves expresivas', 'definidas serenas', 'naturales intensas', 'expresivas elegantes', 'serenas distintivas', 'intensas delgadas', 'elegantes medianas', 'distintivas gruesas'],
+    'skin_textures': ['suave', 'rugosa', 'porosa', 'mixta', 'seca', 'grasa', 'normal', 'sensible', 'madura', 'joven', 'natural', 'cuidada', 'descuidada', 'lisa', 'texturizada', 'suave natural', 'rugosa texturizada', 'porosa mixta', 'mixta normal', 'seca sensible', 'grasa madura', 'normal joven', 'sensible cuidada', 'madura descuidada', 'joven lisa', 'natural suave', 'cuidada rugosa', 'descuidada porosa', 'lisa mixta', 'texturizada seca'],
+    'freckles': ['ninguno', 'pocos', 'moderados', 'muchos', 'leves', 'intensos', 'dispersos', 'concentrados', 'naturales', 'artificiales', 'suaves', 'definidos', 'tenues', 'prominentes', 'distintivos', 'ninguno natural', 'pocos leves', 'moderados intensos', 'muchos dispersos', 'leves concentrados', 'intensos naturales', 'dispersos artificiales', 'concentrados suaves', 'naturales definidos', 'artificiales tenues', 'suaves prominentes', 'definidos distintivos', 'tenues ninguno', 'prominentes pocos', 'distintivos moderados'],
+    'moles': ['ninguno', 'pocos', 'moderados', 'muchos', 'pequeños', 'grandes', 'dispersos', 'concentrados', 'naturales', 'artificiales', 'suaves', 'definidos', 'tenues', 'prominentes', 'distintivos', 'ninguno natural', 'pocos pequeños', 'moderados grandes', 'muchos dispersos', 'pequeños concentrados', 'grandes naturales', 'dispersos artificiales', 'concentrados suaves', 'naturales definidos', 'artificiales tenues', 'suaves prominentes', 'definidos distintivos', 'tenues ninguno', 'prominentes pocos', 'distintivos moderados'],
+    'scars': ['ninguno', 'pequeños', 'medianos', 'grandes', 'leves', 'intensos', 'dispersos', 'concentrados', 'naturales', 'artificiales', 'suaves', 'definidos', 'tenues', 'prominentes', 'distintivos', 'ninguno natural', 'pequeños leves', 'medianos intensos', 'grandes dispersos', 'leves concentrados', 'intensos naturales', 'dispersos artificiales', 'concentrados suaves', 'naturales definidos', 'artificiales tenues', 'suaves prominentes', 'definidos distintivos', 'tenues ninguno', 'prominentes pequeños', 'distintivos medianos'],
+    'acne': ['ninguno', 'leve', 'moderado', 'severo', 'ocasional', 'crónico', 'disperso', 'concentrado', 'natural', 'artificial', 'suave', 'intenso', 'tenue', 'prominente', 'distintivo', 'ninguno natural', 'leve ocasional', 'moderado crónico', 'severo disperso', 'ocasional concentrado', 'crónico natural', 'disperso artificial', 'concentrado suave', 'natural intenso', 'artificial tenue', 'suave prominente', 'intenso distintivo', 'tenue ninguno', 'prominente leve', 'distintivo moderado'],
+    'wrinkles': ['ninguno', 'leves', 'moderados', 'profundos', 'naturales', 'artificiales', 'dispersos', 'concentrados', 'suaves', 'intensos', 'tenues', 'prominentes', 'distintivos', 'expresivos', 'serenos', 'ninguno natural', 'leves artificiales', 'moderados dispersos', 'profundos concentrados', 'naturales suaves', 'artificiales intensos', 'dispersos tenues', 'concentrados prominentes', 'suaves distintivos', 'intensos expresivos', 'tenues serenos', 'prominentes ninguno', 'distintivos leves', 'expresivos moderados', 'serenos profundos'],
+    'hair_styles': ['corto', 'mediano', 'largo', 'ondulado', 'rizado', 'liso', 'recogido', 'suelto', 'peinado', 'despeinado', 'elegante', 'casual', 'formal', 'informal', 'distintivo', 'natural', 'artificial', 'moderno', 'clásico', 'vintage', 'corto peinado', 'mediano ondulado', 'largo rizado', 'ondulado liso', 'rizado recogido', 'liso suelto', 'recogido peinado', 'suelto despeinado', 'peinado elegante', 'despeinado casual', 'elegante formal', 'casual informal', 'formal distintivo', 'informal natural', 'distintivo artificial', 'natural moderno', 'artificial clásico', 'moderno vintage', 'clásico corto', 'vintage mediano']
+}
+
+
+def gender_key(gender: Any) -> Optional[str]:
+    """Normalizar un género ('hombre', 'Female'...) a 'male', 'female' o None"""
+    if not hasattr(gender, 'lower'):
+        return None
+    gender = gender.lower()
+    if gender in MALE_ALIASES:
+        return 'male'
+    if gender in FEMALE_ALIASES:
+        return 'female'
+    return None
+
+
+def filter_gender_features(gender: str, category: str, values: Iterable[str]) -> list:
+    """
+    Filtrar rasgos realistas para un género ('male' o 'female')
+
+    Se quedan solo los valores presentes en GENDER_FEATURES y, si quedan menos
+    de 5, se añaden las opciones básicas de GENDER_BASIC_FEATURES.
+    """
+    values = list(values)
+    features = GENDER_FEATURES.get(gender, {})
+    if category not in features:
+        return values
+    filtered = [value for value in values if value in features[category]]
+    if len(filtered) < 5:
+        filtered.extend(GENDER_BASIC_FEATURES[gender].get(category, []))
+    return filtered
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class TraitCategory:
+    """
+    Categoría compilada
+
+    values es el vocabulario (cadenas internadas, sin duplicados) y codes su
+    inverso. Cada máscara es la tupla de códigos de un conjunto de opciones
+    (None = todas, 'male'/'female' = filtradas por género); los duplicados de la
+    lista original se conservan porque cuentan como multiplicidad al sortear.
+    """
+
+    __slots__ = ('name', 'values', 'codes', 'masks', '_options')
+
+    def __init__(self, name: str, options: Iterable[str], gender_options: Optional[Dict[str, Iterable[str]]] = None):
+        self.name = sys.intern(name)
+        self.codes: Dict[str, int] = {}
+        self.masks: Dict[Optional[str], Tuple[int, ...]] = {None: self._encode(options)}
+        for key, values in (gender_options or {}).items():
+            self.masks[key] = self._encode(values)
+        self.values = tuple(self.codes)
+        self._options = {key: tuple(self.values[code] for code in mask) for key, mask in self.masks.items()}
+
+    def _encode(self, values: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self.codes.setdefault(_intern(value), len(self.codes)) for value in values)
+
+    def options(self, gender: Any = None) -> tuple:
+        """Opciones (tupla compartida, no modificar) para un género"""
+        return self._options.get(gender_key(gender), self._options[None])
+
+    def mask(self, gender: Any = None) -> Tuple[int, ...]:
+        """Códigos de las opciones de un género"""
+        return self.masks.get(gender_key(gender), self.masks[None])
+
+    def code(self, value: str) -> int:
+        return self.codes.get(value, -1)
+
+    def decode(self, code: int) -> str:
+        return self.values[code]
+
+    def __contains__(self, value) -> bool:
+        return value in self.codes
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class TraitCatalog:
+    """
+    Catálogo compartido de rasgos, organizado por espacios de nombres:
+
+    - 'ultra': diversity_data.json (+ ultra_diversity_data.json) para UltraDiversityEngine
+    - 'options': diversity_options.json (controles de la interfaz)
+    - 'genetic': tabla de generate_genetic_batch
+    - 'direct': tabla de DirectGeneticGenerator
+    """
+
+    def __init__(self, data_dir=None):
+        self.data_dir = Path(data_dir) if data_dir else DATA_DIR
+        self._namespaces: Dict[str, Dict[str, TraitCategory]] = {}
+        self._views: Dict[str, Dict[str, tuple]] = {}
+
+        self._compile('ultra', self._load_ultra_data(), gender_filter=True)
+        self._compile('options', self._load_json(self.data_dir / "diversity_options.json"))
+        self._compile('genetic', GENETIC_BATCH_OPTIONS, GENETIC_GENDER_OPTIONS)
+        self._compile('direct', DIRECT_GENERATOR_OPTIONS)
+
+        # Pesos regionales precalculados: (región, categoría) -> (valores, pesos)
+        self._region_weights: Dict[Tuple[str, str], Tuple[tuple, tuple]] = {}
+        for region, categories in REGION_BIAS_WEIGHTS.items():
+            for category, weights in categories.items():
+                positive = [(_intern(value), weight) for value, weight in weights.items() if weight > 0]
+                if positive:
+                    values, region_weights = zip(*positive)
+                    self._region_weights[(region, category)] = (values, region_weights)
+
+    def _load_json(self, path: Path) -> Dict[str, Any]:
+        try:
+            if path.exists():
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.warning(f"No se pudo cargar {path.name}: {e}")
+        return {}
+
+    def _load_ultra_data(self) -> Dict[str, Any]:
+        data = self._load_json(self.data_dir / "diversity_data.json")
+        data.update(self._load_json(ULTRA_OVERRIDE_FILE))
+        return data
+
+    def _compile(self, namespace: str, data: Dict[str, Any],
+                 gender_options: Optional[Dict[str, Dict[str, list]]] = None, gender_filter: bool = False):
+        categories = {}
+        for name, values in data.items():
+            if not isinstance(values, list):
+                continue
+            per_gender = dict((gender_options or {}).get(name, {}))
+            if gender_filter and name in GENDER_FEATURES['male']:
+                for gender in ('male', 'female'):
+                    per_gender[gender] = filter_gender_features(gender, name, values)
+            categories[sys.intern(name)] = TraitCategory(name, values, per_gender)
+        self._namespaces[namespace] = categories
+        self._views[namespace] = {name: category.options() for name, category in categories.items()}
+
+    def namespace(self, namespace: str) -> Dict[str, tuple]:
+        """Vista categoría -> opciones (tuplas compartidas) de un espacio de nombres"""
+        return self._views.get(namespace, {})
+
+    def category(self, namespace: str, name: str) -> Optional[TraitCategory]:
+        return self._namespaces.get(namespace, {}).get(name)
+
+    def options(self, namespace: str, name: str, gender: Any = None) -> tuple:
+        """Opciones de una categoría para un género (tupla vacía si no existe)"""
+        category = self.category(namespace, name)
+        return category.options(gender) if category is not None else ()
+
+    def contains(self, namespace: str, name: str, value: Any) -> bool:
+        category = self.category(namespace, name)
+        return category is not None and value in category
+
+    def region_weights(self, region: str, name: str) -> Optional[Tuple[tuple, tuple]]:
+        """(valores, pesos) con sesgo regional para una categoría, o None"""
+        return self._region_weights.get((region, name))
+
+
+_catalog: Optional[TraitCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> TraitCatalog:
+    """Catálogo compartido del proceso (se compila en el primer uso)"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = TraitCatalog()
+                logger.info(
+                    "Catálogo de rasgos compilado: "
+                    + ", ".join(f"{name}={len(view)}" for name, view in _catalog._views.items())
+                )
+    return _catalog
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Índice global de combinaciones de rasgos
+Guarda el hash de cada vector completo de rasgos emitido (en todos los lotes)
+para que el muestreador de perfiles no repita una combinación ya usada. Un
+filtro de Bloom en memoria descarta casi todas las consultas sin tocar disco;
+solo sus positivos (combinaciones usadas o falsos positivos, ~0.1%) se
+confirman contra el conjunto exacto en outputs/.trait_vectors.sqlite3
+
+Una combinación solo se escribe en disco cuando su imagen está guardada
+(commit); hasta entonces es una reserva en memoria que release() devuelve si
+el lote se cancela o falla, así que un trabajo abandonado no gasta
+combinaciones para siempre
+"""
+
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from output_catalog import INTERNAL_PREFIXES
+
+logger = logging.getLogger(__name__)
+
+TRAIT_INDEX_FILENAME = INTERNAL_PREFIXES[2]
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_ERROR_RATE = 0.001
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trait_vectors (
+    digest BLOB PRIMARY KEY,
+    run_seed INTEGER,
+    profile_index INTEGER,
+    added REAL
+) WITHOUT ROWID;
+"""
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre digests de 16 bytes (doble hashing de sus dos mitades)"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes):
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:16], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, digest: bytes):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+def vector_digest(traits: Dict[str, Any]) -> bytes:
+    """Hash de un vector de rasgos (independiente del orden de las claves)"""
+    canonical = "\x1f".join(f"{name}={traits[name]}" for name in sorted(traits))
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).digest()
+
+
+def trait_vector(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Vector de rasgos de un perfil de generate_genetic_batch
+
+    Nacionalidad, género y los rasgos escalares de ethnic_characteristics (la
+    edad no cuenta: dos perfiles que solo difieren en la edad se consideran la
+    misma combinación).
+    """
+    vector = {
+        name: value for name, value in profile.get('ethnic_characteristics', {}).items()
+        if isinstance(value, (str, int, float))
+    }
+    metadata = profile.get('metadata', {})
+    vector['nationality'] = metadata.get('nationality')
+    vector['gender'] = metadata.get('gender')
+    return vector
+
+
+class TraitVectorIndex:
+    """
+    Conjunto persistente de combinaciones de rasgos ya emitidas
+
+    reserve() comprueba y reserva en una sola operación (seguro entre hilos);
+    la reserva vive en memoria (la ven los demás lotes del proceso) hasta que
+    commit() la escribe al guardarse la imagen o release() la libera. Cada
+    entrada recuerda (run_seed, profile_index), así que al reanudar un lote
+    sus propios perfiles no cuentan como repetidos.
+    """
+
+    def __init__(self, outputs_dir, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE):
+        self.outputs_dir = Path(outputs_dir).resolve()
+        self.outputs_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.outputs_dir / TRAIT_INDEX_FILENAME
+        self.error_rate = error_rate
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._pending: Dict[bytes, Tuple[Optional[int], Optional[int]]] = {}
+        self._stats = {'checked': 0, 'bloom_hits': 0, 'collisions': 0, 'reserved': 0, 'committed': 0, 'released': 0}
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        self._load(capacity)
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _load(self, capacity: int):
+        """Construir el filtro de Bloom con todo el conjunto (con holgura para crecer)"""
+        start_time = time.time()
+        with self._connect() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM trait_vectors").fetchone()[0]
+            self.bloom = BloomFilter(max(capacity, total * 2), self.error_rate)
+            for (digest,) in conn.execute("SELECT digest FROM trait_vectors"):
+                self.bloom.add(digest)
+        for digest in self._pending:
+            self.bloom.add(digest)
+        if total:
+            self.logger.info(f"Índice de combinaciones cargado: {total} vectores en {time.time() - start_time:.1f}s")
+
+    def __len__(self) -> int:
+        return self.bloom.count
+
+    def _owner(self, digest: bytes) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """(run_seed, profile_index) que usó o tiene reservada la combinación, o None si está libre"""
+        if digest in self._pending:
+            return self._pending[digest]
+        with self._connect() as conn:
+            row = conn.execute("SELECT run_seed, profile_index FROM trait_vectors WHERE digest = ?",
+                               (digest,)).fetchone()
+        return tuple(row) if row else None
+
+    def reserve(self, traits: Dict[str, Any], run_seed: Optional[int] = None,
+                profile_index: Optional[int] = None) -> bool:
+        """
+        Reservar una combinación de rasgos
+
+        Args:
+            traits: Vector de rasgos ({categoría: valor})
+            run_seed: Semilla del lote que la emite
+            profile_index: Índice del perfil en el lote
+
+        Returns:
+            True si estaba libre (o ya era de este mismo perfil), False si se
+            usó antes y hay que sortear otra
+        """
+        digest = vector_digest(traits)
+        owner = (run_seed, profile_index)
+        with self._lock:
+            self._stats['checked'] += 1
+            if digest in self.bloom:
+                self._stats['bloom_hits'] += 1
+                used_by = self._owner(digest)
+                if used_by is not None:
+                    if used_by == owner and run_seed is not None:
+                        return True
+                    self._stats['collisions'] += 1
+                    return False
+            self._pending[digest] = owner
+            self.bloom.add(digest)
+            self._stats['reserved'] += 1
+            if self.bloom.count > self.bloom.capacity:
+                # Mantener la tasa de falsos positivos: reconstruir con el doble de capacidad
+                self._load(self.bloom.capacity * 2)
+        return True
+
+    def commit(self, traits: Dict[str, Any], run_seed: Optional[int] = None,
+               profile_index: Optional[int] = None):
+        """Marcar como usada para siempre una combinación cuya imagen ya está en disco"""
+        digest = vector_digest(traits)
+        with self._lock:
+            self._pending.pop(digest, None)
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO trait_vectors (digest, run_seed, profile_index, added) VALUES (?, ?, ?, ?)",
+                    (digest, run_seed, profile_index, time.time())
+                )
+            if digest not in self.bloom:
+                self.bloom.add(digest)
+            self._stats['committed'] += 1
+
+    def release(self, run_seed: Optional[int]) -> int:
+        """
+        Liberar las reservas de un lote que no llegaron a guardarse
+
+        El filtro de Bloom no admite borrados: la combinación liberada queda
+        como un falso positivo más, que _owner() resuelve como libre.
+
+        Returns:
+            Número de reservas liberadas
+        """
+        with self._lock:
+            released = [digest for digest, owner in self._pending.items() if owner[0] == run_seed]
+            for digest in released:
+                del self._pending[digest]
+            self._stats['released'] += len(released)
+        return len(released)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['indexed'] = len(self)
+        return stats
+
+
+_indexes: Dict[Path, TraitVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_trait_index(outputs_dir) -> TraitVectorIndex:
+    """Índice compartido por directorio de salida (el filtro se construye una vez por proceso)"""
+    key = Path(outputs_dir).resolve()
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = TraitVectorIndex(key)
+        return _indexes[key]
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Etapa de validación SAIME en línea
+Cada imagen decodificada se valida en memoria (sin releerla de disco) en un pool
+de procesos antes de guardarse; si no cumple se regenera con otra semilla hasta
+agotar el presupuesto de reintentos. Lleva la tasa de aprobación de cada regla
+para saber qué comprobación hace fallar al lote
+"""
+
+import threading
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from run_rng import RunRandom
+from saime_validator import SAIMEValidationResult, SAIMEValidator, _init_worker, _validate_bytes_in_worker
+
+logger = logging.getLogger(__name__)
+
+# Reglas de SAIMEValidator (claves de compliance_details)
+SAIME_RULES = ('dimensions', 'aspect_ratio', 'background', 'face_detection', 'eye_position', 'shoulder_position')
+
+
+class InlineValidationStage:
+    """
+    Validación con regeneración para los motores de generación
+
+    run() es seguro entre hilos: los hilos de petición del pipeline validan y
+    regeneran en paralelo mientras el pool de procesos hace el trabajo de OpenCV.
+    """
+
+    def __init__(self, run_seed: int = 0, max_retries: int = 2, workers: int = 2,
+                 rules: Optional[List[str]] = None):
+        """
+        Args:
+            run_seed: Semilla del lote (las semillas de regeneración se derivan de ella)
+            max_retries: Regeneraciones por imagen antes de descartarla
+            workers: Procesos de validación (0 = en el hilo que llama)
+            rules: Reglas que deben cumplirse (None = resultado global is_valid)
+        """
+        self.run_rng = RunRandom(run_seed)
+        self.max_retries = max(0, int(max_retries))
+        self.rules = [rule for rule in rules if rule in SAIME_RULES] if rules else None
+        self.validator = SAIMEValidator()
+        self._executor = None
+        if workers and workers > 0:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                     initargs=(self.validator.saime_specs,))
+            except Exception as e:
+                logger.warning(f"No se pudo crear el pool de validación, se valida en el hilo: {e}")
+        self._lock = threading.Lock()
+        self._stats = {'validated': 0, 'accepted': 0, 'regenerated': 0, 'rejected': 0,
+                       'validation_seconds': 0.0}
+        self._rule_counts = {rule: [0, 0] for rule in SAIME_RULES}  # [aprobadas, evaluadas]
+
+    def validate(self, image_data: bytes) -> SAIMEValidationResult:
+        """Validar una imagen en memoria (en el pool si existe)"""
+        start_time = time.time()
+        result = None
+        if self._executor is not None:
+            try:
+                result = self._executor.submit(_validate_bytes_in_worker, image_data).result()
+            except Exception as e:
+                logger.warning(f"Error en el pool de validación, se valida en el hilo: {e}")
+        if result is None:
+            result = self.validator.validate_bytes(image_data)
+        self._record(result, time.time() - start_time)
+        return result
+
+    def _record(self, result: SAIMEValidationResult, seconds: float):
+        with self._lock:
+            self._stats['validated'] += 1
+            self._stats['validation_seconds'] += seconds
+            for rule, details in result.compliance_details.items():
+                if rule in self._rule_counts:
+                    self._rule_counts[rule][0] += int(bool(details.get('valid', False)))
+                    self._rule_counts[rule][1] += 1
+
+    def failed_rules(self, result: SAIMEValidationResult) -> List[str]:
+        """Reglas exigidas que no se cumplen"""
+        if not result.compliance_details:
+            return list(self.rules or SAIME_RULES)
+        return [rule for rule, details in result.compliance_details.items()
+                if (self.rules is None or rule in self.rules) and not details.get('valid', False)]
+
+    def passes(self, result: SAIMEValidationResult) -> bool:
+        if self.rules is None:
+            return result.is_valid
+        return not self.failed_rules(result)
+
+    def retry_seed(self, index: int, attempt: int) -> int:
+        """Semilla determinista del reintento attempt (1, 2, ...) de un índice"""
+        return self.run_rng.stream(f'retry{attempt}', index).randint(1, 2**31 - 1)
+
+    def run(self, index: int, image_data: Optional[bytes], regenerate: Callable[[int], Optional[bytes]],
+            seed: Optional[int] = None) -> Tuple[Optional[bytes], Dict[str, Any]]:
+        """
+        Validar una imagen y regenerarla mientras no cumpla
+
+        Args:
+            index: Índice de la imagen en el lote
+            image_data: Primera imagen generada (None si la petición falló)
+            regenerate: Función seed -> bytes que vuelve a generar la imagen
+            seed: Semilla de la primera imagen
+
+        Returns:
+            (bytes de la imagen aceptada o None si se agotaron los reintentos,
+             resumen de la validación para los metadatos)
+        """
+        attempt = 0
+        result = None
+        while True:
+            if image_data is not None:
+                result = self.validate(image_data)
+                if self.passes(result):
+                    with self._lock:
+                        self._stats['accepted'] += 1
+                    return image_data, self._summary(result, attempt, seed, accepted=True)
+            if attempt >= self.max_retries:
+                break
+            attempt += 1
+            seed = self.retry_seed(index, attempt)
+            with self._lock:
+                self._stats['regenerated'] += 1
+            failed = self.failed_rules(result) if result is not None else ['generation']
+            print(f"🔁 Imagen {index + 1} no cumple SAIME ({', '.join(failed)}), regenerando ({attempt}/{self.max_retries})")
+            try:
+                image_data = regenerate(seed)
+            except Exception as e:
+                logger.error(f"Error regenerando imagen {index + 1}: {e}")
+                image_data = None
+
+        with self._lock:
+            self._stats['rejected'] += 1
+        print(f"🚫 Imagen {index + 1} descartada tras {attempt} regeneraciones")
+        summary = self._summary(result, attempt, seed, accepted=False) if result is not None else {
+            'valid': False, 'attempts': attempt + 1, 'seed': seed, 'failed_rules': ['generation']
+        }
+        return None, summary
+
+    def _summary(self, result: SAIMEValidationResult, attempt: int, seed: Optional[int],
+                 accepted: bool) -> Dict[str, Any]:
+        return {
+            'valid': accepted,
+            'score': result.score,
+            'attempts': attempt + 1,
+            'seed': seed,
+            'failed_rules': self.failed_rules(result),
+            'violations': result.violations
+        }
+
+    @staticmethod
+    def annotate(profile: Any, summary: Dict[str, Any], accepted: bool):
+        """Guardar el resumen en el perfil (y la semilla con la que se regeneró la imagen aceptada)"""
+        if not isinstance(profile, dict):
+            return
+        profile['saime_validation'] = summary
+        if accepted and summary['attempts'] > 1 and 'generation_parameters' in profile:
+            profile['generation_parameters']['seed'] = summary['seed']
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del lote y tasa de aprobación por regla"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['rule_pass_rates'] = {
+                rule: round(passed / total, 4) for rule, (passed, total) in self._rule_counts.items() if total
+            }
+        return stats
+
+    def close(self):
+        """Detener el pool y registrar las tasas de aprobación"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        stats = self.stats()
+        logger.info(
+            f"Validación SAIME en línea: {stats['accepted']} aceptadas, {stats['regenerated']} regeneraciones, "
+            f"{stats['rejected']} descartadas; aprobación por regla: {stats['rule_pass_rates']}"
+        )
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Muestreador vectorizado de rasgos para UltraDiversityEngine
+Codifica cada categoría como enteros y sortea todos los rasgos de N perfiles con
+NumPy, conservando la penalización por recencia de _anti_repetition_selection*
+"""
+
+import sys
+import time
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Historial que consulta _anti_repetition_selection* (guarda 15 y filtra contra 14)
+RECENT_WINDOW = 14
+
+# (penalización, refuerzo si se usó una vez, peso mínimo) de cada sistema anti-repetición
+RECENCY_WEIGHTS = {
+    None: (0.01, 20.0, 0.001),
+    'male': (0.005, 50.0, 0.0001),
+    'female': (0.005, 50.0, 0.0001),
+}
+
+
+class RecencyTable:
+    """
+    Familia de categorías con anti-repetición, codificadas como enteros
+
+    Cada categoría puede tener varios conjuntos de opciones (p. ej. arrugas por
+    grupo de edad); en cada paso se elige el conjunto por perfil. Las opciones
+    repetidas en la lista original cuentan como multiplicidad, igual que en
+    random.choices.
+
+    Por cada perfil se resuelven todas las categorías a la vez: se elige de forma
+    uniforme entre las opciones que no están en el historial y, si todas lo
+    están, se pondera por el número de apariciones recientes.
+    """
+
+    def __init__(self, option_sets: Dict[str, List[List[str]]], histories: Optional[Dict[str, List[str]]] = None,
+                 variant: Optional[str] = None, window: int = RECENT_WINDOW):
+        histories = histories or {}
+        self.categories = list(option_sets)
+        self.window = window
+        num_categories = len(self.categories)
+
+        # Vocabulario por categoría: opciones de todos los conjuntos + valores del historial
+        self.vocab = []
+        codes = []
+        for category in self.categories:
+            seen = {}
+            for options in option_sets[category]:
+                for value in options:
+                    seen.setdefault(value, len(seen))
+            for value in histories.get(category, [])[-window:]:
+                seen.setdefault(value, len(seen))
+            codes.append(seen)
+            self.vocab.append(np.array(list(seen), dtype=object))
+
+        max_sets = max(len(option_sets[category]) for category in self.categories)
+        max_options = max(len(vocab) for vocab in self.vocab)
+        self.num_sets = np.array([len(option_sets[category]) for category in self.categories])
+
+        # multiplicity[c, s, k]: veces que la opción k aparece en el conjunto s de la categoría c
+        self.multiplicity = np.zeros((num_categories, max_sets, max_options))
+        for c, category in enumerate(self.categories):
+            for s, options in enumerate(option_sets[category]):
+                for value in options:
+                    self.multiplicity[c, s, codes[c][value]] += 1
+
+        # Historial circular y contador de apariciones dentro de la ventana
+        self.history = np.full((num_categories, window), -1, dtype=np.int64)
+        self.counts = np.zeros((num_categories, max_options), dtype=np.int64)
+        self.position = 0
+        for c, category in enumerate(self.categories):
+            recent = histories.get(category, [])[-window:]
+            for j, value in enumerate(recent):
+                code = codes[c][value]
+                self.history[c, window - len(recent) + j] = code
+                self.counts[c, code] += 1
+
+        # Peso de respaldo según apariciones recientes (solo cuando no queda ninguna libre)
+        penalty, once_boost, min_weight = RECENCY_WEIGHTS[variant]
+        repeats = np.arange(window + 2)
+        fallback = penalty ** repeats.astype(float)
+        fallback[1] *= once_boost
+        self.fallback_weights = np.maximum(fallback, min_weight)
+
+        self._rows = np.arange(num_categories)
+
+    def sample(self, n: int, rng: np.random.Generator, set_index: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Sortear n perfiles
+
+        Args:
+            n: Número de perfiles
+            rng: Generador NumPy
+            set_index: Matriz [n, categorías] con el conjunto de opciones de cada perfil
+
+        Returns:
+            Matriz [n, categorías] de códigos
+        """
+        num_categories = len(self.categories)
+        if set_index is None:
+            set_index = np.zeros((n, num_categories), dtype=np.int64)
+        set_index = np.minimum(set_index, self.num_sets - 1)
+        draws = rng.random((n, num_categories))
+        result = np.empty((n, num_categories), dtype=np.int64)
+
+        for i in range(n):
+            multiplicity = self.multiplicity[self._rows, set_index[i]]
+            free = multiplicity * (self.counts == 0)
+            has_free = free.any(axis=1)
+            weights = np.where(has_free[:, None], free, multiplicity * self.fallback_weights[self.counts])
+
+            cumulative = weights.cumsum(axis=1)
+            targets = draws[i] * cumulative[:, -1]
+            picks = (cumulative <= targets[:, None]).sum(axis=1)
+            picks = np.minimum(picks, multiplicity.shape[1] - 1)
+            result[i] = picks
+
+            # Avanzar el historial circular
+            expired = self.history[:, self.position]
+            valid = expired >= 0
+            self.counts[self._rows[valid], expired[valid]] -= 1
+            self.history[:, self.position] = picks
+            self.counts[self._rows, picks] += 1
+            self.position = (self.position + 1) % self.window
+
+        return result
+
+    def decode(self, codes: np.ndarray) -> Dict[str, List[str]]:
+        """Convertir códigos [n, categorías] a listas de valores por categoría"""
+        return {category: self.vocab[c][codes[:, c]].tolist() for c, category in enumerate(self.categories)}
+
+    def recent_values(self) -> Dict[str, List[str]]:
+        """Historial actual por categoría (de más antiguo a más reciente)"""
+        order = (self.position + np.arange(self.window)) % self.window
+        recent = {}
+        for c, category in enumerate(self.categories):
+            codes = self.history[c, order]
+            recent[category] = self.vocab[c][codes[codes >= 0]].tolist()
+        return recent
+
+
+class UniformTable:
+    """Categorías sin anti-repetición: un único sorteo [n, categorías]"""
+
+    def __init__(self, option_lists: Dict[str, List[str]]):
+        self.categories = list(option_lists)
+        self.options = [np.array(option_lists[category], dtype=object) for category in self.categories]
+        self.sizes = np.array([len(options) for options in self.options])
+
+    def sample(self, n: int, rng: np.random.Generator) -> Dict[str, List[str]]:
+        if not self.categories:
+            return {}
+        codes = (rng.random((n, len(self.categories))) * self.sizes).astype(np.int64)
+        return {category: self.options[c][codes[:, c]].tolist() for c, category in enumerate(self.categories)}
+
+
+def benchmark_sampler(count: int = 1000, gender: str = "mujer") -> Dict[str, float]:
+    """
+    Comparar la generación perfil a perfil con el muestreo por lotes
+
+    Args:
+        count: Número de perfiles por método
+        gender: Género usado en ambos métodos
+
+    Returns:
+        Perfiles por segundo de cada método y la aceleración
+    """
+    from diversity_engine import UltraDiversityEngine, ADVANCED_CONTROL_DEFAULTS
+
+    engine = UltraDiversityEngine()
+
+    start_time = time.perf_counter()
+    for _ in range(count):
+        engine.generate_advanced_genetic_profile(
+            nationality="venezuelan", region="aleatorio", gender=gender, age=30,
+            edad_min=18, edad_max=65, **ADVANCED_CONTROL_DEFAULTS
+        )
+    scalar_elapsed = time.perf_counter() - start_time
+
+    engine.reset_anti_repetition_system()
+    start_time = time.perf_counter()
+    engine.generate_advanced_genetic_profiles_batch(
+        count, nationality="venezuelan", region="aleatorio", gender=gender, age=30,
+        edad_min=18, edad_max=65
+    )
+    batch_elapsed = time.perf_counter() - start_time
+
+    result = {
+        'count': count,
+        'scalar_profiles_per_sec': count / scalar_elapsed if scalar_elapsed > 0 else 0.0,
+        'batch_profiles_per_sec': count / batch_elapsed if batch_elapsed > 0 else 0.0,
+        'speedup': scalar_elapsed / batch_elapsed if batch_elapsed > 0 else 0.0
+    }
+    print(f"📊 Perfil a perfil: {result['scalar_profiles_per_sec']:.0f} perfiles/s")
+    print(f"📊 Por lotes:       {result['batch_profiles_per_sec']:.0f} perfiles/s")
+    print(f"🚀 Aceleración: x{result['speedup']:.1f}")
+    return result
+
+
+if __name__ == "__main__":
+    benchmark_sampler(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -5,7 +5,9 @@ Interfaz atractiva y funcional con prioridad en funcionalidad
 """
 
 from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
+import io
 import json
+import mimetypes
 import time
 import os
 
@@ -252,17 +254,22 @@ def translate_to_english(spanish_value):
         return 'random'
 import sys
 from pathlib import Path
-import threading
 import logging
 
 # Agregar el directorio core al path
 sys.path.append(str(Path(__file__).parent.parent / "core"))
 
-from api_client import WebUIAPIClient, GeneticAPIGenerator
+from api_client import WebUIBackendPool, GeneticAPIGenerator, create_webui_client
 from diversity_engine import UltraDiversityEngine
 from saime_validator import SAIMEValidator
 from file_manager import FileManager
+from output_catalog import OutputCatalog
+from image_dedup import get_deduplicator
+from diversity_metrics import active_metrics
+from shard_store import read_member
 from massive_engine import MassiveGenerationEngine
+from job_queue import JobQueue
+from trait_catalog import get_catalog
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -277,15 +284,60 @@ diversity_engine = None
 saime_validator = None
 file_manager = None
 massive_engine = None
-generation_status = {"running": False, "progress": 0, "current": 0, "total": 0}
+job_queue = None
+
+def _compact_result(result):
+    """Resultado reducido para guardar en la cola (sin perfiles completos)"""
+    return {
+        'success': result.get('success', False),
+        'error': result.get('error'),
+        'generated_count': result.get('generated_count', 0),
+        'output_dir': result.get('output_dir'),
+        'cancelled': result.get('cancelled', False),
+        # Contadores y tasa de aprobación por regla de la validación SAIME en línea
+        'validation': result.get('validation'),
+        # Entropía, cobertura y unicidad medidas del lote (DiversityMetrics)
+        'diversity_metrics': result.get('diversity_metrics'),
+        'near_duplicates': result.get('near_duplicates')
+    }
+
+def _run_genetic_job(params, context):
+    """Ejecutar un trabajo de generación genética (reanuda con el manifiesto del directorio)"""
+    from genetic_engine import generate_genetic_batch
+    
+    if context.checkpoint.get('output_dir'):
+        # El motor lee del manifiesto la semilla y los índices ya completados
+        print(f"🔄 Reanudando trabajo {context.job_id}: {context.checkpoint.get('completed', 0)}/{params['cantidad']} completadas")
+        params = dict(params, output_dir=context.checkpoint['output_dir'])
+    
+    result = generate_genetic_batch(
+        dict(params, job_id=context.job_id),
+        progress_callback=context.progress,
+        cancel_event=context.cancel_event
+    )
+    logger.info(f"Generación completada: {result.get('generated_count', 0)} imágenes")
+    return _compact_result(result)
+
+def _run_massive_job(params, context):
+    """Ejecutar un trabajo de generación masiva (reanuda con el manifiesto del directorio)"""
+    if context.checkpoint.get('output_dir'):
+        params = dict(params, resume_dir=context.checkpoint['output_dir'])
+    result = massive_engine.generate_massive_batch(
+        params['dataset_path'],
+        dict(params, job_id=context.job_id),
+        progress_callback=context.progress,
+        cancel_event=context.cancel_event
+    )
+    logger.info(f"Generación masiva completada: {result.get('generated_count', 0)} imágenes")
+    return _compact_result(result)
 
 def init_system():
     """Inicializar sistema genético"""
-    global api_client, genetic_generator, diversity_engine, saime_validator, file_manager, massive_engine
+    global api_client, genetic_generator, diversity_engine, saime_validator, file_manager, massive_engine, job_queue
     
     try:
-        # Inicializar cliente API
-        api_client = WebUIAPIClient()
+        # Inicializar cliente API (WEBUI_URLS con varias URLs crea un pool de backends)
+        api_client = create_webui_client()
         
         # Esperar que WebUI esté disponible
         if not api_client.wait_for_webui():
@@ -307,6 +359,15 @@ def init_system():
         # Inicializar motor de generación masiva
         massive_engine = MassiveGenerationEngine()
         
+        # Inicializar cola de trabajos persistente (reanuda trabajos interrumpidos)
+        job_queue = JobQueue(
+            Path(file_manager.outputs_dir) / "jobs.sqlite3",
+            workers=int(os.environ.get('GENETIC_JOB_WORKERS', 1))
+        )
+        job_queue.register_handler('genetic', _run_genetic_job)
+        job_queue.register_handler('massive', _run_massive_job)
+        job_queue.start()
+        
         logger.info("✅ Sistema genético inicializado correctamente")
         return True
         
@@ -332,7 +393,7 @@ def api_status():
                 'models_count': len(models),
                 'models': [model.get('title', model.get('model_name', 'Unknown')) for model in models],
                 'current_model': options.get('sd_model_checkpoint', 'Unknown'),
-                'generation_status': generation_status
+                'generation_status': job_queue.status_summary() if job_queue else {}
             })
         else:
             return jsonify({'webui_connected': False})
@@ -340,6 +401,18 @@ def api_status():
         logger.error(f"Error obteniendo estado: {e}")
         return jsonify({'webui_connected': False, 'error': str(e)})
 
+@app.route('/api/backends')
+def api_backends():
+    """API para consultar el estado de los backends WebUI"""
+    try:
+        if isinstance(api_client, WebUIBackendPool):
+            return jsonify({'success': True, 'backends': api_client.check_health()})
+        if api_client:
+            return jsonify({'success': True, 'backends': [{'url': api_client.base_url, 'healthy': True}]})
+        return jsonify({'success': False, 'error': 'Cliente API no inicializado'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/api/models')
 def api_models():
     """Obtener modelos disponibles"""
@@ -372,9 +445,6 @@ def api_set_model():
 def api_generate_genetic():
     """API para generación genética"""
     try:
-        if generation_status["running"]:
-            return jsonify({'success': False, 'error': 'Generación en progreso'})
-        
         # Manejar tanto JSON como FormData
         if request.is_json:
             data = request.json
@@ -414,6 +484,24 @@ def api_generate_genetic():
             'steps': int(data.get('steps', 20)),
             'sampler_name': data.get('sampler_name', 'DPM++ 2M'),
             'seed': int(data.get('seed', -1)),
+            # Pipeline concurrente (1 = modo secuencial clásico)
+            'max_in_flight': int(data.get('max_in_flight', 1)),
+            'api_batch_size': int(data.get('api_batch_size', 1)),
+            # Un solo trabajo en el WebUI (/sdapi/v1/txt2img-batch) con resultados en streaming
+            'server_batch': bool(data.get('server_batch', False)),
+            'server_batch_size': int(data.get('server_batch_size', 8)),
+            'webui_urls': data.get('webui_urls', []),
+            # Procesos para renderizar prompts (0 = en el hilo de generación)
+            'prompt_workers': int(data.get('prompt_workers', 0)),
+            # Disposición de salida: 'flat', 'sharded' (subdirectorios por hash) o 'packed' (shards tar)
+            'output_layout': data.get('output_layout', 'flat'),
+            # Validación SAIME en línea: las imágenes que no cumplen se regeneran con otra semilla
+            'saime_validation': bool(data.get('saime_validation', False)),
+            'validation_retries': int(data.get('validation_retries', 2)),
+            'validation_workers': int(data.get('validation_workers', 2)),
+            'validation_rules': data.get('validation_rules'),
+            # No repetir combinaciones de rasgos ya emitidas en lotes anteriores
+            'global_uniqueness': bool(data.get('global_uniqueness', True)),
             # Controles de diversidad genética (español a inglés)
             'beauty_control': translate_to_english(data.get('beauty_control', 'aleatorio')),
             'skin_control': translate_to_english(data.get('skin_control', 'aleatorio')),
@@ -445,30 +533,10 @@ def api_generate_genetic():
             'physical_complexion_control': translate_to_english(data.get('physical_complexion_control', 'aleatorio'))
         }
         
-        # Iniciar generación en hilo separado
-        def generate_worker():
-            global generation_status
-            generation_status["running"] = True
-            generation_status["progress"] = 0
-            generation_status["current"] = 0
-            generation_status["total"] = params['cantidad']
-            
-            try:
-                # Importar función de generación genética
-                from genetic_engine import generate_genetic_batch
-                result = generate_genetic_batch(params)
-                generation_status["running"] = False
-                generation_status["progress"] = 100
-                logger.info(f"Generación completada: {result}")
-            except Exception as e:
-                generation_status["running"] = False
-                logger.error(f"Error en generación: {e}")
-        
-        thread = threading.Thread(target=generate_worker)
-        thread.daemon = True
-        thread.start()
+        # Encolar trabajo (se ejecuta cuando haya un worker libre)
+        job_id = job_queue.submit('genetic', params, total=params['cantidad'])
         
-        return jsonify({'success': True, 'message': 'Generación iniciada'})
+        return jsonify({'success': True, 'message': 'Generación encolada', 'job_id': job_id})
         
     except Exception as e:
         logger.error(f"Error en API genética: {e}")
@@ -478,9 +546,6 @@ def api_generate_genetic():
 def api_generate_massive():
     """API para generación masiva con diversidad genética"""
     try:
-        if generation_status["running"]:
-            return jsonify({'success': False, 'error': 'Generación en progreso'})
-        
         data = request.json
         
         # Validar parámetros requeridos
@@ -490,6 +555,8 @@ def api_generate_massive():
         
         # Parámetros de generación
         params = {
+            'dataset_path': dataset_path,
+            'resume_dir': data.get('resume_dir'),
             'model': data.get('model'),
             'cantidad': int(data.get('cantidad', 10)),
             'width': int(data.get('width', 512)),
@@ -497,6 +564,13 @@ def api_generate_massive():
             'cfg_scale': float(data.get('cfg_scale', 7.5)),
             'steps': int(data.get('steps', 20)),
             'seed': int(data.get('seed', -1)),
+            # Disposición de salida: 'flat', 'sharded' (subdirectorios por hash) o 'packed' (shards tar)
+            'output_layout': data.get('output_layout', 'flat'),
+            # Validación SAIME en línea: las imágenes que no cumplen se regeneran con otra semilla
+            'saime_validation': bool(data.get('saime_validation', False)),
+            'validation_retries': int(data.get('validation_retries', 2)),
+            'validation_workers': int(data.get('validation_workers', 2)),
+            'validation_rules': data.get('validation_rules'),
             # Controles de diversidad genética
             'skin_control': data.get('skin_control', 'aleatorio'),
             'hair_control': data.get('hair_control', 'aleatorio'),
@@ -504,28 +578,10 @@ def api_generate_massive():
             'beauty_control': data.get('beauty_control', 'aleatorio')
         }
         
-        # Iniciar generación en hilo separado
-        def generate_worker():
-            global generation_status
-            generation_status["running"] = True
-            generation_status["progress"] = 0
-            generation_status["current"] = 0
-            generation_status["total"] = params['cantidad']
-            
-            try:
-                result = massive_engine.generate_massive_batch(dataset_path, params)
-                generation_status["running"] = False
-                generation_status["progress"] = 100
-                logger.info(f"Generación masiva completada: {result}")
-            except Exception as e:
-                generation_status["running"] = False
-                logger.error(f"Error en generación masiva: {e}")
+        # Encolar trabajo
+        job_id = job_queue.submit('massive', params, total=params['cantidad'])
         
-        thread = threading.Thread(target=generate_worker)
-        thread.daemon = True
-        thread.start()
-        
-        return jsonify({'success': True, 'message': 'Generación masiva iniciada'})
+        return jsonify({'success': True, 'message': 'Generación masiva encolada', 'job_id': job_id})
         
     except Exception as e:
         logger.error(f"Error en API masiva: {e}")
@@ -533,10 +589,90 @@ def api_generate_massive():
 
 @app.route('/api/stop_generation', methods=['POST'])
 def api_stop_generation():
-    """Detener generación en curso"""
+    """Detener generación en curso (un trabajo concreto o todos)"""
     try:
-        generation_status["running"] = False
-        return jsonify({'success': True, 'message': 'Generación detenida'})
+        data = request.get_json(silent=True) or {}
+        if data.get('job_id'):
+            if not job_queue.cancel(data['job_id']):
+                return jsonify({'success': False, 'error': 'Trabajo no encontrado o ya finalizado'})
+            return jsonify({'success': True, 'message': 'Generación detenida'})
+        cancelled = job_queue.cancel_all()
+        return jsonify({'success': True, 'message': 'Generación detenida', 'cancelled': cancelled})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/jobs')
+def api_jobs():
+    """Listar trabajos (opcionalmente filtrados por estado)"""
+    try:
+        states = request.args.get('state')
+        jobs = job_queue.list_jobs(
+            states=states.split(',') if states else None,
+            limit=int(request.args.get('limit', 100))
+        )
+        return jsonify({'success': True, 'jobs': jobs})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """Estado y progreso de un trabajo"""
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+        return jsonify({'success': True, 'job': job})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    """Cancelar un trabajo encolado o en curso"""
+    try:
+        if not job_queue.cancel(job_id):
+            return jsonify({'success': False, 'error': 'Trabajo no encontrado o ya finalizado'})
+        return jsonify({'success': True, 'message': 'Cancelación solicitada'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/diversity_metrics')
+def api_diversity_metrics():
+    """
+    Métricas de diversidad medidas de un lote
+    
+    Parámetros: job_id (en curso: métricas en vivo; terminado: las del
+    resultado) o batch=<modelo>/<lote> para un lote ya guardado en outputs/
+    """
+    try:
+        job_id = request.args.get('job_id')
+        if job_id:
+            job = job_queue.get(job_id) if job_queue is not None else None
+            if job is None:
+                return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+            output_dir = (job.get('checkpoint') or {}).get('output_dir')
+            metrics = active_metrics(output_dir) if output_dir else None
+            if metrics is not None:
+                return jsonify({'success': True, 'live': True, 'metrics': metrics.summary()})
+            summary = (job.get('result') or {}).get('diversity_metrics')
+            if summary is not None:
+                return jsonify({'success': True, 'live': False, 'metrics': summary})
+            return jsonify({'success': False, 'error': 'El trabajo aún no tiene métricas de diversidad'})
+        
+        batch = request.args.get('batch')
+        if not batch:
+            return jsonify({'success': False, 'error': 'Indique job_id o batch'}), 400
+        outputs_dir = (file_manager.outputs_dir if file_manager is not None else Path("outputs")).resolve()
+        batch_dir = (outputs_dir / batch).resolve()
+        if outputs_dir not in batch_dir.parents:
+            return jsonify({'success': False, 'error': 'Lote no válido'}), 400
+        metrics = active_metrics(batch_dir)
+        if metrics is not None:
+            return jsonify({'success': True, 'live': True, 'metrics': metrics.summary()})
+        for metrics_path in (batch_dir / "metadata" / "diversity_metrics.json", batch_dir / "diversity_metrics.json"):
+            if metrics_path.exists():
+                with open(metrics_path, 'r', encoding='utf-8') as f:
+                    return jsonify({'success': True, 'live': False, 'metrics': json.load(f)})
+        return jsonify({'success': False, 'error': 'Lote sin métricas de diversidad'}), 404
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -557,10 +693,8 @@ def api_saime_config():
 def api_diversity_options():
     """Obtener opciones de diversidad"""
     try:
-        options_path = Path("data/diversity_options.json")
-        if options_path.exists():
-            with open(options_path, 'r') as f:
-                options = json.load(f)
+        options = get_catalog().namespace('options')
+        if options:
             return jsonify({'success': True, 'options': options})
         return jsonify({'success': False, 'error': 'Opciones de diversidad no encontradas'})
     except Exception as e:
@@ -582,23 +716,86 @@ def api_update_saime_config():
 
 @app.route('/api/outputs')
 def api_outputs():
-    """Obtener lista de archivos generados"""
+    """
+    Obtener lista de archivos generados (paginada, desde el catálogo SQLite)
+    
+    Parámetros: page, per_page, model, batch, kind, nationality, gender,
+    age_min, age_max, name, trait.<rasgo>=<valor>, sort, order (asc/desc) y
+    refresh=1 para sincronizar antes el catálogo con el disco
+    """
+    try:
+        catalog = file_manager.catalog if file_manager is not None else None
+        if catalog is None:
+            outputs_dir = Path("outputs")
+            if not outputs_dir.exists():
+                return jsonify({'success': True, 'files': [], 'total': 0})
+            catalog = OutputCatalog(outputs_dir)
+            if catalog.count() == 0:
+                catalog.refresh()
+        elif request.args.get('refresh') in ('1', 'true'):
+            catalog.refresh()
+        
+        args = request.args
+        page = max(1, args.get('page', 1, type=int))
+        per_page = min(max(1, args.get('per_page', 200, type=int)), 1000)
+        filters = {key: args.get(key) for key in ('model', 'batch', 'kind', 'nationality', 'gender', 'name')}
+        filters['age_min'] = args.get('age_min', type=int)
+        filters['age_max'] = args.get('age_max', type=int)
+        filters['traits'] = {key[len('trait.'):]: value for key, value in args.items() if key.startswith('trait.')}
+        
+        result = catalog.query(
+            filters,
+            sort=args.get('sort', 'modified'),
+            descending=args.get('order', 'desc') != 'asc',
+            limit=per_page,
+            offset=(page - 1) * per_page
+        )
+        return jsonify({
+            'success': True,
+            'files': result['files'],
+            'total': result['total'],
+            'page': page,
+            'per_page': per_page
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/near_duplicates')
+def api_near_duplicates():
+    """
+    Casi-duplicados detectados por hash perceptual (paginados)
+    
+    Parámetros: page, per_page, model, batch, scope (batch = dentro del mismo
+    lote, history = contra lotes anteriores) y backfill=1 para hashear antes
+    las imágenes del catálogo que aún no tienen hash
+    """
     try:
-        outputs_dir = Path("outputs")
-        if not outputs_dir.exists():
-            return jsonify({'success': True, 'files': []})
-        
-        files = []
-        for file_path in outputs_dir.rglob("*"):
-            if file_path.is_file():
-                files.append({
-                    'name': file_path.name,
-                    'path': str(file_path.relative_to(outputs_dir)),
-                    'size': file_path.stat().st_size,
-                    'modified': file_path.stat().st_mtime
-                })
-        
-        return jsonify({'success': True, 'files': files})
+        outputs_dir = file_manager.outputs_dir if file_manager is not None else Path("outputs")
+        dedup = get_deduplicator(outputs_dir)
+        args = request.args
+        if args.get('backfill') in ('1', 'true') and file_manager is not None and file_manager.catalog is not None:
+            catalog = file_manager.catalog
+            images = catalog.query({'kind': 'image'}, limit=catalog.count({'kind': 'image'}))['files']
+            dedup.backfill(outputs_dir / image['path'] for image in images if not image.get('shard'))
+        
+        page = max(1, args.get('page', 1, type=int))
+        per_page = min(max(1, args.get('per_page', 100, type=int)), 1000)
+        scope = args.get('scope')
+        result = dedup.duplicates(
+            model=args.get('model'),
+            batch=args.get('batch'),
+            same_batch={'batch': True, 'history': False}.get(scope),
+            limit=per_page,
+            offset=(page - 1) * per_page
+        )
+        return jsonify({
+            'success': True,
+            'duplicates': result['duplicates'],
+            'total': result['total'],
+            'indexed': len(dedup),
+            'page': page,
+            'per_page': per_page
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -617,11 +814,19 @@ def api_open_output_folder():
 
 @app.route('/download/<path:filename>')
 def download_file(filename):
-    """Descargar archivo generado"""
+    """Descargar archivo generado (los miembros de lotes empaquetados se leen del shard tar)"""
     try:
-        file_path = Path("outputs") / filename
+        outputs_dir = file_manager.outputs_dir if file_manager is not None else Path("outputs")
+        file_path = outputs_dir / filename
         if file_path.exists():
-            return send_file(file_path, as_attachment=True)
+            return send_file(file_path.absolute(), as_attachment=True)
+        
+        catalog = file_manager.catalog if file_manager is not None else None
+        entry = catalog.locate(filename) if catalog is not None else None
+        if entry and entry['shard']:
+            data = read_member(outputs_dir / entry['shard'], entry['offset'], entry['size'])
+            return send_file(io.BytesIO(data), as_attachment=True, download_name=entry['name'],
+                             mimetype=mimetypes.guess_type(entry['name'])[0] or 'application/octet-stream')
         return jsonify({'error': 'Archivo no encontrado'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
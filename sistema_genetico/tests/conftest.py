@@ -0,0 +1,54 @@
+import functools
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+import pytest
+
+# Los módulos de core se importan sin paquete, como en las interfaces
+sys.path.insert(0, str(Path(__file__).parent.parent / "core"))
+sys.path.insert(1, str(Path(__file__).parent.parent / "interfaces"))
+
+
+def png_bytes(width=8, height=8, color=(0, 0, 0)):
+    """PNG RGB mínimo sin depender de PIL"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    raw = b"".join(b"\x00" + bytes(color) * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+class FakeWebUI:
+    """Cliente WebUI en memoria: registra cada petición y devuelve un PNG distinto por imagen"""
+
+    base_url = "http://fake-webui"
+
+    def __init__(self, fail_after=None):
+        self.requests = []
+        self.fail_after = fail_after
+
+    def generate_image(self, prompt, negative_prompt, params):
+        if self.fail_after is not None and len(self.requests) >= self.fail_after:
+            raise RuntimeError("backend caído")
+        self.requests.append({'prompt': prompt, 'negative_prompt': negative_prompt, 'params': dict(params)})
+        return png_bytes(color=(len(self.requests) % 256, 0, 0))
+
+
+@pytest.fixture
+def outputs_dir(tmp_path, monkeypatch):
+    """FileManager escribe en un directorio temporal en lugar de outputs/ del proyecto"""
+    import file_manager
+    monkeypatch.setattr(file_manager, "FileManager", functools.partial(file_manager.FileManager, base_dir=tmp_path))
+    return tmp_path / "outputs"
+
+
+@pytest.fixture
+def fake_webui(monkeypatch):
+    """create_webui_client devuelve un FakeWebUI compartido"""
+    pytest.importorskip("requests")
+    import api_client
+    client = FakeWebUI()
+    monkeypatch.setattr(api_client, "create_webui_client", lambda *args, **kwargs: client)
+    return client
@@ -0,0 +1,194 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from async_api_client import AsyncWebUIAPIClient, WebUIConnectionError, WebUIHTTPError  # noqa: E402
+
+
+class StubWebUI:
+    """WebUI mínimo que falla las primeras peticiones de cada ruta y cuenta las llamadas"""
+
+    def __init__(self, failures=None, txt2img_delay=0.0):
+        # {(método, ruta): [estado o 'drop', ...]} que se consumen antes de responder bien
+        self.failures = {key: list(value) for key, value in (failures or {}).items()}
+        self.txt2img_delay = txt2img_delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, data):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, method):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub.lock:
+                    stub.calls.append((method, self.path))
+                    pending = stub.failures.get((method, self.path))
+                    failure = pending.pop(0) if pending else None
+                if failure == 'drop':
+                    # Conexión cerrada sin respuesta
+                    self.close_connection = True
+                    return
+                if failure is not None:
+                    with stub.lock:
+                        stub.completed += self.path == "/sdapi/v1/txt2img"
+                    self._reply(failure, {"error": "busy"})
+                    return
+                if self.path == "/sdapi/v1/txt2img":
+                    with stub.lock:
+                        stub.in_flight += 1
+                        stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    time.sleep(stub.txt2img_delay)
+                    with stub.lock:
+                        stub.in_flight -= 1
+                        stub.completed += 1
+                    prompt = json.loads(body)["prompt"]
+                    self._reply(200, {"images": [base64.b64encode(prompt.encode()).decode()]})
+                elif self.path == "/sdapi/v1/options":
+                    self._reply(200, {"sd_model_checkpoint": "model.safetensors [abc]"})
+                else:
+                    self._reply(404, {"detail": "Not Found"})
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def count(self, method, path):
+        return self.calls.count((method, path))
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_factory():
+    stubs = []
+
+    def make(**kwargs):
+        stub = StubWebUI(**kwargs)
+        stubs.append(stub)
+        return stub
+
+    yield make
+    for stub in stubs:
+        stub.close()
+
+
+async def _call(stub, method_name, *args):
+    async with AsyncWebUIAPIClient(stub.url, binary_transport=False, retries=3, backoff=0.0) as client:
+        return await getattr(client, method_name)(*args)
+
+
+def test_idempotent_calls_are_retried(stub_factory):
+    stub = stub_factory(failures={("GET", "/sdapi/v1/options"): [503, 'drop', 429],
+                                  ("POST", "/sdapi/v1/options"): [502]})
+
+    assert asyncio.run(_call(stub, "get_current_model")) == "modelsafetensors abc"
+    assert stub.count("GET", "/sdapi/v1/options") == 4
+    # Cambiar de modelo es un POST, pero idempotente
+    asyncio.run(_call(stub, "set_model", "other"))
+    assert stub.count("POST", "/sdapi/v1/options") == 2
+
+
+def test_retries_give_up_and_client_errors_are_not_retried(stub_factory):
+    stub = stub_factory(failures={("GET", "/sdapi/v1/options"): [503] * 10})
+
+    with pytest.raises(WebUIHTTPError) as excinfo:
+        asyncio.run(_call(stub, "get_options"))
+    assert excinfo.value.status == 503
+    assert stub.count("GET", "/sdapi/v1/options") == 4
+
+    with pytest.raises(WebUIHTTPError) as excinfo:
+        asyncio.run(_call(stub, "get_models"))
+    assert excinfo.value.status == 404
+    assert stub.count("GET", "/sdapi/v1/sd-models") == 1
+
+
+@pytest.mark.parametrize("failure, error", [(503, WebUIHTTPError), ('drop', WebUIConnectionError)])
+def test_txt2img_is_never_retried(stub_factory, failure, error):
+    stub = stub_factory(failures={("POST", "/sdapi/v1/txt2img"): [failure]})
+
+    with pytest.raises(error):
+        asyncio.run(_call(stub, "generate_image", "a", "", {}))
+    # Reintentar volvería a generar la imagen
+    assert stub.count("POST", "/sdapi/v1/txt2img") == 1
+    assert asyncio.run(_call(stub, "generate_image", "a", "", {})) == b"a"
+
+
+def test_txt2img_many_keeps_a_bounded_window(stub_factory):
+    stub = stub_factory(txt2img_delay=0.05, failures={("POST", "/sdapi/v1/txt2img"): [503]})
+    pulled = []
+
+    def jobs(count):
+        for i in range(count):
+            pulled.append(i)
+            yield f"p{i}", "", {}
+
+    async def consume():
+        results, lags = {}, []
+        async with AsyncWebUIAPIClient(stub.url, binary_transport=False, backoff=0.0) as client:
+            async for index, images in client.txt2img_many(jobs(12), max_in_flight=3):
+                results[index] = images
+                # Trabajos leídos del generador que aún no han terminado: nunca más que la ventana
+                lags.append(len(pulled) - stub.completed)
+        return results, lags
+
+    results, lags = asyncio.run(consume())
+    assert sorted(results) == list(range(12))
+    # El primer txt2img falla con 503: se entrega el error, sin reintento
+    errors = [index for index, images in results.items() if isinstance(images, WebUIHTTPError)]
+    assert len(errors) == 1 and stub.count("POST", "/sdapi/v1/txt2img") == 12
+    assert all(results[i] == [f"p{i}".encode()] for i in range(12) if i not in errors)
+    assert stub.max_in_flight == 3
+    assert max(lags) <= 3
+
+
+def test_txt2img_many_cancels_pending_when_consumer_stops(stub_factory):
+    stub = stub_factory(txt2img_delay=0.05)
+    pulled = []
+
+    def jobs():
+        for i in range(1000):
+            pulled.append(i)
+            yield f"p{i}", "", {}
+
+    async def first():
+        async with AsyncWebUIAPIClient(stub.url, binary_transport=False) as client:
+            many = client.txt2img_many(jobs(), max_in_flight=4)
+            async for result in many:
+                await many.aclose()
+                return result
+
+    index, images = asyncio.run(first())
+    assert images == [f"p{index}".encode()]
+    # De un generador sin fin solo se leen la ventana y los huecos liberados antes de parar
+    assert len(pulled) <= 8
+    time.sleep(0.2)
+    assert stub.count("POST", "/sdapi/v1/txt2img") <= len(pulled)
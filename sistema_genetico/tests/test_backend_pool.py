@@ -0,0 +1,195 @@
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from api_client import WebUIBackendPool, create_webui_client  # noqa: E402
+
+
+class StubWebUI:
+    """WebUI mínimo: progress, pending-tasks, txt2img y txt2img-batch que devuelven su propio nombre como imagen"""
+
+    def __init__(self, name, pending_tasks=0, die_on_txt2img=False):
+        self.name = name
+        self.pending_tasks = pending_tasks
+        self.die_on_txt2img = die_on_txt2img
+        self.txt2img_calls = 0
+        self.batch_jobs = {}
+        self.event_reads = []
+        self.release = threading.Event()
+        self.release.set()
+        self.arrivals = None
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, data):
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/sdapi/v1/progress"):
+                    self._json({"progress": 0, "state": {"job_count": 0}})
+                elif self.path.startswith("/internal/pending-tasks"):
+                    self._json({"size": stub.pending_tasks})
+                elif self.path.startswith("/sdapi/v1/txt2img-batch/"):
+                    job_id = self.path.split("/")[4]
+                    stub.event_reads.append(job_id)
+                    image = base64.b64encode(stub.name.encode()).decode()
+                    events = [f"id: {i}\nevent: image\ndata: {json.dumps({'index': i, 'image': image})}\n\n"
+                              for i in range(stub.batch_jobs[job_id])]
+                    events.append(f"id: {len(events)}\nevent: done\ndata: {json.dumps({'status': 'done'})}\n\n")
+                    body = "".join(events).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                if self.path.startswith("/sdapi/v1/txt2img-batch"):
+                    # Cuerpo JSON Lines en streaming (chunked)
+                    body = b""
+                    while True:
+                        size = int(self.rfile.readline().strip(), 16)
+                        body += self.rfile.read(size + 2)[:size]
+                        if not size:
+                            break
+                    lines = len(body.splitlines())
+                    job_id = f"{stub.name}-job{len(stub.batch_jobs)}"
+                    stub.batch_jobs[job_id] = lines
+                    self._json({"job_id": job_id, "total": lines, "batches": 1})
+                    return
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.txt2img_calls += 1
+                if stub.die_on_txt2img:
+                    # El nodo cae con la petición aceptada: se cierra la conexión sin respuesta
+                    self.close_connection = True
+                    return
+                if stub.arrivals is not None:
+                    stub.arrivals.append(stub.name)
+                stub.release.wait(10)
+                self._json({"images": [base64.b64encode(stub.name.encode()).decode()]})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stubs():
+    created = []
+
+    def make(*args, **kwargs):
+        stub = StubWebUI(*args, **kwargs)
+        created.append(stub)
+        return stub
+
+    yield make
+    for stub in created:
+        stub.close()
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timeout esperando al stub"
+        time.sleep(0.01)
+
+
+def test_create_webui_client_builds_pool_for_several_urls(stubs):
+    a, b = stubs("a"), stubs("b")
+    assert isinstance(create_webui_client([a.url, b.url]), WebUIBackendPool)
+    assert not isinstance(create_webui_client([a.url]), WebUIBackendPool)
+
+
+def test_dispatch_goes_to_least_loaded_backend(stubs):
+    # Carga inicial solo por la cola remota: a=2, b=0, c=1
+    a, b, c = stubs("a", pending_tasks=2), stubs("b"), stubs("c", pending_tasks=1)
+    pool = WebUIBackendPool([a.url, b.url, c.url], health_interval=60)
+    arrivals = []
+    for stub in (a, b, c):
+        stub.arrivals = arrivals
+        stub.release.clear()
+
+    results = []
+    threads = []
+    for count in range(1, 5):
+        thread = threading.Thread(target=lambda: results.append(pool.generate_image("p", "n", {})))
+        thread.start()
+        threads.append(thread)
+        # Cada petición sigue en vuelo cuando se despacha la siguiente
+        _wait_for(lambda: len(arrivals) == count)
+    for stub in (a, b, c):
+        stub.release.set()
+    for thread in threads:
+        thread.join(10)
+
+    # b (0) -> b (1, empata con c y va primero) -> c (1) -> a (2): todos con carga 2
+    assert arrivals == ["b", "b", "c", "a"]
+    assert sorted(results) == [b"a", b"b", b"b", b"c"]
+    assert all(backend.in_flight == 0 for backend in pool.backends)
+
+
+def test_failover_when_backend_dies_mid_request(stubs):
+    dead, alive = stubs("dead", die_on_txt2img=True), stubs("alive", pending_tasks=1)
+    pool = WebUIBackendPool([dead.url, alive.url], health_interval=60, max_failures=1)
+
+    # El nodo sin cola recibe la petición, cae, y el trabajo se repite en el otro
+    assert pool.generate_image("p", "n", {}) == b"alive"
+    assert dead.txt2img_calls == 1
+    assert alive.txt2img_calls == 1
+
+    dead_backend = pool.backends[0]
+    assert not dead_backend.healthy
+    assert dead_backend.in_flight == 0
+
+    # Mientras está fuera de servicio no vuelve a recibir trabajo
+    assert pool.generate_image("p", "n", {}) == b"alive"
+    assert dead.txt2img_calls == 1
+    assert alive.txt2img_calls == 2
+
+
+def test_dispatch_returns_none_when_every_backend_fails(stubs):
+    first, second = stubs("first", die_on_txt2img=True), stubs("second", die_on_txt2img=True)
+    pool = WebUIBackendPool([first.url, second.url], health_interval=60)
+
+    assert pool.generate_image("p", "n", {}) is None
+    assert first.txt2img_calls == 1
+    assert second.txt2img_calls == 1
+
+
+def test_server_batch_job_is_pinned_to_least_loaded_backend(stubs):
+    a, b = stubs("a", pending_tasks=1), stubs("b")
+    pool = WebUIBackendPool([a.url, b.url], health_interval=60)
+    jobs = [{'prompt': f"p{i}", 'negative_prompt': "n", 'seed': i, 'params': {}} for i in range(3)]
+
+    first = pool.submit_txt2img_batch(iter(jobs), batch_size=2)
+    assert first in b.batch_jobs and b.batch_jobs[first] == 3
+    # El trabajo en curso cuenta como carga: el siguiente va al otro nodo
+    assert pool.backends[1].in_flight == 1
+    second = pool.submit_txt2img_batch(iter(jobs[:1]))
+    assert second in a.batch_jobs
+
+    assert list(pool.iter_txt2img_batch(first)) == [(0, b"b"), (1, b"b"), (2, b"b")]
+    assert b.event_reads == [first] and a.event_reads == []
+    assert list(pool.iter_txt2img_batch(second)) == [(0, b"a")]
+    assert all(backend.in_flight == 0 for backend in pool.backends)
@@ -0,0 +1,56 @@
+import pytest
+
+import columnar_store
+import file_manager
+from columnar_store import ColumnarBatchWriter
+
+
+def _write_batch(path, rows, row_group_size=2):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    writer = ColumnarBatchWriter(path, row_group_size=row_group_size)
+    for row in rows:
+        writer.append(row)
+    writer.close()
+    return writer
+
+
+def test_batches_are_combined_and_filtered(tmp_path):
+    pytest.importorskip("pyarrow")
+    outputs = tmp_path / "outputs"
+    first = _write_batch(outputs / "model_a" / "lote1" / "analysis.parquet", [
+        {'gender': 'female', 'skin_tone': 'olive', 'age': 30, 'cfg_scale': 7.0},
+        {'gender': 'male', 'skin_tone': 'olive', 'age': 'n/a', 'cfg_scale': 7.0},
+        # Columnas que no estaban en la primera fila se ignoran
+        {'gender': 'female', 'skin_tone': 'dark', 'age': 41, 'cfg_scale': 7.5, 'late': 'x'},
+    ])
+    _write_batch(outputs / "model_b" / "lote2" / "analysis.parquet", [
+        {'gender': 'female', 'skin_tone': 'olive', 'age': 25, 'seed': 9},
+    ])
+    assert first.rows_written == 3
+    assert [path.parent.name for path in columnar_store.find_batch_files(outputs)] == ["lote1", "lote2"]
+
+    table = columnar_store.load_profiles(outputs)
+    assert table.num_rows == 4
+    assert {'model', 'batch', 'seed'} <= set(table.column_names) and 'late' not in table.column_names
+    # Un valor que no encaja en el tipo de su columna queda como nulo
+    ages = columnar_store.load_profiles(outputs, model="model_a", columns=['age']).column('age').to_pylist()
+    assert ages == [30, None, 41]
+
+    females = columnar_store.load_profiles(outputs, filters={'gender': 'female'}, columns=['skin_tone', 'model'])
+    assert females.num_rows == 3
+    assert columnar_store.trait_distribution(outputs, 'skin_tone') == {'olive': 3, 'dark': 1}
+    assert columnar_store.trait_distribution(outputs, 'skin_tone', model="model_b") == {'olive': 1}
+    assert columnar_store.trait_distribution(tmp_path / "empty", 'skin_tone') == {}
+
+
+def test_without_pyarrow_columnar_output_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar_store, "PYARROW_AVAILABLE", False)
+    monkeypatch.setattr(file_manager, "PYARROW_AVAILABLE", False)
+
+    with pytest.raises(ImportError):
+        ColumnarBatchWriter(tmp_path / "analysis.parquet")
+    manager = file_manager.FileManager(base_dir=tmp_path)
+    result = manager.append_columnar_row(tmp_path, "analysis.parquet", {'gender': 'female'})
+    manager.close()
+    assert not result['success']
+    assert not (tmp_path / "analysis.parquet").exists()
@@ -0,0 +1,71 @@
+import json
+import os
+import random
+
+import pytest
+
+from conftest import png_bytes
+from dataset_index import DatasetIndex
+
+
+def _add_entry(dataset, name, gender='hombre', age=30, png=True):
+    (dataset / f"{name}.json").write_text(json.dumps(
+        {'image_id': name, 'metadata': {'nationality': 'venezuelan', 'gender': gender, 'age': age}}
+    ))
+    if png:
+        (dataset / f"{name}.png").write_bytes(png_bytes())
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "dataset"
+    path.mkdir()
+    for i in range(7):
+        _add_entry(path, f"e{i}", gender='male' if i % 2 else 'mujer', age=20 + i)
+    return path
+
+
+def test_refresh_only_parses_new_or_modified_files(dataset, monkeypatch):
+    index = DatasetIndex(dataset)
+    assert index.refresh() == {'added': 7, 'updated': 0, 'removed': 0, 'total': 7}
+
+    parsed = []
+    read_entry = DatasetIndex._read_entry
+    monkeypatch.setattr(DatasetIndex, "_read_entry",
+                        lambda self, json_file, mtime: parsed.append(json_file) or read_entry(self, json_file, mtime))
+    reopened = DatasetIndex(dataset)
+    assert reopened.refresh() == {'added': 0, 'updated': 0, 'removed': 0, 'total': 7}
+    assert parsed == []
+
+    stat = os.stat(dataset / "e1.json")
+    _add_entry(dataset, "e1", gender='male', age=60)
+    os.utime(dataset / "e1.json", (stat.st_atime, stat.st_mtime + 10))
+    (dataset / "e2.json").unlink()
+    _add_entry(dataset, "e9", png=False)
+    assert reopened.refresh() == {'added': 1, 'updated': 1, 'removed': 1, 'total': 6}
+    assert sorted(os.path.basename(path) for path in parsed) == ["e1.json", "e9.json"]
+    assert reopened.count({'age_min': 60}) == 1
+
+    # El PNG que llega después de su JSON se asocia sin volver a parsear
+    (dataset / "e9.png").write_bytes(png_bytes())
+    assert reopened.refresh()['total'] == 7
+    assert len(parsed) == 2
+
+
+def test_keyset_paging_is_stable_and_filtered(dataset):
+    index = DatasetIndex(dataset)
+    index.refresh()
+
+    names = [entry['image_id'] for entry in index.iter_entries(batch_size=2)]
+    assert names == [f"e{i}" for i in range(7)]
+    assert [entry['image_id'] for entry in index.iter_entries(limit=3, batch_size=2)] == ["e0", "e1", "e2"]
+
+    # Alias de género y rango de edad resueltos en SQL
+    male = [entry['image_id'] for entry in index.iter_entries({'gender': 'hombre', 'age_max': 25}, batch_size=1)]
+    assert male == ["e1", "e3", "e5"]
+    assert index.count({'gender': 'female'}) == 4
+
+    sample = index.sample(3, {'gender': 'mujer'}, rng=random.Random(1))
+    assert len({entry['image_id'] for entry in sample}) == 3
+    assert all(entry['gender'] == 'mujer' for entry in sample)
+    assert DatasetIndex.load_metadata(sample[0])['metadata']['metadata']['gender'] == 'mujer'
@@ -0,0 +1,107 @@
+import math
+import random
+from collections import Counter
+from itertools import combinations
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from diversity_metrics import CategoryCounter, CountMinSketch, DiversityMetrics, HyperLogLog  # noqa: E402
+
+
+def _entropy(counts):
+    total = sum(counts.values())
+    return -sum(count / total * math.log2(count / total) for count in counts.values())
+
+
+@pytest.mark.parametrize("precision, cardinality", [(12, 50), (12, 50000), (14, 20000)])
+def test_hyperloglog_within_three_standard_errors(precision, cardinality):
+    hll = HyperLogLog(precision=precision)
+    for i in range(cardinality):
+        # Cada valor dos veces: los repetidos no cuentan
+        hll.add(f"value-{i}")
+        hll.add(f"value-{i}")
+    error = 1.04 / math.sqrt(1 << precision)
+    assert abs(hll.count() - cardinality) <= max(2, 3 * error * cardinality)
+
+
+def test_count_min_never_underestimates():
+    rng = random.Random(3)
+    values = [f"v{rng.randrange(20000)}" for _ in range(30000)]
+    sketch = CountMinSketch(width=512, depth=4)
+    for value in values:
+        sketch.add(value)
+    counts = Counter(values)
+    assert all(sketch.estimate(value) >= count for value, count in counts.items())
+    # Error total acotado por e/width * N con alta probabilidad
+    overestimates = [sketch.estimate(value) - count for value, count in counts.items()]
+    assert sorted(overestimates)[len(overestimates) // 2] <= math.e / 512 * len(values)
+
+
+def _count(values, max_values):
+    counter = CategoryCounter("skin_tone", max_values=max_values)
+    for value in values:
+        counter.add(value)
+    return counter
+
+
+def test_entropy_is_exact_then_bounded_on_overflow():
+    rng = random.Random(5)
+    values = [f"v{index}" for index in rng.choices(range(300), weights=[1 / (r + 1) for r in range(300)], k=20000)]
+    counts = Counter(values)
+    exact = _count(values, max_values=1024)
+
+    assert exact.overflow == 0
+    assert exact.entropy() == pytest.approx(_entropy(counts), abs=1e-9)
+    assert exact.distinct_count() == len(counts)
+    # Simpson es exacto (usa la suma de cuadrados)
+    simpson = 1 - sum(count * (count - 1) for count in counts.values()) / (len(values) * (len(values) - 1))
+    assert exact.simpson() == pytest.approx(simpson)
+
+    # Con desbordamiento la cola se supone uniforme: cota superior que no
+    # supera la real en más que la entropía máxima de la masa desbordada
+    bounded = _count(values, max_values=32)
+    share = bounded.overflow / bounded.total
+    tail = len(counts) - len(bounded.counts)
+    assert bounded.overflow > 0 and len(bounded.counts) == 32
+    assert _entropy(counts) - 0.05 <= bounded.entropy() <= _entropy(counts) + share * math.log2(tail)
+    assert bounded.simpson() == pytest.approx(simpson)
+    # Cardinalidad del HyperLogLog(10): 3 errores típicos
+    assert abs(bounded.distinct_count() - len(counts)) <= 3 * 1.04 / math.sqrt(1 << 10) * len(counts)
+
+
+def test_entropy_overflow_is_tight_for_uniform_tail():
+    rng = random.Random(9)
+    values = [f"v{rng.randrange(500)}" for _ in range(50000)]
+    assert _count(values, max_values=32).entropy() == pytest.approx(_entropy(Counter(values)), abs=0.05)
+
+
+def test_batch_summary_matches_exact_values():
+    rng = random.Random(11)
+    vocabularies = {'skin_tone': [f"s{i}" for i in range(6)], 'eye_color': [f"e{i}" for i in range(4)],
+                    'hair': [f"h{i}" for i in range(5)]}
+    profiles = [{name: rng.choice(values[:-1]) for name, values in vocabularies.items()} for _ in range(300)]
+    metrics = DiversityMetrics(vocabularies=vocabularies, reservoir_size=64)
+    scores = [metrics.observe(profile) for profile in profiles]
+    summary = metrics.summary()
+
+    assert scores[0] == 1.0 and all(0.0 <= score <= 1.0 for score in scores)
+    assert summary['profiles'] == 300
+    for name, vocabulary in vocabularies.items():
+        category = summary['categories'][name]
+        counts = Counter(profile[name] for profile in profiles)
+        assert category['entropy'] == pytest.approx(_entropy(counts), abs=1e-4)
+        assert category['normalized_entropy'] == pytest.approx(_entropy(counts) / math.log2(len(vocabulary)), abs=1e-4)
+        # El último valor de cada vocabulario nunca se usa
+        assert category['coverage'] == round((len(vocabulary) - 1) / len(vocabulary), 4)
+
+    # Media de Hamming exacta sobre todos los pares, sin compararlos
+    pairwise = sum(sum(a[name] != b[name] for name in vocabularies) for a, b in combinations(profiles, 2))
+    assert summary['mean_pairwise_hamming'] == pytest.approx(pairwise / math.comb(300, 2), abs=1e-4)
+
+    combos = Counter(tuple(sorted(profile.items())) for profile in profiles)
+    assert abs(summary['combinations']['distinct'] - len(combos)) <= max(2, 0.03 * len(combos))
+    assert summary['combinations']['max_repeat'] >= max(combos.values())
+    assert summary['nearest_neighbor']['min'] == 0
+    assert sum(summary['nearest_neighbor']['histogram'].values()) == 299
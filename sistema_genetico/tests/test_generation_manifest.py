@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from conftest import FakeWebUI, png_bytes  # noqa: E402
+from generation_manifest import GenerationManifest  # noqa: E402
+from run_rng import RunRandom  # noqa: E402
+
+BASE_PARAMS = {'cantidad': 4, 'run_seed': 7, 'dedup': False}
+
+
+def _add_entry(dataset, name):
+    (dataset / f"{name}.json").write_text(json.dumps(
+        {'image_id': name, 'metadata': {'nationality': 'venezuelan', 'gender': 'hombre', 'age': 30}}
+    ))
+    (dataset / f"{name}.png").write_bytes(png_bytes())
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "dataset"
+    path.mkdir()
+    for name in ("b", "d", "f", "h"):
+        _add_entry(path, name)
+    return path
+
+
+@pytest.fixture
+def engine(outputs_dir, monkeypatch):
+    import file_manager
+    import massive_engine
+    monkeypatch.setattr(massive_engine, "FileManager", file_manager.FileManager)
+    monkeypatch.setattr(massive_engine, "create_webui_client", FakeWebUI)
+    return massive_engine.MassiveGenerationEngine()
+
+
+def _sent_seeds(engine):
+    return [request['params']['seed'] for request in engine.api_client.requests]
+
+
+def test_resume_generates_only_missing_indices_with_same_seeds(engine, dataset):
+    full = engine.generate_massive_batch(str(dataset), dict(BASE_PARAMS, job_id="full"))
+    assert full['success'] and full['generated_count'] == 4
+    full_seeds = _sent_seeds(engine)
+
+    # Lote interrumpido: la WebUI cae tras dos imágenes
+    engine.api_client = FakeWebUI(fail_after=2)
+    partial = engine.generate_massive_batch(str(dataset), dict(BASE_PARAMS, job_id="partial"))
+    manifest = GenerationManifest.load(partial['output_dir'])
+    assert sorted(manifest.completed) == [0, 1]
+
+    engine.api_client = FakeWebUI()
+    resumed = engine.generate_massive_batch(str(dataset), {'resume_dir': partial['output_dir']})
+
+    assert resumed['success']
+    assert resumed['skipped_completed'] == 2 and resumed['generated_count'] == 2
+    assert _sent_seeds(engine) == full_seeds[2:]
+    manifest = GenerationManifest.load(partial['output_dir'])
+    assert {i: record['seed'] for i, record in manifest.completed.items()} == dict(enumerate(full_seeds))
+    assert manifest.run_seed == BASE_PARAMS['run_seed']
+
+
+def test_resume_is_refused_after_dataset_changes(engine, dataset):
+    engine.api_client = FakeWebUI(fail_after=2)
+    partial = engine.generate_massive_batch(str(dataset), dict(BASE_PARAMS))
+    assert sorted(GenerationManifest.load(partial['output_dir']).completed) == [0, 1]
+
+    # Una entrada nueva delante desplaza los índices ya completados
+    _add_entry(dataset, "a")
+    engine.api_client = FakeWebUI()
+    resumed = engine.generate_massive_batch(str(dataset), {'resume_dir': partial['output_dir']})
+
+    assert not resumed['success']
+    assert "dataset cambió" in resumed['error']
+    assert engine.api_client.requests == []
+
+
+def test_genetic_resume_regenerates_missing_indices(outputs_dir, fake_webui):
+    from genetic_engine import generate_genetic_batch
+
+    params = dict(BASE_PARAMS, columnar_output=False, global_uniqueness=False, write_behind=False)
+    fake_webui.fail_after = 2
+    partial = generate_genetic_batch(dict(params))
+    output_dir = partial['output_dir']
+    done = set(GenerationManifest.load(output_dir).completed)
+    assert len(done) == 2
+
+    fake_webui.fail_after = None
+    fake_webui.requests.clear()
+    resumed = generate_genetic_batch({'output_dir': output_dir})
+
+    assert resumed['success']
+    missing = sorted(set(range(4)) - done)
+    run_rng = RunRandom(params['run_seed'])
+    assert sorted(request['params']['seed'] for request in fake_webui.requests) == sorted(
+        run_rng.seed_for(i) for i in missing
+    )
+    assert GenerationManifest.load(output_dir).completed_count == 4
+
+
+def test_new_manifest_does_not_inherit_previous_records(tmp_path):
+    old = GenerationManifest.create(tmp_path, 1, {})
+    old.record(0, seed=5, profile={}, filename="a.png")
+
+    GenerationManifest.create(tmp_path, 1, {})
+    assert GenerationManifest.load(tmp_path).completed_count == 0
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from genetic_engine import generate_genetic_batch  # noqa: E402
+
+BASE_PARAMS = {
+    'cantidad': 4,
+    'dedup': False,
+    'columnar_output': False,
+    'global_uniqueness': False,
+    'write_behind': False
+}
+
+
+def test_fixed_seed_gives_seed_plus_index(outputs_dir, fake_webui):
+    result = generate_genetic_batch(dict(BASE_PARAMS, seed=1000, run_seed=7))
+
+    assert result['success'], result.get('error')
+    sent = [request['params']['seed'] for request in fake_webui.requests]
+    assert sorted(sent) == [1000, 1001, 1002, 1003]
+    recorded = {image['profile']['replication_info']['profile_index']: image['profile']['generation_parameters']['seed']
+                for image in result['images']}
+    assert recorded == {0: 1000, 1: 1001, 2: 1002, 3: 1003}
+
+
+def test_random_seed_is_reproducible_from_run_seed(outputs_dir, fake_webui):
+    first = generate_genetic_batch(dict(BASE_PARAMS, run_seed=7))
+    sent_first = [request['params']['seed'] for request in fake_webui.requests]
+    fake_webui.requests.clear()
+    second = generate_genetic_batch(dict(BASE_PARAMS, run_seed=7))
+    sent_second = [request['params']['seed'] for request in fake_webui.requests]
+
+    assert first['success'] and second['success']
+    assert sent_first == sent_second
+    assert len(set(sent_first)) == 4
+    assert -1 not in sent_first
@@ -0,0 +1,95 @@
+import io
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from image_dedup import ImageDeduplicator, MultiIndexHash, get_deduplicator, hamming, perceptual_hashes  # noqa: E402
+
+
+def _image(seed, size=256):
+    """Imagen sintética de baja frecuencia (rejilla aleatoria ampliada)"""
+    grid = np.random.default_rng(seed).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    return Image.fromarray(grid).resize((size, size), Image.BILINEAR)
+
+
+def _encode(image, fmt="PNG", **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def _near_copy(image, seed):
+    """Recompresión JPEG y ruido leve: otra imagen para el disco, la misma para el ojo"""
+    noisy = np.asarray(image, dtype=np.int16) + np.random.default_rng(seed).integers(-4, 5, (image.height, image.width, 3))
+    return _encode(Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8)), "JPEG", quality=80)
+
+
+def test_hashes_are_stable_across_input_forms():
+    image = _image(1)
+    expected = perceptual_hashes(_encode(image))
+    assert perceptual_hashes(image) == expected
+    assert perceptual_hashes(np.asarray(image)) == expected
+    near = perceptual_hashes(_near_copy(image, 0))
+    assert hamming(near[0], expected[0]) <= 6
+    other = perceptual_hashes(_image(2))
+    assert hamming(other[0], expected[0]) > 6
+
+
+def test_near_duplicates_within_batch_and_against_history(tmp_path):
+    outputs = tmp_path / "outputs"
+    dedup = ImageDeduplicator(outputs)
+
+    original = dedup.check_and_add(_encode(_image(1)), outputs / "model_a" / "lote1" / "img_0.png")
+    assert original['near_duplicates'] == [] and len(original['phash']) == 16
+    assert dedup.check_and_add(_encode(_image(2)), outputs / "model_a" / "lote1" / "img_1.png")['near_duplicates'] == []
+
+    same_batch = dedup.check_and_add(_near_copy(_image(1), 1), outputs / "model_a" / "lote1" / "img_2.png")
+    assert [(m['path'], m['same_batch']) for m in same_batch['near_duplicates']] == [("model_a/lote1/img_0.png", True)]
+
+    # Un proceso nuevo recarga el histórico desde SQLite
+    reloaded = ImageDeduplicator(outputs)
+    assert len(reloaded) == 3
+    history = reloaded.check_and_add(_near_copy(_image(1), 2), outputs / "model_b" / "lote2" / "img_0.png")
+    assert sorted((m['path'], m['same_batch']) for m in history['near_duplicates']) == [
+        ("model_a/lote1/img_0.png", False), ("model_a/lote1/img_2.png", False)
+    ]
+    # Volver a registrar la misma ruta no la cuenta como su propio duplicado
+    again = reloaded.check_and_add(_encode(_image(2)), outputs / "model_a" / "lote1" / "img_1.png")
+    assert again['near_duplicates'] == []
+
+    assert reloaded.duplicates(same_batch=True)['total'] == 1
+    across = reloaded.duplicates(same_batch=False, model="model_b")
+    assert across['total'] == 2
+    assert {row['match_path'] for row in across['duplicates']} == {"model_a/lote1/img_0.png", "model_a/lote1/img_2.png"}
+    broken = reloaded.check_and_add(b"not an image", outputs / "model_a" / "lote1" / "broken.png")
+    assert broken['error'] and broken['near_duplicates'] == [] and len(reloaded) == 4
+
+
+def test_multi_index_search_matches_brute_force():
+    rng = random.Random(7)
+    base = [rng.getrandbits(64) for _ in range(200)]
+    # Vecinos cercanos de algunos hashes para que haya coincidencias
+    values = base + [value ^ sum(1 << bit for bit in rng.sample(range(64), rng.randint(1, 8))) for value in base[:100]]
+    index = MultiIndexHash()
+    for item_id, value in enumerate(values):
+        index.add(value, item_id)
+
+    for query in values[:50] + [rng.getrandbits(64) for _ in range(20)]:
+        expected = sorted((item_id, hamming(query, value)) for item_id, value in enumerate(values)
+                          if hamming(query, value) <= 6)
+        assert sorted(index.search(query, 6)) == expected
+
+    # Re-indexar un id reemplaza su hash anterior
+    index.add(values[0] ^ ((1 << 64) - 1), 0)
+    assert len(index) == len(values)
+    assert 0 not in [item_id for item_id, _ in index.search(values[0], 6)]
+    assert (0, 0) in index.search(values[0] ^ ((1 << 64) - 1), 6)
+
+
+def test_deduplicator_is_shared_per_outputs_dir(tmp_path):
+    first = get_deduplicator(tmp_path / "a")
+    assert get_deduplicator(tmp_path / "a" / ".." / "a") is first
+    assert get_deduplicator(tmp_path / "b") is not first
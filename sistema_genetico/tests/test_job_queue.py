@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+from generation_manifest import GenerationManifest
+from job_queue import (
+    FINISHED_STATES, JOB_CANCELLED, JOB_DONE, JOB_QUEUED, JOB_RUNNING, JobContext, JobQueue
+)
+
+
+def _wait_finished(queue, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while queue.get(job_id)['state'] not in FINISHED_STATES:
+        assert time.time() < deadline, "el trabajo no terminó a tiempo"
+        time.sleep(0.02)
+    return queue.get(job_id)
+
+
+@pytest.fixture
+def queues(tmp_path):
+    """Crea colas sobre la misma base de datos (cada una simula un proceso)"""
+    created = []
+
+    def make(**handlers):
+        queue = JobQueue(tmp_path / "jobs.db")
+        for kind, handler in handlers.items():
+            queue.register_handler(kind, handler)
+        created.append(queue)
+        return queue
+
+    yield make
+    for queue in created:
+        queue.stop()
+
+
+def test_submit_persists_params_with_run_seed(queues):
+    queue = queues(echo=lambda params, context: {'params': params})
+
+    job_id = queue.submit('echo', {'cantidad': 3}, total=3)
+    job = queue.get(job_id)
+    assert job['state'] == JOB_QUEUED and job['total'] == 3
+    assert job['params']['cantidad'] == 3
+    assert isinstance(job['params']['run_seed'], int)
+    # Una semilla explícita se respeta
+    assert queue.get(queue.submit('echo', {'run_seed': 42}))['params']['run_seed'] == 42
+    with pytest.raises(ValueError):
+        queue.submit('missing', {})
+
+    queue.start()
+    job = _wait_finished(queue, job_id)
+    assert job['state'] == JOB_DONE
+    assert job['result']['params'] == job['params']
+
+
+def test_cancel_queued_and_running_jobs(queues):
+    started = threading.Event()
+
+    def wait_for_cancel(params, context):
+        started.set()
+        assert context.cancel_event.wait(10)
+        return {'success': True}
+
+    queue = queues(wait=wait_for_cancel)
+    running_id = queue.submit('wait', {})
+    queued_id = queue.submit('wait', {})
+    queue.start()
+    assert started.wait(10)
+
+    # El segundo sigue en cola (un solo hilo): se cancela sin llegar a ejecutarse
+    assert queue.cancel(queued_id)
+    assert queue.get(queued_id)['state'] == JOB_CANCELLED
+    assert not queue.cancel(queued_id)
+
+    assert queue.cancel(running_id)
+    job = _wait_finished(queue, running_id)
+    assert job['state'] == JOB_CANCELLED and job['cancel_requested']
+    assert not queue.cancel('missing')
+
+
+def test_running_job_is_requeued_on_restart_with_same_run_seed(queues):
+    first = queues(gen=lambda params, context: {})
+    job_id = first.submit('gen', {'cantidad': 2})
+    # El proceso cae con el trabajo tomado y un punto de control guardado
+    claimed = first._claim_next()
+    assert claimed['id'] == job_id and first.get(job_id)['state'] == JOB_RUNNING
+    first._update_progress(job_id, 1, 2, {'completed': 1})
+
+    seen = []
+    restarted = queues(gen=lambda params, context: seen.append((params, context.checkpoint)) or {})
+    restarted.start()
+    job = _wait_finished(restarted, job_id)
+
+    assert job['state'] == JOB_DONE
+    assert seen == [(claimed['params'], {'completed': 1})]
+
+
+def test_restarted_genetic_job_resumes_from_manifest(queues, outputs_dir, fake_webui):
+    pytest.importorskip("flask")
+    pytest.importorskip("numpy")
+    import web_interface
+
+    params = {'cantidad': 4, 'dedup': False, 'columnar_output': False, 'global_uniqueness': False,
+              'write_behind': False}
+    first = queues(genetic=web_interface._run_genetic_job)
+    job_id = first.submit('genetic', params, total=4)
+    job = first._claim_next()
+    # Primer intento: la WebUI cae tras dos imágenes y el proceso muere sin cerrar el trabajo
+    fake_webui.fail_after = 2
+    web_interface._run_genetic_job(job['params'], JobContext(first, job_id, job['checkpoint']))
+    checkpoint = first.get(job_id)['checkpoint']
+    assert checkpoint['completed'] == 2
+    first_seeds = [request['params']['seed'] for request in fake_webui.requests]
+
+    fake_webui.fail_after = None
+    fake_webui.requests.clear()
+    restarted = queues(genetic=web_interface._run_genetic_job)
+    restarted.start()
+    assert _wait_finished(restarted, job_id)['state'] == JOB_DONE
+
+    manifest = GenerationManifest.load(checkpoint['output_dir'])
+    assert manifest.run_seed == job['params']['run_seed'] == checkpoint['run_seed']
+    assert manifest.completed_count == 4
+    # Solo se generan los índices que faltaban, con las semillas del lote
+    resumed_seeds = [request['params']['seed'] for request in fake_webui.requests]
+    assert len(resumed_seeds) == 2
+    assert sorted(first_seeds + resumed_seeds) == sorted(record['seed'] for record in manifest.completed.values())
@@ -0,0 +1,74 @@
+import json
+import os
+
+from output_catalog import CATALOG_FILENAME, OutputCatalog, profile_fields
+
+
+def _profile(gender, age, skin_tone):
+    return {'metadata': {'nationality': 'Venezuela', 'gender': gender, 'age': age},
+            'ethnic_characteristics': {'skin_tone': skin_tone, 'features': ['x']}}
+
+
+def _save(outputs, relative, metadata=None, mtime=None):
+    path = outputs / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"png")
+    if metadata is not None:
+        path.with_suffix('.json').write_text(json.dumps(metadata))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_profile_fields_accepts_both_engines():
+    genetic = profile_fields(_profile('female', '31', 'olive'))
+    assert genetic == {'nationality': 'Venezuela', 'gender': 'female', 'age': 31, 'traits': {'skin_tone': 'olive'}}
+    assert profile_fields({'genetic_profile': _profile('male', 'n/a', 'dark')})['age'] is None
+    assert profile_fields(None) == {'traits': {}}
+
+
+def test_query_filters_and_pages(tmp_path):
+    outputs = tmp_path / "outputs"
+    catalog = OutputCatalog(outputs)
+    for i in range(5):
+        gender, skin_tone = ('female', 'olive') if i % 2 else ('male', 'dark')
+        path = _save(outputs, f"model_a/lote1/img_{i}.png", mtime=1000 + i)
+        catalog.record(path, metadata=_profile(gender, 20 + i, skin_tone))
+    catalog.record(_save(outputs, "model_b/lote2/img_9.png", mtime=2000), metadata=_profile('female', 50, 'olive'))
+
+    assert catalog.count() == 6
+    assert catalog.count({'model': 'model_a', 'gender': 'female'}) == 2
+    assert catalog.count({'traits': {'skin_tone': 'olive'}, 'age_min': 40}) == 1
+    assert [f['name'] for f in catalog.query({'name': 'img_1'})['files']] == ["img_1.png"]
+
+    # Páginas estables ordenadas por fecha y sin solapes
+    pages = [catalog.query({'kind': 'image'}, limit=4, offset=offset) for offset in (0, 4)]
+    assert [page['total'] for page in pages] == [6, 6]
+    names = [f['name'] for page in pages for f in page['files']]
+    assert names == ["img_9.png", "img_4.png", "img_3.png", "img_2.png", "img_1.png", "img_0.png"]
+    ascending = catalog.query(sort='name', descending=False, limit=2)
+    assert [f['name'] for f in ascending['files']] == ["img_0.png", "img_1.png"]
+    # Una columna de orden desconocida no llega al SQL
+    assert catalog.query(sort='name; DROP TABLE artifacts', limit=1)['files'][0]['name'] == "img_9.png"
+
+    batches = {(b['model'], b['batch']): b['images'] for b in catalog.batches()}
+    assert batches == {('model_a', 'lote1'): 5, ('model_b', 'lote2'): 1}
+
+
+def test_refresh_indexes_sidecars_and_drops_missing_files(tmp_path):
+    outputs = tmp_path / "outputs"
+    catalog = OutputCatalog(outputs)
+    _save(outputs, "model_a/lote1/img_0.png", metadata=_profile('female', 30, 'olive'))
+    stale = _save(outputs, "model_a/lote1/img_1.png")
+    # Ya registrado al guardarse: refresh no vuelve a indexarlo
+    catalog.record(stale)
+
+    assert catalog.refresh() == {'added': 2, 'removed': 0, 'total': 3}
+    # Las bases de datos internas no se catalogan
+    assert catalog.count({'name': CATALOG_FILENAME}) == 0
+    assert catalog.count({'kind': 'metadata'}) == 1
+    assert catalog.count({'traits': {'skin_tone': 'olive'}, 'gender': 'female'}) == 1
+
+    stale.unlink()
+    assert catalog.refresh() == {'added': 0, 'removed': 1, 'total': 2}
+    assert catalog.locate("model_a/lote1/img_1.png") is None
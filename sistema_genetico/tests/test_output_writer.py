@@ -0,0 +1,119 @@
+import csv
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from output_writer import WriteBehindWriter
+
+CORE_DIR = Path(__file__).parent.parent / "core"
+
+# Proceso que encola filas CSV y muere con SIGKILL dentro del callback de la fila 20
+KILLED_WRITER = """
+import os, signal, sys
+sys.path.insert(0, {core!r})
+from output_writer import WriteBehindWriter
+
+def durable(i):
+    print(i, flush=True)
+    if i >= 20:
+        os.kill(os.getpid(), signal.SIGKILL)
+
+writer = WriteBehindWriter(fsync_batch=3, fsync_interval=0.05)
+for i in range(200):
+    writer.submit([('csv', {path!r}, {{'index': i}})], on_durable=lambda i=i: durable(i))
+writer.close()
+"""
+
+
+def _csv_indices(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [int(row['index']) for row in csv.DictReader(f)]
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="SIGKILL no disponible")
+def test_rows_up_to_last_callback_survive_kill(tmp_path):
+    path = tmp_path / "analysis.csv"
+    result = subprocess.run([sys.executable, "-c", KILLED_WRITER.format(core=str(CORE_DIR), path=str(path))],
+                            capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == -9
+    durable = [int(line) for line in result.stdout.split()]
+    assert durable and durable[-1] >= 20
+    on_disk = _csv_indices(path)
+    assert on_disk[:durable[-1] + 1] == list(range(durable[-1] + 1))
+
+
+def test_units_are_written_and_acknowledged_in_order(tmp_path):
+    writer = WriteBehindWriter(fsync_batch=4, fsync_interval=0.05)
+    acknowledged = []
+    for i in range(10):
+        writer.submit([('bytes', tmp_path / f"{i}.png", b"png"), ('json', tmp_path / f"{i}.json", {'i': i}),
+                       ('csv', tmp_path / "analysis.csv", {'index': i})],
+                      on_durable=lambda i=i: acknowledged.append(i))
+    assert writer.flush(10)
+    writer.close()
+
+    assert acknowledged == list(range(10))
+    assert _csv_indices(tmp_path / "analysis.csv") == list(range(10))
+    assert all((tmp_path / f"{i}.png").read_bytes() == b"png" for i in range(10))
+
+
+def test_full_queue_blocks_producer_until_disk_catches_up(tmp_path):
+    writer = WriteBehindWriter(max_pending=1, fsync_interval=0.05)
+    entered, release = threading.Event(), threading.Event()
+    write = writer._write
+
+    def slow_write(kind, path, payload):
+        entered.set()
+        assert release.wait(10)
+        write(kind, path, payload)
+
+    writer._write = slow_write
+    writer.submit([('bytes', tmp_path / "0.png", b"0")])
+    assert entered.wait(10)
+    # El hilo de disco está ocupado: la siguiente unidad llena la cola y la tercera espera
+    writer.submit([('bytes', tmp_path / "1.png", b"1")])
+    producer = threading.Thread(target=writer.submit, args=([('bytes', tmp_path / "2.png", b"2")],))
+    producer.start()
+    producer.join(0.3)
+    assert producer.is_alive()
+    assert writer.stats['backpressure_waits'] == 1
+
+    release.set()
+    producer.join(10)
+    writer.close()
+    assert writer.stats['written'] == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["0.png", "1.png", "2.png"]
+
+
+def test_failed_unit_is_dropped_without_callback(tmp_path):
+    writer = WriteBehindWriter(fsync_interval=0.05)
+    acknowledged = []
+    writer.submit([('csv', tmp_path / "analysis.csv", {'index': 0}),
+                   ('bytes', tmp_path / "missing" / "0.png", b"0")],
+                  on_durable=lambda: acknowledged.append(0))
+    writer.submit([('bytes', tmp_path / "1.png", b"1")], on_durable=lambda: acknowledged.append(1))
+    assert writer.flush(10)
+    writer.close()
+
+    assert acknowledged == [1]
+    assert writer.stats['errors'] == 1 and writer.stats['written'] == 1
+
+
+def test_columnar_rows_are_written_at_close(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "analysis.parquet"
+    writer = WriteBehindWriter(fsync_interval=0.05)
+    acknowledged = []
+    writer.submit([('columnar', path, {'index': 0})], on_durable=lambda: acknowledged.append(0))
+    assert writer.flush(10)
+
+    # El callback no espera al Parquet: sus filas siguen en memoria hasta close()
+    assert acknowledged == [0]
+    assert not path.exists()
+    writer.close()
+    import pyarrow.parquet as pq
+    assert pq.read_table(str(path)).column('index').to_pylist() == [0]
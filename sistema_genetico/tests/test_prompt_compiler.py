@@ -0,0 +1,40 @@
+import logging
+
+from prompt_compiler import BatchPromptCompiler
+
+DIVERSITY_PARAMS = {'genero': 'mujer', 'skin_control': 'olive', 'hair_control': 'random'}
+
+
+def _items(count):
+    return [(i, {'metadata': {'gender': 'female', 'nationality': 'Venezuela', 'age': 20 + i % 30},
+                 'extra': i}) for i in range(count)]
+
+
+def test_constant_parts_are_compiled_once_per_batch():
+    compiler = BatchPromptCompiler(DIVERSITY_PARAMS, run_seed=3)
+    prompt = compiler.render_index(_items(1)[0][1], 0)
+
+    assert prompt.startswith("venezuelan passport photo, female from Venezuela, 20 years old, ")
+    assert prompt.endswith(compiler.suffix)
+    assert "olive skin" in compiler.suffix and "random" not in compiler.suffix
+    # Depende solo de (run_seed, índice)
+    assert compiler.render_index(_items(1)[0][1], 0) == prompt
+    assert BatchPromptCompiler(DIVERSITY_PARAMS, run_seed=3, index_offset=5).render_index(_items(1)[0][1], 0) == \
+        compiler.render_index(_items(1)[0][1], 5)
+
+
+def test_process_pool_gives_same_prompts_in_order(caplog):
+    compiler = BatchPromptCompiler(DIVERSITY_PARAMS, run_seed=11)
+    items = _items(50)
+
+    serial = list(compiler.iter_prompts(items))
+    with caplog.at_level(logging.WARNING, logger="prompt_compiler"):
+        pooled = list(compiler.iter_prompts(iter(items), workers=2, chunk_size=7))
+
+    # Sin avisos: los bloques se renderizaron en el pool y no en la ruta de respaldo
+    assert caplog.records == []
+    assert pooled == serial
+    assert [index for index, _, _ in pooled] == list(range(50))
+    # El perfil completo vuelve al consumidor aunque al proceso solo viajen sus metadatos
+    assert all(profile['extra'] == index for index, profile, _ in pooled)
+    assert len({prompt for _, _, prompt in serial}) > 1
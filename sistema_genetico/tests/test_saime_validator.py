@@ -0,0 +1,99 @@
+import logging
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from saime_validator import SAIMEValidator  # noqa: E402
+
+
+def _photo(width=512, height=768, background=255, face=(120, 110, 100)):
+    """Retrato sintético: fondo liso, óvalo de rostro y hombros"""
+    image = np.full((height, width, 3), background, dtype=np.uint8)
+    cv2.ellipse(image, (width // 2, int(height * 0.35)), (width // 5, height // 6), 0, 0, 360, face, -1)
+    cv2.rectangle(image, (width // 6, int(height * 0.75)), (width * 5 // 6, height), face, -1)
+    return image
+
+
+@pytest.fixture
+def images(tmp_path):
+    variants = [_photo(), _photo(600, 600), _photo(background=90), _photo(256, 384), _photo(1024, 1536)]
+    paths = []
+    for i, image in enumerate(variants):
+        path = tmp_path / f"img_{i}.png"
+        cv2.imwrite(str(path), image)
+        paths.append(str(path))
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    paths.insert(2, str(broken))
+    return paths
+
+
+def test_batch_matches_validate_image_in_order(images, caplog):
+    validator = SAIMEValidator()
+    expected = [validator.validate_image(path) for path in images]
+    progress = []
+
+    with caplog.at_level(logging.WARNING, logger="saime_validator"):
+        results = list(validator.validate_batch(iter(images), workers=2, chunk_size=2,
+                                                progress_callback=lambda *args: progress.append(args)))
+
+    # Sin avisos de respaldo: los bloques se validaron en el pool
+    assert not [record for record in caplog.records if "pool" in record.getMessage()]
+    assert [path for path, _ in results] == images
+    assert [result for _, result in results] == expected
+    assert validator.last_batch_stats['images'] == len(images)
+    assert validator.last_batch_stats['valid'] == sum(result.is_valid for result in expected)
+    assert [count for count, _, _ in progress] == list(range(1, len(images) + 1))
+
+
+def test_batch_workers_use_the_validator_specs(images):
+    validator = SAIMEValidator()
+    validator.saime_specs['target_width'] = 600
+    validator.saime_specs['target_height'] = 600
+    validator.saime_specs['aspect_ratio'] = 1.0
+
+    serial = list(validator.validate_batch(images, workers=0))
+    pooled = list(validator.validate_batch(images, workers=2, chunk_size=3))
+
+    assert pooled == serial
+    square = dict(pooled)[images[1]]
+    assert "dimensions" in square.compliance_details
+    assert square.compliance_details["dimensions"]["violations"] == []
+
+
+@pytest.mark.parametrize("variant", [_photo(), _photo(600, 600, background=90), _photo(1024, 1536)])
+def test_in_memory_entry_points_match_validate_image(tmp_path, variant):
+    Image = pytest.importorskip("PIL.Image")
+    validator = SAIMEValidator()
+    path = tmp_path / "photo.png"
+    cv2.imwrite(str(path), variant)
+    expected = validator.validate_image(str(path))
+    data = path.read_bytes()
+    rgb = cv2.cvtColor(variant, cv2.COLOR_BGR2RGB)
+
+    assert validator.validate_bytes(data) == expected
+    assert validator.validate(bytearray(data)) == expected
+    assert validator.validate(path) == expected
+    assert validator.validate_pil(Image.open(path)) == expected
+    assert validator.validate(Image.fromarray(rgb).convert('RGBA')) == expected
+    assert validator.validate_array(variant) == expected
+    assert validator.validate(rgb, color_order='rgb') == expected
+    assert validator.validate_array(cv2.cvtColor(rgb, cv2.COLOR_RGB2RGBA), color_order='rgb') == expected
+    assert validator.validate_array(cv2.cvtColor(variant, cv2.COLOR_BGR2BGRA)) == expected
+
+    # Escala de grises: igual que leer el PNG gris con IMREAD_COLOR
+    gray = cv2.cvtColor(variant, cv2.COLOR_BGR2GRAY)
+    gray_path = tmp_path / "gray.png"
+    cv2.imwrite(str(gray_path), gray)
+    expected_gray = validator.validate_image(str(gray_path))
+    assert validator.validate_array(gray) == expected_gray
+    assert validator.validate_pil(Image.open(gray_path)) == expected_gray
+
+
+def test_in_memory_entry_points_reject_bad_input():
+    validator = SAIMEValidator()
+    assert validator.validate_bytes(b"not an image").violations == ["No se pudo decodificar la imagen"]
+    assert not validator.validate_array(np.zeros((10, 10, 3), dtype=np.float32)).is_valid
+    assert not validator.validate_array(np.zeros((10, 10, 5), dtype=np.uint8)).is_valid
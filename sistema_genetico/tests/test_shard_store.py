@@ -0,0 +1,80 @@
+import json
+import tarfile
+
+import pytest
+
+from conftest import png_bytes
+from file_manager import FileManager
+from shard_store import ShardWriter, iter_samples, load_shard_index, read_member
+
+
+def _sample(i):
+    return [('png', png_bytes(color=(i, 0, 0))), ('json', json.dumps({'i': i}).encode())]
+
+
+def test_members_round_trip_through_index_and_tar(tmp_path):
+    writer = ShardWriter(tmp_path, max_samples=2)
+    entries = [entry for i in range(5) for entry in writer.add(f"img_{i}", _sample(i))]
+    writer.close()
+
+    # Rotación cada 2 muestras y un índice por miembro
+    assert sorted(path.name for path in tmp_path.glob("shard-*.tar")) == [
+        "shard-000000.tar", "shard-000001.tar", "shard-000002.tar"
+    ]
+    index = load_shard_index(tmp_path)
+    assert len(index) == 10
+    for i in range(5):
+        for extension, data in _sample(i):
+            entry = index[f"img_{i}.{extension}"]
+            assert read_member(tmp_path / entry['shard'], entry['offset'], entry['size']) == data
+    assert [entry['member'] for entry in entries] == list(index)
+
+    # Los shards son tar válidos y se leen en streaming agrupados por clave
+    with tarfile.open(tmp_path / "shard-000000.tar") as tar:
+        assert tar.getnames() == ["img_0.png", "img_0.json", "img_1.png", "img_1.json"]
+    assert [(key, sample) for key, sample in iter_samples(tmp_path)] == [
+        (f"img_{i}", dict(_sample(i))) for i in range(5)
+    ]
+
+    # Un lote reanudado abre un shard nuevo sin tocar los cerrados
+    resumed = ShardWriter(tmp_path, max_samples=2)
+    assert resumed.add("img_5", _sample(5))[0]['shard'] == "shard-000003.tar"
+    resumed.close()
+    assert len(load_shard_index(tmp_path)) == 12
+
+
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_packed_save_is_located_through_catalog(tmp_path, write_behind):
+    manager = FileManager(base_dir=tmp_path, write_behind=write_behind, layout='packed')
+    output_dir = manager.outputs_dir / "model" / "lote"
+    output_dir.mkdir(parents=True)
+    saved = []
+    result = manager.save_image(png_bytes(color=(7, 7, 7)), output_dir, "img_0",
+                                metadata={'metadata': {'gender': 'female'}}, on_saved=lambda: saved.append(True))
+    manager.close_packed()
+    manager.close()
+
+    assert result['success'] and saved == [True]
+    entry = manager.catalog.locate("model/lote/img_0.png")
+    assert entry['shard'] == "model/lote/shard-000000.tar" and entry['gender'] == 'female'
+    assert read_member(manager.outputs_dir / entry['shard'], entry['offset'], entry['size']) == png_bytes(color=(7, 7, 7))
+
+
+def test_download_serves_packed_member(tmp_path, monkeypatch):
+    pytest.importorskip("flask")
+    import web_interface
+
+    manager = FileManager(base_dir=tmp_path, layout='packed')
+    output_dir = manager.outputs_dir / "model" / "lote"
+    output_dir.mkdir(parents=True)
+    manager.save_image(png_bytes(color=(9, 0, 0)), output_dir, "img_0", metadata={'i': 0})
+    manager.close_packed()
+    monkeypatch.setattr(web_interface, "file_manager", manager)
+
+    client = web_interface.app.test_client()
+    response = client.get("/download/model/lote/img_0.png")
+    assert response.status_code == 200
+    assert response.data == png_bytes(color=(9, 0, 0))
+    assert response.mimetype == "image/png"
+    assert client.get("/download/model/lote/img_0.json").get_json() == {'i': 0}
+    assert client.get("/download/model/lote/missing.png").status_code == 404
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+import trait_catalog
+from trait_catalog import (
+    GENDER_BASIC_FEATURES, GENDER_FEATURES, REGION_BIAS_WEIGHTS, TraitCatalog, TraitCategory, get_catalog
+)
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    """Catálogo compilado desde un data/ temporal"""
+    monkeypatch.setattr(trait_catalog, "ULTRA_OVERRIDE_FILE", tmp_path / "missing.json")
+    (tmp_path / "diversity_data.json").write_text(json.dumps({
+        'face_shapes': ['oval', 'square', 'heart', 'chiseled', 'oval', 'blob'],
+        'clothing_colors': ['red', 'blue'],
+        'version': 3
+    }))
+    (tmp_path / "diversity_options.json").write_text(json.dumps({'skin_control': ['aleatorio', 'fair']}))
+    return TraitCatalog(tmp_path)
+
+
+def test_category_codes_and_gender_masks():
+    category = TraitCategory('beard', ['none', 'short', 'none'], {'male': ['short', 'long']})
+
+    # Vocabulario sin duplicados; las opciones conservan la multiplicidad
+    assert category.values == ('none', 'short', 'long')
+    assert category.options() == ('none', 'short', 'none')
+    assert category.mask() == (0, 1, 0)
+    assert category.options('Hombre') == category.options('male') == ('short', 'long')
+    # Sin opciones propias del género (o género desconocido) se usan todas
+    assert category.options('mujer') == category.options(None) == category.options(42) == ('none', 'short', 'none')
+    assert category.decode(category.code('long')) == 'long'
+    assert category.code('missing') == -1
+    assert 'long' in category and 'missing' not in category
+    assert len(category) == 3
+
+
+def test_catalog_namespaces_filter_by_gender(catalog):
+    face_shapes = catalog.category('ultra', 'face_shapes')
+    assert catalog.namespace('ultra')['face_shapes'] == face_shapes.options()
+    assert 'version' not in catalog.namespace('ultra')
+
+    male = catalog.options('ultra', 'face_shapes', 'hombre')
+    female = catalog.options('ultra', 'face_shapes', 'mujer')
+    assert set(male) <= set(GENDER_FEATURES['male']['face_shapes'])
+    assert 'chiseled' in male and 'chiseled' not in female
+    # Menos de 5 opciones tras filtrar: se completan con las básicas del género
+    assert female[-len(GENDER_BASIC_FEATURES['female']['face_shapes']):] == tuple(
+        GENDER_BASIC_FEATURES['female']['face_shapes']
+    )
+    # Las categorías sin rasgos por género no se filtran
+    assert catalog.options('ultra', 'clothing_colors', 'hombre') == ('red', 'blue')
+
+    assert catalog.options('options', 'skin_control') == ('aleatorio', 'fair')
+    assert catalog.options('genetic', 'facial_hair', 'male') == ('none', 'light', 'medium', 'heavy')
+    assert catalog.contains('genetic', 'skin_tone', 'olive')
+    assert not catalog.contains('genetic', 'skin_tone', 'green')
+    assert catalog.options('genetic', 'missing') == ()
+    assert catalog.namespace('missing') == {}
+
+
+def test_region_weights_and_shared_instance(catalog):
+    values, weights = catalog.region_weights('Caracas', 'hair_color')
+    expected = {value: weight for value, weight in REGION_BIAS_WEIGHTS['Caracas']['hair_color'].items() if weight > 0}
+    assert dict(zip(values, weights)) == expected
+    assert catalog.region_weights('Caracas', 'face_shape') is None
+    assert catalog.region_weights('Lima', 'hair_color') is None
+
+    assert get_catalog() is get_catalog()
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from uniqueness_index import TRAIT_INDEX_FILENAME, TraitVectorIndex
+
+TRAITS = {'skin_tone': 'olive', 'hair_color': 'black', 'nationality': 'Venezuela', 'gender': 'female'}
+
+
+def _stored(outputs_dir):
+    with sqlite3.connect(str(outputs_dir / TRAIT_INDEX_FILENAME)) as conn:
+        return conn.execute("SELECT run_seed, profile_index FROM trait_vectors").fetchall()
+
+
+def test_reservation_blocks_other_runs_until_released(tmp_path):
+    index = TraitVectorIndex(tmp_path)
+
+    assert index.reserve(TRAITS, run_seed=1, profile_index=0)
+    assert not index.reserve(TRAITS, run_seed=2, profile_index=0)
+    # El mismo perfil (p. ej. al reanudar) no cuenta como repetido
+    assert index.reserve(TRAITS, run_seed=1, profile_index=0)
+
+    assert index.release(1) == 1
+    assert _stored(tmp_path) == []
+    assert index.reserve(TRAITS, run_seed=2, profile_index=0)
+
+
+def test_commit_persists_across_processes(tmp_path):
+    index = TraitVectorIndex(tmp_path)
+    index.reserve(TRAITS, run_seed=1, profile_index=3)
+    index.commit(TRAITS, run_seed=1, profile_index=3)
+    assert index.release(1) == 0
+
+    reopened = TraitVectorIndex(tmp_path)
+    assert _stored(tmp_path) == [(1, 3)]
+    assert not reopened.reserve(TRAITS, run_seed=2, profile_index=0)
+    assert reopened.reserve(dict(TRAITS, hair_color='red'), run_seed=2, profile_index=0)
+
+
+def test_failed_job_only_burns_saved_combinations(outputs_dir, fake_webui):
+    pytest.importorskip("numpy")
+    from genetic_engine import generate_genetic_batch
+
+    fake_webui.fail_after = 2
+    result = generate_genetic_batch({'cantidad': 5, 'run_seed': 11, 'dedup': False, 'columnar_output': False,
+                                     'write_behind': False, 'global_uniqueness': True})
+
+    assert result['generated_count'] == 2
+    saved = sorted(image['profile']['replication_info']['profile_index'] for image in result['images'])
+    assert sorted(index for _, index in _stored(outputs_dir)) == saved
@@ -0,0 +1,92 @@
+import logging
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from validation_stage import InlineValidationStage  # noqa: E402
+
+
+def _png(width, height):
+    return cv2.imencode(".png", np.full((height, width, 3), 255, dtype=np.uint8))[1].tobytes()
+
+
+GOOD, BAD = _png(512, 768), _png(600, 600)
+
+
+@pytest.fixture
+def stages():
+    created = []
+
+    def make(**kwargs):
+        stage = InlineValidationStage(run_seed=5, rules=['dimensions'], **kwargs)
+        created.append(stage)
+        return stage
+
+    yield make
+    for stage in created:
+        stage.close()
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_failed_image_is_regenerated_with_deterministic_seed(stages, workers, caplog):
+    stage = stages(workers=workers, max_retries=2)
+    seeds = []
+
+    def regenerate(seed):
+        seeds.append(seed)
+        return BAD if len(seeds) == 1 else GOOD
+
+    with caplog.at_level(logging.WARNING, logger="validation_stage"):
+        image, summary = stage.run(3, BAD, regenerate, seed=100)
+
+    # Sin avisos de respaldo: con workers=2 se validó en el pool
+    assert not [record for record in caplog.records if "pool" in record.getMessage()]
+    assert image == GOOD
+    assert seeds == [stage.retry_seed(3, 1), stage.retry_seed(3, 2)]
+    assert seeds == [InlineValidationStage(run_seed=5, workers=0).retry_seed(3, attempt) for attempt in (1, 2)]
+    assert summary['valid'] and summary['attempts'] == 3 and summary['seed'] == seeds[-1]
+    stats = stage.stats()
+    assert (stats['validated'], stats['accepted'], stats['regenerated'], stats['rejected']) == (3, 1, 2, 0)
+    assert stats['rule_pass_rates']['dimensions'] == round(1 / 3, 4)
+
+    profile = {'generation_parameters': {'seed': 100}}
+    InlineValidationStage.annotate(profile, summary, accepted=True)
+    assert profile['generation_parameters']['seed'] == seeds[-1]
+    assert profile['saime_validation'] is summary
+
+
+def test_image_is_rejected_after_retry_budget(stages):
+    stage = stages(workers=0, max_retries=1)
+    calls = []
+
+    image, summary = stage.run(0, BAD, lambda seed: calls.append(seed) or BAD, seed=1)
+
+    assert image is None and len(calls) == 1
+    assert not summary['valid'] and summary['failed_rules'] == ['dimensions']
+    assert stage.stats()['rejected'] == 1
+
+
+def test_failed_generation_is_retried_then_rejected(stages):
+    stage = stages(workers=0, max_retries=2)
+
+    def regenerate(seed):
+        raise RuntimeError("backend caído")
+
+    image, summary = stage.run(0, None, regenerate, seed=1)
+
+    assert image is None
+    assert summary == {'valid': False, 'attempts': 3, 'seed': stage.retry_seed(0, 2), 'failed_rules': ['generation']}
+    assert stage.stats()['validated'] == 0
+
+
+def test_only_selected_rules_gate_acceptance(stages):
+    # El fondo blanco sin rostro falla otras reglas, pero solo se exige 'dimensions'
+    stage = stages(workers=0, max_retries=0)
+    image, summary = stage.run(0, GOOD, lambda seed: None)
+    assert image == GOOD and summary['valid']
+    assert summary['violations']
+
+    strict = InlineValidationStage(run_seed=5, workers=0, max_retries=0)
+    assert strict.run(0, GOOD, lambda seed: None)[0] is None
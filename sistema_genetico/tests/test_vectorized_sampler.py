@@ -0,0 +1,80 @@
+import dataclasses
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from diversity_engine import (  # noqa: E402
+    ADVANCED_CONTROL_DEFAULTS, ADVANCED_REGIONS, FACIAL_HAIR_CHOICES, GENDERED_RECENCY_CONTROLS,
+    GENERIC_RECENCY_FIELDS, UltraDiversityEngine
+)
+
+COUNT = 30
+# Campo del perfil -> categoría con anti-repetición
+RECENCY_CATEGORIES = dict([(field, category) for field, category, _ in GENDERED_RECENCY_CONTROLS.values()],
+                          **GENERIC_RECENCY_FIELDS)
+
+
+def _per_profile(engine, count, gender, region="aleatorio"):
+    return [engine.generate_advanced_genetic_profile("Venezuela", region, gender, 30, **ADVANCED_CONTROL_DEFAULTS)
+            for _ in range(count)]
+
+
+def _batch(engine, count, gender, region="aleatorio"):
+    return engine.generate_advanced_genetic_profiles_batch(count, "Venezuela", region, gender, 30)
+
+
+def _no_repeat_prefix(engine, values, field):
+    """Los primeros valores no se repiten mientras queden opciones fuera del historial"""
+    distinct = len(set(engine.diversity_data[RECENCY_CATEGORIES[field]]))
+    prefix = values[:min(distinct, 15)]
+    return len(set(prefix)) == len(prefix)
+
+
+@pytest.mark.parametrize("generate", [_per_profile, _batch])
+@pytest.mark.parametrize("gender", ["mujer", "hombre"])
+def test_gender_region_and_no_repeat_constraints(generate, gender):
+    engine = UltraDiversityEngine(run_seed=5)
+    profiles = generate(engine, COUNT, gender)
+
+    assert len(profiles) == COUNT
+    assert all(profile.region in ADVANCED_REGIONS for profile in profiles)
+    if gender == "mujer":
+        assert all(getattr(profile, field) == "none" for profile in profiles for field in FACIAL_HAIR_CHOICES)
+    else:
+        assert all(profile.makeup == "none" for profile in profiles)
+    for field in RECENCY_CATEGORIES:
+        values = [getattr(profile, field) for profile in profiles]
+        assert _no_repeat_prefix(engine, values, field), field
+
+    fixed = generate(UltraDiversityEngine(run_seed=5), 3, gender, region="caracas")
+    assert [profile.region for profile in fixed] == ["caracas"] * 3
+
+
+def test_batch_profiles_have_per_profile_schema():
+    single = _per_profile(UltraDiversityEngine(run_seed=1), 1, "mujer")[0]
+    batch = _batch(UltraDiversityEngine(run_seed=1), 1, "mujer")[0]
+
+    for field in dataclasses.fields(single):
+        expected, actual = getattr(single, field.name), getattr(batch, field.name)
+        assert type(actual) is type(expected), field.name
+
+
+def test_batch_continues_per_profile_history():
+    engine = UltraDiversityEngine(run_seed=2)
+    first = _per_profile(engine, 5, "hombre")
+    second = _batch(engine, 5, "hombre")
+
+    clothing = [profile.clothing_type for profile in first + second]
+    assert len(set(clothing)) == len(clothing)
+
+
+def test_balanced_profiles_use_balanced_controls():
+    engine = UltraDiversityEngine(run_seed=3)
+    profiles = engine.generate_balanced_profiles(
+        9, "Venezuela", "mujer", 30, {"skin_control": ["aleatorio", "fair", "dark", "olive"]}
+    )
+
+    assert all(profile is not None for profile in profiles)
+    assert sorted(profile.skin_tone for profile in profiles) == ["dark"] * 3 + ["fair"] * 3 + ["olive"] * 3
+    assert all(profile.region in ADVANCED_REGIONS for profile in profiles)
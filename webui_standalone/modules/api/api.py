@@ -1,18 +1,25 @@
 import base64
 import io
+import json
 import os
 import time
 import datetime
 import uvicorn
 import ipaddress
 import requests
+import uuid
 import gradio as gr
-from threading import Lock
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Condition, Lock
 from io import BytesIO
-from fastapi import APIRouter, Depends, FastAPI, Request, Response
+from fastapi import APIRouter, Depends, FastAPI, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.exceptions import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
 from fastapi.encoders import jsonable_encoder
 from secrets import compare_digest
 
@@ -28,6 +35,7 @@ from modules.sd_models_config import find_checkpoint_config_near_filename
 from modules.realesrgan_model import get_realesrgan_models
 from modules import devices
 from typing import Any
+import numpy as np
 import piexif
 import piexif.helper
 from contextlib import closing
@@ -40,6 +48,38 @@ def script_name_to_index(name, scripts):
         raise HTTPException(status_code=422, detail=f"Script '{name}' not found") from e
 
 
+def validate_per_image_lists(req):
+    """per-image prompt/seed lists must describe exactly batch_size * n_iter images"""
+    total = (req.batch_size or 1) * (req.n_iter or 1)
+    for field in ("prompt", "negative_prompt", "seed", "subseed"):
+        value = getattr(req, field, None)
+        if isinstance(value, list) and len(value) != total:
+            raise HTTPException(status_code=422, detail=f"{field} has {len(value)} entries, expected batch_size * n_iter = {total}")
+
+
+def validate_response_format(req):
+    if req.response_format not in ("base64", "binary"):
+        raise HTTPException(status_code=422, detail=f"Invalid response_format: {req.response_format}")
+
+
+encode_media_types = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg", "webp": "image/webp", "raw": "application/octet-stream", "npy": "application/octet-stream"}
+
+
+def validate_encode_options(req):
+    if req.image_format is not None and req.image_format.lower() not in encode_media_types:
+        raise HTTPException(status_code=422, detail=f"Invalid image_format: {req.image_format}")
+    if req.png_compress_level is not None and not 0 <= req.png_compress_level <= 9:
+        raise HTTPException(status_code=422, detail=f"png_compress_level must be between 0 and 9, got {req.png_compress_level}")
+
+
+def pop_encode_options(args):
+    return {
+        "image_format": args.pop('image_format', None),
+        "png_compress_level": args.pop('png_compress_level', None),
+        "webp_lossless": args.pop('webp_lossless', False),
+    }
+
+
 def validate_sampler_name(name):
     config = sd_samplers.all_samplers_map.get(name, None)
     if config is None:
@@ -99,37 +139,229 @@ def decode_base64_to_image(encoding):
         raise HTTPException(status_code=500, detail="Invalid encoded image") from e
 
 
-def encode_pil_to_base64(image):
+def encode_pil_to_bytes(image, image_format=None, png_compress_level=None, webp_lossless=False):
+    """Encode as image_format (defaults to the samples format); "raw" is packed RGB bytes, "npy" a NumPy HxWx3 uint8 array"""
+    image_format = (image_format or opts.samples_format).lower()
     with io.BytesIO() as output_bytes:
-        if isinstance(image, str):
-            return image
-        if opts.samples_format.lower() == 'png':
+        if image_format == 'png':
             use_metadata = False
             metadata = PngImagePlugin.PngInfo()
             for key, value in image.info.items():
                 if isinstance(key, str) and isinstance(value, str):
                     metadata.add_text(key, value)
                     use_metadata = True
-            image.save(output_bytes, format="PNG", pnginfo=(metadata if use_metadata else None), quality=opts.jpeg_quality)
+            compress_level = {} if png_compress_level is None else {"compress_level": png_compress_level}
+            image.save(output_bytes, format="PNG", pnginfo=(metadata if use_metadata else None), quality=opts.jpeg_quality, **compress_level)
+
+        elif image_format == 'raw':
+            return image.convert("RGB").tobytes()
+
+        elif image_format == 'npy':
+            np.save(output_bytes, np.asarray(image.convert("RGB")), allow_pickle=False)
 
-        elif opts.samples_format.lower() in ("jpg", "jpeg", "webp"):
+        elif image_format in ("jpg", "jpeg", "webp"):
             if image.mode in ("RGBA", "P"):
                 image = image.convert("RGB")
             parameters = image.info.get('parameters', None)
             exif_bytes = piexif.dump({
                 "Exif": { piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump(parameters or "", encoding="unicode") }
             })
-            if opts.samples_format.lower() in ("jpg", "jpeg"):
+            if image_format in ("jpg", "jpeg"):
                 image.save(output_bytes, format="JPEG", exif = exif_bytes, quality=opts.jpeg_quality)
             else:
-                image.save(output_bytes, format="WEBP", exif = exif_bytes, quality=opts.jpeg_quality)
+                image.save(output_bytes, format="WEBP", exif = exif_bytes, quality=opts.jpeg_quality, lossless=webp_lossless)
 
         else:
             raise HTTPException(status_code=500, detail="Invalid image format")
 
-        bytes_data = output_bytes.getvalue()
+        return output_bytes.getvalue()
+
+
+def encode_pil_to_base64(image):
+    if isinstance(image, str):
+        return image
+    return base64.b64encode(encode_pil_to_bytes(image))
+
+
+def encoded_media_type(image_format=None):
+    return encode_media_types.get((image_format or opts.samples_format).lower(), "application/octet-stream")
+
+
+class ResultStore:
+    """Encoded images of response_format=binary requests, served by /sdapi/v1/results until fetched or expired"""
+
+    def __init__(self, ttl=600, max_bytes=1024 ** 3):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.results = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+
+    def put(self, images, media_type):
+        result_id = uuid.uuid4().hex
+        with self.lock:
+            self.results[result_id] = (time.time(), images, media_type)
+            self.size += sum(len(image) for image in images)
+            self.evict(keep=result_id)
+        return result_id
+
+    def get(self, result_id, index):
+        with self.lock:
+            result = self.results.get(result_id)
+            if result is None or not 0 <= index < len(result[1]):
+                return None
+            return result[1][index], result[2]
+
+    def delete(self, result_id):
+        with self.lock:
+            result = self.results.pop(result_id, None)
+            if result is None:
+                return False
+            self.size -= sum(len(image) for image in result[1])
+            return True
+
+    def evict(self, keep=None):
+        now = time.time()
+        while self.results:
+            result_id, (created, images, _) = next(iter(self.results.items()))
+            if result_id == keep or (now - created < self.ttl and self.size <= self.max_bytes):
+                break
+            del self.results[result_id]
+            self.size -= sum(len(image) for image in images)
+
+
+# fields a txt2img-batch item cannot set through params, the job fills them in per batch
+batch_reserved_params = ("prompt", "negative_prompt", "seed", "batch_size", "n_iter", "response_format", "send_images")
+
+
+def parse_txt2img_batch_items(body):
+    """txt2img-batch body: a JSON array of items or JSON Lines with one item per line"""
+    try:
+        text = body.decode("utf-8")
+        if text.lstrip().startswith("["):
+            entries = list(enumerate(json.loads(text), 1))
+        else:
+            entries = []
+            for number, line in enumerate(text.splitlines(), 1):
+                if line.strip():
+                    try:
+                        entries.append((number, json.loads(line)))
+                    except ValueError as e:
+                        raise HTTPException(status_code=422, detail=f"Line {number}: {e}") from e
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid batch body: {e}") from e
+
+    items = []
+    for number, entry in entries:
+        if not isinstance(entry, dict):
+            raise HTTPException(status_code=422, detail=f"Item {number}: expected an object")
+        try:
+            item = models.TextToImageBatchItem(**entry)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Item {number}: {e}") from e
+        item.params = {k: v for k, v in item.params.items() if k not in batch_reserved_params}
+        items.append(item)
+    return items
+
+
+class TextToImageBatchJob:
+    """A txt2img-batch job: items with equal params are grouped into batches, results are buffered as events until streamed"""
+
+    def __init__(self, items, batch_size, max_buffered, idle_timeout=300):
+        self.id = uuid.uuid4().hex
+        self.total = len(items)
+        self.max_buffered = max_buffered
+        self.idle_timeout = idle_timeout
+        self.last_taken = time.time()
+        self.status = "queued"
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = False
+        self.finished_at = None
+        self.events = deque()
+        self.next_event_id = 0
+        self.condition = Condition()
+
+        groups = {}
+        for index, item in enumerate(items):
+            groups.setdefault(json.dumps(item.params, sort_keys=True), []).append((index, item))
+        self.batches = [members[start:start + batch_size] for members in groups.values() for start in range(0, len(members), batch_size)]
+
+    def add_event(self, event, data):
+        with self.condition:
+            # generation pauses while the buffer is full, so a job nobody streams does not pile up images in memory;
+            # if nobody takes events for idle_timeout seconds the job is cancelled so it does not hold the batch worker forever
+            while len(self.events) >= self.max_buffered and not self.cancelled:
+                idle = time.time() - self.last_taken
+                if idle >= self.idle_timeout:
+                    self.cancelled = True
+                    break
+                self.condition.wait(self.idle_timeout - idle)
+            self.events.append((self.next_event_id, event, data))
+            self.next_event_id += 1
+            if event == "image":
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.condition.notify_all()
+
+    def finish(self):
+        with self.condition:
+            self.status = "cancelled" if self.cancelled else "done"
+            self.finished_at = time.time()
+            self.events.append((self.next_event_id, "done", {"status": self.status, "completed": self.completed, "failed": self.failed}))
+            self.next_event_id += 1
+            self.condition.notify_all()
+
+    def cancel(self):
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify_all()
+
+    def take_events(self, offset, timeout=15):
+        """events from offset on; the ones before it count as delivered and are dropped"""
+        with self.condition:
+            self.last_taken = time.time()
+            while self.events and self.events[0][0] < offset:
+                self.events.popleft()
+            self.condition.notify_all()
+            if not self.events and self.finished_at is None:
+                self.condition.wait(timeout)
+            return list(self.events)
+
+    def to_status(self):
+        return models.TextToImageBatchStatus(job_id=self.id, status=self.status, total=self.total, completed=self.completed, failed=self.failed, buffered=len(self.events))
+
+
+def stream_txt2img_batch_events(job, offset, stream):
+    while True:
+        events = job.take_events(offset)
+        if not events:
+            if job.finished_at is not None:
+                return
+            if stream == "sse":
+                yield ": keep-alive\n\n"
+            continue
+
+        for event_id, event, data in events:
+            if stream == "sse":
+                yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+            else:
+                yield json.dumps(dict(data, event=event, id=event_id)) + "\n"
+            offset = event_id + 1
+            if event == "done":
+                return
+
 
-    return base64.b64encode(bytes_data)
+def encode_image(image, **encode_options):
+    # scripts may hand back images that are already base64 encoded
+    return image if isinstance(image, str) else encode_pil_to_bytes(image, **encode_options)
+
+
+def info_with_encode_time(processed, encode_time):
+    info = json.loads(processed.js())
+    info["encode_time"] = round(encode_time, 4)
+    return json.dumps(info, default=lambda o: None)
 
 
 def api_middleware(app: FastAPI):
@@ -207,9 +439,22 @@ class Api:
         self.router = APIRouter()
         self.app = app
         self.queue_lock = queue_lock
+        self.results = ResultStore()
+        self.batch_jobs = {}
+        self.batch_jobs_lock = Lock()
+        # one job at a time, in submission order; each batch still queues on queue_lock with regular requests
+        self.batch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-txt2img-batch")
+        # images are encoded in parallel after queue_lock is released, so the next job starts sampling meanwhile
+        self.encode_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="api-encode")
         api_middleware(self.app)
         self.add_api_route("/sdapi/v1/txt2img", self.text2imgapi, methods=["POST"], response_model=models.TextToImageResponse)
         self.add_api_route("/sdapi/v1/img2img", self.img2imgapi, methods=["POST"], response_model=models.ImageToImageResponse)
+        self.add_api_route("/sdapi/v1/results/{result_id}/{index}", self.get_result_image, methods=["GET"])
+        self.add_api_route("/sdapi/v1/results/{result_id}", self.delete_result, methods=["DELETE"])
+        self.add_api_route("/sdapi/v1/txt2img-batch", self.text2img_batch_api, methods=["POST"], response_model=models.TextToImageBatchResponse)
+        self.add_api_route("/sdapi/v1/txt2img-batch/{job_id}", self.get_txt2img_batch, methods=["GET"], response_model=models.TextToImageBatchStatus)
+        self.add_api_route("/sdapi/v1/txt2img-batch/{job_id}/events", self.stream_txt2img_batch, methods=["GET"])
+        self.add_api_route("/sdapi/v1/txt2img-batch/{job_id}", self.cancel_txt2img_batch, methods=["DELETE"], response_model=models.TextToImageBatchStatus)
         self.add_api_route("/sdapi/v1/extra-single-image", self.extras_single_image_api, methods=["POST"], response_model=models.ExtrasSingleImageResponse)
         self.add_api_route("/sdapi/v1/extra-batch-images", self.extras_batch_images_api, methods=["POST"], response_model=models.ExtrasBatchImagesResponse)
         self.add_api_route("/sdapi/v1/png-info", self.pnginfoapi, methods=["POST"], response_model=models.PNGInfoResponse)
@@ -434,6 +679,10 @@ class Api:
 
         script_runner = scripts.scripts_txt2img
 
+        validate_per_image_lists(txt2imgreq)
+        validate_response_format(txt2imgreq)
+        validate_encode_options(txt2imgreq)
+
         infotext_script_args = {}
         self.apply_infotext(txt2imgreq, "txt2img", script_runner=script_runner, mentioned_script_args=infotext_script_args)
 
@@ -461,33 +710,39 @@ class Api:
 
         send_images = args.pop('send_images', True)
         args.pop('save_images', None)
+        response_format = args.pop('response_format', 'base64')
+        encode_options = pop_encode_options(args)
 
         add_task_to_queue(task_id)
 
-        with self.queue_lock:
-            with closing(StableDiffusionProcessingTxt2Img(sd_model=shared.sd_model, **args)) as p:
-                p.is_api = True
-                p.scripts = script_runner
-                p.outpath_grids = opts.outdir_txt2img_grids
-                p.outpath_samples = opts.outdir_txt2img_samples
+        # everything up to here, and building p, runs concurrently with the job holding queue_lock;
+        # the lock only covers sampling and decode, encoding happens after it is released
+        with closing(StableDiffusionProcessingTxt2Img(sd_model=shared.sd_model, **args)) as p:
+            p.is_api = True
+            p.scripts = script_runner
+            p.outpath_grids = opts.outdir_txt2img_grids
+            p.outpath_samples = opts.outdir_txt2img_samples
+            if selectable_scripts is not None:
+                p.script_args = script_args # Need to pass args as list here
+            else:
+                p.script_args = tuple(script_args) # Need to pass args as tuple here
 
+            with self.queue_lock:
                 try:
                     shared.state.begin(job="scripts_txt2img")
                     start_task(task_id)
                     if selectable_scripts is not None:
-                        p.script_args = script_args
-                        processed = scripts.scripts_txt2img.run(p, *p.script_args) # Need to pass args as list here
+                        processed = scripts.scripts_txt2img.run(p, *p.script_args)
                     else:
-                        p.script_args = tuple(script_args) # Need to pass args as tuple here
                         processed = process_images(p)
                     finish_task(task_id)
                 finally:
                     shared.state.end()
                     shared.total_tqdm.clear()
 
-        b64images = list(map(encode_pil_to_base64, processed.images)) if send_images else []
+        images, encode_time = self.encode_images(processed.images if send_images else [], response_format, encode_options)
 
-        return models.TextToImageResponse(images=b64images, parameters=vars(txt2imgreq), info=processed.js())
+        return models.TextToImageResponse(parameters=vars(txt2imgreq), info=info_with_encode_time(processed, encode_time), **images)
 
     def img2imgapi(self, img2imgreq: models.StableDiffusionImg2ImgProcessingAPI):
         task_id = img2imgreq.force_task_id or create_task_id("img2img")
@@ -496,6 +751,9 @@ class Api:
         if init_images is None:
             raise HTTPException(status_code=404, detail="Init image not found")
 
+        validate_response_format(img2imgreq)
+        validate_encode_options(img2imgreq)
+
         mask = img2imgreq.mask
         if mask:
             mask = decode_base64_to_image(mask)
@@ -531,38 +789,160 @@ class Api:
 
         send_images = args.pop('send_images', True)
         args.pop('save_images', None)
+        response_format = args.pop('response_format', 'base64')
+        encode_options = pop_encode_options(args)
 
         add_task_to_queue(task_id)
 
-        with self.queue_lock:
-            with closing(StableDiffusionProcessingImg2Img(sd_model=shared.sd_model, **args)) as p:
-                p.init_images = [decode_base64_to_image(x) for x in init_images]
-                p.is_api = True
-                p.scripts = script_runner
-                p.outpath_grids = opts.outdir_img2img_grids
-                p.outpath_samples = opts.outdir_img2img_samples
+        # see text2imgapi: decoding init images and building p happen outside queue_lock
+        with closing(StableDiffusionProcessingImg2Img(sd_model=shared.sd_model, **args)) as p:
+            p.init_images = [decode_base64_to_image(x) for x in init_images]
+            p.is_api = True
+            p.scripts = script_runner
+            p.outpath_grids = opts.outdir_img2img_grids
+            p.outpath_samples = opts.outdir_img2img_samples
+            if selectable_scripts is not None:
+                p.script_args = script_args # Need to pass args as list here
+            else:
+                p.script_args = tuple(script_args) # Need to pass args as tuple here
 
+            with self.queue_lock:
                 try:
                     shared.state.begin(job="scripts_img2img")
                     start_task(task_id)
                     if selectable_scripts is not None:
-                        p.script_args = script_args
-                        processed = scripts.scripts_img2img.run(p, *p.script_args) # Need to pass args as list here
+                        processed = scripts.scripts_img2img.run(p, *p.script_args)
                     else:
-                        p.script_args = tuple(script_args) # Need to pass args as tuple here
                         processed = process_images(p)
                     finish_task(task_id)
                 finally:
                     shared.state.end()
                     shared.total_tqdm.clear()
 
-        b64images = list(map(encode_pil_to_base64, processed.images)) if send_images else []
+        images, encode_time = self.encode_images(processed.images if send_images else [], response_format, encode_options)
 
         if not img2imgreq.include_init_images:
             img2imgreq.init_images = None
             img2imgreq.mask = None
 
-        return models.ImageToImageResponse(images=b64images, parameters=vars(img2imgreq), info=processed.js())
+        return models.ImageToImageResponse(parameters=vars(img2imgreq), info=info_with_encode_time(processed, encode_time), **images)
+
+    def encode_images(self, images, response_format, encode_options):
+        t = time.perf_counter()
+        encoded = list(self.encode_pool.map(partial(encode_image, **encode_options), images))
+        encode_time = time.perf_counter() - t
+
+        if response_format == "binary":
+            encoded = [base64.b64decode(image) if isinstance(image, str) else image for image in encoded]
+            result_id = self.results.put(encoded, encoded_media_type(encode_options["image_format"]))
+            return {"images": [], "result_id": result_id, "image_count": len(encoded)}, encode_time
+        return {"images": [image if isinstance(image, str) else base64.b64encode(image) for image in encoded]}, encode_time
+
+    def get_result_image(self, result_id: str, index: int):
+        result = self.results.get(result_id, index)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Result not found")
+        image, media_type = result
+        return Response(content=image, media_type=media_type)
+
+    def delete_result(self, result_id: str):
+        if not self.results.delete(result_id):
+            raise HTTPException(status_code=404, detail="Result not found")
+        return {}
+
+    async def text2img_batch_api(self, request: Request, batch_size: int = 8, max_buffered: int = 256, idle_timeout: int = 300):
+        if batch_size < 1:
+            raise HTTPException(status_code=422, detail="batch_size must be at least 1")
+        if idle_timeout < 1:
+            raise HTTPException(status_code=422, detail="idle_timeout must be at least 1")
+        items = await run_in_threadpool(parse_txt2img_batch_items, await request.body())
+        if not items:
+            raise HTTPException(status_code=422, detail="No items in batch")
+
+        job = TextToImageBatchJob(items, batch_size, max(max_buffered, batch_size), idle_timeout)
+        for members in job.batches:
+            try:
+                models.StableDiffusionTxt2ImgProcessingAPI(**members[0][1].params)
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=f"Invalid params for item {members[0][0] + 1}: {e}") from e
+
+        with self.batch_jobs_lock:
+            expired = [job_id for job_id, old in self.batch_jobs.items() if old.finished_at is not None and time.time() - old.finished_at > 3600]
+            for job_id in expired:
+                del self.batch_jobs[job_id]
+            self.batch_jobs[job.id] = job
+        self.batch_executor.submit(self.run_txt2img_batch, job)
+
+        return models.TextToImageBatchResponse(job_id=job.id, total=job.total, batches=len(job.batches))
+
+    def run_txt2img_batch(self, job):
+        job.status = "running"
+        # time spent queued behind other jobs does not count as idle
+        job.last_taken = time.time()
+        try:
+            for members in job.batches:
+                if job.cancelled:
+                    break
+
+                items = [item for _, item in members]
+                req = models.StableDiffusionTxt2ImgProcessingAPI(**dict(
+                    items[0].params,
+                    prompt=[item.prompt for item in items],
+                    negative_prompt=[item.negative_prompt for item in items],
+                    seed=[item.seed for item in items],
+                    batch_size=len(items),
+                    n_iter=1,
+                ))
+                try:
+                    response = self.text2imgapi(req)
+                except Exception as e:
+                    detail = e.detail if isinstance(e, HTTPException) else str(e)
+                    for index, _ in members:
+                        job.add_event("error", {"index": index, "error": detail})
+                    continue
+
+                info = json.loads(response.info)
+                first = info.get("index_of_first_image", 0)
+                seeds = info.get("all_seeds") or []
+                for position, (index, item) in enumerate(members):
+                    if first + position >= len(response.images):
+                        job.add_event("error", {"index": index, "error": "No image returned"})
+                        continue
+                    image = response.images[first + position]
+                    job.add_event("image", {
+                        "index": index,
+                        "seed": seeds[position] if position < len(seeds) else item.seed,
+                        "image": image.decode() if isinstance(image, bytes) else image,
+                    })
+        except Exception as e:
+            errors.report(f"txt2img-batch job {job.id} failed: {e}", exc_info=True)
+        finally:
+            job.finish()
+
+    def get_txt2img_batch_job(self, job_id):
+        with self.batch_jobs_lock:
+            job = self.batch_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Batch job not found")
+        return job
+
+    def get_txt2img_batch(self, job_id: str):
+        return self.get_txt2img_batch_job(job_id).to_status()
+
+    def stream_txt2img_batch(self, job_id: str, offset: int = 0, stream: str = "sse", last_event_id: str = Header(None)):
+        job = self.get_txt2img_batch_job(job_id)
+        if stream not in ("sse", "jsonl"):
+            raise HTTPException(status_code=422, detail=f"Invalid stream: {stream}")
+        if last_event_id is not None and last_event_id.isdigit():
+            offset = max(offset, int(last_event_id) + 1)
+
+        media_type = "text/event-stream" if stream == "sse" else "application/x-ndjson"
+        return StreamingResponse(stream_txt2img_batch_events(job, offset, stream), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+    def cancel_txt2img_batch(self, job_id: str):
+        job = self.get_txt2img_batch_job(job_id)
+        job.cancel()
+        return job.to_status()
 
     def extras_single_image_api(self, req: models.ExtrasSingleImageRequest):
         reqDict = setUpscalers(req)
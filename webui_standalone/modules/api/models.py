@@ -1,7 +1,7 @@
 import inspect
 
 from pydantic import BaseModel, Field, create_model
-from typing import Any, Optional, Literal
+from typing import Any, Optional, Literal, Union
 from inflection import underscore
 from modules.processing import StableDiffusionProcessingTxt2Img, StableDiffusionProcessingImg2Img
 from modules.shared import sd_upscalers, opts, parser
@@ -24,6 +24,14 @@ API_NOT_ALLOWED = [
     "ddim_discretize"
 ]
 
+# fields that also accept one value per image, so a single request can carry a whole batch of distinct prompts/seeds
+API_PER_IMAGE_LIST_FIELDS = {
+    "prompt": Union[str, list[str]],
+    "negative_prompt": Union[str, list[str]],
+    "seed": Union[int, list[int]],
+    "subseed": Union[int, list[int]],
+}
+
 class ModelDef(BaseModel):
     """Assistance Class for Pydantic Dynamic Model Generation"""
 
@@ -54,6 +62,9 @@ class PydanticModelGenerator:
                 # images are sent as base64 strings via API
                 field_type = 'str'
 
+            if k in API_PER_IMAGE_LIST_FIELDS:
+                field_type = API_PER_IMAGE_LIST_FIELDS[k]
+
             return Optional[field_type]
 
         def merge_class_params(class_):
@@ -109,6 +120,10 @@ StableDiffusionTxt2ImgProcessingAPI = PydanticModelGenerator(
         {"key": "alwayson_scripts", "type": dict, "default": {}},
         {"key": "force_task_id", "type": str, "default": None},
         {"key": "infotext", "type": str, "default": None},
+        {"key": "response_format", "type": str, "default": "base64"},
+        {"key": "image_format", "type": str, "default": None},
+        {"key": "png_compress_level", "type": int, "default": None},
+        {"key": "webp_lossless", "type": bool, "default": False},
     ]
 ).generate_model()
 
@@ -128,6 +143,10 @@ StableDiffusionImg2ImgProcessingAPI = PydanticModelGenerator(
         {"key": "alwayson_scripts", "type": dict, "default": {}},
         {"key": "force_task_id", "type": str, "default": None},
         {"key": "infotext", "type": str, "default": None},
+        {"key": "response_format", "type": str, "default": "base64"},
+        {"key": "image_format", "type": str, "default": None},
+        {"key": "png_compress_level", "type": int, "default": None},
+        {"key": "webp_lossless", "type": bool, "default": False},
     ]
 ).generate_model()
 
@@ -135,11 +154,34 @@ class TextToImageResponse(BaseModel):
     images: list[str] = Field(default=None, title="Image", description="The generated image in base64 format.")
     parameters: dict
     info: str
+    result_id: str = Field(default=None, title="Result ID", description="With response_format=binary, the ID to fetch the raw images from /sdapi/v1/results/{result_id}/{index}.")
+    image_count: int = Field(default=None, title="Image count", description="With response_format=binary, the number of images stored under result_id.")
 
 class ImageToImageResponse(BaseModel):
     images: list[str] = Field(default=None, title="Image", description="The generated image in base64 format.")
     parameters: dict
     info: str
+    result_id: str = Field(default=None, title="Result ID", description="With response_format=binary, the ID to fetch the raw images from /sdapi/v1/results/{result_id}/{index}.")
+    image_count: int = Field(default=None, title="Image count", description="With response_format=binary, the number of images stored under result_id.")
+
+class TextToImageBatchItem(BaseModel):
+    prompt: str = Field(title="Prompt")
+    negative_prompt: str = Field(default="", title="Negative Prompt")
+    seed: int = Field(default=-1, title="Seed")
+    params: dict = Field(default={}, title="Parameters", description="Other txt2img request fields; items with equal params are generated together in the same batch.")
+
+class TextToImageBatchResponse(BaseModel):
+    job_id: str = Field(title="Job ID", description="ID to stream results from /sdapi/v1/txt2img-batch/{job_id}/events.")
+    total: int = Field(title="Total", description="Number of images in the job.")
+    batches: int = Field(title="Batches", description="Number of txt2img batches the job was split into.")
+
+class TextToImageBatchStatus(BaseModel):
+    job_id: str = Field(title="Job ID")
+    status: str = Field(title="Status", description="queued, running, done or cancelled.")
+    total: int = Field(title="Total")
+    completed: int = Field(title="Completed", description="Images generated so far.")
+    failed: int = Field(title="Failed", description="Images whose batch failed.")
+    buffered: int = Field(title="Buffered", description="Results waiting to be streamed; generation pauses while this buffer is full.")
 
 class ExtrasBaseRequest(BaseModel):
     resize_mode: Literal[0, 1] = Field(default=0, title="Resize Mode", description="Sets the resize mode: 0 to upscale by upscaling_resize amount, 1 to upscale up to upscaling_resize_h x upscaling_resize_w.")
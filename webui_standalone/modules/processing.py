@@ -673,6 +673,9 @@ def decode_latent_batch(model, batch, target_device=None, check_for_nans=False):
 
 
 def get_fixed_seed(seed):
+    if isinstance(seed, list):
+        return [get_fixed_seed(x) for x in seed]
+
     if seed == '' or seed is None:
         seed = -1
     elif isinstance(seed, str):
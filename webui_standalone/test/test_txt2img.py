@@ -1,4 +1,8 @@
 
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 import requests
 
@@ -88,3 +92,114 @@ def test_txt2img_multiple_batches_performed(url_txt2img, simple_txt2img_request)
 def test_txt2img_batch_performed(url_txt2img, simple_txt2img_request):
     simple_txt2img_request["batch_size"] = 2
     assert requests.post(url_txt2img, json=simple_txt2img_request).status_code == 200
+
+
+def test_txt2img_per_image_prompts_and_seeds_performed(url_txt2img, simple_txt2img_request):
+    simple_txt2img_request["batch_size"] = 2
+    simple_txt2img_request["prompt"] = ["first person", "second person"]
+    simple_txt2img_request["seed"] = [1234, 5678]
+    response = requests.post(url_txt2img, json=simple_txt2img_request)
+    assert response.status_code == 200
+    assert len(response.json()["images"]) == 2
+
+
+def test_txt2img_per_image_prompts_length_mismatch_rejected(url_txt2img, simple_txt2img_request):
+    simple_txt2img_request["batch_size"] = 2
+    simple_txt2img_request["prompt"] = ["only one prompt"]
+    assert requests.post(url_txt2img, json=simple_txt2img_request).status_code == 422
+
+
+def test_txt2img_binary_response_performed(base_url, url_txt2img, simple_txt2img_request):
+    simple_txt2img_request["batch_size"] = 2
+    simple_txt2img_request["response_format"] = "binary"
+    response = requests.post(url_txt2img, json=simple_txt2img_request)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["images"] == []
+    assert result["image_count"] == 2
+
+    url_result = f"{base_url}/sdapi/v1/results/{result['result_id']}"
+    for index in range(2):
+        image = requests.get(f"{url_result}/{index}")
+        assert image.status_code == 200
+        assert image.headers["content-type"].startswith("image/")
+        assert len(image.content) > 0
+    assert requests.get(f"{url_result}/2").status_code == 404
+    assert requests.delete(url_result).status_code == 200
+    assert requests.get(f"{url_result}/0").status_code == 404
+
+
+def test_txt2img_invalid_response_format_rejected(url_txt2img, simple_txt2img_request):
+    simple_txt2img_request["response_format"] = "multipart"
+    assert requests.post(url_txt2img, json=simple_txt2img_request).status_code == 422
+
+
+@pytest.mark.parametrize("encode_options", [{"image_format": "png", "png_compress_level": 1}, {"image_format": "webp", "webp_lossless": True}, {"image_format": "raw"}])
+def test_txt2img_encode_options_performed(url_txt2img, simple_txt2img_request, encode_options):
+    simple_txt2img_request.update(encode_options)
+    response = requests.post(url_txt2img, json=simple_txt2img_request)
+    assert response.status_code == 200
+    assert len(response.json()["images"]) == 1
+    assert "encode_time" in json.loads(response.json()["info"])
+
+
+def test_txt2img_npy_binary_response_performed(base_url, url_txt2img, simple_txt2img_request):
+    simple_txt2img_request["image_format"] = "npy"
+    simple_txt2img_request["response_format"] = "binary"
+    result = requests.post(url_txt2img, json=simple_txt2img_request).json()
+    image = requests.get(f"{base_url}/sdapi/v1/results/{result['result_id']}/0")
+    assert image.status_code == 200
+    assert image.content.startswith(b"\x93NUMPY")
+
+
+@pytest.mark.parametrize("encode_options", [{"image_format": "tiff"}, {"png_compress_level": 10}])
+def test_txt2img_invalid_encode_options_rejected(url_txt2img, simple_txt2img_request, encode_options):
+    simple_txt2img_request.update(encode_options)
+    assert requests.post(url_txt2img, json=simple_txt2img_request).status_code == 422
+
+
+def test_txt2img_concurrent_clients_overlap(url_txt2img, simple_txt2img_request):
+    # setup and encoding run outside queue_lock, so concurrent clients overlap everything but sampling
+    clients = 4
+
+    def post(_=None):
+        assert requests.post(url_txt2img, json=simple_txt2img_request).status_code == 200
+
+    post()  # warm-up
+
+    t = time.perf_counter()
+    for _ in range(clients):
+        post()
+    serial = time.perf_counter() - t
+
+    t = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(post, range(clients)))
+    concurrent = time.perf_counter() - t
+
+    assert concurrent < serial
+
+
+@pytest.fixture()
+def url_txt2img_batch(base_url):
+    return f"{base_url}/sdapi/v1/txt2img-batch"
+
+
+def test_txt2img_batch_job_streamed(url_txt2img_batch, simple_txt2img_request):
+    params = {key: simple_txt2img_request[key] for key in ("steps", "width", "height", "sampler_index")}
+    items = [{"prompt": f"example prompt {i}", "seed": 1000 + i, "params": params} for i in range(3)]
+    response = requests.post(url_txt2img_batch, params={"batch_size": 2}, data="\n".join(json.dumps(item) for item in items))
+    assert response.status_code == 200
+    job = response.json()
+    assert job["total"] == 3
+    assert job["batches"] == 2
+
+    events = [json.loads(line) for line in requests.get(f"{url_txt2img_batch}/{job['job_id']}/events", params={"stream": "jsonl"}).iter_lines() if line]
+    assert sorted(event["index"] for event in events if event["event"] == "image") == [0, 1, 2]
+    assert events[-1]["event"] == "done"
+    assert requests.get(f"{url_txt2img_batch}/{job['job_id']}").json()["completed"] == 3
+
+
+def test_txt2img_batch_job_invalid_item_rejected(url_txt2img_batch):
+    assert requests.post(url_txt2img_batch, data='[{"negative_prompt": "no prompt"}]').status_code == 422
+    assert requests.get(f"{url_txt2img_batch}/missing").status_code == 404